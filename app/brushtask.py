@@ -29,6 +29,7 @@ from app.utils.types import BrushDeleteType, BrushStopType, MediaType
 from app.scheduler_service import SchedulerService
 from app.queue import scheduler_queue
 from app.utils import RedisStore
+from app.utils.torrent_attr_cache import TorrentAttrCache
 
 
 class BrushTask(metaclass=SingletonMeta):
@@ -40,12 +41,15 @@ class BrushTask(metaclass=SingletonMeta):
     rsshelper = None
     downloader = None
     redis_store = None
+    attr_cache = None
     _scheduler = None
     _jobstore = "brushtask"
     _brush_tasks = {}
     _torrents_cache = []
     _qb_client = "qbittorrent"
     _tr_client = "transmission"
+    # 每个站点每轮最多刷新的过期种子属性数
+    _attr_refresh_limit = 20
 
     def __init__(self):
         self.init_config()
@@ -58,6 +62,7 @@ class BrushTask(metaclass=SingletonMeta):
         self.siteconf = SiteConf()
         self.filter = Filter()
         self.downloader = Downloader()
+        self.attr_cache = TorrentAttrCache()
         self.redis_store = RedisStore()
         # 移除现有任务
         self.stop_service()
@@ -311,6 +316,9 @@ class BrushTask(metaclass=SingletonMeta):
                                                 headers=headers,
                                                 proxy=site_proxy)
                 log.debug("【Brush】%s 解析详情, %s" % (torrent_name, torrent_attr))
+                # 添加下载时直接使用本次解析的属性
+                if enclosure:
+                    self.attr_cache.set_attr(self.__get_torrent_url(site_info, enclosure), torrent_attr)
                 # 检查种子是否符合选种规则
                 if not self.__check_rss_rule(rss_rule=rss_rule,
                                              title=torrent_name,
@@ -386,11 +394,8 @@ class BrushTask(metaclass=SingletonMeta):
                 torrent_id = torrent.id
                 total_uploaded += torrent.uploaded
                 total_downloaded += torrent.downloaded
-                
-                
-                if torrent_id_maps.get(torrent_id):
-                    enclosure = torrent_id_maps.get(torrent_id)
-                    torrent_url, torrent_attr = self.get_torrent_attr(site_info, enclosure)
+
+                torrent_url, torrent_attr = torrent_attrs.get(torrent_id_maps.get(torrent_id)) or (None, {})
                 log.debug("【Brush】%s 解析详情 %s" %
                             (torrent_url, torrent_attr))
                 torrent_params = {
@@ -399,7 +404,7 @@ class BrushTask(metaclass=SingletonMeta):
                     "uploaded": torrent.uploaded,
                     "iatime": torrent.iatime,
                     "avg_upspeed": torrent.avg_upload_speed,
-                    "freespace": self.downloader.get_free_space(downloader_id, download_dir),
+                    "freespace": freespace,
                     "torrent_attr": torrent_attr,
                 }
 
@@ -451,20 +456,33 @@ class BrushTask(metaclass=SingletonMeta):
             if not torrent_ids:
                 return
 
-            # 查询下载器完成的种子并处理
-            completed_torrents = self.downloader.get_completed_torrents(downloader_id, torrent_ids)
+            # 从种子表查询下载器完成的种子，不在种子表中的种子刷新后再判断，避免误删新添加的种子
+            completed_torrents = self.downloader.get_state_torrents(downloader_id, torrent_ids,
+                                                                    status="completed", max_age=0)
             if completed_torrents is None:
                 log.warn(f"【Brush】任务 {task_name} 获取下载完成种子失败")
                 return
             remove_torrent_ids = set(torrent_ids) - set([torrent.id for torrent in completed_torrents])
-            process_torrents(completed_torrents, downloader_cfg, site_info)
 
-            # 查询下载中种子并处理
-            downloading_torrents = self.downloader.get_downloading_torrents(downloader_id, torrent_ids)
+            # 查询下载中种子
+            downloading_torrents = self.downloader.get_state_torrents(downloader_id, torrent_ids,
+                                                                      status="downloading", max_age=0)
             if downloading_torrents is None:
                 log.warn(f"【Brush】任务 {task_name} 获取下载中种子失败")
                 return
             remove_torrent_ids -= set([torrent.id for torrent in downloading_torrents])
+
+            # 种子属性及剩余空间每轮统一获取一次
+            if self.__need_torrent_attr(remove_rule):
+                torrent_attrs = self.get_torrent_attrs(
+                    site_info,
+                    [torrent_id_maps.get(torrent.id) for torrent in completed_torrents + downloading_torrents])
+            else:
+                torrent_attrs = {}
+            freespace = self.downloader.get_free_space(downloader_id, download_dir) \
+                if remove_rule and remove_rule.get("freespace") else None
+
+            process_torrents(completed_torrents, downloader_cfg, site_info)
             process_torrents(downloading_torrents, downloader_cfg, site_info, is_downloading=True)
 
             # 删除下载器中已不存在的种子
@@ -477,7 +495,7 @@ class BrushTask(metaclass=SingletonMeta):
             if delete_ids:
                 self.downloader.delete_torrents(downloader_id, delete_ids, delete_file=True)
                 time.sleep(5)
-                torrents = self.downloader.get_torrents(downloader_id, delete_ids)
+                torrents = self.downloader.get_torrents(downloader_id, delete_ids, fields=["id"])
                 if torrents is None:
                     delete_ids = []
                     update_torrents = []
@@ -544,8 +562,10 @@ class BrushTask(metaclass=SingletonMeta):
         """
         查询当前正在下载的任务数
         """
-        torrents = self.downloader.get_downloading_torrents(
-            downloader_id=downloader_id) or []
+        torrents = self.downloader.get_state_torrents(downloader_id=downloader_id,
+                                                      status="downloading")
+        if torrents is None:
+            return None
         return len(torrents)
 
     def __download_torrent(self,
@@ -569,7 +589,7 @@ class BrushTask(metaclass=SingletonMeta):
         if not enclosure:
             return False
         # 站点流控
-        if self.sites.check_ratelimit(site_info.get("id")):
+        if self.sites.check_ratelimit(site_info.get("id"), timeout=30):
             return False
         taskid = taskinfo.get("id")
         taskname = taskinfo.get("name")
@@ -872,6 +892,8 @@ class BrushTask(metaclass=SingletonMeta):
 
         hr = params.get('torrent_attr', {}).get('hr', False)
         log.debug(f"HR 状态 {hr}")
+        # 种子属性获取失败时，不按HR及免费状态删种
+        attr_unknown = params.get('torrent_attr', {}).get('unknown', False)
 
         # 提取各参数
         values = {
@@ -918,6 +940,11 @@ class BrushTask(metaclass=SingletonMeta):
                         log.debug(f"规则 {field} 被设置为忽略 (#)，跳过检查")
                         continue
 
+                    if attr_unknown and field in ["time", "hr_time", "freestatus"]:
+                        log.debug(f"跳过检查 '{field}'，因为种子属性未知")
+                        if mode == 'and':
+                            all_conditions_met = False
+                        continue
                     # hr 为 True 时只检查 hr_time，反之检查 time
                     if field == "time" and hr:
                         log.debug("跳过检查 'time'，因为 hr 为 True")
@@ -980,7 +1007,7 @@ class BrushTask(metaclass=SingletonMeta):
         if not stop_rule:
             return False
 
-        if stop_rule.get("stopfree") and torrent_attr:
+        if stop_rule.get("stopfree") and torrent_attr and not torrent_attr.get("unknown"):
             rule_stopfree = stop_rule.get("stopfree")
             if rule_stopfree:
                 if rule_stopfree == "Y" and not (torrent_attr.get('2xfree') or torrent_attr.get('free')):
@@ -1084,12 +1111,14 @@ class BrushTask(metaclass=SingletonMeta):
         # 下载器名称
         downlaod_name = downloader_cfg.get("name")
         # 查询下载器中正在下载的所有种子
-        torrents = self.downloader.get_downloading_torrents(downloader_id=downloader_id,
-                                                            ids=torrent_ids)
+        torrents = self.downloader.get_state_torrents(downloader_id=downloader_id,
+                                                      ids=torrent_ids,
+                                                      status="downloading")
         # 有错误不处理了，避免误删种子
         if torrents is None:
             log.warn("【Brush】任务 %s 获取正在下载种子失败" % task_name)
             return
+        torrent_attrs = self.get_torrent_attrs(site_info, [torrent_id_maps.get(torrent.id) for torrent in torrents])
         for torrent in torrents:
             torrent_id = torrent.id
             # 种子名称
@@ -1098,7 +1127,7 @@ class BrushTask(metaclass=SingletonMeta):
             add_time = torrent.add_time
             if torrent_id_maps.get(torrent_id):
                 enclosure = torrent_id_maps.get(torrent_id)
-                torrent_url, torrent_attr = self.get_torrent_attr(site_info, enclosure)
+                torrent_url, torrent_attr = torrent_attrs.get(enclosure) or (None, {})
                 log.debug("【Brush】%s 解析详情 %s" %
                             (torrent_url, torrent_attr))
 
@@ -1117,19 +1146,55 @@ class BrushTask(metaclass=SingletonMeta):
 
     def get_torrent_attr(self, site_info: dict, enclosure: str):
         """
-        通过下载链接获取种子属性
+        通过下载链接获取种子属性，新鲜期内的属性直接使用缓存
         """
         if not site_info:
             return None, {}
-        ua = site_info.get("ua")
-        headers = site_info.get("headers")
-        if JsonUtils.is_valid_json(headers):
-            headers = json.loads(site_info.get("headers"))
-        else:
-            headers = {}
-        headers.update({'User-Agent': ua})
-        site_proxy = site_info.get("proxy")
-        site_cookie = site_info.get("cookie")
+        torrent_url = self.__get_torrent_url(site_info, enclosure)
+        torrent_attr = self.attr_cache.get_attr(torrent_url)
+        if torrent_attr is None:
+            torrent_attr = self.__fetch_torrent_attr(site_info, torrent_url)
+        return torrent_url, torrent_attr
+
+    def get_torrent_attrs(self, site_info: dict, enclosures: list):
+        """
+        批量获取种子属性，优先使用缓存：
+        从未获取过属性的种子总是查询，避免按默认属性误删种；
+        过了新鲜期的种子受站点流控及单轮刷新上限约束，未轮到刷新的继续使用旧属性
+        :return: {下载链接: (详情页地址, 种子属性)}
+        """
+        enclosures = [enclosure for enclosure in dict.fromkeys(enclosures) if enclosure]
+        if not site_info:
+            return {enclosure: (None, {}) for enclosure in enclosures}
+        torrent_urls = {enclosure: self.__get_torrent_url(site_info, enclosure) for enclosure in enclosures}
+        cached_attrs = self.attr_cache.get_attrs(torrent_urls.values())
+        ret_attrs = {}
+        missing_enclosures = []
+        stale_enclosures = []
+        for enclosure, torrent_url in torrent_urls.items():
+            if torrent_url not in cached_attrs:
+                missing_enclosures.append(enclosure)
+                continue
+            torrent_attr, fresh = cached_attrs.get(torrent_url)
+            ret_attrs[enclosure] = (torrent_url, torrent_attr)
+            if not fresh:
+                stale_enclosures.append(enclosure)
+        for enclosure in missing_enclosures:
+            torrent_url = torrent_urls.get(enclosure)
+            ret_attrs[enclosure] = (torrent_url, self.__fetch_torrent_attr(site_info, torrent_url))
+        for i, enclosure in enumerate(stale_enclosures):
+            if i >= self._attr_refresh_limit or self.sites.check_ratelimit(site_info.get("id")):
+                log.debug(f"【Brush】站点 {site_info.get('name')} 本轮暂缓刷新 {len(stale_enclosures) - i} 个种子属性")
+                break
+            torrent_url, stale_attr = ret_attrs.get(enclosure)
+            ret_attrs[enclosure] = (torrent_url, self.__fetch_torrent_attr(site_info, torrent_url, stale_attr))
+        return ret_attrs
+
+    @staticmethod
+    def __get_torrent_url(site_info: dict, enclosure: str):
+        """
+        通过下载链接生成种子详情页地址
+        """
         split_url = urlsplit(site_info.get("rssurl"))
         site_base_url = f"{split_url.scheme}://{split_url.netloc}"
 
@@ -1138,15 +1203,42 @@ class BrushTask(metaclass=SingletonMeta):
         site_key = next((key for key in ['m-team', 'yemapt', 'star-space'] if key in enclosure), 'default')
 
         # 构建 torrent_url
-        torrent_url = f"{site_base_url}{SiteConf().URL_DETAIL_TEMPLATES[site_key].format(tid=tid)}"
+        return f"{site_base_url}{SiteConf().URL_DETAIL_TEMPLATES[site_key].format(tid=tid)}"
 
+    def __fetch_torrent_attr(self, site_info: dict, torrent_url: str, stale_attr: dict = None):
+        """
+        请求种子详情页获取属性并写入缓存
+        :param stale_attr: 过了新鲜期的旧属性，获取失败时继续使用，不覆盖缓存
+        """
+        ua = site_info.get("ua")
+        headers = site_info.get("headers")
+        if JsonUtils.is_valid_json(headers):
+            headers = json.loads(site_info.get("headers"))
+        else:
+            headers = {}
+        headers.update({'User-Agent': ua})
         torrent_attr = self.siteconf.check_torrent_attr(torrent_url=torrent_url,
-                                                                cookie=site_cookie,
-                                                                ua=ua,
-                                                                headers=headers,
-                                                                proxy=site_proxy)
-                                                        
-        return torrent_url,torrent_attr
+                                                        cookie=site_info.get("cookie"),
+                                                        ua=ua,
+                                                        headers=headers,
+                                                        proxy=site_info.get("proxy"),
+                                                        cached=False)
+        if torrent_attr.get("unknown"):
+            log.debug(f"【Brush】{torrent_url} 获取种子属性失败")
+            if stale_attr and not stale_attr.get("unknown"):
+                return stale_attr
+        self.attr_cache.set_attr(torrent_url, torrent_attr)
+        return torrent_attr
+
+    @staticmethod
+    def __need_torrent_attr(remove_rule):
+        """
+        删种规则是否用到种子属性：做种时间按是否HR区分，促销到期需要免费状态
+        """
+        if not remove_rule:
+            return False
+        return any(remove_rule.get(field) and remove_rule.get(field) not in ["#", "N"]
+                   for field in ["time", "hr_time", "freestatus"])
 
     @staticmethod
     def is_in_time_range(time_range: str=""):
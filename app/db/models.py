@@ -155,7 +155,7 @@ class DOWNLOADHISTORY(Base):
     TITLE = Column(Text, index=True)
     YEAR = Column(Text)
     TYPE = Column(Text)
-    TMDBID = Column(Text)
+    TMDBID = Column(Text, index=True)
     SE = Column(Text)
     VOTE = Column(Text)
     POSTER = Column(Text)
@@ -358,6 +358,16 @@ class SEARCHRESULTINFO(Base):
     UPLOAD_VOLUME_FACTOR = Column(Float)
     DOWNLOAD_VOLUME_FACTOR = Column(Float)
     NOTE = Column(Text)
+    # 以下为入库时预先计算的分组信息
+    TITLE_KEY = Column(Text, index=True)
+    SE_KEY = Column(Text)
+    GROUP_KEY = Column(Text)
+    UNIQUE_KEY = Column(Text)
+    RES_PIX = Column(Text)
+    RES_SOURCE = Column(Text)
+    RES_EFFECT = Column(Text)
+    VIDEO_ENCODE = Column(Text)
+    SORT_ORDER = Column(Integer, index=True)
 
 
 class SITEBRUSHTASK(Base):
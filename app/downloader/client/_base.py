@@ -42,12 +42,13 @@ class _IDownloadClient(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_torrents(self, ids, status, tag):
+    def get_torrents(self, ids, status, tag, fields=None):
         """
         按条件读取种子信息
         :param ids: 种子ID，单个ID或者ID列表
         :param status: 种子状态过滤
         :param tag: 种子标签过滤
+        :param fields: 需要的种子属性，为空时返回全部属性，下载器可据此只查询需要的信息
         :return: 种子信息列表，是否发生错误
         """
         pass
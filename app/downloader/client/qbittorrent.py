@@ -4,6 +4,7 @@ import re
 import time
 import hashlib
 from datetime import datetime
+from threading import Lock
 
 from bencode import bdecode
 
@@ -37,6 +38,19 @@ class Qbittorrent(_IDownloadClient):
     download_dir = []
     name = "测试"
 
+    # sync/maindata增量同步的种子表：hash -> 种子信息
+    _sync_rid = 0
+    _sync_torrents = None
+    _sync_lock = None
+    # 懒加载的种子tracker及平均上传速度，种子变化前一直有效：hash -> (校验值, tracker列表, 平均上传速度)
+    _torrent_extras = None
+
+    # 本地种子表可过滤的状态
+    _completed_states = ["uploading", "stalledUP", "checkingUP", "pausedUP", "stoppedUP",
+                         "queuedUP", "forcedUP"]
+    _downloading_states = ["downloading", "metaDL", "forcedMetaDL", "stalledDL", "checkingDL",
+                           "pausedDL", "stoppedDL", "queuedDL", "forcedDL", "allocating"]
+
     def __init__(self, config):
         self._client_config = config
         self.init_config()
@@ -67,6 +81,13 @@ class Qbittorrent(_IDownloadClient):
         return self.client_type
 
     def connect(self):
+        # 重新连接后完整同步
+        if not self._sync_lock:
+            self._sync_lock = Lock()
+        with self._sync_lock:
+            self._sync_rid = 0
+            self._sync_torrents = {}
+            self._torrent_extras = {}
         if self.host and self.port:
             self.qbc = self.__login_qbittorrent()
 
@@ -182,16 +203,23 @@ class Qbittorrent(_IDownloadClient):
                 return category_name
         return None
 
-    def get_torrents(self, ids=None, status=None, tag=None) -> Tuple[list[Torrent], bool]:
+    def get_torrents(self, ids=None, status=None, tag=None, fields=None) -> Tuple[list[Torrent], bool]:
         """
-        获取种子列表
+        获取种子列表，从sync/maindata增量同步的本地种子表中读取
+        :param fields: 需要的种子属性，本地种子表已包含全部属性，忽略
         return: 种子列表, 是否发生异常
         """
         if not self.qbc:
             return [], True
         try:
-            torrents = self.qbc.torrents_info(torrent_hashes=ids,
-                                              status_filter=status)
+            if status and status not in ["completed", "downloading"]:
+                # 其它状态由下载器过滤
+                torrents = self.qbc.torrents_info(torrent_hashes=ids,
+                                                  status_filter=status)
+            else:
+                torrents = self.__filter_torrents(torrents=self.__sync_torrents(),
+                                                  ids=ids,
+                                                  status=status)
             torrent_list: list[Torrent] = []
             for torrent in torrents:
                 torrent_list.append(self.torrent_properties(torrent=torrent))
@@ -213,6 +241,53 @@ class Qbittorrent(_IDownloadClient):
             ExceptionUtils.exception_traceback(err)
             return [], True
 
+    def __sync_torrents(self):
+        """
+        通过sync/maindata按rid增量更新本地种子表
+        :return: 种子信息列表
+        """
+        with self._sync_lock:
+            try:
+                maindata = self.qbc.sync_maindata(rid=self._sync_rid) or {}
+            except Exception:
+                # 下次完整同步
+                self._sync_rid = 0
+                raise
+            if maindata.get("full_update"):
+                self._sync_torrents = {}
+            for torrent_hash, torrent in (maindata.get("torrents") or {}).items():
+                if torrent_hash in self._sync_torrents:
+                    self._sync_torrents[torrent_hash].update(torrent)
+                else:
+                    self._sync_torrents[torrent_hash] = dict(torrent, hash=torrent_hash)
+            for torrent_hash in maindata.get("torrents_removed") or []:
+                self._sync_torrents.pop(torrent_hash, None)
+                self._torrent_extras.pop(torrent_hash, None)
+            if maindata.get("full_update"):
+                for torrent_hash in set(self._torrent_extras) - set(self._sync_torrents):
+                    self._torrent_extras.pop(torrent_hash, None)
+            self._sync_rid = maindata.get("rid") or 0
+            return [dict(torrent) for torrent in self._sync_torrents.values()]
+
+    def __filter_torrents(self, torrents, ids=None, status=None):
+        """
+        按种子hash及状态过滤本地种子表
+        """
+        if ids:
+            if not isinstance(ids, list):
+                ids = [ids]
+            ids = {str(tid).lower() for tid in ids}
+            torrents = [torrent for torrent in torrents if torrent.get("hash") in ids]
+        if status == "completed":
+            torrents = [torrent for torrent in torrents
+                        if torrent.get("state") in self._completed_states
+                        or (torrent.get("state") not in self._downloading_states
+                            and (torrent.get("progress") or 0) >= 1)]
+        elif status == "downloading":
+            torrents = [torrent for torrent in torrents
+                        if torrent.get("state") in self._downloading_states]
+        return torrents
+
     def get_completed_torrents(self, ids=None, tag=None):
         """
         获取已完成的种子
@@ -807,13 +882,38 @@ class Qbittorrent(_IDownloadClient):
             ExceptionUtils.exception_traceback(err)
             return
       
+    def __get_torrent_extras(self, torrent):
+        """
+        获取种子的tracker列表及平均上传速度，只在首次使用或种子tracker变化时请求下载器
+        :return: tracker列表, 平均上传速度
+        """
+        torrent_hash = torrent.get("hash")
+        check_key = (torrent.get("tracker"), torrent.get("trackers_count"))
+        with self._sync_lock:
+            extras = self._torrent_extras.get(torrent_hash)
+        if extras and extras[0] == check_key:
+            trackers = extras[1]
+        else:
+            trackers = [tracker.get('url') for tracker in self._get_torrent_trackers(torrent_hash=torrent_hash) or []
+                        if not any(keyword in tracker.get('url', '') for keyword in ['DHT', 'PeX', 'LSD'])]
+            with self._sync_lock:
+                self._torrent_extras[torrent_hash] = (check_key, trackers)
+        # 平均上传速度为上传量除以活动时间，与种子属性中的up_speed_avg一致
+        time_active = torrent.get("time_active")
+        if time_active is None:
+            properties = self._get_torrent_generic_properties(torrent_hash) or {}
+            avg_upload_speed = properties.get("up_speed_avg") or 0
+        else:
+            avg_upload_speed = int((torrent.get("uploaded") or 0) / time_active) if time_active > 0 else 0
+        return trackers, avg_upload_speed
+
     def torrent_properties(self, torrent):
         # 当前时间戳
         date_now = int(time.time())
 
         torrent_obj = Torrent()
-        properties = self._get_torrent_generic_properties(torrent.get("hash"))
-        
+        trackers, avg_upload_speed = self.__get_torrent_extras(torrent)
+
         torrent_obj.id = torrent.get("hash")
         torrent_obj.name = torrent.get("name")
         # 下载时间
@@ -828,7 +928,7 @@ class Qbittorrent(_IDownloadClient):
             # 上传量
         torrent_obj.uploaded = torrent.get("uploaded") or 0
         # 平均上传速度 Byte/s
-        torrent_obj.avg_upload_speed = properties.get("up_speed_avg")
+        torrent_obj.avg_upload_speed = avg_upload_speed
         # 已未活动 秒
         torrent_obj.iatime = date_now - \
                 torrent.get("last_activity") if torrent.get(
@@ -849,7 +949,7 @@ class Qbittorrent(_IDownloadClient):
         # 分类
         torrent_obj.category = list(map(lambda s: s.strip(), (torrent.get("category") or "").split(",")))
         # tracker
-        torrent_obj.trackers = [tracker.get('url') for tracker in self._get_torrent_trackers(torrent_hash=torrent.get("hash")) if not any(keyword in tracker.get('url', '') for keyword in ['DHT', 'PeX', 'LSD'])]
+        torrent_obj.trackers = trackers
         # 下载速度
         torrent_obj.download_speed = torrent.get('dlspeed')
         # 上传速度
@@ -2,6 +2,7 @@ import os.path
 import re
 import time
 from datetime import datetime
+from threading import Lock
 from typing import Tuple
 
 import transmission_rpc
@@ -28,8 +29,42 @@ class Transmission(_IDownloadClient):
               "peersGettingFromUs", "peersSendingToUs", "uploadRatio", "uploadedEver", "downloadedEver", "downloadDir",
               "error", "errorString", "doneDate", "queuePosition", "activityDate", "trackers", "secondsSeeding", "eta"]
 
+    # 种子实体各属性需要查询的参数，调用方只声明需要的属性
+    _field_args = {
+        "id": ["hashString"],
+        "name": ["name"],
+        "size": ["totalSize"],
+        "downloaded": ["totalSize", "percentDone"],
+        "uploaded": ["totalSize", "percentDone", "uploadRatio"],
+        "ratio": ["uploadRatio"],
+        "seeding_time": ["doneDate"],
+        "download_time": ["addedDate"],
+        "avg_upload_speed": ["uploadedEver", "secondsSeeding"],
+        "iatime": ["activityDate"],
+        "labels": ["labels"],
+        "status": ["status", "error"],
+        "save_path": ["downloadDir"],
+        "trackers": ["trackers"],
+        "progress": ["percentDone"],
+        "download_speed": ["rateDownload"],
+        "upload_speed": ["rateUpload"],
+        "eta": ["eta"]
+    }
+    # 按状态、标签过滤时需要的参数
+    _filter_args = ["id", "hashString", "status", "error", "labels", "percentDone"]
+    # 判断种子是否有变化的参数
+    _change_args = ["id", "activityDate", "editDate", "doneDate", "status", "error", "labels", "percentDone",
+                    "downloadDir", "name"]
+    # recently-active只返回最近60秒内有变化的种子，超过该间隔按变化参数比对
+    _recently_active_seconds = 50
+
     # 私有属性
     _client_config = {}
+    # 本地种子表：种子ID -> (种子, 查询时间, 变化校验值)
+    _torrent_table = None
+    _table_args = None
+    _table_time = 0
+    _table_lock = None
 
     trc = None
     host = None
@@ -63,6 +98,13 @@ class Transmission(_IDownloadClient):
         return self.client_type
 
     def connect(self):
+        # 重新连接后完整同步
+        if not self._table_lock:
+            self._table_lock = Lock()
+        with self._table_lock:
+            self._torrent_table = {}
+            self._table_args = set()
+            self._table_time = 0
         if self.host and self.port:
             self.trc = self.__login_transmission()
 
@@ -98,19 +140,24 @@ class Transmission(_IDownloadClient):
             ids = int(ids)
         return ids
 
-    def get_torrents(self, ids=None, status=None, tag=None) -> Tuple[list[Torrent], bool]:
+    def get_torrents(self, ids=None, status=None, tag=None, fields=None) -> Tuple[list[Torrent], bool]:
         """
-        获取种子列表
+        获取种子列表，未指定ID时从按recently-active增量维护的本地种子表中读取
+        :param fields: 需要的种子属性，为空时返回全部属性
         返回结果 种子列表, 是否有错误
         """
         if not self.trc:
             return [], True
         ids = self.__parse_ids(ids)
         try:
-            torrents = self.trc.get_torrents(ids=ids, arguments=self._trarg)
+            arguments = self.__get_arguments(fields)
+            if ids:
+                torrents = [(torrent, None) for torrent in self.trc.get_torrents(ids=ids, arguments=arguments)]
+            else:
+                torrents = self.__sync_torrents(arguments)
             torrent_list: list[Torrent] = []
-            for torrent in torrents:
-                torrent_list.append(self.torrent_properties(torrent=torrent))
+            for torrent, fetch_time in torrents:
+                torrent_list.append(self.torrent_properties(torrent=torrent, fields=fields, fetch_time=fetch_time))
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return [], True
@@ -150,7 +197,52 @@ class Transmission(_IDownloadClient):
                 ret_torrents.append(torrent)
         return ret_torrents, False
 
-    def get_completed_torrents(self, ids=None, tag=None) -> list[Torrent]:
+    def __get_arguments(self, fields=None):
+        """
+        种子属性对应需要查询的参数
+        """
+        if not fields:
+            return self._trarg
+        arguments = set(self._filter_args)
+        for field in fields:
+            arguments.update(self._field_args.get(field) or [])
+        return list(arguments)
+
+    def __get_change_key(self, torrent):
+        return tuple(str(torrent.fields.get(arg)) for arg in self._change_args)
+
+    def __sync_torrents(self, arguments):
+        """
+        更新本地种子表：间隔较短时只查询recently-active的种子，否则先查询各种子的变化参数，只重新获取有变化的种子
+        :return: [(种子, 查询时间)]
+        """
+        with self._table_lock:
+            now = time.time()
+            if not set(arguments) <= self._table_args:
+                # 需要新的参数，完整查询
+                self._table_args |= set(arguments) | set(self._change_args)
+                self._torrent_table = {}
+                torrents = self.trc.get_torrents(arguments=list(self._table_args))
+            elif now - self._table_time < self._recently_active_seconds:
+                torrents, removed = self.trc.get_recently_active_torrents(arguments=list(self._table_args))
+                for tid in removed or []:
+                    self._torrent_table.pop(tid, None)
+            else:
+                heads = self.trc.get_torrents(arguments=self._change_args)
+                head_ids = {head.id for head in heads}
+                for tid in set(self._torrent_table) - head_ids:
+                    self._torrent_table.pop(tid)
+                changed_ids = [head.id for head in heads
+                               if head.id not in self._torrent_table
+                               or self._torrent_table[head.id][2] != self.__get_change_key(head)]
+                torrents = self.trc.get_torrents(ids=changed_ids,
+                                                 arguments=list(self._table_args)) if changed_ids else []
+            for torrent in torrents:
+                self._torrent_table[torrent.id] = (torrent, now, self.__get_change_key(torrent))
+            self._table_time = now
+            return [(torrent, fetch_time) for torrent, fetch_time, _ in self._torrent_table.values()]
+
+    def get_completed_torrents(self, ids=None, tag=None, fields=None) -> list[Torrent]:
         """
         获取已完成的种子列表
         return 种子列表, 发生错误时返回None
@@ -158,13 +250,13 @@ class Transmission(_IDownloadClient):
         if not self.trc:
             return None
         try:
-            torrents, error = self.get_torrents(status=[TorrentStatus.Uploading], ids=ids, tag=tag)
+            torrents, error = self.get_torrents(status=[TorrentStatus.Uploading], ids=ids, tag=tag, fields=fields)
             return None if error else torrents or []
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return None
 
-    def get_downloading_torrents(self, ids=None, tag=None) -> list[Torrent]:
+    def get_downloading_torrents(self, ids=None, tag=None, fields=None) -> list[Torrent]:
         """
         获取正在下载的种子列表
         return 种子列表, 发生错误时返回None
@@ -174,7 +266,8 @@ class Transmission(_IDownloadClient):
         try:
             torrents, error = self.get_torrents(ids=ids,
                                                 status=[TorrentStatus.Downloading, TorrentStatus.Stopped],
-                                                tag=tag)
+                                                tag=tag,
+                                                fields=fields)
             torrents = [t for t in torrents if t.progress * 100 < 100]
             return None if error else torrents or []
         except Exception as err:
@@ -300,7 +393,7 @@ class Transmission(_IDownloadClient):
         获取下载文件转移任务种子
         """
         # 处理下载完成的任务
-        torrents = self.get_completed_torrents() or []
+        torrents = self.get_completed_torrents(fields=["name", "labels", "save_path"]) or []
         trans_tasks = []
         for torrent in torrents:
             torrent_tags = torrent.labels or ""
@@ -337,7 +430,9 @@ class Transmission(_IDownloadClient):
         remove_torrents = []
         remove_torrents_ids = []
         torrents, error_flag = self.get_torrents(tag=config.get("filter_tags"),
-                                                 status=config.get("tr_state"))
+                                                 status=config.get("tr_state"),
+                                                 fields=["name", "seeding_time", "avg_upload_speed", "ratio",
+                                                         "size", "save_path", "trackers"])
         if error_flag:
             return []
         ratio = config.get("ratio")
@@ -527,7 +622,8 @@ class Transmission(_IDownloadClient):
         """
         获取正在下载的种子进度
         """
-        Torrents = self.get_downloading_torrents(tag=tag, ids=ids) or []
+        Torrents = self.get_downloading_torrents(tag=tag, ids=ids,
+                                                 fields=["name", "download_speed", "upload_speed"]) or []
         DispTorrents = []
         for torrent in Torrents:
             if torrent.status in [TorrentStatus.Stopped]:
@@ -601,61 +697,80 @@ class Transmission(_IDownloadClient):
             ExceptionUtils.exception_traceback(err)
             return
 
-    def torrent_properties(self, torrent):
+    def torrent_properties(self, torrent, fields=None, fetch_time=None):
+        """
+        转换为种子实体
+        :param fields: 需要的种子属性，为空时转换全部属性
+        :param fetch_time: 种子信息的查询时间，用于推算做种中的种子此后增加的做种时长
+        """
         # 当前时间戳
         date_now = int(time.time())
 
+        def _need(attr):
+            return not fields or attr in fields
+
         torrent_obj = Torrent()
         torrent_obj.id = torrent.hashString
-        torrent_obj.name = torrent.name
+        if _need("name"):
+            torrent_obj.name = torrent.name
         # 做种时间
-        if not torrent.done_date or torrent.done_date.timestamp() < 1:
-            torrent_obj.seeding_time = 0
-        else:
-            torrent_obj.seeding_time = date_now - int(torrent.done_date.timestamp())
+        if _need("seeding_time"):
+            if not torrent.done_date or torrent.done_date.timestamp() < 1:
+                torrent_obj.seeding_time = 0
+            else:
+                torrent_obj.seeding_time = date_now - int(torrent.done_date.timestamp())
         # 下载耗时
-        if not torrent.added_date or torrent.added_date.timestamp() < 1:
-            torrent_obj.download_time = 0
-        else:
-            torrent_obj.download_time = date_now - int(torrent.added_date.timestamp())
+        if _need("download_time"):
+            if not torrent.added_date or torrent.added_date.timestamp() < 1:
+                torrent_obj.download_time = 0
+            else:
+                torrent_obj.download_time = date_now - int(torrent.added_date.timestamp())
         # 下载量
-        torrent_obj.downloaded = int(torrent.total_size * torrent.progress / 100)
-
+        if _need("downloaded") or _need("uploaded"):
+            torrent_obj.downloaded = int(torrent.total_size * torrent.progress / 100)
         # 分享率
-        torrent_obj.ratio = torrent.ratio or 0
-        
+        if _need("ratio") or _need("uploaded"):
+            torrent_obj.ratio = torrent.ratio or 0
         # 上传量
-        torrent_obj.uploaded = int(torrent_obj.downloaded * torrent.ratio)
-
+        if _need("uploaded"):
+            torrent_obj.uploaded = int(torrent_obj.downloaded * torrent.ratio)
         # 平均上传速度
-        torrent_obj.avg_upload_speed = torrent.uploaded_ever / torrent.seconds_seeding if torrent.seconds_seeding != 0 else 0
-        
+        if _need("avg_upload_speed"):
+            seconds_seeding = torrent.seconds_seeding
+            if fetch_time and seconds_seeding and torrent.status.name == "SEEDING":
+                seconds_seeding += max(int(date_now - fetch_time), 0)
+            torrent_obj.avg_upload_speed = torrent.uploaded_ever / seconds_seeding if seconds_seeding != 0 else 0
         # 未活动时间
-        if not torrent.activity_date or torrent.activity_date.timestamp() < 1:
-            torrent_obj.iatime = 0
-        else:
-            torrent_obj.iatime = date_now - int(torrent.activity_date.timestamp())
-
+        if _need("iatime"):
+            if not torrent.activity_date or torrent.activity_date.timestamp() < 1:
+                torrent_obj.iatime = 0
+            else:
+                torrent_obj.iatime = date_now - int(torrent.activity_date.timestamp())
         # 种子大小
-        torrent_obj.size = torrent.total_size
-
+        if _need("size"):
+            torrent_obj.size = torrent.total_size
         # 状态
         torrent_obj.status = Transmission._judge_status(torrent.status.name, torrent.error)
         # 标签
         torrent_obj.labels = torrent.labels if hasattr(torrent, "labels") else []
         # tracker
-        torrent_obj.trackers = [tracker.announce for tracker in torrent.trackers]
+        if _need("trackers"):
+            torrent_obj.trackers = [tracker.announce for tracker in torrent.trackers]
         # 下载速度
-        torrent_obj.download_speed = torrent.rate_download
+        if _need("download_speed"):
+            torrent_obj.download_speed = torrent.rate_download
         # 上传速度
-        torrent_obj.upload_speed = torrent.rate_upload
+        if _need("upload_speed"):
+            torrent_obj.upload_speed = torrent.rate_upload
         # eta
-        torrent_obj.eta = torrent.eta
+        if _need("eta"):
+            torrent_obj.eta = torrent.eta
         # 下载进度
         torrent_obj.progress = torrent.percent_done
         # 保存路径
-        torrent_obj.save_path = torrent.download_dir
-        
+        if _need("save_path"):
+            torrent_obj.save_path = torrent.download_dir
+
         return torrent_obj
 
     @staticmethod
@@ -6,6 +6,7 @@ import re
 from urllib.parse import urlsplit
 
 from app.downloader.client._base import _IDownloadClient
+from app.downloader.torrent_state import TorrentStateService
 from app.entities import torrent
 import log
 from app.conf import ModuleConf
@@ -20,7 +21,8 @@ from app.plugins import EventManager
 from app.sites import Sites, SiteSubtitle, SiteConf
 from app.utils import Torrent, StringUtils, SystemUtils, ExceptionUtils, NumberUtils, RequestUtils, JsonUtils
 from app.utils.commons import SingletonMeta
-from app.utils.types import MediaType, DownloaderType, SearchType, RmtMode, EventType, SystemConfigKey
+from app.utils.types import MediaType, DownloaderType, SearchType, RmtMode, EventType, SystemConfigKey, \
+    TorrentChangeType
 from config import MT_URL, Config, PT_TAG, RMT_MEDIAEXT, PT_TRANSFER_INTERVAL
 
 from app.scheduler_service import SchedulerService
@@ -43,6 +45,10 @@ class Downloader(metaclass=SingletonMeta):
     _DownloaderEnum = None
     _scheduler = None
     _jobstore = 'download'
+    # 下载器ID-种子状态服务
+    _state_services = {}
+    # 有待转移种子的下载器ID
+    _transfer_pending = set()
 
     message = None
     mediaserver = None
@@ -61,6 +67,9 @@ class Downloader(metaclass=SingletonMeta):
             filter_func=lambda _, obj: hasattr(obj, 'client_id')
         )
         log.debug(f"【Downloader】加载下载器类型：{self._downloader_schema}")
+        # 种子状态服务及订阅跨配置重载保留
+        self._state_services = {}
+        self._transfer_pending = set()
         self.init_config()
 
     def init_config(self):
@@ -228,13 +237,27 @@ class Downloader(metaclass=SingletonMeta):
         """
         # 移出现有任务
         self.stop_service()
+        self._scheduler = SchedulerService()
+        # 种子状态轮询，各下载器按自身的自适应间隔实际轮询
+        scheduler_queue.put({
+                            "func_str": "Downloader.refresh_torrent_states",
+                            "args": [],
+                            "job_id": "Downloader.refresh_torrent_states",
+                            "trigger": "interval",
+                            "seconds": TorrentStateService.min_interval,
+                            "jobstore": self._jobstore
+                            })
         # 启动转移任务
         if not self._monitor_downloader_ids:
             return
-        self._scheduler = SchedulerService()
+        # 下载完成时立即转移，定时任务只处理有变化或状态不可信的下载器
+        self._transfer_pending.update(str(did) for did in self._monitor_downloader_ids)
+        self.subscribe_torrent_changes(self.__on_transfer_changes,
+                                       change_types=[TorrentChangeType.Added, TorrentChangeType.Completed],
+                                       downloader_ids=self._monitor_downloader_ids)
         for downloader_id in self._monitor_downloader_ids:
             scheduler_queue.put({
-                                "func_str": "Downloader.transfer",
+                                "func_str": "Downloader.transfer_changed",
                                 "args": [downloader_id],
                                 "job_id": "Downloader.transfer",
                                 "trigger": "interval",
@@ -627,35 +650,164 @@ class Downloader(metaclass=SingletonMeta):
                 _client = self.__get_client(downloader_id)
                 if not _client:
                     continue
-                trans_tasks = _client.get_transfer_task(tag=PT_TAG if only_nastool else None, match_path=match_path)
-                if trans_tasks:
-                    log.info(f"【Downloader】下载器 {name} 开始转移下载文件...")
+                # 本次转移会处理此前的全部变化，转移期间的新变化会重新登记
+                self._transfer_pending.discard(str(downloader_id))
+                try:
+                    self.__transfer_tasks(downloader_id, _client, name, only_nastool, match_path, rmt_mode)
+                except Exception:
+                    # 转移出错时下次定时任务重试
+                    self._transfer_pending.add(str(downloader_id))
+                    raise
+
+    def __transfer_tasks(self, downloader_id, _client, name, only_nastool, match_path, rmt_mode):
+        """
+        转移一个下载器中下载完成的种子
+        """
+        trans_tasks = _client.get_transfer_task(tag=PT_TAG if only_nastool else None, match_path=match_path)
+        if trans_tasks:
+            log.info(f"【Downloader】下载器 {name} 开始转移下载文件...")
+        else:
+            return
+        for task in trans_tasks:
+            done_flag, done_msg = self.filetransfer.transfer_media(
+                in_from=self._DownloaderEnum[str(downloader_id)],
+                in_path=task.get("path"),
+                rmt_mode=rmt_mode)
+            if not done_flag:
+                log.warn(f"【Downloader】下载器 {name} 任务%s 转移失败：%s" % (task.get("path"), done_msg))
+                _client.set_torrents_status(ids=task.get("id"),
+                                            tags=task.get("tags"))
+            else:
+                if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
+                    log.warn(f"【Downloader】下载器 {name} 移动模式下删除种子文件：%s" % task.get("id"))
+                    _client.delete_torrents(delete_file=True, ids=task.get("id"))
                 else:
-                    continue
-                for task in trans_tasks:
-                    done_flag, done_msg = self.filetransfer.transfer_media(
-                        in_from=self._DownloaderEnum[str(downloader_id)],
-                        in_path=task.get("path"),
-                        rmt_mode=rmt_mode)
-                    if not done_flag:
-                        log.warn(f"【Downloader】下载器 {name} 任务%s 转移失败：%s" % (task.get("path"), done_msg))
-                        _client.set_torrents_status(ids=task.get("id"),
-                                                    tags=task.get("tags"))
-                    else:
-                        if rmt_mode in [RmtMode.MOVE, RmtMode.RCLONE, RmtMode.MINIO]:
-                            log.warn(f"【Downloader】下载器 {name} 移动模式下删除种子文件：%s" % task.get("id"))
-                            _client.delete_torrents(delete_file=True, ids=task.get("id"))
-                        else:
-                            _client.set_torrents_status(ids=task.get("id"),
-                                                        tags=task.get("tags"))
-                log.info(f"【Downloader】下载器 {name} 下载文件转移结束")
+                    _client.set_torrents_status(ids=task.get("id"),
+                                                tags=task.get("tags"))
+        log.info(f"【Downloader】下载器 {name} 下载文件转移结束")
+
+    def transfer_changed(self, downloader_id=None):
+        """
+        定时转移：种子表可信且没有新增/完成的种子时跳过，避免反复列出全部种子
+        """
+        downloader_ids = [downloader_id] if downloader_id \
+            else self._monitor_downloader_ids
+        for downloader_id in downloader_ids:
+            state_service = self._state_services.get(str(downloader_id))
+            if state_service \
+                    and state_service.is_ready() \
+                    and str(downloader_id) not in self._transfer_pending:
+                continue
+            self.transfer(downloader_id)
+
+    def __on_transfer_changes(self, changes):
+        """
+        种子新增或下载完成时触发转移
+        """
+        downloader_ids = {change.downloader_id for change in changes
+                          if change.type == TorrentChangeType.Completed
+                          or (change.torrent.progress or 0) >= 1}
+        for downloader_id in downloader_ids:
+            self._transfer_pending.add(downloader_id)
+            ThreadHelper().start_thread(self.transfer, (downloader_id,))
+
+    def get_torrent_state_service(self, downloader_id) -> TorrentStateService:
+        """
+        获取下载器的种子状态服务，不存在时创建
+        """
+        if not downloader_id:
+            return None
+        downloader_id = str(downloader_id)
+        with client_lock:
+            if not self._state_services.get(downloader_id):
+                downloader_conf = self.get_downloader_conf(downloader_id) or {}
+                self._state_services[downloader_id] = TorrentStateService(
+                    downloader_id=downloader_id,
+                    get_client=lambda: self.__get_client(downloader_id),
+                    name=downloader_conf.get("name"))
+            return self._state_services.get(downloader_id)
+
+    def subscribe_torrent_changes(self, handler, change_types=None, downloader_ids=None):
+        """
+        订阅下载器种子变化
+        :param handler: 处理函数，参数为TorrentChange列表
+        :param change_types: 订阅的变化类型列表，为空时订阅全部
+        :param downloader_ids: 下载器ID列表，为空时订阅全部启用的下载器
+        """
+        if not downloader_ids:
+            downloader_ids = [did for did, conf in self._downloader_confs.items() if conf.get("enabled")]
+        for downloader_id in downloader_ids:
+            state_service = self.get_torrent_state_service(downloader_id)
+            if state_service:
+                state_service.subscribe(handler, change_types)
+
+    def unsubscribe_torrent_changes(self, handler):
+        """
+        取消订阅下载器种子变化
+        """
+        for state_service in list(self._state_services.values()):
+            state_service.unsubscribe(handler)
+
+    def refresh_torrent_states(self, force=False):
+        """
+        轮询有订阅者的下载器种子状态并推送变化
+        """
+        for downloader_id, state_service in list(self._state_services.items()):
+            if not state_service.has_subscribers():
+                continue
+            downloader_conf = self.get_downloader_conf(downloader_id)
+            if not downloader_conf or not downloader_conf.get("enabled"):
+                continue
+            try:
+                state_service.refresh(force=force)
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+
+    def get_state_torrents(self, downloader_id=None, ids=None, status=None, max_age=None) -> list[torrent.Torrent]:
+        """
+        从种子状态服务的种子表查询种子，与订阅种子变化的模块共用轮询，不再各自列出下载器全部种子
+        超过轮询间隔时先刷新种子表；要查询的种子不在表中且种子表已超过max_age秒时强制刷新一次
+        :param downloader_id: 下载器ID
+        :param ids: 种子ID列表
+        :param status: completed 已完成（进度100%），downloading 未完成，为空时返回全部
+        :param max_age: 缺少种子时允许的种子表时长（秒），为空时取最小轮询间隔，为0时总是刷新
+        :return: 种子信息列表，发生错误时返回None
+        """
+        if not downloader_id:
+            downloader_id = self.default_downloader_id
+        state_service = self.get_torrent_state_service(downloader_id)
+        if not state_service:
+            return None
+        state_service.refresh()
+        if not state_service.is_ready():
+            return None
+        torrents = state_service.get_torrents()
+        if ids:
+            if not isinstance(ids, list):
+                ids = [ids]
+            ids = {str(tid) for tid in ids}
+            torrents = [item for item in torrents if str(item.id) in ids]
+            if max_age is None:
+                max_age = TorrentStateService.min_interval
+            # 种子可能在上次轮询后才添加
+            if ids - {str(item.id) for item in torrents} and state_service.age >= max_age:
+                state_service.refresh(force=True)
+                if not state_service.is_ready():
+                    return None
+                torrents = [item for item in state_service.get_torrents() if str(item.id) in ids]
+        if status == "completed":
+            torrents = [item for item in torrents if (item.progress or 0) >= 1]
+        elif status == "downloading":
+            torrents = [item for item in torrents if (item.progress or 0) < 1]
+        return torrents
 
-    def get_torrents(self, downloader_id=None, ids=None, tag=None) -> list[torrent.Torrent]:
+    def get_torrents(self, downloader_id=None, ids=None, tag=None, fields=None) -> list[torrent.Torrent]:
         """
         获取种子信息
         :param downloader_id: 下载器ID
         :param ids: 种子ID
         :param tag: 种子标签
+        :param fields: 需要的种子属性，为空时返回全部属性
         :return: 种子信息列表
         """
         if not downloader_id:
@@ -664,7 +816,7 @@ class Downloader(metaclass=SingletonMeta):
         if not _client:
             return None
         try:
-            torrents, error_flag = _client.get_torrents(tag=tag, ids=ids)
+            torrents, error_flag = _client.get_torrents(tag=tag, ids=ids, fields=fields)
             if error_flag:
                 return None
             return torrents
@@ -1484,6 +1636,7 @@ class Downloader(metaclass=SingletonMeta):
         """
         停止服务
         """
+        self.unsubscribe_torrent_changes(self.__on_transfer_changes)
         try:
             if self._scheduler and self._scheduler.SCHEDULER:
                 self._scheduler.remove_all_jobs(jobstore=self._jobstore)
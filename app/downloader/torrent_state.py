@@ -0,0 +1,197 @@
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+import log
+from app.entities.torrent import Torrent
+from app.utils import ExceptionUtils
+from app.utils.types import TorrentChangeType
+
+
+@dataclass
+class TorrentChange:
+    # 变化类型
+    type: TorrentChangeType
+    # 下载器ID
+    downloader_id: str
+    # 当前种子信息，删除时为删除前的种子信息
+    torrent: Torrent
+    # 变化前的种子信息，新增时为空
+    previous: Torrent = None
+
+
+class TorrentStateService:
+    """
+    单个下载器的种子状态服务，统一轮询下载器并维护种子表，将新增、完成、状态变化、删除、标签变化事件推送给订阅者
+    """
+    # 轮询间隔（秒），有变化时回到最小间隔，无变化时逐步退避到最大间隔
+    min_interval = 15
+    max_interval = 120
+
+    def __init__(self, downloader_id, get_client, name=None):
+        """
+        :param downloader_id: 下载器ID
+        :param get_client: 获取下载器实例的函数，下载器配置变化后可取到新实例
+        :param name: 下载器名称，用于日志
+        """
+        self.downloader_id = str(downloader_id)
+        self.name = name or self.downloader_id
+        self._get_client = get_client
+        self._lock = Lock()
+        # 种子ID -> 种子信息
+        self._torrents = {}
+        # 种子ID -> (状态, 是否完成, 标签)，用于对比变化
+        self._states = {}
+        # 订阅者：[(处理函数, 变化类型集合)]
+        self._handlers = []
+        self._interval = self.min_interval
+        self._poll_time = 0
+        self._success_time = 0
+        self._error = False
+        self._initialized = False
+
+    def subscribe(self, handler, change_types=None):
+        """
+        订阅种子变化
+        :param handler: 处理函数，参数为TorrentChange列表
+        :param change_types: 订阅的变化类型列表，为空时订阅全部
+        """
+        change_types = set(change_types or TorrentChangeType)
+        with self._lock:
+            self._handlers = [(h, t) for h, t in self._handlers if h != handler]
+            self._handlers.append((handler, change_types))
+
+    def unsubscribe(self, handler):
+        """
+        取消订阅
+        """
+        with self._lock:
+            self._handlers = [(h, t) for h, t in self._handlers if h != handler]
+
+    def has_subscribers(self):
+        return bool(self._handlers)
+
+    def is_ready(self):
+        """
+        种子表是否可信：最近一次轮询成功且未过期
+        """
+        return self._initialized \
+            and not self._error \
+            and time.time() - self._success_time < self.max_interval * 2
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def age(self):
+        """
+        距上次轮询的时长（秒）
+        """
+        return time.time() - self._poll_time
+
+    def get_torrents(self):
+        """
+        获取当前种子表
+        """
+        with self._lock:
+            return list(self._torrents.values())
+
+    def refresh(self, force=False):
+        """
+        轮询下载器并推送变化，未到轮询间隔时直接返回
+        :param force: 忽略轮询间隔强制刷新
+        :return: 本次检测到的变化列表
+        """
+        with self._lock:
+            if not force and time.time() - self._poll_time < self._interval:
+                return []
+            self._poll_time = time.time()
+            torrents = self.__fetch_torrents()
+            if torrents is None:
+                self._error = True
+                self._interval = self.min_interval
+                return []
+            changes = self.__update_table(torrents)
+            self._error = False
+            self._initialized = True
+            self._success_time = self._poll_time
+            if changes:
+                self._interval = self.min_interval
+            else:
+                self._interval = min(self._interval * 2, self.max_interval)
+            handlers = list(self._handlers)
+        if changes:
+            log.debug(f"【Downloader】下载器 {self.name} 种子变化 {len(changes)} 个，"
+                      f"下次轮询间隔 {self._interval} 秒")
+            self.__dispatch(handlers, changes)
+        return changes
+
+    def __fetch_torrents(self):
+        """
+        读取下载器全部种子，发生错误时返回None
+        """
+        _client = self._get_client()
+        if not _client:
+            return None
+        try:
+            result = _client.get_torrents()
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return None
+        # 部分下载器返回(种子列表, 是否出错)
+        if isinstance(result, tuple):
+            torrents, error_flag = result
+            if error_flag:
+                return None
+        else:
+            torrents = result
+        return [torrent for torrent in torrents or [] if isinstance(torrent, Torrent) and torrent.id]
+
+    @staticmethod
+    def __get_state(torrent):
+        return torrent.status, (torrent.progress or 0) >= 1, frozenset(torrent.labels or [])
+
+    def __update_table(self, torrents):
+        """
+        用新的种子列表更新种子表，返回变化列表
+        """
+        changes = []
+        new_torrents = {}
+        new_states = {}
+        for torrent in torrents:
+            tid = str(torrent.id)
+            state = self.__get_state(torrent)
+            new_torrents[tid] = torrent
+            new_states[tid] = state
+            old_state = self._states.get(tid)
+            previous = self._torrents.get(tid)
+            if old_state is None:
+                changes.append(TorrentChange(TorrentChangeType.Added, self.downloader_id, torrent))
+                continue
+            if state[1] and not old_state[1]:
+                changes.append(TorrentChange(TorrentChangeType.Completed, self.downloader_id, torrent, previous))
+            if state[0] != old_state[0]:
+                changes.append(TorrentChange(TorrentChangeType.StateChanged, self.downloader_id, torrent, previous))
+            if state[2] != old_state[2]:
+                changes.append(TorrentChange(TorrentChangeType.TagsChanged, self.downloader_id, torrent, previous))
+        for tid, torrent in self._torrents.items():
+            if tid not in new_torrents:
+                changes.append(TorrentChange(TorrentChangeType.Removed, self.downloader_id, torrent, torrent))
+        self._torrents = new_torrents
+        self._states = new_states
+        return changes
+
+    def __dispatch(self, handlers, changes):
+        """
+        按订阅的变化类型推送给订阅者，单个订阅者出错不影响其它订阅者
+        """
+        for handler, change_types in handlers:
+            handler_changes = [change for change in changes if change.type in change_types]
+            if not handler_changes:
+                continue
+            try:
+                handler(handler_changes)
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                log.error(f"【Downloader】下载器 {self.name} 种子变化处理出错：{str(err)}")
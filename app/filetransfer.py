@@ -5,14 +5,14 @@ import re
 import shutil
 import traceback
 from enum import Enum
-from threading import Lock
+from functools import partial
 from time import sleep
 
 import log
 from app.conf import ModuleConf
 from app.helper import DbHelper, ProgressHelper
-from app.helper import ThreadHelper
-from app.media import Media, Category, Scraper
+from app.helper import ThreadHelper, TransferHelper
+from app.media import Media, Category, Scraper, LibraryIndex
 from app.media.meta import MetaInfo
 from app.message import Message
 from app.plugins import EventManager
@@ -22,9 +22,6 @@ from app.utils.types import MediaType, SyncType, RmtMode, EventType, ProgressKey
 from config import RMT_AUDIO_TRACK_EXT, RMT_SUBEXT, RMT_MEDIAEXT, RMT_FAVTYPE, RMT_MIN_FILESIZE, DEFAULT_MOVIE_FORMAT, \
     DEFAULT_TV_FORMAT, Config
 
-lock = Lock()
-
-
 class FileTransfer(metaclass=SingletonMeta):
     media = None
     message = None
@@ -32,6 +29,8 @@ class FileTransfer(metaclass=SingletonMeta):
     mediaserver = None
     scraper = None
     threadhelper = None
+    transferhelper = None
+    libraryindex = None
     dbhelper = None
     progress = None
     eventmanager = None
@@ -63,6 +62,8 @@ class FileTransfer(metaclass=SingletonMeta):
         self.category = Category()
         self.scraper = Scraper()
         self.threadhelper = ThreadHelper()
+        self.transferhelper = TransferHelper()
+        self.libraryindex = LibraryIndex()
         self.dbhelper = DbHelper()
         self.progress = ProgressHelper()
         self.eventmanager = EventManager()
@@ -146,14 +147,16 @@ class FileTransfer(metaclass=SingletonMeta):
                                                           RmtMode.COPY)
 
     @staticmethod
-    def __transfer_command(file_item, target_file, rmt_mode):
+    def __transfer_command(file_item, target_file, rmt_mode, callback=None):
         """
         使用系统命令处理单个文件
         :param file_item: 文件路径
         :param target_file: 目标文件路径
         :param rmt_mode: RmtMode转移方式
+        :param callback: 复制进度回调，参数为已复制字节数、文件总大小
         """
-        with lock:
+        # 同一组磁盘上的转移排队执行
+        with TransferHelper().slot(file_item, target_file, rmt_mode):
             if rmt_mode == RmtMode.LINK:
                 # 更链接
                 retcode, retmsg = SystemUtils.link(file_item, target_file)
@@ -162,7 +165,7 @@ class FileTransfer(metaclass=SingletonMeta):
                 retcode, retmsg = SystemUtils.softlink(file_item, target_file)
             elif rmt_mode == RmtMode.MOVE:
                 # 移动
-                retcode, retmsg = SystemUtils.move(file_item, target_file)
+                retcode, retmsg = SystemUtils.move(file_item, target_file, callback=callback)
             elif rmt_mode == RmtMode.RCLONE:
                 # Rclone移动
                 retcode, retmsg = SystemUtils.rclone_move(file_item, target_file)
@@ -177,9 +180,12 @@ class FileTransfer(metaclass=SingletonMeta):
                 retcode, retmsg = SystemUtils.minio_copy(file_item, target_file)
             else:
                 # 复制
-                retcode, retmsg = SystemUtils.copy(file_item, target_file)
+                retcode, retmsg = SystemUtils.copy(file_item, target_file, callback=callback)
         if retcode != 0:
             log.error("【Rmt】%s" % retmsg)
+        elif rmt_mode not in ModuleConf.REMOTE_RMT_MODES:
+            # 不等目录监控事件，立即更新媒体库索引
+            LibraryIndex().add_path(target_file)
         return retcode
 
     def __transfer_other_files(self, org_name, new_name, rmt_mode, over_flag):
@@ -321,6 +327,7 @@ class FileTransfer(metaclass=SingletonMeta):
                     else:
                         log.info("【Rmt】正在删除已存在的音轨文件：%s" % new_track_file)
                         os.remove(new_track_file)
+                        self.libraryindex.remove_path(new_track_file)
                 try:
                     log.info("【Rmt】正在转移音轨文件：%s 到 %s" % (track_file, new_track_file))
                     retcode = self.__transfer_command(file_item=track_file,
@@ -461,10 +468,19 @@ class FileTransfer(metaclass=SingletonMeta):
         if over_flag and old_file and os.path.isfile(old_file):
             log.info("【Rmt】正在删除已存在的文件：%s" % old_file)
             os.remove(old_file)
+            self.libraryindex.remove_path(old_file)
         log.info("【Rmt】正在转移文件：%s 到 %s" % (file_name, new_file))
+
+        def __update_progress(copied, total):
+            if total:
+                self.progress.update(ptype=ProgressKey.FileTransfer,
+                                     text="正在%s：%s %s%%" % (rmt_mode.value, file_name,
+                                                              round(copied / total * 100)))
+
         retcode = self.__transfer_command(file_item=file_item,
                                           target_file=new_file,
-                                          rmt_mode=rmt_mode)
+                                          rmt_mode=rmt_mode,
+                                          callback=__update_progress)
         if retcode == 0:
             log.info("【Rmt】文件 %s %s完成" % (file_name, rmt_mode.value))
             self.dbhelper.insert_transfer_blacklist(file_item)
@@ -477,6 +493,26 @@ class FileTransfer(metaclass=SingletonMeta):
                                            rmt_mode=rmt_mode,
                                            over_flag=over_flag)
 
+    def __run_transfer_job(self, job, rmt_mode, bluray=False):
+        """
+        执行transfer_media登记的一个转移任务
+        :param job: 转移任务
+        :param rmt_mode: RmtMode转移方式
+        :param bluray: 是否蓝光原盘目录
+        :return: 错误码
+        """
+        if bluray:
+            return self.__transfer_bluray_dir(job["file_item"], job["ret_dir_path"], rmt_mode)
+        retcode = self.__transfer_file(file_item=job["file_item"],
+                                       new_file=job["new_file"],
+                                       rmt_mode=rmt_mode,
+                                       over_flag=job["over_flag"],
+                                       old_file=job["old_file"])
+        # 移动模式随机休眠（兼容一些网盘挂载目录）
+        if retcode == 0 and rmt_mode == RmtMode.MOVE:
+            sleep(round(random.uniform(0, 1), 1))
+        return retcode
+
     def transfer_media(self,
                        in_from: Enum,
                        in_path,
@@ -637,6 +673,10 @@ class FileTransfer(metaclass=SingletonMeta):
 
         # 电视剧可能有多集，如果在循环里发消息就太多了，要在外面发消息
         message_medias = {}
+        # 需要转移的文件，先逐个识别检查，再按磁盘分组并行转移
+        transfer_jobs = []
+        # 已安排转移的目的路径
+        planned_paths = set()
 
         # 处理识别后的每一个文件或单个文件夹
         for file_item, media in Medias.items():
@@ -716,7 +756,9 @@ class FileTransfer(metaclass=SingletonMeta):
                 new_file = ret_file_path
                 # 已存在的文件数量
                 exist_filenum = 0
+                # 是否覆盖已存在的文件
                 handler_flag = False
+                old_file = None
                 # 路径存在
                 if dir_exist_flag:
                     # 蓝光原盘
@@ -741,22 +783,6 @@ class FileTransfer(metaclass=SingletonMeta):
                                 # 覆盖
                                 log.info(
                                     f"【Rmt】文件 {old_file} 已存在，原文件大小：{orgin_file_size}，新文件大小：{media.size}，覆盖为 {new_file} ...")
-                                ret = self.__transfer_file(file_item=file_item,
-                                                           new_file=new_file,
-                                                           rmt_mode=rmt_mode,
-                                                           over_flag=True,
-                                                           old_file=old_file)
-                                if ret != 0:
-                                    success_flag = False
-                                    error_message = "文件转移失败，错误码 %s" % ret
-                                    self.progress.update(ptype=ProgressKey.FileTransfer, text=error_message)
-                                    if udf_flag:
-                                        return __finish_transfer(success_flag, error_message)
-                                    failed_count += 1
-                                    alert_count += 1
-                                    if error_message not in alert_messages:
-                                        alert_messages.append(error_message)
-                                    continue
                                 handler_flag = True
                             else:
                                 log.warn("【Rmt】文件 %s 已存在" % ret_file_path)
@@ -788,20 +814,10 @@ class FileTransfer(metaclass=SingletonMeta):
                         # 创建目录
                         log.debug("【Rmt】正在创建目录：%s" % ret_dir_path)
                         os.makedirs(ret_dir_path)
+                        self.libraryindex.add_path(ret_dir_path, is_dir=True)
                 # 转移蓝光原盘
                 if bluray_disk_dir:
-                    ret = self.__transfer_bluray_dir(file_item, ret_dir_path, rmt_mode)
-                    if ret != 0:
-                        success_flag = False
-                        error_message = "蓝光目录转移失败，错误码：%s" % ret
-                        self.progress.update(ptype=ProgressKey.FileTransfer, text=error_message)
-                        if udf_flag:
-                            return __finish_transfer(success_flag, error_message)
-                        failed_count += 1
-                        alert_count += 1
-                        if error_message not in alert_messages:
-                            alert_messages.append(error_message)
-                        continue
+                    target_path = ret_dir_path
                 else:
                     # 开始转移文件
                     if not handler_flag:
@@ -822,21 +838,69 @@ class FileTransfer(metaclass=SingletonMeta):
                                 alert_messages.append(error_message)
                             continue
                         new_file = "%s%s" % (ret_file_path, file_ext)
-                        ret = self.__transfer_file(file_item=file_item,
-                                                   new_file=new_file,
-                                                   rmt_mode=rmt_mode,
-                                                   over_flag=False)
-                        if ret != 0:
-                            success_flag = False
-                            error_message = "文件转移失败，错误码 %s" % ret
-                            self.progress.update(ptype=ProgressKey.FileTransfer, text=error_message)
-                            if udf_flag:
-                                return __finish_transfer(success_flag, error_message)
-                            failed_count += 1
-                            alert_count += 1
-                            if error_message not in alert_messages:
-                                alert_messages.append(error_message)
-                            continue
+                    target_path = new_file
+                # 多个文件识别为同一目的文件时只转移第一个
+                if target_path in planned_paths:
+                    log.warn("【Rmt】文件 %s 已存在" % target_path)
+                    failed_count += 1
+                    continue
+                planned_paths.add(target_path)
+                transfer_jobs.append({
+                    "index": total_count,
+                    "file_item": file_item,
+                    "file_name": file_name,
+                    "media": media,
+                    "reg_path": reg_path,
+                    "dist_path": dist_path,
+                    "ret_dir_path": ret_dir_path,
+                    "ret_file_path": ret_file_path,
+                    "file_ext": file_ext,
+                    "new_file": new_file,
+                    "target_path": target_path,
+                    "over_flag": handler_flag,
+                    "old_file": old_file,
+                    "exist_filenum": exist_filenum
+                })
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                log.error("【Rmt】文件转移时发生错误：%s - %s" % (str(err), traceback.format_exc()))
+
+        # 按源和目的所在磁盘分组并行转移，同一组磁盘上的文件排队转移
+        if transfer_jobs:
+            self.progress.update(ptype=ProgressKey.FileTransfer,
+                                 text="正在转移 %s 个文件..." % len(transfer_jobs))
+        results = self.transferhelper.run([
+            (partial(self.__run_transfer_job, job, rmt_mode, bool(bluray_disk_dir)),
+             job["file_item"], job["target_path"], rmt_mode) for job in transfer_jobs
+        ])
+
+        # 按原顺序处理转移结果
+        for job, ret in zip(transfer_jobs, results):
+            try:
+                file_item = job["file_item"]
+                file_name = job["file_name"]
+                media = job["media"]
+                reg_path = job["reg_path"]
+                dist_path = job["dist_path"]
+                ret_dir_path = job["ret_dir_path"]
+                ret_file_path = job["ret_file_path"]
+                file_ext = job["file_ext"]
+                new_file = job["new_file"]
+                exist_filenum = job["exist_filenum"]
+                if ret != 0:
+                    success_flag = False
+                    if bluray_disk_dir:
+                        error_message = "蓝光目录转移失败，错误码：%s" % ret
+                    else:
+                        error_message = "文件转移失败，错误码 %s" % ret
+                    self.progress.update(ptype=ProgressKey.FileTransfer, text=error_message)
+                    if udf_flag:
+                        return __finish_transfer(success_flag, error_message)
+                    failed_count += 1
+                    alert_count += 1
+                    if error_message not in alert_messages:
+                        alert_messages.append(error_message)
+                    continue
                 # 查询TMDB详情，需要全部数据
                 media.set_tmdb_info(self.media.get_tmdb_info(mtype=media.type,
                                                              tmdbid=media.tmdb_id,
@@ -887,13 +951,9 @@ class FileTransfer(metaclass=SingletonMeta):
                                                    rmt_mode=rmt_mode)
                 # 更新进度
                 self.progress.update(ptype=ProgressKey.FileTransfer,
-                                     value=round(total_count / len(Medias) * 100),
+                                     value=round(job["index"] / len(Medias) * 100),
                                      text="%s 转移完成" % file_name)
 
-                # 移动模式随机休眠（兼容一些网盘挂载目录）
-                if rmt_mode == RmtMode.MOVE:
-                    sleep(round(random.uniform(0, 1), 1))
-
                 # 解发字幕下载事件
                 self.eventmanager.send_event(EventType.SubtitleDownload, {
                     "media_info": media.to_dict(),
@@ -977,7 +1037,7 @@ class FileTransfer(metaclass=SingletonMeta):
                           media_dest,
                           media):
         """
-        判断媒体文件是否忆存在
+        判断媒体文件是否忆存在，媒体库目录下的路径通过索引查询，不访问磁盘
         :param media_dest: 媒体文件所在目录
         :param media: 已识别的媒体信息
         :return: 目录是否存在，目录路径，文件是否存在，文件路径
@@ -999,13 +1059,13 @@ class FileTransfer(metaclass=SingletonMeta):
                 for m_type in [RMT_FAVTYPE, media.category]:
                     type_path = os.path.join(media_dest, m_type, dir_name)
                     # 目录是否存在
-                    if os.path.exists(type_path):
+                    if self.libraryindex.exists(type_path):
                         file_path = type_path
                         break
             # 返回路径
             ret_dir_path = file_path
             # 路径存在标志
-            if os.path.exists(file_path):
+            if self.libraryindex.exists(file_path):
                 dir_exist_flag = True
             # 文件路径
             file_dest = os.path.join(file_path, file_name)
@@ -1014,7 +1074,7 @@ class FileTransfer(metaclass=SingletonMeta):
             # 文件是否存在
             for ext in RMT_MEDIAEXT:
                 ext_dest = "%s%s" % (file_dest, ext)
-                if os.path.exists(ext_dest):
+                if self.libraryindex.exists(ext_dest):
                     file_exist_flag = True
                     ret_file_path = ext_dest
                     break
@@ -1035,7 +1095,7 @@ class FileTransfer(metaclass=SingletonMeta):
                 # 返回目录路径
                 ret_dir_path = season_dir
                 # 目录是否存在
-                if os.path.exists(season_dir):
+                if self.libraryindex.exists(season_dir):
                     dir_exist_flag = True
                 # 处理集
                 episodes = media.get_episode_list()
@@ -1047,7 +1107,7 @@ class FileTransfer(metaclass=SingletonMeta):
                     # 文件存在标志
                     for ext in RMT_MEDIAEXT:
                         ext_dest = "%s%s" % (file_path, ext)
-                        if os.path.exists(ext_dest):
+                        if self.libraryindex.exists(ext_dest):
                             file_exist_flag = True
                             ret_file_path = ext_dest
                             break
@@ -1076,7 +1136,7 @@ class FileTransfer(metaclass=SingletonMeta):
 
     def get_no_exists_medias(self, meta_info, season=None, total_num=None):
         """
-        根据媒体库目录结构，判断媒体是否存在
+        根据媒体库目录结构，判断媒体是否存在，媒体库目录下的路径通过索引查询，不访问磁盘
         :param meta_info: 已识别的媒体信息
         :param season: 季号，数字，剧集时需要
         :param total_num: 该季总集数，剧集时需要
@@ -1088,13 +1148,13 @@ class FileTransfer(metaclass=SingletonMeta):
             for dest_path in self._movie_path:
                 # 判断精选
                 fav_path = os.path.join(dest_path, RMT_FAVTYPE, dir_name)
-                fav_files = PathUtils.get_dir_files(fav_path, RMT_MEDIAEXT)
+                fav_files = self.libraryindex.get_dir_files(fav_path, RMT_MEDIAEXT)
                 # 其它分类
                 if self._movie_category_flag:
                     dest_path = os.path.join(dest_path, meta_info.category, dir_name)
                 else:
                     dest_path = os.path.join(dest_path, dir_name)
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
+                files = self.libraryindex.get_dir_files(dest_path, RMT_MEDIAEXT)
                 if len(files) > 0 or len(fav_files) > 0:
                     return [{'title': meta_info.title, 'year': meta_info.year}]
             return []
@@ -1119,18 +1179,10 @@ class FileTransfer(metaclass=SingletonMeta):
                 else:
                     dest_path = os.path.join(dest_path, dir_name, season_name)
                 # 目录不存在
-                if not os.path.exists(dest_path):
+                if not self.libraryindex.exists(dest_path):
                     continue
-                files = PathUtils.get_dir_files(dest_path, RMT_MEDIAEXT)
-                for file in files:
-                    file_meta_info = MetaInfo(title=os.path.basename(file))
-                    if not file_meta_info.get_season_list() or not file_meta_info.get_episode_list():
-                        continue
-                    if file_meta_info.get_name() != meta_info.title:
-                        continue
-                    if not file_meta_info.is_in_season(season):
-                        continue
-                    exists_episodes = list(set(exists_episodes).union(set(file_meta_info.get_episode_list())))
+                exists_episodes = list(set(exists_episodes).union(
+                    self.libraryindex.get_episodes(dest_path, meta_info.title, season, RMT_MEDIAEXT)))
             return list(set(total_episodes).difference(set(exists_episodes)))
 
     def get_best_target_path(self, mtype, in_path=None, size=0):
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 import log
 from app.conf import ModuleConf
@@ -8,6 +9,166 @@ from app.utils import StringUtils
 from app.utils.commons import SingletonMeta
 from app.utils.types import MediaType
 
+# 正则元字符，不包含这些字符的关键字按普通文本匹配
+_REGEX_META_CHARS = set(".^$*+?{}[]\\|()")
+
+
+@lru_cache(maxsize=256)
+def _compile_keyword(keyword):
+    """
+    编译包含/排除关键字，返回 text -> bool 的匹配函数
+    普通关键字直接用小写文本查找，正则编译失败时在匹配时抛出原异常
+    """
+    if not _REGEX_META_CHARS.intersection(keyword) \
+            and (keyword.isascii() or keyword.lower() == keyword.upper()):
+        keyword = keyword.lower()
+        return lambda text: keyword in text.lower()
+    try:
+        pattern = re.compile(r'%s' % keyword, re.IGNORECASE)
+    except re.error as err:
+        def raise_error(_):
+            raise err
+        return raise_error
+    return lambda text: pattern.search(text) is not None
+
+
+@lru_cache(maxsize=256)
+def _compile_regex(pattern):
+    """
+    编译过滤条件中的正则，忽略大小写
+    """
+    return re.compile(r"%s" % pattern, re.I)
+
+
+class _FilterRule:
+    """
+    编译后的单条过滤规则
+    """
+
+    def __init__(self, filter_info):
+        self.filter_info = filter_info
+        self.error = None
+        self.order_seq = None
+        try:
+            self.order_seq = 100 - int(filter_info.get('pri'))
+        except Exception as err:
+            self.error = err
+        self.includes = [_compile_keyword(include.strip())
+                         for include in filter_info.get('include') or [] if include]
+        self.excludes = [_compile_keyword(exclude.strip())
+                         for exclude in filter_info.get('exclude') or [] if exclude]
+        self.sizes = None
+        self.sizes_error = None
+        try:
+            self.sizes = self.__parse_sizes(filter_info.get('size'))
+        except Exception as err:
+            self.sizes_error = err
+        self.free = None
+        self.free_error = None
+        free = filter_info.get("free")
+        if free:
+            try:
+                ul_factor, dl_factor = free.split()
+                self.free = (float(ul_factor), float(dl_factor))
+            except Exception as err:
+                self.free_error = err
+
+    @staticmethod
+    def __parse_sizes(sizes):
+        """
+        解析大小范围，单位GB，返回(最小字节数, 最大字节数)
+        """
+        if not sizes:
+            return None
+        if sizes.find(',') != -1:
+            sizes = sizes.split(',')
+            begin_size = float(sizes[0].strip()) if StringUtils.is_numeric(sizes[0]) else 0
+            end_size = float(sizes[1].strip()) if StringUtils.is_numeric(sizes[1]) else 0
+        else:
+            begin_size = 0
+            end_size = float(sizes.strip()) if StringUtils.is_numeric(sizes) else 0
+        return begin_size * 1024 ** 3, end_size * 1024 ** 3
+
+    def match(self, meta_info, title):
+        """
+        检查种子是否命中本规则，规则有误时抛出异常
+        """
+        if self.error:
+            raise self.error
+        rule_match = True
+        # 必须包括的项
+        for include in self.includes:
+            if not include(title):
+                rule_match = False
+                break
+        # 不能包含的项，全部命中时不匹配
+        if self.excludes and rule_match:
+            exclude_flag = False
+            for exclude in self.excludes:
+                if not exclude(title):
+                    exclude_flag = True
+            if not exclude_flag:
+                rule_match = False
+        # 大小
+        if (self.sizes or self.sizes_error) and rule_match and meta_info.size:
+            meta_info.size = StringUtils.num_filesize(meta_info.size)
+            if self.sizes_error:
+                raise self.sizes_error
+            begin_size, end_size = self.sizes
+            if meta_info.type == MediaType.MOVIE:
+                if not begin_size <= int(meta_info.size) <= end_size:
+                    rule_match = False
+            else:
+                if meta_info.total_episodes \
+                        and not begin_size <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size:
+                    rule_match = False
+        # 促销
+        if self.filter_info.get("free") \
+                and meta_info.upload_volume_factor is not None \
+                and meta_info.download_volume_factor is not None:
+            if self.free_error:
+                raise self.free_error
+            ul_factor, dl_factor = self.free
+            if ul_factor > meta_info.upload_volume_factor \
+                    or dl_factor < meta_info.download_volume_factor:
+                rule_match = False
+        return rule_match
+
+
+class _FilterRuleGroup:
+    """
+    编译后的过滤规则组，按优先级依次检查组内规则
+    """
+
+    def __init__(self, name, filters):
+        self.name = name
+        self.rules = [_FilterRule(filter_info) for filter_info in filters]
+
+    def check(self, meta_info):
+        """
+        :return: 是否匹配，匹配的优先值，规则组名称
+        """
+        # 过滤使用的文本
+        title = meta_info.rev_string
+        if meta_info.subtitle:
+            title = f"{title} {meta_info.subtitle}"
+        # 命中优先级
+        order_seq = 0
+        # 当前规则组是否命中
+        group_match = True
+        for rule in self.rules:
+            try:
+                if rule.order_seq is not None:
+                    order_seq = rule.order_seq
+                if rule.match(meta_info, title):
+                    return True, order_seq, self.name
+                else:
+                    group_match = False
+            except Exception as err:
+                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{rule.filter_info}")
+        if not group_match:
+            return False, 0, self.name
+        return True, order_seq, self.name
 
 
 class Filter(metaclass=SingletonMeta):
@@ -15,6 +176,8 @@ class Filter(metaclass=SingletonMeta):
     dbhelper = None
     _groups = []
     _rules = []
+    # 编译后的规则组，规则变化时清空
+    _rule_groups = {}
 
     def __init__(self):
         self.init_config()
@@ -24,6 +187,7 @@ class Filter(metaclass=SingletonMeta):
         self.rg_matcher = ReleaseGroupsMatcher()
         self._groups = self.get_filter_group()
         self._rules = self.get_filter_rule()
+        self._rule_groups = {}
 
     def get_rule_groups(self, groupid=None, default=False):
         """
@@ -93,6 +257,25 @@ class Filter(metaclass=SingletonMeta):
         first_order = min([int(rule_info.get("pri")) for rule_info in self.get_rules(groupid=rulegroup)] or [0])
         return 100 - first_order
 
+    def __get_rule_group(self, rulegroup=None):
+        """
+        获取编译后的规则组，未配置默认规则组时返回None
+        """
+        key = str(rulegroup) if rulegroup else ""
+        if key in self._rule_groups:
+            return self._rule_groups[key]
+        if not rulegroup:
+            group_info = self.get_rule_groups(default=True)
+        else:
+            group_info = self.get_rule_groups(groupid=rulegroup)
+        if not rulegroup and not group_info:
+            rule_group = None
+        else:
+            rule_group = _FilterRuleGroup(name=group_info.get("name"),
+                                          filters=self.get_rules(groupid=group_info.get("id")))
+        self._rule_groups[key] = rule_group
+        return rule_group
+
     def check_rules(self, meta_info, rulegroup=None):
         """
         检查种子是否匹配站点过滤规则：排除规则、包含规则，优先规则
@@ -100,104 +283,28 @@ class Filter(metaclass=SingletonMeta):
         :param rulegroup: 规则组ID
         :return: 是否匹配，匹配的优先值，规则名称，值越大越优先
         """
-        if not meta_info:
-            return False, 0, ""
+        return self.check_rules_batch([meta_info], rulegroup)[0]
+
+    def check_rules_batch(self, meta_infos, rulegroup=None):
+        """
+        批量检查种子是否匹配站点过滤规则，规则组只解析一次
+        :param meta_infos: 识别的信息列表
+        :param rulegroup: 规则组ID
+        :return: 与meta_infos顺序一致的(是否匹配，匹配的优先值，规则名称)列表
+        """
         # 为-1时不使用过滤规则
         if rulegroup and int(rulegroup) == -1:
-            return True, 0, "不过滤"
-        # 过滤使用的文本
-        title = meta_info.rev_string
-        if meta_info.subtitle:
-            title = f"{title} {meta_info.subtitle}"
-        # 过滤规则组
-        if not rulegroup:
-            rulegroup = self.get_rule_groups(default=True)
-            if not rulegroup:
-                return True, 0, "未配置过滤规则"
-        else:
-            rulegroup = self.get_rule_groups(groupid=rulegroup)
-        filters = self.get_rules(groupid=rulegroup.get("id"))
-        # 命中优先级
-        order_seq = 0
-        # 当前规则组是否命中
-        group_match = True
-        for filter_info in filters:
-            try:
-                # 当前规则是否命中
-                rule_match = True
-                # 命中规则的序号
-                order_seq = 100 - int(filter_info.get('pri'))
-                # 必须包括的项
-                includes = filter_info.get('include')
-                if includes and rule_match:
-                    include_flag = True
-                    for include in includes:
-                        if not include:
-                            continue
-                        if not re.search(r'%s' % include.strip(), title, re.IGNORECASE):
-                            include_flag = False
-                            break
-                    if not include_flag:
-                        rule_match = False
-
-                # 不能包含的项
-                excludes = filter_info.get('exclude')
-                if excludes and rule_match:
-                    exclude_flag = False
-                    exclude_count = 0
-                    for exclude in excludes:
-                        if not exclude:
-                            continue
-                        exclude_count += 1
-                        if not re.search(r'%s' % exclude.strip(), title, re.IGNORECASE):
-                            exclude_flag = True
-                    if exclude_count > 0 and not exclude_flag:
-                        rule_match = False
-                # 大小
-                sizes = filter_info.get('size')
-                if sizes and rule_match and meta_info.size:
-                    meta_info.size = StringUtils.num_filesize(meta_info.size)
-                    if sizes.find(',') != -1:
-                        sizes = sizes.split(',')
-                        if StringUtils.is_numeric(sizes[0]):
-                            begin_size = float(sizes[0].strip())
-                        else:
-                            begin_size = 0
-                        if StringUtils.is_numeric(sizes[1]):
-                            end_size = float(sizes[1].strip())
-                        else:
-                            end_size = 0
-                    else:
-                        begin_size = 0
-                        if StringUtils.is_numeric(sizes):
-                            end_size = float(sizes.strip())
-                        else:
-                            end_size = 0
-                    if meta_info.type == MediaType.MOVIE:
-                        if not begin_size * 1024 ** 3 <= int(meta_info.size) <= end_size * 1024 ** 3:
-                            rule_match = False
-                    else:
-                        if meta_info.total_episodes \
-                                and not begin_size * 1024 ** 3 <= int(meta_info.size) / int(meta_info.total_episodes) <= end_size * 1024 ** 3:
-                            rule_match = False
-
-                # 促销
-                free = filter_info.get("free")
-                if free and meta_info.upload_volume_factor is not None and meta_info.download_volume_factor is not None:
-                    ul_factor, dl_factor = free.split()
-                    if float(ul_factor) > meta_info.upload_volume_factor \
-                            or float(dl_factor) < meta_info.download_volume_factor:
-                        rule_match = False
-
-                if rule_match:
-                    return True, order_seq, rulegroup.get("name")
-                else:
-                    group_match = False
-            except Exception as err:
-                log.error(f"【Filter】过滤规则出现严重错误 {err}，请检查：{filter_info}")
-        if not group_match:
-            return False, 0, rulegroup.get("name")
-        return True, order_seq, rulegroup.get("name")
+            return [(False, 0, "") if not meta_info else (True, 0, "不过滤") for meta_info in meta_infos]
+        rule_group = self.__get_rule_group(rulegroup)
+        results = []
+        for meta_info in meta_infos:
+            if not meta_info:
+                results.append((False, 0, ""))
+            elif not rule_group:
+                results.append((True, 0, "未配置过滤规则"))
+            else:
+                results.append(rule_group.check(meta_info))
+        return results
 
     def is_rule_free(self, rulegroup=None):
         """
@@ -255,80 +362,103 @@ class Filter(metaclass=SingletonMeta):
         :param downloadvolumefactor: 种子的下载因子 传空不过滤
         :return: 是否匹配，匹配的优先值，匹配信息，值越大越优先
         """
-        # 过滤包含，排除，关键字使用的文本
-        text = meta_info.rev_string
-        if meta_info.subtitle:
-            text = f"{text} {meta_info.subtitle}"
-        # 过滤质量
+        return self.check_torrents_filter([(meta_info, uploadvolumefactor, downloadvolumefactor)], filter_args)[0]
+
+    def check_torrents_filter(self, torrents, filter_args):
+        """
+        批量对种子进行过滤，过滤条件和规则组只解析一次
+        :param torrents: (名称识别后的MetaBase对象, 上传因子, 下载因子)的列表，因子传空不过滤
+        :param filter_args: 过滤条件的字典
+        :return: 与torrents顺序一致的(是否匹配，匹配的优先值，匹配信息)列表
+        """
+        restype_re = pix_re = None
         if filter_args.get("restype"):
             restype_re = ModuleConf.TORRENT_SEARCH_PARAMS["restype"].get(filter_args.get("restype"))
-            if not meta_info.get_edtion_string():
-                return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
-            if restype_re and not re.search(r"%s" % restype_re, meta_info.get_edtion_string(), re.I):
-                return False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"
-        # 过滤分辨率
         if filter_args.get("pix"):
             pix_re = ModuleConf.TORRENT_SEARCH_PARAMS["pix"].get(filter_args.get("pix"))
-            if not meta_info.resource_pix:
-                return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
-            if pix_re and not re.search(r"%s" % pix_re, meta_info.resource_pix, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"
-        # 过滤制作组/字幕组
-        if filter_args.get("team"):
-            team = filter_args.get("team")
-            if not meta_info.resource_team:
-                resource_team = self.rg_matcher.match(
-                    title=meta_info.rev_string,
-                    groups=team)
-                if not resource_team:
-                    return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
-                else:
-                    meta_info.resource_team = resource_team
-            elif not re.search(r"%s" % team, meta_info.resource_team, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"
-        # 过滤促销
-        if filter_args.get("sp_state"):
-            ul_factor, dl_factor = filter_args.get("sp_state").split()
-            if uploadvolumefactor and ul_factor not in ("*", str(uploadvolumefactor)):
-                return False, 0, f"{meta_info.org_string} 不符合促销要求"
-            if downloadvolumefactor and dl_factor not in ("*", str(downloadvolumefactor)):
-                return False, 0, f"{meta_info.org_string} 不符合促销要求"
-        # 过滤包含
-        if filter_args.get("include"):
-            include = filter_args.get("include")
-            if not re.search(r"%s" % include, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合包含 {include} 要求"
-        # 过滤排除
-        if filter_args.get("exclude"):
-            exclude = filter_args.get("exclude")
-            if re.search(r"%s" % exclude, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合排除 {exclude} 要求"
-        # 过滤关键字
-        if filter_args.get("key"):
-            key = filter_args.get("key")
-            if not re.search(r"%s" % key, text, re.I):
-                return False, 0, f"{meta_info.org_string} 不符合 {key} 要求"
-        # 过滤过滤规则，-1表示不使用过滤规则，空则使用默认过滤规则
-        if filter_args.get("rule"):
-            # 已设置默认规则
-            match_flag, order_seq, rule_name = self.check_rules(meta_info, filter_args.get("rule"))
-            match_msg = "%s 大小：%s 促销：%s 不符合订阅/站点过滤规则 %s 要求" % (
-                meta_info.org_string,
-                StringUtils.str_filesize(meta_info.size),
-                meta_info.get_volume_factor_string(),
-                rule_name
-            )
-            return match_flag, order_seq, match_msg
+        sp_state = filter_args.get("sp_state").split() if filter_args.get("sp_state") else None
+        include = filter_args.get("include")
+        exclude = filter_args.get("exclude")
+        key = filter_args.get("key")
+        rule = filter_args.get("rule")
+        if rule:
+            rule_msg = "%s 大小：%s 促销：%s 不符合订阅/站点过滤规则 %s 要求"
         else:
-            # 默认过滤规则
-            match_flag, order_seq, rule_name = self.check_rules(meta_info)
-            match_msg = "%s 大小：%s 促销：%s 不符合默认过滤规则 %s 要求" % (
-                meta_info.org_string,
-                StringUtils.str_filesize(meta_info.size),
-                meta_info.get_volume_factor_string(),
-                rule_name
-            )
-            return match_flag, order_seq, match_msg
+            rule_msg = "%s 大小：%s 促销：%s 不符合默认过滤规则 %s 要求"
+        results = []
+        rule_checks = []
+        for meta_info, uploadvolumefactor, downloadvolumefactor in torrents:
+            # 过滤包含，排除，关键字使用的文本
+            text = meta_info.rev_string
+            if meta_info.subtitle:
+                text = f"{text} {meta_info.subtitle}"
+            # 过滤质量
+            if filter_args.get("restype"):
+                if not meta_info.get_edtion_string() \
+                        or (restype_re and not self.__search(restype_re, meta_info.get_edtion_string())):
+                    results.append((False, 0, f"{meta_info.org_string} 不符合质量 {filter_args.get('restype')} 要求"))
+                    continue
+            # 过滤分辨率
+            if filter_args.get("pix"):
+                if not meta_info.resource_pix \
+                        or (pix_re and not self.__search(pix_re, meta_info.resource_pix)):
+                    results.append((False, 0, f"{meta_info.org_string} 不符合分辨率 {filter_args.get('pix')} 要求"))
+                    continue
+            # 过滤制作组/字幕组
+            if filter_args.get("team"):
+                team = filter_args.get("team")
+                if not meta_info.resource_team:
+                    resource_team = self.rg_matcher.match(
+                        title=meta_info.rev_string,
+                        groups=team)
+                    if not resource_team:
+                        results.append((False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"))
+                        continue
+                    else:
+                        meta_info.resource_team = resource_team
+                elif not self.__search(team, meta_info.resource_team):
+                    results.append((False, 0, f"{meta_info.org_string} 不符合制作组/字幕组 {team} 要求"))
+                    continue
+            # 过滤促销
+            if sp_state:
+                ul_factor, dl_factor = sp_state
+                if (uploadvolumefactor and ul_factor not in ("*", str(uploadvolumefactor))) \
+                        or (downloadvolumefactor and dl_factor not in ("*", str(downloadvolumefactor))):
+                    results.append((False, 0, f"{meta_info.org_string} 不符合促销要求"))
+                    continue
+            # 过滤包含
+            if include and not self.__search(include, text):
+                results.append((False, 0, f"{meta_info.org_string} 不符合包含 {include} 要求"))
+                continue
+            # 过滤排除
+            if exclude and self.__search(exclude, text):
+                results.append((False, 0, f"{meta_info.org_string} 不符合排除 {exclude} 要求"))
+                continue
+            # 过滤关键字
+            if key and not self.__search(key, text):
+                results.append((False, 0, f"{meta_info.org_string} 不符合 {key} 要求"))
+                continue
+            # 过滤规则，-1表示不使用过滤规则，空则使用默认过滤规则，之后统一批量检查
+            rule_checks.append((len(results), meta_info))
+            results.append(None)
+        if rule_checks:
+            rule_results = self.check_rules_batch([meta_info for _, meta_info in rule_checks], rule)
+            for (index, meta_info), (match_flag, order_seq, rule_name) in zip(rule_checks, rule_results):
+                match_msg = rule_msg % (
+                    meta_info.org_string,
+                    StringUtils.str_filesize(meta_info.size),
+                    meta_info.get_volume_factor_string(),
+                    rule_name
+                )
+                results[index] = (match_flag, order_seq, match_msg)
+        return results
+
+    @staticmethod
+    def __search(pattern, text):
+        """
+        使用预编译的正则忽略大小写查找
+        """
+        return _compile_regex(pattern).search(text)
 
     def add_group(self, name, default='N'):
         """
@@ -1,9 +1,10 @@
 import datetime
 import os.path
+import re
 import time
 import json
 from enum import Enum
-from sqlalchemy import cast, func, and_, case
+from sqlalchemy import cast, func, and_, or_, case
 
 from app.db import MainDb, DbPersist
 from app.db.models import *
@@ -11,6 +12,17 @@ from app.utils import StringUtils
 from app.utils.types import MediaType, RmtMode
 
 
+# 搜索结果分组标识中需要去掉的字符
+_SEARCH_KEY_STRIP_RE = re.compile(r"[-.\s@|]")
+
+
+def _int_or_zero(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
 class DbHelper:
     _db = MainDb()
 
@@ -34,6 +46,11 @@ class DbHelper:
                 mtype = "ANI"
             
             mappings.append({
+                **self.__get_search_result_keys(media_item=media_item,
+                                                mtype=mtype if ident_flag else '',
+                                                title=media_item.title if ident_flag else title,
+                                                year=media_item.year if ident_flag else '',
+                                                es_string=media_item.get_season_episode_string() if ident_flag else ''),
                 'TORRENT_NAME': media_item.org_string,
                 'ENCLOSURE': media_item.enclosure,
                 'DESCRIPTION': media_item.description,
@@ -70,6 +87,37 @@ class DbHelper:
         # 使用批量插入映射，性能更好
         self._db.bulk_insert_mappings(SEARCHRESULTINFO, mappings, batch_size=500)
 
+    @staticmethod
+    def __get_search_result_keys(media_item, mtype, title, year, es_string):
+        """
+        计算搜索结果的分组标识，入库时计算一次，查询时直接按列分组
+        """
+        respix = media_item.resource_pix or ""
+        restype = media_item.resource_type or ""
+        reseffect = media_item.resource_effect or ""
+        video_encode = media_item.video_encode or ""
+        size = StringUtils.str_filesize(int(media_item.size))
+        # 标题（年份）
+        title_key = f"{title}"
+        if year:
+            title_key = f"{title_key} ({year})"
+        # 排序：资源优先级、站点优先级、做种数
+        sort_order = _int_or_zero(media_item.res_order) * 10 ** 13 \
+            + _int_or_zero(media_item.site_order) * 10 ** 10 \
+            + min(_int_or_zero(media_item.seeders), 10 ** 10 - 1)
+        return {
+            'TITLE_KEY': title_key,
+            'SE_KEY': es_string if es_string and mtype != "MOV" else "MOV",
+            'GROUP_KEY': _SEARCH_KEY_STRIP_RE.sub("", f"{respix}_{restype}").lower(),
+            'UNIQUE_KEY': _SEARCH_KEY_STRIP_RE.sub(
+                "", f"{respix}_{restype}_{video_encode}_{reseffect}_{size}_{media_item.resource_team}").lower(),
+            'RES_PIX': respix,
+            'RES_SOURCE': restype,
+            'RES_EFFECT': reseffect,
+            'VIDEO_ENCODE': video_encode,
+            'SORT_ORDER': sort_order
+        }
+
     def get_search_result_by_id(self, dl_id):
         """
         根据ID从数据库中查询搜索结果的一条记录
@@ -78,9 +126,60 @@ class DbHelper:
 
     def get_search_results(self):
         """
-        查询搜索结果的所有记录
+        查询搜索结果的所有记录，按资源优先级、站点优先级、做种数排序
+        """
+        return self._db.query(SEARCHRESULTINFO).order_by(SEARCHRESULTINFO.SORT_ORDER.desc(),
+                                                          SEARCHRESULTINFO.ID).all()
+
+    def get_search_results_by_title(self, page=None, page_size=None, filters: dict = None):
+        """
+        按标题分组分页查询搜索结果
+        :param page: 页码，为空时查询全部
+        :param page_size: 每页标题数
+        :param filters: 过滤条件 site/releasegroup/video/season/free
+        :return: 结果总数，标题总数，当前页的搜索结果（按标题分组顺序排列）
         """
-        return self._db.query(SEARCHRESULTINFO).all()
+        conditions = []
+        filters = filters or {}
+        if filters.get("site"):
+            conditions.append(SEARCHRESULTINFO.SITE.in_(filters.get("site")))
+        if filters.get("releasegroup"):
+            releasegroups = filters.get("releasegroup")
+            if "未知" in releasegroups:
+                conditions.append(SEARCHRESULTINFO.OTHERINFO.in_(releasegroups)
+                                  | SEARCHRESULTINFO.OTHERINFO.is_(None))
+            else:
+                conditions.append(SEARCHRESULTINFO.OTHERINFO.in_(releasegroups))
+        if filters.get("video"):
+            conditions.append(SEARCHRESULTINFO.VIDEO_ENCODE.in_(filters.get("video")))
+        if filters.get("season"):
+            conditions.append(func.substr(SEARCHRESULTINFO.SE_KEY, 1, func.instr(SEARCHRESULTINFO.SE_KEY + " ", " ") - 1)
+                              .in_(filters.get("season")))
+        if filters.get("free"):
+            free_conditions = []
+            for free in filters.get("free"):
+                upload, download = str(free).split()
+                free_conditions.append(and_(SEARCHRESULTINFO.UPLOAD_VOLUME_FACTOR == float(upload),
+                                            SEARCHRESULTINFO.DOWNLOAD_VOLUME_FACTOR == float(download)))
+            conditions.append(or_(*free_conditions))
+        # 结果总数
+        total = self._db.query(func.count(SEARCHRESULTINFO.ID)).filter(*conditions).scalar() or 0
+        if not total:
+            return 0, 0, []
+        # 标题按组内最优资源排序
+        title_query = self._db.query(SEARCHRESULTINFO.TITLE_KEY).filter(*conditions).group_by(
+            SEARCHRESULTINFO.TITLE_KEY).order_by(func.max(SEARCHRESULTINFO.SORT_ORDER).desc(),
+                                                 func.min(SEARCHRESULTINFO.ID))
+        title_total = title_query.count()
+        if page and page_size:
+            title_query = title_query.offset((int(page) - 1) * int(page_size)).limit(int(page_size))
+        title_keys = [item[0] for item in title_query.all()]
+        title_orders = {title_key: index for index, title_key in enumerate(title_keys)}
+        results = self._db.query(SEARCHRESULTINFO).filter(
+            SEARCHRESULTINFO.TITLE_KEY.in_(title_keys), *conditions).order_by(
+            SEARCHRESULTINFO.SORT_ORDER.desc(), SEARCHRESULTINFO.ID).all()
+        results.sort(key=lambda x: title_orders.get(x.TITLE_KEY, 0))
+        return total, title_total, results
 
     @DbPersist(_db)
     def delete_all_search_torrents(self):
@@ -1551,6 +1650,20 @@ class DbHelper:
         count = query.count()
         return count > 0
 
+    def get_download_history_se_by_tmdbids(self, tmdb_ids):
+        """
+        批量查询下载历史中各TMDB ID已下载的季集
+        :return: {TMDB ID: 季集信息集合}，未下载过的TMDB ID不在结果中
+        """
+        tmdb_ids = list({str(tmdb_id) for tmdb_id in tmdb_ids if tmdb_id})
+        ret = {}
+        for i in range(0, len(tmdb_ids), 500):
+            rows = self._db.query(DOWNLOADHISTORY.TMDBID, DOWNLOADHISTORY.SE).filter(
+                DOWNLOADHISTORY.TMDBID.in_(tmdb_ids[i:i + 500])).all()
+            for tmdb_id, season_episode in rows:
+                ret.setdefault(str(tmdb_id), set()).add(season_episode)
+        return ret
+
     @DbPersist(_db)
     def insert_download_history(self, media_info, downloader, download_id, save_dir):
         """
@@ -2679,6 +2792,22 @@ class DbHelper:
             DATE=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
         ))
 
+    @DbPersist(_db)
+    def insert_indexer_statistics_batch(self, statistics: list):
+        """
+        批量插入索引器统计
+        :param statistics: [{"indexer": 索引器名称, "itype": 类型, "seconds": 耗时, "result": Y/N, "date": 时间}]
+        """
+        if not statistics:
+            return
+        self._db.bulk_insert_mappings(INDEXERSTATISTICS, [{
+            "INDEXER": item.get("indexer"),
+            "TYPE": item.get("itype"),
+            "SECONDS": item.get("seconds"),
+            "RESULT": item.get("result"),
+            "DATE": item.get("date") or time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+        } for item in statistics])
+
     @DbPersist(_db)
     def delete_all_indexer_statistics(self):
         """
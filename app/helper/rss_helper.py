@@ -1,16 +1,38 @@
-from email import header
-import xml.dom.minidom
+import hashlib
 import re
+from io import BytesIO
+from threading import Lock
 from urllib.parse import urlsplit
 
+from lxml import etree
+from sqlalchemy import func
+
 from app.db import MainDb, DbPersist
 from app.db.models import RSSTORRENTS
-from app.utils import RssTitleUtils, StringUtils, RequestUtils, ExceptionUtils, DomUtils
+from app.utils import RssTitleUtils, StringUtils, RequestUtils, ExceptionUtils, BloomFilter
 from config import Config
 
 
 class RssHelper:
     _db = MainDb()
+    # RSS条件请求的校验信息，url -> {"etag": , "last_modified": , "hash": , "enclosures": 上次RSS中的全部种子链接}
+    _rss_validators = {}
+    _rss_validators_lock = Lock()
+    # 已处理种子链接的布隆过滤器，及已载入的最大记录ID
+    _seen_filter = None
+    _seen_filter_max_id = 0
+    _seen_filter_lock = Lock()
+    # 批量查询时每次IN的数量
+    _seen_query_batch = 500
+
+    _special_title_sites = {
+        'pt.keepfrds.com': RssTitleUtils.keepfriends_title
+    }
+
+    _rss_expired_msg = [
+        "RSS 链接已过期, 您需要获得一个新的!",
+        "RSS Link has expired, You need to get a new one!"
+    ]
 
     @staticmethod
     def parse_rssxml(url, proxy=False):
@@ -20,98 +42,232 @@ class RssHelper:
         :param proxy: 是否使用代理
         :return: 种子信息列表，如为None代表Rss过期
         """
-        _special_title_sites = {
-            'pt.keepfrds.com': RssTitleUtils.keepfriends_title
-        }
-
-        _rss_expired_msg = [
-            "RSS 链接已过期, 您需要获得一个新的!",
-            "RSS Link has expired, You need to get a new one!"
-        ]
-
-        # 开始处理
-        ret_array = []
         if not url:
             return []
-        site_domain = StringUtils.get_url_domain(url)
+        ret = RssHelper.__get_rss_res(url=url, proxy=proxy)
+        if not ret:
+            return []
+        if RssHelper.is_rss_expired(ret.text):
+            return None
+        return list(RssHelper.iter_rss_items(url=url, ret_xml=ret.text))
+
+    @staticmethod
+    def parse_rssxml_if_modified(url, proxy=False):
+        """
+        使用条件请求解析RSS订阅URL，站点返回304或内容与上次相同时不再解析
+        站点未返回ETag/Last-Modified时按内容摘要判断，只返回上次RSS中没有的种子
+        （置顶种子会一直排在最前面，不能在遇到上次的种子时停止解析）
+        :param url: RSS地址
+        :param proxy: 是否使用代理
+        :return: 是否有变化，种子信息列表（如为None代表Rss过期）
+        """
+        if not url:
+            return True, []
+        with RssHelper._rss_validators_lock:
+            validator = RssHelper._rss_validators.get(url) or {}
+        headers = {}
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator.get("etag")
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator.get("last_modified")
+        ret = RssHelper.__get_rss_res(url=url, proxy=proxy, headers=headers)
+        if ret is None:
+            return True, []
+        if ret.status_code == 304:
+            return False, []
+        if not ret:
+            return True, []
+        content_hash = hashlib.md5(ret.content).hexdigest()
+        if content_hash == validator.get("hash"):
+            return False, []
+        if RssHelper.is_rss_expired(ret.text):
+            return True, None
+        last_enclosures = validator.get("enclosures") or set()
+        enclosures = set()
+        ret_array = []
+        for item in RssHelper.iter_rss_items(url=url, ret_xml=ret.text):
+            enclosures.add(item.get("enclosure"))
+            if item.get("enclosure") not in last_enclosures:
+                ret_array.append(item)
+        # 解析成功后才记录，下次请求时带上
+        with RssHelper._rss_validators_lock:
+            RssHelper._rss_validators[url] = {
+                "etag": ret.headers.get("ETag"),
+                "last_modified": ret.headers.get("Last-Modified"),
+                "hash": content_hash,
+                "enclosures": enclosures
+            }
+        # 没有新种子
+        if not ret_array and last_enclosures:
+            return False, []
+        return True, ret_array
+
+    @staticmethod
+    def retry_rss_enclosure(url, enclosure):
+        """
+        种子本次未能处理（识别失败、站点流控等），下次RSS时完整下载并重新返回该种子，其它种子不受影响
+        """
+        with RssHelper._rss_validators_lock:
+            validator = RssHelper._rss_validators.get(url)
+            if not validator:
+                return
+            (validator.get("enclosures") or set()).discard(enclosure)
+            validator.update({"etag": None, "last_modified": None, "hash": None})
+
+    @staticmethod
+    def clear_rss_validators(url=None):
+        """
+        清除RSS条件请求的校验信息，下次将完整下载并解析
+        """
+        with RssHelper._rss_validators_lock:
+            if url:
+                RssHelper._rss_validators.pop(url, None)
+            else:
+                RssHelper._rss_validators.clear()
+
+    @staticmethod
+    def __get_rss_res(url, proxy=False, headers=None):
+        """
+        下载RSS，返回响应对象
+        """
         try:
-            headers = {
+            req_headers = {
                 "Accept": "application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
                 "User-Agent": Config().get_ua()
             }
-            ret = RequestUtils(headers=headers, proxies=Config().get_proxies() if proxy else None).get_res(url)
-            if not ret:
-                return []
-            ret.encoding = ret.apparent_encoding
+            if headers:
+                req_headers.update(headers)
+            ret = RequestUtils(headers=req_headers, proxies=Config().get_proxies() if proxy else None).get_res(url)
+            if ret is not None:
+                ret.encoding = ret.apparent_encoding
+            return ret
         except Exception as e2:
             ExceptionUtils.exception_traceback(e2)
-            return []
-        if ret:
-            ret_xml = ret.text
-            try:
-                # 解析XML
-                dom_tree = xml.dom.minidom.parseString(ret_xml)
-                rootNode = dom_tree.documentElement
-                items = rootNode.getElementsByTagName("item")
-                for item in items:
-                    try:
-                        # 标题
-                        title = DomUtils.tag_value(item, "title", default="")
-                        if not title:
-                            continue
-                        # 标题特殊处理
-                        if site_domain and site_domain in _special_title_sites:
-                            title = _special_title_sites.get(site_domain)(title)
-                        # 描述
-                        description = DomUtils.tag_value(item, "description", default="")
-                        # 种子页面
-                        link = DomUtils.tag_value(item, "link", default="")
-                        # 种子链接
-                        enclosure = DomUtils.tag_value(item, "enclosure", "url", default="")
-
-                        if not enclosure and not link:
-                            continue
-                        # 部分RSS只有link没有enclosure
-                        if not enclosure and link:
-                            enclosure = link
-                            link = None
-                        
-                        # monika rss兼容
-                        if enclosure and 'monikadesign' in enclosure:
-                            tids = re.findall(r'(\d+)\.', enclosure)
-                            if tids:
-                                split_url = urlsplit(enclosure)
-                                link = f"{split_url.scheme}://{split_url.netloc}/torrents/{tids[0]}"
-                        # 大小
-                        size = DomUtils.tag_value(item, "enclosure", "length", default=0)
-                        if size == 0:
-                            size = StringUtils.num_filesize(DomUtils.tag_value(item, "torrent:size", default=0))
-                        if size and str(size).isdigit():
-                            size = int(size)
-                        else:
-                            size = 0
-                        # 发布日期
-                        pubdate = DomUtils.tag_value(item, "pubDate", default="")
-                        if pubdate:
-                            # 转换为时间
-                            pubdate = StringUtils.get_time_stamp(pubdate)
-                        # 返回对象
-                        tmp_dict = {'title': title,
-                                    'enclosure': enclosure,
-                                    'size': size,
-                                    'description': description,
-                                    'link': link,
-                                    'pubdate': pubdate}
-                        ret_array.append(tmp_dict)
-                    except Exception as e1:
-                        ExceptionUtils.exception_traceback(e1)
-                        continue
-            except Exception as e2:
-                # RSS过期 观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
-                if ret_xml in _rss_expired_msg:
-                    return None
-                ExceptionUtils.exception_traceback(e2)
-        return ret_array
+            return None
+
+    @staticmethod
+    def is_rss_expired(ret_xml):
+        """
+        判断RSS链接是否过期
+        观众RSS 链接已过期，您需要获得一个新的！  pthome RSS Link has expired, You need to get a new one!
+        """
+        return bool(ret_xml) and ret_xml.strip() in RssHelper._rss_expired_msg
+
+    @staticmethod
+    def get_xml_parser():
+        """
+        容错的XML解析器，部分站点返回的XML格式不规范，内容需已转为UTF-8
+        """
+        return etree.XMLParser(encoding="utf-8", recover=True, huge_tree=True,
+                               resolve_entities=False, no_network=True)
+
+    @staticmethod
+    def iter_rss_items(url, ret_xml):
+        """
+        流式解析RSS内容，逐条返回种子信息，格式不规范的XML尽量解析
+        :param url: RSS地址
+        :param ret_xml: RSS内容
+        """
+        if not ret_xml:
+            return
+        site_domain = StringUtils.get_url_domain(url)
+        if isinstance(ret_xml, str):
+            ret_xml = ret_xml.encode("utf-8")
+        try:
+            for _, item in etree.iterparse(BytesIO(ret_xml),
+                                           events=("end",),
+                                           encoding="utf-8",
+                                           recover=True,
+                                           huge_tree=True,
+                                           resolve_entities=False,
+                                           no_network=True):
+                if not isinstance(item.tag, str) or item.tag.rsplit("}", 1)[-1] != "item" or item.prefix:
+                    continue
+                try:
+                    tmp_dict = RssHelper.__get_rss_item(item=item, site_domain=site_domain)
+                except Exception as e1:
+                    ExceptionUtils.exception_traceback(e1)
+                    tmp_dict = None
+                # 释放已解析的节点
+                item.clear()
+                while item.getprevious() is not None:
+                    del item.getparent()[0]
+                if not tmp_dict:
+                    continue
+                yield tmp_dict
+        except etree.XMLSyntaxError as e2:
+            ExceptionUtils.exception_traceback(e2)
+
+    @staticmethod
+    def __get_rss_item(item, site_domain):
+        """
+        从item节点中获取种子信息
+        """
+        # 各子节点的第一个值
+        tags = {}
+        for node in item.iter():
+            if node is item or not isinstance(node.tag, str):
+                continue
+            tag_name = node.tag.rsplit("}", 1)[-1]
+            if node.prefix:
+                tag_name = f"{node.prefix}:{tag_name}"
+            if tag_name not in tags:
+                tags[tag_name] = node
+        # 标题
+        title = RssHelper.__node_text(tags.get("title"))
+        if not title:
+            return None
+        # 标题特殊处理
+        if site_domain and site_domain in RssHelper._special_title_sites:
+            title = RssHelper._special_title_sites.get(site_domain)(title)
+        # 描述
+        description = RssHelper.__node_text(tags.get("description"))
+        # 种子页面
+        link = RssHelper.__node_text(tags.get("link"))
+        # 种子链接
+        enclosure_node = tags.get("enclosure")
+        enclosure = enclosure_node.get("url") if enclosure_node is not None else ""
+        if not enclosure and not link:
+            return None
+        # 部分RSS只有link没有enclosure
+        if not enclosure and link:
+            enclosure = link
+            link = None
+        # monika rss兼容
+        if enclosure and 'monikadesign' in enclosure:
+            tids = re.findall(r'(\d+)\.', enclosure)
+            if tids:
+                split_url = urlsplit(enclosure)
+                link = f"{split_url.scheme}://{split_url.netloc}/torrents/{tids[0]}"
+        # 大小
+        size = enclosure_node.get("length") if enclosure_node is not None else None
+        if not size:
+            size = StringUtils.num_filesize(RssHelper.__node_text(tags.get("torrent:size")) or 0)
+        if size and str(size).isdigit():
+            size = int(size)
+        else:
+            size = 0
+        # 发布日期
+        pubdate = RssHelper.__node_text(tags.get("pubDate"))
+        if pubdate:
+            # 转换为时间
+            pubdate = StringUtils.get_time_stamp(pubdate)
+        # 返回对象
+        return {'title': title,
+                'enclosure': enclosure,
+                'size': size,
+                'description': description,
+                'link': link,
+                'pubdate': pubdate}
+
+    @staticmethod
+    def __node_text(node):
+        """
+        节点的文本值
+        """
+        if node is None or not node.text:
+            return ""
+        return node.text
 
     @DbPersist(_db)
     def insert_rss_torrents(self, media_info):
@@ -139,6 +295,47 @@ class RssHelper:
         # 使用first()代替count()，查询到第一条记录就返回，不需要计算总数
         return self._db.query(RSSTORRENTS).filter(RSSTORRENTS.ENCLOSURE == enclosure).first() is not None
 
+    def get_rssd_enclosures(self, enclosures):
+        """
+        批量查询RSS是否处理过，根据下载链接
+        先经布隆过滤器排除一定未处理过的，其余按批IN查询
+        :param enclosures: 下载链接列表
+        :return: 已处理过的下载链接集合，链接为空的视为已处理
+        """
+        rssd = {enclosure for enclosure in enclosures if not enclosure}
+        enclosures = {enclosure for enclosure in enclosures if enclosure}
+        if not enclosures:
+            return rssd
+        seen_filter = self.__sync_seen_filter()
+        candidates = [enclosure for enclosure in enclosures if enclosure in seen_filter]
+        for i in range(0, len(candidates), self._seen_query_batch):
+            rows = self._db.query(RSSTORRENTS.ENCLOSURE).filter(
+                RSSTORRENTS.ENCLOSURE.in_(candidates[i:i + self._seen_query_batch])).all()
+            rssd.update(row[0] for row in rows)
+        return rssd
+
+    def __sync_seen_filter(self):
+        """
+        按记录ID增量载入新的下载链接，记录减少（清空、恢复备份）时重建
+        """
+        with RssHelper._seen_filter_lock:
+            max_id = self._db.query(func.max(RSSTORRENTS.ID)).scalar() or 0
+            seen_filter = RssHelper._seen_filter
+            start_id = RssHelper._seen_filter_max_id
+            if seen_filter is None or max_id < start_id or seen_filter.is_full():
+                count = self._db.query(func.count(RSSTORRENTS.ID)).scalar() or 0
+                seen_filter = BloomFilter(capacity=max(count * 2, 100000))
+                start_id = 0
+            if max_id > start_id:
+                rows = self._db.query(RSSTORRENTS.ENCLOSURE).filter(RSSTORRENTS.ID > start_id,
+                                                                     RSSTORRENTS.ID <= max_id).all()
+                for row in rows:
+                    if row[0]:
+                        seen_filter.add(row[0])
+            RssHelper._seen_filter = seen_filter
+            RssHelper._seen_filter_max_id = max_id
+            return seen_filter
+
     def is_rssd_by_simple(self, torrent_name, enclosure):
         """
         查询RSS是否处理过，根据名称
@@ -172,6 +369,8 @@ class RssHelper:
                                                RSSTORRENTS.ENCLOSURE == enclosure).delete()
         else:
             self._db.query(RSSTORRENTS).filter(RSSTORRENTS.TORRENT_NAME == title).delete()
+        # 删除后记录ID可能被复用，重建过滤器
+        self.reset_seen_filter()
 
     @DbPersist(_db)
     def truncate_rss_history(self):
@@ -179,3 +378,13 @@ class RssHelper:
         清空RSS历史记录
         """
         self._db.query(RSSTORRENTS).delete()
+        self.reset_seen_filter()
+
+    @staticmethod
+    def reset_seen_filter():
+        """
+        清除已处理种子链接的过滤器，下次查询时重建
+        """
+        with RssHelper._seen_filter_lock:
+            RssHelper._seen_filter = None
+            RssHelper._seen_filter_max_id = 0
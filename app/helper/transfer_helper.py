@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock, BoundedSemaphore
+
+import log
+from app.conf.moduleconf import ModuleConf
+from app.utils import ExceptionUtils
+from app.utils.commons import SingletonMeta
+from app.utils.types import RmtMode
+
+
+class TransferHelper(metaclass=SingletonMeta):
+    """
+    文件转移调度：按源文件和目的文件所在设备分组，每组使用独立的有界线程池，
+    同一组磁盘上的转移排队执行，避免磁头来回寻道，不同磁盘之间的转移并行执行
+    """
+    # 本地复制/移动每组同时转移数
+    _local_workers = 1
+    # 硬链接/软链接每组同时转移数，只操作元数据
+    _link_workers = 4
+    # 远程存储（Rclone/Minio）同时转移数
+    _remote_workers = 2
+
+    def __init__(self):
+        self._executors = {}
+        self._semaphores = {}
+        self._group_lock = Lock()
+
+    def init_config(self):
+        pass
+
+    @staticmethod
+    def get_device(path):
+        """
+        获取路径所在设备，路径不存在时取最近一级存在的上级目录
+        """
+        if not path:
+            return None
+        path = os.path.abspath(path)
+        while True:
+            try:
+                return os.stat(path).st_dev
+            except OSError:
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return None
+                path = parent
+
+    def get_group(self, src, dest, rmt_mode: RmtMode):
+        """
+        计算转移所属分组
+        """
+        if rmt_mode in ModuleConf.REMOTE_RMT_MODES:
+            return "remote"
+        if rmt_mode in [RmtMode.LINK, RmtMode.SOFTLINK]:
+            return "link:%s" % self.get_device(src)
+        return "%s:%s" % (self.get_device(src), self.get_device(dest))
+
+    @staticmethod
+    def __get_workers(group):
+        if group == "remote":
+            return TransferHelper._remote_workers
+        if group.startswith("link:"):
+            return TransferHelper._link_workers
+        return TransferHelper._local_workers
+
+    def __get_executor(self, group):
+        with self._group_lock:
+            if group not in self._executors:
+                self._executors[group] = ThreadPoolExecutor(max_workers=self.__get_workers(group),
+                                                            thread_name_prefix="transfer")
+            return self._executors[group]
+
+    def __get_semaphore(self, group):
+        with self._group_lock:
+            if group not in self._semaphores:
+                self._semaphores[group] = BoundedSemaphore(self.__get_workers(group))
+            return self._semaphores[group]
+
+    @contextmanager
+    def slot(self, src, dest, rmt_mode: RmtMode):
+        """
+        占用所属分组的一个转移名额，未经run调度的转移也受分组并发数限制
+        """
+        with self.__get_semaphore(self.get_group(src, dest, rmt_mode)):
+            yield
+
+    def run(self, tasks):
+        """
+        按设备分组并行执行转移任务
+        :param tasks: [(转移函数, 源路径, 目的路径, 转移方式)]，转移函数无参数，返回错误码
+        :return: 与tasks顺序一致的错误码列表
+        """
+        futures = [self.__get_executor(self.get_group(src, dest, rmt_mode)).submit(func)
+                   for func, src, dest, rmt_mode in tasks]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as err:
+                ExceptionUtils.exception_traceback(err)
+                log.error("【Rmt】文件转移时发生错误：%s" % str(err))
+                results.append(-1)
+        return results
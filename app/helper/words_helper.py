@@ -1,9 +1,11 @@
+import threading
+
 import regex as re
 import cn2an
-import functools
 import time
 
 from app.helper.db_helper import DbHelper
+from app.utils.cache_manager import cacheman
 from app.utils.commons import SingletonMeta
 from app.utils.exception_utils import ExceptionUtils
 
@@ -12,40 +14,128 @@ class WordsHelper(metaclass=SingletonMeta):
     dbhelper = None
     # 识别词
     words_info = []
-    _cache = {}
+    # 编译后的识别词规则，按识别词顺序执行
+    _program = None
+    _signature = None
     _cache_time = 0
-    _cache_ttl = 60  # 缓存60秒
+    _cache_ttl = 60  # 60秒检查一次识别词变化
+    _load_lock = threading.Lock()
 
     def __init__(self):
         self.init_config()
 
     def init_config(self):
         self.dbhelper = DbHelper()
-        self._load_words_with_cache()
-    
-    def _load_words_with_cache(self):
-        """带缓存的加载识别词"""
+        self._load_words_with_cache(force=True)
+
+    def _load_words_with_cache(self, force=False):
+        """
+        加载识别词并编译为规则，识别词有变化时清空处理结果缓存
+        """
         current_time = time.time()
-        if current_time - self._cache_time > self._cache_ttl or not self.words_info:
-            self.words_info = self.dbhelper.get_custom_words(enabled=1)
+        if not force \
+                and self._program is not None \
+                and current_time - self._cache_time <= self._cache_ttl:
+            return
+        with self._load_lock:
+            if not force \
+                    and self._program is not None \
+                    and current_time - self._cache_time <= self._cache_ttl:
+                return
+            words_info = self.dbhelper.get_custom_words(enabled=1)
+            signature = tuple((word.ID, word.TYPE, word.REGEX, word.REPLACED, word.REPLACE,
+                               word.FRONT, word.BACK, word.OFFSET) for word in words_info)
+            if signature != self._signature or self._program is None:
+                self.words_info = words_info
+                self._program = self.__compile_words(words_info)
+                self._signature = signature
+                cacheman["words_process"].clear()
             self._cache_time = current_time
-            # 清空处理缓存
-            self._cache.clear()
 
     def clear_cache(self):
         """清除缓存，用于配置更新后"""
-        self._cache_time = 0
-        self._cache.clear()
+        self._signature = None
         self.init_config()
 
+    @staticmethod
+    def __compile_regex(pattern):
+        """
+        编译识别词正则，有误时返回None，执行时按原方式处理以输出错误信息
+        """
+        try:
+            return re.compile(r'%s' % pattern)
+        except Exception:
+            return None
+
+    def __compile_words(self, words_info):
+        """
+        将识别词编译为有序规则：连续的非正则屏蔽词合并为一个匹配器，正则预先编译
+        """
+        program = []
+        for word_info in words_info:
+            match word_info.TYPE:
+                case 1:
+                    ignored = word_info.REPLACED
+                    if not word_info.REGEX and isinstance(ignored, str):
+                        if program and program[-1]["type"] == "ignore_literals":
+                            program[-1]["words"].append(ignored)
+                        else:
+                            program.append({"type": "ignore_literals", "words": [ignored]})
+                        continue
+                    program.append({"type": "ignore",
+                                    "word": ignored,
+                                    "regex": word_info.REGEX,
+                                    "pattern": self.__compile_regex(ignored) if word_info.REGEX else None})
+                case 2:
+                    program.append({"type": "replace",
+                                    "replaced": word_info.REPLACED,
+                                    "replace": word_info.REPLACE,
+                                    "regex": word_info.REGEX,
+                                    "pattern": self.__compile_regex(word_info.REPLACED) if word_info.REGEX else None})
+                case 3:
+                    program.append({"type": "replace_offset",
+                                    "replaced": word_info.REPLACED,
+                                    "replace": word_info.REPLACE,
+                                    "front": word_info.FRONT,
+                                    "back": word_info.BACK,
+                                    "offset": word_info.OFFSET,
+                                    "pattern": self.__compile_regex(word_info.REPLACED),
+                                    "offset_patterns": self.__compile_offset(word_info.FRONT, word_info.BACK)})
+                case 4:
+                    program.append({"type": "offset",
+                                    "front": word_info.FRONT,
+                                    "back": word_info.BACK,
+                                    "offset": word_info.OFFSET,
+                                    "offset_patterns": self.__compile_offset(word_info.FRONT, word_info.BACK)})
+                case _:
+                    pass
+        # 合并的屏蔽词先用一个正则判断是否出现，均未出现时整段跳过
+        for rule in program:
+            if rule["type"] == "ignore_literals":
+                rule["matcher"] = re.compile("|".join(re.escape(word) for word in rule["words"]))
+        return program
+
+    @staticmethod
+    def __compile_offset(front, back):
+        """
+        预编译集偏移的前后定位词和集数提取正则
+        """
+        try:
+            return (re.compile(r'%s' % front) if front else None,
+                    re.compile(r'%s' % back) if back else None,
+                    re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back)))
+        except Exception:
+            return None
+
     def process(self, title):
-        # 检查缓存
-        if title in self._cache:
-            return self._cache[title]
-        
         # 刷新配置（如果需要）
         self._load_words_with_cache()
-        
+        # 检查缓存
+        cache = cacheman["words_process"]
+        result = cache.get(title)
+        if result is not None:
+            return result
+        org_title = title
         # 错误信息
         msg = []
         # 应用屏蔽
@@ -55,43 +145,54 @@ class WordsHelper(metaclass=SingletonMeta):
         # 应用集偏移
         used_offset_words = []
         # 应用识别词
-        for word_info in self.words_info:
-            match word_info.TYPE:
-                case 1:
+        for rule in self._program or []:
+            match rule["type"]:
+                case "ignore_literals":
+                    # 合并的非正则屏蔽词
+                    if not rule["matcher"].search(title):
+                        continue
+                    for ignored in rule["words"]:
+                        title, ignore_msg, ignore_flag = self.replace_noregex(title, ignored, "")
+                        if ignore_flag:
+                            used_ignored_words.append(ignored)
+                        elif ignore_msg:
+                            msg.append(f"自定义屏蔽词 {ignored} 设置有误：{ignore_msg}")
+                case "ignore":
                     # 屏蔽
-                    ignored = word_info.REPLACED
-                    ignored_word = ignored
-                    title, ignore_msg, ignore_flag = self.replace_regex(title, ignored, "") \
-                        if word_info.REGEX else self.replace_noregex(title, ignored, "")
+                    ignored = rule["word"]
+                    title, ignore_msg, ignore_flag = self.__replace_compiled(title, rule["pattern"], ignored, "") \
+                        if rule["regex"] else self.replace_noregex(title, ignored, "")
                     if ignore_flag:
-                        used_ignored_words.append(ignored_word)
+                        used_ignored_words.append(ignored)
                     elif ignore_msg:
-                        msg.append(f"自定义屏蔽词 {ignored_word} 设置有误：{ignore_msg}")
-                case 2:
+                        msg.append(f"自定义屏蔽词 {ignored} 设置有误：{ignore_msg}")
+                case "replace":
                     # 替换
-                    replaced, replace = word_info.REPLACED, word_info.REPLACE
+                    replaced, replace = rule["replaced"], rule["replace"]
                     replaced_word = f"{replaced} ⇒ {replace}"
-                    title, replace_msg, replace_flag = self.replace_regex(title, replaced, replace) \
-                        if word_info.REGEX else self.replace_noregex(title, replaced, replace)
+                    title, replace_msg, replace_flag = \
+                        self.__replace_compiled(title, rule["pattern"], replaced, replace) \
+                        if rule["regex"] else self.replace_noregex(title, replaced, replace)
                     if replace_flag:
                         used_replaced_words.append(replaced_word)
                     elif replace_msg:
                         msg.append(f"自定义替换词 {replaced_word} 格式有误：{replace_msg}")
-
-                case 3:
+                case "replace_offset":
                     # 替换+集偏移
                     replaced, replace, front, back, offset = \
-                        word_info.REPLACED, word_info.REPLACE, word_info.FRONT, word_info.BACK, word_info.OFFSET
+                        rule["replaced"], rule["replace"], rule["front"], rule["back"], rule["offset"]
                     replaced_word = f"{replaced} ⇒ {replace}"
                     offset_word = f"{front} + {back} >> {offset}"
                     replaced_offset_word = f"{replaced_word} @@@ {offset_word}"
                     # 记录替换前title
                     title_cache = title
                     # 替换
-                    title, replace_msg, replace_flag = self.replace_regex(title, replaced, replace)
+                    title, replace_msg, replace_flag = \
+                        self.__replace_compiled(title, rule["pattern"], replaced, replace)
                     # 替换应用成功进行集数偏移
                     if replace_flag:
-                        title, offset_msg, offset_flag = self.episode_offset(title, front, back, offset)
+                        title, offset_msg, offset_flag = \
+                            self.episode_offset(title, front, back, offset, rule["offset_patterns"])
                         # 集数偏移应用成功
                         if offset_flag:
                             used_replaced_words.append(replaced_word)
@@ -103,23 +204,34 @@ class WordsHelper(metaclass=SingletonMeta):
                                 f"自定义替换+集偏移词 {replaced_offset_word} 集偏移部分格式有误：{offset_msg}")
                     elif replace_msg:
                         msg.append(f"自定义替换+集偏移词 {replaced_offset_word} 替换部分格式有误：{replace_msg}")
-                case 4:
+                case "offset":
                     # 集数偏移
-                    front, back, offset = word_info.FRONT, word_info.BACK, word_info.OFFSET
+                    front, back, offset = rule["front"], rule["back"], rule["offset"]
                     offset_word = f"{front} + {back} >> {offset}"
-                    title, offset_msg, offset_flag = self.episode_offset(title, front, back, offset)
+                    title, offset_msg, offset_flag = \
+                        self.episode_offset(title, front, back, offset, rule["offset_patterns"])
                     if offset_flag:
                         used_offset_words.append(offset_word)
                     elif offset_msg:
                         msg.append(f"自定义集偏移词 {offset_word} 格式有误：{offset_msg}")
-                case _:
-                    pass
         result = (title, msg, {"ignored": used_ignored_words, "replaced": used_replaced_words, "offset": used_offset_words})
-        # 缓存结果（限制缓存大小）
-        if len(self._cache) < 1000:  # 最多缓存1000个结果
-            self._cache[title] = result
+        cache.set(org_title, result)
         return result
 
+    def __replace_compiled(self, title, pattern, replaced, replace) -> (str, str, bool):
+        """
+        使用预编译的正则替换，正则编译失败时按原方式处理
+        """
+        if pattern is None:
+            return self.replace_regex(title, replaced, replace)
+        try:
+            if not pattern.search(title):
+                return title, "", False
+            return pattern.sub(r'%s' % replace, title), "", True
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return title, str(err), False
+
     @staticmethod
     def replace_regex(title, replaced, replace) -> (str, str, bool):
         try:
@@ -143,13 +255,23 @@ class WordsHelper(metaclass=SingletonMeta):
             return title, str(err), False
 
     @staticmethod
-    def episode_offset(title, front, back, offset) -> (str, str, bool):
+    def episode_offset(title, front, back, offset, patterns=None) -> (str, str, bool):
+        """
+        :param patterns: 预编译的(前定位词, 后定位词, 集数提取)正则，为空时现场编译
+        """
         try:
-            if back and not re.findall(r'%s' % back, title):
+            if patterns:
+                front_re, back_re, offset_word_info_re = patterns
+            else:
+                front_re = re.compile(r'%s' % front) if front else None
+                back_re = re.compile(r'%s' % back) if back else None
+                offset_word_info_re = None
+            if back_re and not back_re.search(title):
                 return title, "", False
-            if front and not re.findall(r'%s' % front, title):
+            if front_re and not front_re.search(title):
                 return title, "", False
-            offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
+            if not offset_word_info_re:
+                offset_word_info_re = re.compile(r'(?<=%s.*?)[0-9一二三四五六七八九十]+(?=.*?%s)' % (front, back))
             episode_nums_str = re.findall(offset_word_info_re, title)
             if not episode_nums_str:
                 return title, "", False
@@ -1,5 +1,7 @@
+import copy
 import datetime
-from threading import Lock
+import time
+from threading import Lock, local
 import xml.dom.minidom
 from abc import ABCMeta, abstractmethod
 
@@ -8,7 +10,7 @@ from app.filter import Filter
 from app.helper import ProgressHelper, DbHelper
 from app.media import Media
 from app.media.meta import MetaInfo
-from app.utils import DomUtils, RequestUtils, StringUtils, ExceptionUtils
+from app.utils import DomUtils, RequestUtils, StringUtils, ExceptionUtils, cacheman
 from app.utils.types import MediaType, SearchType, ProgressKey
 
 
@@ -25,8 +27,10 @@ class _IIndexClient(metaclass=ABCMeta):
     filter = None
     dbhelper = None
     lock = Lock()
-    # 媒体识别缓存，避免重复识别
-    media_ident_cache = {}
+    # 各搜索线程最近一次搜索的状态
+    _search_state = local()
+    # 待写入数据库的索引统计
+    _statistics = []
 
     def __init__(self):
         self.media = Media()
@@ -34,6 +38,42 @@ class _IIndexClient(metaclass=ABCMeta):
         self.progress = ProgressHelper()
         self.dbhelper = DbHelper()
 
+    def set_search_state(self, state):
+        """
+        记录当前线程的搜索状态
+        :param state: done-完成、timeout-超时、failed-失败
+        """
+        self._search_state.value = state
+
+    def get_search_state(self):
+        """
+        获取当前线程最近一次搜索的状态
+        """
+        return getattr(self._search_state, "value", None) or "done"
+
+    def add_indexer_statistics(self, indexer, seconds, result):
+        """
+        记录索引统计，由 flush_indexer_statistics 统一写入数据库
+        """
+        with self.lock:
+            self._statistics.append({
+                "indexer": indexer,
+                "itype": self.client_id,
+                "seconds": seconds,
+                "result": result,
+                "date": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
+            })
+
+    def flush_indexer_statistics(self):
+        """
+        将缓存的索引统计一次性写入数据库
+        """
+        with self.lock:
+            statistics = self._statistics[:]
+            self._statistics.clear()
+        if statistics:
+            self.dbhelper.insert_indexer_statistics_batch(statistics)
+
     @abstractmethod
     def match(self, ctype):
         """
@@ -98,34 +138,34 @@ class _IIndexClient(metaclass=ABCMeta):
 
         # 索引花费时间
         seconds = (datetime.datetime.now() - start_time).seconds
+        # 索引统计
+        self.add_indexer_statistics(indexer=indexer.name,
+                                    seconds=seconds,
+                                    result='Y' if result_array else 'N')
         if len(result_array) == 0:
-            with self.lock:
-                log.warn(f"【{self.index_type}】{indexer.name} 关键词 {key_word} 未搜索到数据")
-                self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 关键词 {key_word} 未搜索到数据")
-
-                self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
-                                            itype=self.client_id,
-                                            seconds=seconds,
-                                            result='N'
-                                            )
-                return []
+            log.warn(f"【{self.index_type}】{indexer.name} 关键词 {key_word} 未搜索到数据")
+            self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 关键词 {key_word} 未搜索到数据")
+            return []
         else:
-            with self.lock:
-                log.warn(f"【{self.index_type}】{indexer.name} 关键词 {key_word} 返回数据：{len(result_array)}")
-                # 更新进度
-                self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 关键词 {key_word} 返回 {len(result_array)} 条数据")
-                # 索引统计
-                self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
-                                                        itype=self.client_id,
-                                                        seconds=seconds,
-                                                        result='Y'
-                                                        )
-                return self.filter_search_results(result_array=result_array,
-                                                order_seq=order_seq,
-                                                indexer=indexer,
-                                                filter_args=filter_args,
-                                                match_media=match_media,
-                                                start_time=start_time)
+            log.warn(f"【{self.index_type}】{indexer.name} 关键词 {key_word} 返回数据：{len(result_array)}")
+            # 更新进度
+            self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 关键词 {key_word} 返回 {len(result_array)} 条数据")
+            return self.filter_search_results(result_array=result_array,
+                                              order_seq=order_seq,
+                                              indexer=indexer,
+                                              filter_args=filter_args,
+                                              match_media=match_media,
+                                              start_time=start_time)
+
+    @staticmethod
+    def __get_torrent_key(item, site):
+        """
+        种子唯一标识：下载链接或Hash、站点、大小、标题
+        """
+        return StringUtils.md5_hash("%s|%s|%s|%s" % (item.get('enclosure') or item.get('infohash') or item.get('page_url'),
+                                                     site,
+                                                     item.get('size'),
+                                                     item.get('title')))
 
     @staticmethod
     def __parse_torznabxml(url):
@@ -244,6 +284,12 @@ class _IIndexClient(metaclass=ABCMeta):
         index_rule_fail = 0
         index_match_fail = 0
         index_error = 0
+        # 已处理的种子标识
+        torrent_keys = set()
+        # 本批次识别失败的名称，重复的种子不再识别
+        ident_fails = {}
+        # 通过初步过滤的种子，统一批量检查过滤规则
+        candidates = []
         for item in result_array:
             # 名称
             torrent_name = item.get('title')
@@ -252,11 +298,14 @@ class _IIndexClient(metaclass=ABCMeta):
             if not torrent_name:
                 index_error += 1
                 continue
-            enclosure = item.get('enclosure')
             size = item.get('size')
             seeders = item.get('seeders')
-            peers = item.get('peers')
-            page_url = item.get('page_url')
+            # 去重
+            torrent_key = self.__get_torrent_key(item=item, site=indexer.name)
+            if torrent_key in torrent_keys:
+                index_rule_fail += 1
+                continue
+            torrent_keys.add(torrent_key)
             uploadvolumefactor = round(float(item.get('uploadvolumefactor')), 1) if item.get(
                 'uploadvolumefactor') is not None else 1.0
             downloadvolumefactor = round(float(item.get('downloadvolumefactor')), 1) if item.get(
@@ -288,12 +337,21 @@ class _IIndexClient(metaclass=ABCMeta):
                     f"不匹配类型：{filter_args.get('type').value}")
                 index_rule_fail += 1
                 continue
-            # 检查订阅过滤规则匹配
-            match_flag, res_order, match_msg = self.filter.check_torrent_filter(
-                meta_info=meta_info,
-                filter_args=filter_args,
-                uploadvolumefactor=uploadvolumefactor,
-                downloadvolumefactor=downloadvolumefactor)
+            candidates.append((item, meta_info, uploadvolumefactor, downloadvolumefactor))
+        # 检查订阅过滤规则匹配，过滤条件和规则组只解析一次
+        filter_results = self.filter.check_torrents_filter(
+            [(meta_info, uploadvolumefactor, downloadvolumefactor)
+             for _, meta_info, uploadvolumefactor, downloadvolumefactor in candidates],
+            filter_args)
+        for (item, meta_info, uploadvolumefactor, downloadvolumefactor), (match_flag, res_order, match_msg) \
+                in zip(candidates, filter_results):
+            torrent_name = item.get('title')
+            description = item.get('description')
+            enclosure = item.get('enclosure')
+            size = item.get('size')
+            seeders = item.get('seeders')
+            peers = item.get('peers')
+            page_url = item.get('page_url')
             if not match_flag:
                 log.info(f"【{self.client_name}】{match_msg}")
                 index_rule_fail += 1
@@ -312,24 +370,34 @@ class _IIndexClient(metaclass=ABCMeta):
                 else:
                     # 检查缓存
                     cache_key = f"{torrent_name}_{description}"
-                    if cache_key in self.media_ident_cache:
-                        media_info = self.media_ident_cache[cache_key]
+                    if cache_key in ident_fails:
+                        if ident_fails[cache_key]:
+                            index_match_fail += 1
+                        else:
+                            index_error += 1
+                        continue
+                    media_info = cacheman["indexer_media_ident"].get(cache_key)
+                    if media_info:
                         log.debug(f"【{self.client_name}】从缓存获取媒体信息: {torrent_name}")
                     else:
                         # 识别
                         media_info = self.media.get_media_info(title=torrent_name, subtitle=description, chinese=False)
                         if not media_info:
                             log.warn(f"【{self.client_name}】{torrent_name} 识别媒体信息出错！")
+                            ident_fails[cache_key] = False
                             index_error += 1
                             continue
                         elif not media_info.tmdb_info:
                             log.info(
                                 f"【{self.client_name}】{torrent_name} 识别为 {media_info.get_name()} 未匹配到媒体信息")
+                            ident_fails[cache_key] = True
                             index_match_fail += 1
                             continue
                         # 缓存识别结果
-                        self.media_ident_cache[cache_key] = media_info
-                    
+                        cacheman["indexer_media_ident"].set(cache_key, media_info)
+                    # 缓存的识别结果为共用对象，复制后再设置种子信息
+                    media_info = copy.copy(media_info)
+
                     # TMDBID是否匹配
                     if str(media_info.tmdb_id) != str(match_media.tmdb_id):
                         log.info(
@@ -396,11 +464,8 @@ class _IIndexClient(metaclass=ABCMeta):
                                         page_url=page_url,
                                         upload_volume_factor=uploadvolumefactor,
                                         download_volume_factor=downloadvolumefactor)
-            if media_info not in ret_array:
-                index_sucess += 1
-                ret_array.append(media_info)
-            else:
-                index_rule_fail += 1
+            index_sucess += 1
+            ret_array.append(media_info)
         # 循环结束
         # 计算耗时
         end_time = datetime.datetime.now()
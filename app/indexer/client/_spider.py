@@ -1,6 +1,7 @@
-import copy
 import datetime
 import re
+import threading
+from functools import lru_cache
 from time import sleep
 from urllib.parse import quote
 
@@ -19,6 +20,14 @@ from config import Config
 from feapder.utils.tools import urlencode
 
 
+@lru_cache(maxsize=256)
+def _compile_template(text):
+    """
+    编译字段模板，同一站点的每行种子共用
+    """
+    return Template(text)
+
+
 class TorrentSpider(feapder.AirSpider):
     _redis_valid = RedisHelper.is_valid()
     __custom_setting__ = dict(
@@ -84,6 +93,10 @@ class TorrentSpider(feapder.AirSpider):
     site_info = None
     # 重试次数
     retry_times = 0
+    # 完成事件
+    _complete_event = None
+    # 字段选择器缓存
+    _selectors = {}
 
     def setparam(self, indexer,
                  keyword: [str, list] = None,
@@ -130,6 +143,54 @@ class TorrentSpider(feapder.AirSpider):
         self.result_num = Config().get_config('pt').get('site_search_result_num') or 100
         self.torrents_info_array = []
         self.site_info = Sites().get_sites(siteurl=indexer.domain)
+        self._selectors = {}
+        self._complete_event = threading.Event()
+
+    def set_complete(self, error=False):
+        """
+        标记搜索完成并唤醒等待方
+        """
+        if error:
+            self.is_error = True
+        self.is_complete = True
+        if self._complete_event:
+            self._complete_event.set()
+
+    def wait_complete(self, timeout=None):
+        """
+        等待搜索完成
+        :param timeout: 超时时间（秒）
+        :return: 是否在超时前完成
+        """
+        if not self._complete_event:
+            return self.is_complete
+        return self._complete_event.wait(timeout)
+
+    def stop_spider(self):
+        """
+        停止爬虫，已获取的种子保留
+        """
+        super().stop_spider()
+        if self._complete_event:
+            self._complete_event.set()
+
+    def end_callback(self):
+        """
+        爬虫线程结束时确保等待方被唤醒
+        """
+        self.set_complete()
+
+    def __get_selector(self, name):
+        """
+        获取字段选择器，使用浏览器渲染的站点需补充tbody，每个字段只处理一次
+        """
+        if name not in self._selectors:
+            selector = self.fields.get(name, {})
+            if self.site_info.get('chrome') and selector.get('selector', '').find('table') != -1:
+                selector = dict(selector)
+                selector['selector'] = selector.get('selector', '').replace('tr >', 'tbody > tr > ')
+            self._selectors[name] = selector
+        return self._selectors[name]
 
     def start_requests(self):
         """
@@ -137,7 +198,7 @@ class TorrentSpider(feapder.AirSpider):
         """
 
         if not self.search or not self.domain:
-            self.is_complete = True
+            self.set_complete()
             return
 
         # 种子搜索相对路径
@@ -288,11 +349,7 @@ class TorrentSpider(feapder.AirSpider):
         # title default
         if 'title' not in self.fields:
             return
-        selector = copy.deepcopy(self.fields.get('title', {}))
-        if self.site_info.get('chrome') and selector.get('selector', '').find('table') != -1:
-            tmp_selector = selector.get('selector', '')
-            tmp_selector = tmp_selector.replace('tr >', 'tbody > tr > ')
-            selector['selector'] = tmp_selector
+        selector = self.__get_selector('title')
         if 'selector' in selector:
             title = torrent(selector.get('selector', '')).clone()
             self.__remove(title, selector)
@@ -314,7 +371,7 @@ class TorrentSpider(feapder.AirSpider):
                 items = self.__attribute_or_text(title_optional_item, title_optional_selector)
                 title_optional = self.__index(items, title_optional_selector)
                 render_dict.update({'title_optional': title_optional})
-            self.torrents_info['title'] = Template(selector.get('text')).render(fields=render_dict)
+            self.torrents_info['title'] = _compile_template(selector.get('text')).render(fields=render_dict)
         self.torrents_info['title'] = self.__filter_text(self.torrents_info.get('title'),
                                                          selector.get('filters'))
 
@@ -322,11 +379,7 @@ class TorrentSpider(feapder.AirSpider):
         # title optional
         if 'description' not in self.fields:
             return
-        selector = copy.deepcopy(self.fields.get('description', {}))
-        if self.site_info.get('chrome') and selector.get('selector', '').find('table') != -1:
-            tmp_selector = selector.get('selector', '')
-            tmp_selector = tmp_selector.replace('tr >', 'tbody > tr > ')
-            selector['selector'] = tmp_selector
+        selector = self.__get_selector('description')
 
         if "selector" in selector \
                 or "selectors" in selector:
@@ -365,7 +418,7 @@ class TorrentSpider(feapder.AirSpider):
                 items = self.__attribute_or_text(description_normal_item, description_normal_selector)
                 description_normal = self.__index(items, description_normal_selector)
                 render_dict.update({"description_normal": description_normal})
-            self.torrents_info['description'] = Template(selector.get('text')).render(fields=render_dict)
+            self.torrents_info['description'] = _compile_template(selector.get('text')).render(fields=render_dict)
         self.torrents_info['description'] = self.__filter_text(self.torrents_info.get('description'),
                                                                selector.get('filters'))
 
@@ -557,11 +610,7 @@ class TorrentSpider(feapder.AirSpider):
         # labels
         if 'labels' not in self.fields:
             return
-        selector = copy.deepcopy(self.fields.get('labels', {}))
-        if self.site_info.get('chrome') and selector.get('selector', '').find('table') != -1:
-            tmp_selector = selector.get('selector', '')
-            tmp_selector = tmp_selector.replace('tr >', 'tbody > tr > ')
-            selector['selector'] = tmp_selector
+        selector = self.__get_selector('labels')
 
         labels = torrent(selector.get("selector", "")).clone()
         self.__remove(labels, selector)
@@ -667,20 +716,19 @@ class TorrentSpider(feapder.AirSpider):
         """
         Handle failed requests after all retry attempts
         """
-        self.is_error = True
-        self.is_complete = True
+        self.set_complete(error=True)
         log.warn(f"【Spider】请求失败已达到最大重试次数：{request.url}")
 
     def parse(self, request, response):
         """
         解析整个页面
         """
+        error = False
         try:
             # 获取站点文本
             html_text = response.extract()
             if not html_text:
-                self.is_error = True
-                self.is_complete = True
+                error = True
                 return
             # 解析站点文本对象
             html_doc = PyQuery(html_text)
@@ -688,15 +736,17 @@ class TorrentSpider(feapder.AirSpider):
             torrents_selector = self.list.get('selector', '')
             if self.site_info.get('chrome') and torrents_selector.find('tr:has') != -1:
                 torrents_selector = torrents_selector.replace('> tr:has', ' > tbody > tr:has')
-            # 遍历种子html列表
+            # 遍历种子html列表，Getinfo每行生成新的字典，无需复制
             for torn in html_doc(torrents_selector):
-                self.torrents_info_array.append(copy.deepcopy(self.Getinfo(PyQuery(torn))))
+                if self._stop_spider:
+                    break
+                self.torrents_info_array.append(self.Getinfo(PyQuery(torn)))
                 if len(self.torrents_info_array) >= int(self.result_num):
                     break
 
         except Exception as err:
-            self.is_error = True
+            error = True
             ExceptionUtils.exception_traceback(err)
             log.warn(f"【Spider】错误：{self.indexername} {str(err)}")
         finally:
-            self.is_complete = True
+            self.set_complete(error=error)
@@ -1,7 +1,6 @@
 import copy
 import datetime
 from threading import Lock
-import time
 
 from app.helper.drissionpage_helper import DrissionPageHelper
 import log
@@ -16,7 +15,7 @@ from app.indexer.client._mteam import MteamSpider
 from app.indexer.client._rousi import RousiSpider
 from app.indexer.client._yemapt import YemaPTSpider
 from app.indexer.client._firefly import FireFlySpider
-from app.sites import Sites
+from app.sites import Sites, SiteRateLimiter
 from app.utils import StringUtils
 from app.utils.types import SearchType, IndexerType, ProgressKey, SystemConfigKey
 from config import Config
@@ -37,6 +36,8 @@ class BuiltinIndexer(_IIndexClient):
     sites = None
     dbhelper = None
     lock = Lock()
+    # 站点流控时等待令牌的最长时间（秒）
+    _ratelimit_timeout = 20
 
     def __init__(self, config=None):
         super().__init__()
@@ -136,8 +137,12 @@ class BuiltinIndexer(_IIndexClient):
         """
         if not indexer or not key_word:
             return None
-        # 站点流控
-        if self.sites.check_ratelimit(indexer.siteid):
+        # 站点流控，交互搜索优先于订阅等后台搜索
+        if in_from in [SearchType.RSS, SearchType.USERRSS, SearchType.DB, SearchType.PLUGIN]:
+            priority = SiteRateLimiter.PRIORITY_LOW
+        else:
+            priority = SiteRateLimiter.PRIORITY_HIGH
+        if self.sites.check_ratelimit(indexer.siteid, priority=priority, timeout=self._ratelimit_timeout):
             self.progress.update(ptype=ProgressKey.Search, text=f"{indexer.name} 触发站点流控，跳过 ...")
             return []
         # fix 共用同一个dict时会导致某个站点的更新全局全效
@@ -193,16 +198,16 @@ class BuiltinIndexer(_IIndexClient):
         except Exception as err:
             error_flag = True
             print(str(err))
+        if error_flag and self.get_search_state() != "timeout":
+            self.set_search_state("failed")
 
         # 索引花费的时间
         seconds = round((datetime.datetime.now() - start_time).seconds, 1)
         # 索引统计
-        with self.lock:
-            self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
-                                                    itype=self.client_id,
-                                                    seconds=seconds,
-                                                    result='N' if error_flag else 'Y')
-            # 返回结果
+        self.add_indexer_statistics(indexer=indexer.name,
+                                    seconds=seconds,
+                                    result='N' if error_flag else 'Y')
+        # 返回结果
         if len(result_array) == 0:
             log.warn(f"【{self.client_name}】{indexer.name} 关键词 {key_word} 未搜索到数据")
             # 更新进度
@@ -258,15 +263,13 @@ class BuiltinIndexer(_IIndexClient):
         seconds = round((datetime.datetime.now() - start_time).seconds, 1)
 
         # 索引统计
-        with self.lock:
-            self.dbhelper.insert_indexer_statistics(indexer=indexer.name,
-                                                    itype=self.client_id,
-                                                    seconds=seconds,
-                                                    result='N' if error_flag else 'Y')
+        self.add_indexer_statistics(indexer=indexer.name,
+                                    seconds=seconds,
+                                    result='N' if error_flag else 'Y')
+        self.flush_indexer_statistics()
         return result_array
 
-    @staticmethod
-    def __spider_search(indexer, keyword=None, page=None, mtype=None, timeout=90):
+    def __spider_search(self, indexer, keyword=None, page=None, mtype=None, timeout=90):
         """
         根据关键字搜索单个站点
         :param: indexer: 站点配置
@@ -282,14 +285,10 @@ class BuiltinIndexer(_IIndexClient):
                         page=page,
                         mtype=mtype)
         spider.start()
-        # 循环判断是否获取到数据
-        sleep_count = 0
-        while not spider.is_complete:
-            sleep_count += 1
-            time.sleep(1)
-            if sleep_count > timeout:
-                spider.stop_spider()
-                break
+        # 等待爬虫完成，超时则停止爬虫，保留已获取的数据
+        if not spider.wait_complete(timeout):
+            spider.stop_spider()
+            self.set_search_state("timeout")
         # 是否发生错误
         result_flag = spider.is_error
         # 种子列表
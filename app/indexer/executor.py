@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import log
+from app.utils.commons import SingletonMeta
+from config import Config
+
+
+class SearchDeadlineExceeded(Exception):
+    """
+    排队超过搜索截止时间，任务未执行
+    """
+    pass
+
+
+class _SearchTask(object):
+
+    def __init__(self, site, func, args, kwargs, deadline):
+        self.site = site
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.future = Future()
+        self.submit_time = time.time()
+
+
+class SearchExecutor(metaclass=SingletonMeta):
+    """
+    常驻的索引搜索线程池，限制全局并发及单站点并发，超过截止时间的排队任务直接取消
+    """
+    # 全局最大并发数
+    _max_workers = 20
+    # 单站点最大并发数
+    _site_concurrency = 2
+    # 单次搜索的截止时间（秒）
+    _search_timeout = 120
+    _executor = None
+    _pool_size = 0
+    _queue = None
+    _site_running = None
+    _running = 0
+    _cond = None
+    _stats = None
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._site_running = {}
+        self._stats = {}
+        self.init_config()
+
+    def init_config(self):
+        config = Config().get_config("pt") or {}
+        with self._cond:
+            self._max_workers = int(config.get("search_max_threads") or 20)
+            self._site_concurrency = int(config.get("search_site_concurrency") or 2)
+            self._search_timeout = int(config.get("search_timeout") or 120)
+            if self._pool_size != self._max_workers:
+                old_executor = self._executor
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers,
+                                                    thread_name_prefix="IndexerSearch")
+                self._pool_size = self._max_workers
+                if old_executor:
+                    old_executor.shutdown(wait=False)
+        self.__dispatch()
+
+    @property
+    def search_timeout(self):
+        return self._search_timeout
+
+    def submit(self, site, func, *args, deadline=None, **kwargs):
+        """
+        提交搜索任务，按站点排队
+        :param site: 站点标识，同一站点的任务受单站点并发限制
+        :param func: 执行函数
+        :param deadline: 截止时间戳，到期仍在排队的任务不再执行
+        :return: Future
+        """
+        task = _SearchTask(site=site, func=func, args=args, kwargs=kwargs, deadline=deadline)
+        with self._cond:
+            self._queue.append(task)
+        self.__dispatch()
+        return task.future
+
+    def __dispatch(self):
+        """
+        按提交顺序将可执行的任务交给线程池
+        """
+        with self._cond:
+            if not self._queue:
+                return
+            now = time.time()
+            pending = deque()
+            while self._queue:
+                task = self._queue.popleft()
+                # 已取消
+                if task.future.cancelled():
+                    continue
+                # 已超过截止时间
+                if task.deadline and now > task.deadline:
+                    if task.future.set_running_or_notify_cancel():
+                        task.future.set_exception(SearchDeadlineExceeded())
+                    continue
+                if self._running >= self._max_workers \
+                        or self._site_running.get(task.site, 0) >= self._site_concurrency:
+                    pending.append(task)
+                    continue
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                self._running += 1
+                self._site_running[task.site] = self._site_running.get(task.site, 0) + 1
+                # 排队等待时间记录在Future上，供调用方汇总单次搜索
+                task.future.queue_wait = now - task.submit_time
+                self.__record_wait(task.site, task.future.queue_wait)
+                self._executor.submit(self.__run, task)
+            self._queue = pending
+
+    def __run(self, task):
+        try:
+            task.future.set_result(task.func(*task.args, **task.kwargs))
+        except Exception as err:
+            task.future.set_exception(err)
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._site_running[task.site] -= 1
+                if not self._site_running[task.site]:
+                    self._site_running.pop(task.site)
+            self.__dispatch()
+
+    def __record_wait(self, site, wait_time):
+        """
+        记录排队等待时间
+        """
+        stat = self._stats.setdefault(site, {"count": 0, "wait_total": 0.0, "wait_max": 0.0})
+        stat["count"] += 1
+        stat["wait_total"] += wait_time
+        stat["wait_max"] = max(stat["wait_max"], wait_time)
+        if wait_time > 5:
+            log.debug(f"【SearchExecutor】{site} 排队等待 {round(wait_time, 1)} 秒")
+
+    def cancel(self, futures):
+        """
+        取消仍在排队的任务，已在执行的任务不受影响
+        :return: 取消的任务数
+        """
+        count = 0
+        for future in futures:
+            if future.cancel():
+                count += 1
+        self.__dispatch()
+        return count
+
+    def get_stats(self):
+        """
+        获取线程池运行情况及各站点排队等待统计
+        """
+        with self._cond:
+            return {
+                "max_workers": self._max_workers,
+                "site_concurrency": self._site_concurrency,
+                "running": self._running,
+                "queued": len(self._queue),
+                "sites": {
+                    site: {
+                        "count": stat["count"],
+                        "wait_avg": round(stat["wait_total"] / stat["count"], 3) if stat["count"] else 0,
+                        "wait_max": round(stat["wait_max"], 3)
+                    } for site, stat in self._stats.items()
+                }
+            }
@@ -1,9 +1,11 @@
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+from concurrent.futures import as_completed, TimeoutError as FutureTimeoutError
 
 import log
 from app.helper import ProgressHelper, SubmoduleHelper, DbHelper
 from app.indexer.client import BuiltinIndexer
+from app.indexer.executor import SearchExecutor, SearchDeadlineExceeded
 from app.utils import ExceptionUtils, StringUtils
 from app.utils.commons import SingletonMeta
 from app.utils.types import SearchType, IndexerType, ProgressKey
@@ -16,6 +18,7 @@ class Indexer(metaclass=SingletonMeta):
     _client_type = None
     progress = None
     dbhelper = None
+    executor = None
 
     def __init__(self):
         self._indexer_schemas = SubmoduleHelper.import_submodules(
@@ -28,6 +31,8 @@ class Indexer(metaclass=SingletonMeta):
     def init_config(self):
         self.progress = ProgressHelper()
         self.dbhelper = DbHelper()
+        self.executor = SearchExecutor()
+        self.executor.init_config()
         indexer = Config().get_config("pt").get('search_indexer') or 'builtin'
         self._client = self.__get_client(indexer)
         if self._client:
@@ -116,7 +121,8 @@ class Indexer(metaclass=SingletonMeta):
                           key_word: [str, list],
                           filter_args: dict,
                           match_media=None,
-                          in_from: SearchType = None):
+                          in_from: SearchType = None,
+                          callback=None):
         """
         根据关键字调用 Index API 搜索
         :param key_word: 搜索的关键字，不能为空
@@ -125,6 +131,7 @@ class Indexer(metaclass=SingletonMeta):
                             sp_state: 为UL DL，* 代表不关心，
         :param match_media: 需要匹配的媒体信息
         :param in_from: 搜索渠道
+        :param callback: 每个索引站点完成时的回调，参数为(索引站点, 状态, 结果)，状态：done/timeout/failed
         :return: 命中的资源媒体信息列表
         """
         if not key_word:
@@ -144,38 +151,106 @@ class Indexer(metaclass=SingletonMeta):
             log.info(f"【{self._client_type.value}】开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
             self.progress.update(ptype=ProgressKey.Search,
                                  text="开始并行搜索 %s，线程数：%s ..." % (key_word, len(indexers)))
-        # 多线程
-        executor = ThreadPoolExecutor(max_workers=len(indexers))
-        all_task = []
+        # 提交到常驻搜索线程池，按站点限制并发，超过截止时间的站点不再等待
+        deadline = time.time() + self.executor.search_timeout
+        all_task = {}
         for index in indexers:
             order_seq = 100 - int(index.pri)
-            task = executor.submit(self._client.search,
-                                   order_seq,
-                                   index,
-                                   key_word,
-                                   filter_args,
-                                   match_media,
-                                   in_from)
-            all_task.append(task)
+            task = self.executor.submit(self.__get_site_key(index),
+                                        self.__search_indexer,
+                                        order_seq,
+                                        index,
+                                        key_word,
+                                        filter_args,
+                                        match_media,
+                                        in_from,
+                                        deadline=deadline)
+            all_task[task] = index
         ret_array = []
         finish_count = 0
-        for future in as_completed(all_task):
-            result = future.result()
-            finish_count += 1
-            self.progress.update(ptype=ProgressKey.Search,
-                                 value=round(100 * (finish_count / len(all_task))))
-            if result:
-                ret_array = ret_array + result
+        finished = set()
+        try:
+            for future in as_completed(all_task, timeout=max(deadline - time.time(), 0)):
+                finished.add(future)
+                finish_count += 1
+                self.progress.update(ptype=ProgressKey.Search,
+                                     value=round(100 * (finish_count / len(all_task))))
+                result = self.__handle_result(future, all_task[future], callback)
+                if result:
+                    ret_array = ret_array + result
+        except FutureTimeoutError:
+            # 取消仍在排队的任务，未完成的站点按超时处理
+            unfinished = [future for future in all_task if future not in finished]
+            self.executor.cancel(unfinished)
+            log.warn(f"【{self._client_type.value}】搜索关键词 {key_word} 超过 {self.executor.search_timeout} 秒，"
+                     f"{len(unfinished)} 个站点未完成："
+                     f"{'、'.join([all_task[future].name for future in unfinished])}")
+            if callback:
+                for future in unfinished:
+                    self.__notify(callback, all_task[future], "timeout", [])
+        # 索引统计统一写入
+        self._client.flush_indexer_statistics()
         # 计算耗时
         end_time = datetime.datetime.now()
         log.info(f"【{self._client_type.value}】搜索关键词 {key_word} 所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
                  % (len(ret_array), (end_time - start_time).seconds))
+        # 各站点在线程池中的排队等待
+        waits = [(future.queue_wait, all_task[future].name) for future in all_task
+                 if getattr(future, "queue_wait", None) is not None]
+        if waits:
+            max_wait, max_site = max(waits)
+            log.info(f"【{self._client_type.value}】搜索关键词 {key_word} 站点排队平均等待 "
+                     f"{round(sum(wait for wait, _ in waits) / len(waits), 1)} 秒，"
+                     f"最长 {round(max_wait, 1)} 秒（{max_site}）")
         self.progress.update(ptype=ProgressKey.Search,
                              text="搜索关键词 %s 所有站点搜索完成，有效资源数：%s，总耗时 %s 秒"
                                   % (key_word, len(ret_array), (end_time - start_time).seconds),
                              value=100)
         return ret_array
 
+    def __handle_result(self, future, index, callback):
+        """
+        处理单个站点的搜索结果并回调
+        """
+        try:
+            result, state = future.result()
+        except SearchDeadlineExceeded:
+            result, state = [], "timeout"
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            log.error(f"【{self._client_type.value}】{index.name} 搜索出错：{str(err)}")
+            result, state = [], "failed"
+        if callback:
+            self.__notify(callback, index, state, result or [])
+        return result
+
+    @staticmethod
+    def __notify(callback, index, state, result):
+        try:
+            callback(index, state, result)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+
+    @staticmethod
+    def __get_site_key(index):
+        """
+        站点并发限制的标识
+        """
+        return getattr(index, "id", None) or getattr(index, "domain", None) or index.name
+
+    def __search_indexer(self, order_seq, index, key_word, filter_args, match_media, in_from):
+        """
+        搜索单个索引站点，返回结果及搜索状态
+        """
+        self._client.set_search_state("done")
+        result = self._client.search(order_seq,
+                                     index,
+                                     key_word,
+                                     filter_args,
+                                     match_media,
+                                     in_from)
+        return result, self._client.get_search_state()
+
     def get_indexer_statistics(self):
         """
         获取索引器统计信息
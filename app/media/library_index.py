@@ -0,0 +1,369 @@
+import os
+import threading
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+import log
+from app.media.meta import MetaInfo
+from app.utils import PathUtils, ExceptionUtils, SystemUtils
+from app.utils.commons import SingletonMeta
+from config import Config
+
+
+class LibraryMonitorHandler(FileSystemEventHandler):
+    """
+    媒体库目录变化响应类
+    """
+
+    def __init__(self, index, **kwargs):
+        super(LibraryMonitorHandler, self).__init__(**kwargs)
+        self.index = index
+
+    def on_created(self, event):
+        self.index.add_path(event.src_path, is_dir=event.is_directory)
+
+    def on_deleted(self, event):
+        self.index.remove_path(event.src_path)
+
+    def on_moved(self, event):
+        self.index.remove_path(event.src_path)
+        self.index.add_path(event.dest_path, is_dir=event.is_directory)
+
+
+class LibraryIndex(metaclass=SingletonMeta):
+    """
+    媒体库内存索引：启动时遍历一次媒体库目录，之后通过目录监控（inotify）及本程序的转移写入保持更新，
+    媒体文件是否存在、缺失哪些集的查询直接在内存中完成，避免唤醒NAS硬盘
+    未完成索引或不在媒体库目录下的路径直接查询文件系统；
+    网络文件系统上的变化收不到目录监控事件，软链接的目录不会被监控，均不建立索引；
+    监控事件可能溢出丢失，索引定时重新遍历校正
+    """
+    _roots = []
+    # 不建立索引的文件系统类型，以及所有fuse.开头的类型（rclone、sshfs等）
+    _network_fstypes = ["nfs", "nfs4", "cifs", "smb", "smb2", "smb3", "smbfs",
+                        "afpfs", "9p", "davfs", "ceph", "glusterfs", "lustre"]
+    # 重新遍历媒体库目录的间隔（秒）
+    _rescan_interval = 6 * 3600
+
+    def __init__(self):
+        self._index_lock = threading.RLock()
+        # 目录路径 -> (子目录名集合, 文件名集合)
+        self._dirs = {}
+        # 文件路径 -> (名称, 季列表, 集列表)
+        self._parsed = {}
+        # 已完成索引的媒体库目录
+        self._ready_roots = set()
+        # 媒体库目录下不建立索引的子目录：软链接的目录、网络文件系统挂载点
+        self._unindexed = set()
+        self._observers = []
+        self._stop_event = threading.Event()
+        # 重新遍历期间发生变化的路径，遍历结果替换索引后重新登记
+        self._rescan_changes = None
+        # 每次重启服务加一，丢弃上一次未完成的遍历结果
+        self._generation = 0
+        self.init_config()
+
+    def init_config(self):
+        media = Config().get_config('media') or {}
+        roots = []
+        for key in ['movie_path', 'tv_path', 'anime_path']:
+            paths = media.get(key) or []
+            if not isinstance(paths, list):
+                paths = [paths]
+            for path in paths:
+                if path and os.path.normpath(path) not in roots:
+                    roots.append(os.path.normpath(path))
+        # 媒体库目录变化时才重建索引
+        if roots != self._roots or not self._observers:
+            self._roots = roots
+            self.run_service()
+
+    def run_service(self):
+        """
+        监控媒体库目录并在后台建立索引
+        """
+        self.stop_service()
+        if not self._roots:
+            return
+        self._stop_event = threading.Event()
+        threading.Thread(target=self.__build, args=(self._generation, self._stop_event), daemon=True).start()
+
+    def stop_service(self):
+        """
+        停止监控，清空索引
+        """
+        self._stop_event.set()
+        with self._index_lock:
+            self._generation += 1
+            observers = self._observers
+            self._observers = []
+            self._ready_roots = set()
+            self._unindexed = set()
+            self._rescan_changes = None
+            self._dirs = {}
+            self._parsed = {}
+        for observer in observers:
+            try:
+                observer.stop()
+                observer.join()
+            except Exception as e:
+                print(str(e))
+
+    def __build(self, generation, stop_event):
+        """
+        先启动监控再遍历目录，遍历期间的变化不会丢失；无法监控的目录不建立索引
+        """
+        roots = []
+        for root in self._roots:
+            if generation != self._generation:
+                return
+            if not os.path.isdir(root):
+                continue
+            if self.__is_network_fs(root):
+                log.info(f"【Library】{root} 位于网络文件系统，无法监控目录变化，不建立媒体库索引")
+                continue
+            try:
+                observer = Observer(timeout=10)
+                observer.schedule(LibraryMonitorHandler(self), path=root, recursive=True)
+                observer.daemon = True
+                observer.start()
+            except Exception as e:
+                ExceptionUtils.exception_traceback(e)
+                log.warn(f"【Library】{root} 启动目录监控失败，不建立媒体库索引：{str(e)}")
+                continue
+            with self._index_lock:
+                if generation != self._generation:
+                    observer.stop()
+                    return
+                self._observers.append(observer)
+            self.__walk(root, generation)
+            with self._index_lock:
+                if generation == self._generation:
+                    self._ready_roots.add(root)
+                    log.info(f"【Library】{root} 媒体库索引已建立，共 {len(self._dirs)} 个目录")
+            roots.append(root)
+        # 定时重新遍历，校正丢失的监控事件
+        while roots and not stop_event.wait(self._rescan_interval):
+            for root in roots:
+                if generation != self._generation:
+                    return
+                self.__walk(root, generation, rescan=True)
+            log.debug(f"【Library】媒体库索引已重新遍历，共 {len(self._dirs)} 个目录")
+
+    def __is_network_fs(self, path):
+        """
+        路径是否位于网络文件系统
+        """
+        fstype = SystemUtils.get_fstype(path)
+        return fstype in self._network_fstypes or fstype.startswith("fuse.")
+
+    def __is_unindexed_dir(self, path):
+        """
+        不建立索引的目录：软链接的目录不会被监控，网络文件系统的挂载点收不到监控事件
+        """
+        if os.path.islink(path):
+            return os.path.isdir(path)
+        return os.path.ismount(path) and self.__is_network_fs(path)
+
+    def __walk(self, path, generation, rescan=False):
+        """
+        遍历目录并加入索引
+        :param rescan: 重新遍历，替换该目录下原有的索引
+        """
+        dirs_index = {}
+        unindexed = set()
+        changes = None
+        if rescan:
+            with self._index_lock:
+                self._rescan_changes = set()
+        for root, dirs, files in os.walk(path):
+            if generation != self._generation:
+                return
+            dirs_index[root] = (set(dirs), set(files))
+            for name in dirs:
+                if self.__is_unindexed_dir(os.path.join(root, name)):
+                    unindexed.add(os.path.join(root, name))
+        with self._index_lock:
+            if generation != self._generation:
+                return
+            if rescan:
+                for cur_dir in [d for d in self._dirs if PathUtils.is_path_in_path(path, d)]:
+                    files = self._dirs.pop(cur_dir)[1]
+                    new_files = dirs_index.get(cur_dir, (set(), set()))[1]
+                    for file in files - new_files:
+                        self._parsed.pop(os.path.join(cur_dir, file), None)
+                self._unindexed = {d for d in self._unindexed if not PathUtils.is_path_in_path(path, d)}
+                changes, self._rescan_changes = self._rescan_changes, None
+            self._dirs.update(dirs_index)
+            self._unindexed.update(unindexed)
+        for change in changes or []:
+            if os.path.lexists(change):
+                self.add_path(change, is_dir=os.path.isdir(change))
+            else:
+                self.remove_path(change)
+
+    def __get_subdirs(self, path):
+        """
+        已索引的目录及其下所有子目录
+        """
+        subdirs = []
+        stack = [path]
+        while stack:
+            cur_dir = stack.pop()
+            entry = self._dirs.get(cur_dir)
+            if entry is None:
+                continue
+            subdirs.append(cur_dir)
+            stack.extend(os.path.join(cur_dir, name) for name in sorted(entry[0], reverse=True))
+        return subdirs
+
+    def is_indexed(self, path):
+        """
+        路径是否在已完成索引的媒体库目录下
+        """
+        if not path:
+            return False
+        with self._index_lock:
+            if any(PathUtils.is_path_in_path(cur_dir, path) for cur_dir in self._unindexed):
+                return False
+            return any(PathUtils.is_path_in_path(root, path) for root in self._ready_roots)
+
+    def add_path(self, path, is_dir=False):
+        """
+        新增文件或目录
+        """
+        path = os.path.normpath(path)
+        if not any(PathUtils.is_path_in_path(root, path) for root in self._roots):
+            return
+        unindexed = (is_dir or os.path.islink(path)) and self.__is_unindexed_dir(path)
+        if unindexed:
+            is_dir = True
+        with self._index_lock:
+            if self._rescan_changes is not None:
+                self._rescan_changes.add(path)
+            # 补齐上级目录
+            child = path
+            parent = os.path.dirname(child)
+            while parent != child:
+                entry = self._dirs.get(parent)
+                if entry is None:
+                    entry = self._dirs[parent] = (set(), set())
+                if child == path and not is_dir:
+                    entry[1].add(os.path.basename(child))
+                else:
+                    entry[0].add(os.path.basename(child))
+                if any(parent == root for root in self._roots):
+                    break
+                child, parent = parent, os.path.dirname(parent)
+            self._parsed.pop(path, None)
+            if unindexed:
+                self._unindexed.add(path)
+                return
+        # 新建或移入的目录，其中的内容不会逐个产生事件
+        if is_dir and os.path.isdir(path):
+            self.__walk(path, self._generation)
+
+    def remove_path(self, path):
+        """
+        删除文件或目录
+        """
+        path = os.path.normpath(path)
+        with self._index_lock:
+            if self._rescan_changes is not None:
+                self._rescan_changes.add(path)
+            entry = self._dirs.get(os.path.dirname(path))
+            if entry:
+                entry[0].discard(os.path.basename(path))
+                entry[1].discard(os.path.basename(path))
+            for subdir in self.__get_subdirs(path):
+                files = self._dirs.pop(subdir)[1]
+                for file in files:
+                    self._parsed.pop(os.path.join(subdir, file), None)
+            self._parsed.pop(path, None)
+            self._unindexed = {d for d in self._unindexed if not PathUtils.is_path_in_path(path, d)}
+
+    def exists(self, path):
+        """
+        判断文件或目录是否存在
+        """
+        if not self.is_indexed(path):
+            return os.path.exists(path)
+        path = os.path.normpath(path)
+        with self._index_lock:
+            if path in self._dirs:
+                return True
+            entry = self._dirs.get(os.path.dirname(path))
+            if not entry:
+                return False
+            name = os.path.basename(path)
+            return name in entry[0] or name in entry[1]
+
+    def get_dir_files(self, in_path, exts=""):
+        """
+        获得目录下的文件列表，按后缀过滤，与PathUtils.get_dir_files一致
+        """
+        if not self.is_indexed(in_path):
+            return PathUtils.get_dir_files(in_path, exts)
+        in_path = os.path.normpath(in_path)
+        ret_list = []
+        with self._index_lock:
+            if in_path not in self._dirs:
+                if not self.exists(in_path):
+                    return []
+                cur_dirs = [(os.path.dirname(in_path), [os.path.basename(in_path)])]
+                unindexed = []
+            else:
+                cur_dirs = [(root, self._dirs[root][1]) for root in self.__get_subdirs(in_path)]
+                unindexed = sorted(d for d in self._unindexed if PathUtils.is_path_in_path(in_path, d))
+            for root, files in cur_dirs:
+                for file in sorted(files):
+                    cur_path = os.path.join(root, file)
+                    if PathUtils.is_invalid_path(cur_path):
+                        continue
+                    if exts and os.path.splitext(file)[-1].lower() not in exts:
+                        continue
+                    ret_list.append(cur_path)
+        # 不建立索引的子目录查询文件系统
+        for cur_dir in unindexed:
+            ret_list.extend(PathUtils.get_dir_files(cur_dir, exts))
+        return ret_list
+
+    def get_file_meta(self, file_path):
+        """
+        识别文件名中的名称、季、集，识别结果在文件变化前一直缓存
+        :return: (名称, 季列表, 集列表)
+        """
+        with self._index_lock:
+            meta = self._parsed.get(file_path)
+        if meta:
+            return meta
+        file_meta_info = MetaInfo(title=os.path.basename(file_path))
+        meta = (file_meta_info.get_name(),
+                file_meta_info.get_season_list(),
+                file_meta_info.get_episode_list())
+        if self.is_indexed(file_path):
+            with self._index_lock:
+                self._parsed[file_path] = meta
+        return meta
+
+    def get_episodes(self, in_path, title, season, exts=""):
+        """
+        查询目录下某剧集某季已存在的集
+        :param in_path: 季目录
+        :param title: 剧集名称
+        :param season: 季号
+        :param exts: 文件后缀
+        :return: 已存在的集号集合
+        """
+        episodes = set()
+        for file in self.get_dir_files(in_path, exts):
+            name, seasons, file_episodes = self.get_file_meta(file)
+            if not seasons or not file_episodes:
+                continue
+            if name != title:
+                continue
+            if int(season) not in seasons:
+                continue
+            episodes.update(file_episodes)
+        return episodes
@@ -3,6 +3,7 @@ import os
 import random
 import re
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import zhconv
@@ -13,7 +14,7 @@ import log
 from app.helper.openai_helper import OpenAiHelper
 from app.media.meta.metainfo import MetaInfo
 from app.media.tmdbv3api import TMDb, Search, Movie, TV, Person, Find, TMDbException, Discover, Trending, Episode, Genre
-from app.utils import PathUtils, EpisodeFormat, RequestUtils, NumberUtils, StringUtils, cacheman
+from app.utils import PathUtils, EpisodeFormat, RequestUtils, NumberUtils, StringUtils, cacheman, TmdbLookupFlight
 from app.utils.types import MediaType, MatchMode
 from app.utils.tmdb_cache import TMDBCache
 from config import Config, KEYWORD_BLACKLIST, KEYWORD_SEARCH_WEIGHT_3, KEYWORD_SEARCH_WEIGHT_2, KEYWORD_SEARCH_WEIGHT_1, \
@@ -40,6 +41,8 @@ class Media:
     _search_tmdbweb = None
     _chatgpt_enable = None
     _default_language = None
+    # 批量识别文件时的并发查询数
+    _recognize_workers = 5
 
     def __init__(self):
         self.init_config()
@@ -66,8 +69,8 @@ class Media:
             self.tmdb.cache = True
             # APIKEY
             self.tmdb.api_key = app.get('rmt_tmdbkey')
-            # 语种
-            self.tmdb.language = self._default_language
+            # 默认语种，各线程可单独切换
+            self.tmdb.default_language = self._default_language
             # 代理
             self.tmdb.proxies = Config().get_proxies()
             # 调试模式
@@ -100,15 +103,12 @@ class Media:
 
     def __set_language(self, language: str = ""):
         """
-        设置语言
+        设置当前线程的查询语言，为空时恢复默认语言
         :param language: zh/en
         """
         if not self.tmdb:
             return
-        if language:
-            self.tmdb.language = language
-        else:
-            self.tmdb.language = self._default_language
+        self.tmdb.language = language or None
 
     @staticmethod
     def __compare_tmdb_names(file_name, tmdb_names):
@@ -166,13 +166,20 @@ class Media:
                     ret_names.append(name)
         return tmdb_info, ret_names
 
+    def __lookup_key(self, action, file_media_name, *args):
+        """
+        生成合并查询用的key，名称忽略大小写和多余空格
+        """
+        name = " ".join(str(file_media_name).split()).upper()
+        return (action, name, self.tmdb.language) + tuple(args)
+
     def __search_tmdb(self, file_media_name,
                       search_type,
                       first_media_year=None,
                       media_year=None,
                       season_number=None):
         """
-        搜索tmdb中的媒体信息，匹配返回一条尽可能正确的信息
+        搜索tmdb中的媒体信息，匹配返回一条尽可能正确的信息，相同条件的并发查询只请求一次
         :param file_media_name: 剑索的名称
         :param search_type: 类型：电影、电视剧、动漫
         :param first_media_year: 年份，如要是季集需要是首播年份(first_air_date)
@@ -184,8 +191,23 @@ class Media:
             return None
         if not file_media_name:
             return None
+        return TmdbLookupFlight.do(self.__lookup_key("search", file_media_name, search_type,
+                                                     first_media_year, media_year, season_number),
+                                   self.__do_search_tmdb,
+                                   file_media_name, search_type, first_media_year, media_year, season_number)
+
+    def __do_search_tmdb(self, file_media_name,
+                         search_type,
+                         first_media_year=None,
+                         media_year=None,
+                         season_number=None):
+        """
+        实际执行TMDB搜索
+        """
         # TMDB搜索
         info = {}
+        # 是否有查询出错，出错时返回None，不作为未找到处理
+        error_flag = False
         if search_type == MediaType.MOVIE:
             year_range = [first_media_year]
             if first_media_year:
@@ -195,6 +217,8 @@ class Media:
                 log.debug(
                     f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={year} ...")
                 info = self.__search_movie_by_name(file_media_name, year)
+                if info is None:
+                    error_flag = True
                 if info:
                     info['media_type'] = MediaType.MOVIE
                     log.info("【Meta】%s 识别到 电影：TMDBID=%s, 名称=%s, 上映日期=%s" % (
@@ -211,11 +235,15 @@ class Media:
                 info = self.__search_tv_by_season(file_media_name,
                                                   media_year,
                                                   season_number)
+                if info is None:
+                    error_flag = True
             if not info:
                 log.debug(
                     f"【Meta】正在识别{search_type.value}：{file_media_name}, 年份={StringUtils.xstr(first_media_year)} ...")
                 info = self.__search_tv_by_name(file_media_name,
                                                 first_media_year)
+                if info is None:
+                    error_flag = True
             if info:
                 info['media_type'] = MediaType.TV
                 log.info("【Meta】%s 识别到 电视剧：TMDBID=%s, 名称=%s, 首播日期=%s" % (
@@ -227,6 +255,7 @@ class Media:
         if not info:
             log.info("【Meta】%s 以年份 %s 在TMDB中未找到%s信息!" % (
                 file_media_name, StringUtils.xstr(first_media_year), search_type.value if search_type else ""))
+            return None if error_flag else {}
         return info
 
     def __search_movie_by_name(self, file_media_name, first_media_year):
@@ -395,10 +424,20 @@ class Media:
 
     def __search_multi_tmdb(self, file_media_name):
         """
-        根据名称同时查询电影和电视剧，不带年份
+        根据名称同时查询电影和电视剧，不带年份，相同名称的并发查询只请求一次
         :param file_media_name: 识别的文件名或种子名
         :return: 匹配的媒体信息
         """
+        if not file_media_name:
+            return None
+        return TmdbLookupFlight.do(self.__lookup_key("multi", file_media_name),
+                                   self.__do_search_multi_tmdb,
+                                   file_media_name)
+
+    def __do_search_multi_tmdb(self, file_media_name):
+        """
+        实际执行TMDB综合搜索
+        """
         try:
             multis = self.search.multi({"query": file_media_name}) or []
         except (TMDbException, Exception) as err:
@@ -436,7 +475,7 @@ class Media:
                         info = tv_info
                         break
             else:
-                info = None
+                info = {}
                 
         # 设置媒体类型并返回
         if info:
@@ -594,8 +633,22 @@ class Media:
         if not self.tmdb:
             log.error("【Meta】TMDB API Key 未设置！")
             return None
-        # 设置语言
-        self.__set_language(language)
+        # 使用指定语言查询，结束后恢复调用方的语言
+        with self.tmdb.language_context(language):
+            # 相同TMDBID的并发查询只请求一次
+            tmdb_info = TmdbLookupFlight.do(self.__lookup_key("detail", tmdbid, mtype, append_to_response, chinese),
+                                            self.__do_get_tmdb_info,
+                                            mtype, tmdbid, append_to_response, chinese)
+
+        # 设置缓存
+        self.redis_cache.set_tmdb_info(mtype, tmdbid, tmdb_info, language)
+        
+        return tmdb_info
+
+    def __do_get_tmdb_info(self, mtype: MediaType, tmdbid, append_to_response=None, chinese=True):
+        """
+        实际查询TMDB详情
+        """
         if mtype == MediaType.MOVIE:
             tmdb_info = self.__get_tmdb_movie_detail(tmdbid, append_to_response)
             if tmdb_info:
@@ -610,13 +663,6 @@ class Media:
             # 转换中文标题
             if chinese:
                 tmdb_info = self.__update_tmdbinfo_cn_title(tmdb_info)
-        
-        # 重置默认语言
-        self.__set_language()
-
-        # 设置缓存
-        self.redis_cache.set_tmdb_info(mtype, tmdbid, tmdb_info, language)
-        
         return tmdb_info
 
     def __update_tmdbinfo_cn_title(self, tmdb_info):
@@ -759,17 +805,28 @@ class Media:
         if mtype:
             meta_info.type = mtype
 
-        # 尝试从缓存获取
+        # 识别时使用的名称、年份和类型，作为名称索引的键
+        search_name, search_year, search_type = meta_info.get_name(), meta_info.year, meta_info.type
+        # 尝试从名称索引获取TMDBID，详情按TMDBID单独缓存
         if cache:
-            cached_info = self.redis_cache.get_media_info(
-                title=meta_info.get_name(),
-                year=meta_info.year,
-                mtype=meta_info.type
+            cached_index = self.redis_cache.get_media_info(
+                title=search_name,
+                year=search_year,
+                mtype=search_type
             )
-            if cached_info:
-                log.info(f"【Meta】从缓存获取媒体信息: {meta_info.get_name()}")
-                return cached_info
-    
+            if cached_index:
+                cached_tmdbid, cached_type = cached_index
+                log.info(f"【Meta】从缓存获取媒体信息: {search_name}")
+                if cached_tmdbid:
+                    meta_info.set_tmdb_info(self.get_tmdb_info(mtype=cached_type,
+                                                               tmdbid=cached_tmdbid,
+                                                               language=language,
+                                                               chinese=chinese,
+                                                               append_to_response=append_to_response))
+                # 重置默认语言
+                self.__set_language()
+                return meta_info
+
         if meta_info.type != MediaType.TV and not meta_info.year:
             file_media_info = self.__search_multi_tmdb(file_media_name=meta_info.get_name())
         else:
@@ -828,10 +885,11 @@ class Media:
                     file_media_info = self.__search_tmdb(file_media_name=cache_name, search_type=MediaType.MOVIE)
                 else:
                     file_media_info = self.__search_multi_tmdb(file_media_name=cache_name)
-        # 补充全量信息
+        # 补充全量信息，使用与识别相同的语言，与缓存的语言一致
         if file_media_info and not file_media_info.get("genres"):
             file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
                                                  tmdbid=file_media_info.get("id"),
+                                                 language=language,
                                                  chinese=chinese,
                                                  append_to_response=append_to_response)
             
@@ -840,8 +898,14 @@ class Media:
  
         # 赋值TMDB信息并返回
         meta_info.set_tmdb_info(file_media_info)
-        # 保存到缓存
-        self.redis_cache.set_media_info(title=title, info=meta_info, year=meta_info.year, mtype=mtype)
+        # 保存名称索引及详情
+        self.redis_cache.set_media_info(title=search_name,
+                                        tmdbid=meta_info.tmdb_id,
+                                        media_type=file_media_info.get("media_type") if file_media_info else None,
+                                        year=search_year,
+                                        mtype=search_type,
+                                        info=file_media_info,
+                                        language=language)
         return meta_info
 
     def get_media_info_on_files(self,
@@ -855,6 +919,7 @@ class Media:
                                 append_to_response=None):
         """
         根据文件清单，搜刮TMDB信息，用于文件名称的识别
+        文件先按名称解析并分组，相同名称、年份、类型、季的文件只查询一次TMDB，不同的组并发查询
         :param file_list: 文件清单，如果是列表也可以是单个文件，也可以是一个目录
         :param tmdb_info: 如有传入TMDB信息则以该TMDB信息赋于所有文件，否则按名称从TMDB搜索，用于手工识别时传入
         :param media_type: 媒体类型：电影、电视剧、动漫，如有传入以该类型赋于所有文件，否则按名称从TMDB搜索并识别
@@ -869,14 +934,16 @@ class Media:
         if not self.tmdb:
             log.error("【Meta】TMDB API Key 未设置！")
             return {}
-        # 设置语言
-        self.__set_language(language)
         # 返回结果
         return_media_infos = {}
         # 不是list的转为list
         if not isinstance(file_list, list):
             file_list = [file_list]
-        # 遍历每个文件，看得出来的名称是不是不一样，不一样的先搜索媒体信息
+        # 按目录缓存上级目录的识别结果
+        parent_infos = {}
+        # 待查询的分组：(名称, 年份, 类型, 季) -> [(文件路径, MetaInfo)]
+        file_groups = {}
+        # 遍历每个文件，先解析名称，再按名称分组
         for file_path in file_list:
             try:
                 if not os.path.exists(file_path):
@@ -885,8 +952,6 @@ class Media:
                 # 解析媒体名称
                 # 先用自己的名称
                 file_name = os.path.basename(file_path)
-                parent_name = os.path.basename(os.path.dirname(file_path))
-                parent_parent_name = os.path.basename(PathUtils.get_parent_paths(file_path, 2))
                 # 过滤掉蓝光原盘目录下的子文件
                 if not os.path.isdir(file_path) \
                         and PathUtils.get_bluray_dir(file_path):
@@ -898,15 +963,11 @@ class Media:
                     meta_info = MetaInfo(title=file_name)
                     # 识别不到则使用上级的名称
                     if not meta_info.get_name() or not meta_info.year:
-                        parent_info = MetaInfo(parent_name)
-                        if not parent_info.get_name() or not parent_info.year:
-                            parent_parent_info = MetaInfo(parent_parent_name)
-                            parent_info.type = parent_parent_info.type if parent_parent_info.type and parent_info.type != MediaType.TV else parent_info.type
-                            parent_info.cn_name = parent_info.cn_name if parent_info.cn_name else parent_parent_info.cn_name
-                            parent_info.en_name = parent_info.en_name if parent_info.en_name else parent_parent_info.en_name
-                            parent_info.year = parent_parent_info.year if parent_parent_info.year else parent_info.year
-                            parent_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
-                                                                           parent_parent_info.begin_season)
+                        parent_dir = os.path.dirname(file_path)
+                        parent_info = parent_infos.get(parent_dir)
+                        if not parent_info:
+                            parent_info = self.__get_parent_meta_info(file_path)
+                            parent_infos[parent_dir] = parent_info
                         if not meta_info.get_name():
                             meta_info.cn_name = parent_info.cn_name
                             meta_info.en_name = parent_info.en_name
@@ -921,17 +982,90 @@ class Media:
                     if not meta_info.get_name() or not meta_info.type:
                         log.warn("【Rmt】%s 未识别出有效信息！" % meta_info.org_string)
                         continue
-                    # 区配缓存及TMDB
-                    file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                         first_media_year=meta_info.year,
-                                                         search_type=meta_info.type,
-                                                         media_year=meta_info.year,
-                                                         season_number=meta_info.begin_season)
-                    if not file_media_info:
-                        if self._rmt_match_mode == MatchMode.NORMAL:
-                            # 去掉年份再查一次，有可能是年份错误
-                            file_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
-                                                                 search_type=meta_info.type)
+                    group_key = (meta_info.get_name(), meta_info.year, meta_info.type, meta_info.begin_season)
+                    file_groups.setdefault(group_key, []).append((file_path, meta_info))
+                # 自带TMDB信息
+                else:
+                    meta_info = MetaInfo(title=file_name, mtype=media_type)
+                    meta_info.set_tmdb_info(tmdb_info)
+                    if season and meta_info.type != MediaType.MOVIE:
+                        meta_info.begin_season = int(season)
+                    if episode_format:
+                        begin_ep, end_ep, part = episode_format.split_episode(file_name)
+                        if begin_ep is not None:
+                            meta_info.begin_episode = begin_ep
+                            meta_info.part = part
+                        if end_ep is not None:
+                            meta_info.end_episode = end_ep
+                # 按文件路程存储
+                return_media_infos[file_path] = meta_info
+            except Exception as err:
+                print(str(err))
+                log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+        if not file_groups:
+            return return_media_infos
+        # 每个分组只查询一次，多个分组时并发查询
+        groups = list(file_groups.values())
+        if len(groups) == 1:
+            self.__recognize_file_group(groups[0], language, chinese, append_to_response)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self._recognize_workers, len(groups))) as executor:
+                for _ in executor.map(lambda group: self.__recognize_file_group(group,
+                                                                                language,
+                                                                                chinese,
+                                                                                append_to_response),
+                                      groups):
+                    pass
+        return return_media_infos
+
+    @staticmethod
+    def __get_parent_meta_info(file_path):
+        """
+        识别文件上级及上上级目录的名称，用于补全文件名中缺失的信息
+        """
+        parent_name = os.path.basename(os.path.dirname(file_path))
+        parent_parent_name = os.path.basename(PathUtils.get_parent_paths(file_path, 2))
+        parent_info = MetaInfo(parent_name)
+        if not parent_info.get_name() or not parent_info.year:
+            parent_parent_info = MetaInfo(parent_parent_name)
+            parent_info.type = parent_parent_info.type if parent_parent_info.type and parent_info.type != MediaType.TV else parent_info.type
+            parent_info.cn_name = parent_info.cn_name if parent_info.cn_name else parent_parent_info.cn_name
+            parent_info.en_name = parent_info.en_name if parent_info.en_name else parent_parent_info.en_name
+            parent_info.year = parent_parent_info.year if parent_parent_info.year else parent_info.year
+            parent_info.begin_season = NumberUtils.max_ele(parent_info.begin_season,
+                                                           parent_parent_info.begin_season)
+        return parent_info
+
+    def __recognize_file_group(self, file_metas, language=None, chinese=True, append_to_response=None):
+        """
+        识别一组名称相同的文件，名称只查询一次TMDB，未查到时再逐个文件辅助识别
+        :param file_metas: [(文件路径, MetaInfo)]，名称、年份、类型、季均相同
+        """
+        # 语言按线程设置，工作线程中需重新设置
+        self.__set_language(language)
+        try:
+            meta_info = file_metas[0][1]
+            # 区配缓存及TMDB
+            group_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                  first_media_year=meta_info.year,
+                                                  search_type=meta_info.type,
+                                                  media_year=meta_info.year,
+                                                  season_number=meta_info.begin_season)
+            if not group_media_info:
+                if self._rmt_match_mode == MatchMode.NORMAL:
+                    # 去掉年份再查一次，有可能是年份错误
+                    group_media_info = self.__search_tmdb(file_media_name=meta_info.get_name(),
+                                                          search_type=meta_info.type)
+            # 补全TMDB信息
+            if group_media_info and not group_media_info.get("genres"):
+                group_media_info = self.get_tmdb_info(mtype=group_media_info.get("media_type"),
+                                                      tmdbid=group_media_info.get("id"),
+                                                      language=language,
+                                                      chinese=chinese,
+                                                      append_to_response=append_to_response)
+            for file_path, meta_info in file_metas:
+                try:
+                    file_media_info = group_media_info
                     if not file_media_info and self._chatgpt_enable:
                         # 从ChatGPT查询
                         mtype, seaons, episodes, file_media_info = self.__search_chatgpt(file_name=file_path,
@@ -959,33 +1093,20 @@ class Media:
                     if file_media_info and not file_media_info.get("genres"):
                         file_media_info = self.get_tmdb_info(mtype=file_media_info.get("media_type"),
                                                              tmdbid=file_media_info.get("id"),
+                                                             language=language,
                                                              chinese=chinese,
                                                              append_to_response=append_to_response)
- 
                     # 赋值TMDB信息
                     meta_info.set_tmdb_info(file_media_info)
-                # 自带TMDB信息
-                else:
-                    meta_info = MetaInfo(title=file_name, mtype=media_type)
-                    meta_info.set_tmdb_info(tmdb_info)
-                    if season and meta_info.type != MediaType.MOVIE:
-                        meta_info.begin_season = int(season)
-                    if episode_format:
-                        begin_ep, end_ep, part = episode_format.split_episode(file_name)
-                        if begin_ep is not None:
-                            meta_info.begin_episode = begin_ep
-                            meta_info.part = part
-                        if end_ep is not None:
-                            meta_info.end_episode = end_ep
-                # 按文件路程存储
-                return_media_infos[file_path] = meta_info
-            except Exception as err:
-                print(str(err))
-                log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
-        # 重置默认语言
-        self.__set_language()
-
-        return return_media_infos
+                except Exception as err:
+                    print(str(err))
+                    log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+        except Exception as err:
+            print(str(err))
+            log.error("【Rmt】发生错误：%s - %s" % (str(err), traceback.format_exc()))
+        finally:
+            # 重置默认语言
+            self.__set_language()
 
     def __dict_tmdbpersons(self, infos, chinese=True):
         """
@@ -6,6 +6,17 @@ from app.media.category import Category
 from app.utils import StringUtils, ExceptionUtils
 from app.utils.types import MediaType
 
+# 副标题解析正则，预编译
+_SUBTITLE_FLAG_RE = re.compile(r'[全第季集话話期]')
+_SUBTITLE_SEASON_RE = re.compile(r"(?<!全\s*|共\s*)[第\s]+([0-9一二三四五六七八九十S\-]+)\s*季(?!\s*全|\s*共)",
+                                 re.IGNORECASE)
+_SUBTITLE_SEASON_ALL_RE = re.compile(r"[全共]\s*([0-9一二三四五六七八九十]+)\s*季|([0-9一二三四五六七八九十]+)\s*季\s*[全共]",
+                                     re.IGNORECASE)
+_SUBTITLE_EPISODE_RE = re.compile(r"(?<!全\s*|共\s*)[第\s]+([0-9一二三四五六七八九十百零EP\-]+)\s*[集话話期](?!\s*全|\s*共)",
+                                  re.IGNORECASE)
+_SUBTITLE_EPISODE_ALL_RE = re.compile(r"([0-9一二三四五六七八九十百零]+)\s*集\s*[全共]|[共全]\s*([0-9一二三四五六七八九十百零]+)\s*[集话話期]",
+                                      re.IGNORECASE)
+
 
 class MetaBase(object):
     """
@@ -144,10 +155,10 @@ class MetaBase(object):
     note = {}
     # 副标题解析
     _subtitle_flag = False
-    _subtitle_season_re = r"(?<!全\s*|共\s*)[第\s]+([0-9一二三四五六七八九十S\-]+)\s*季(?!\s*全|\s*共)"
-    _subtitle_season_all_re = r"[全共]\s*([0-9一二三四五六七八九十]+)\s*季|([0-9一二三四五六七八九十]+)\s*季\s*[全共]"
-    _subtitle_episode_re = r"(?<!全\s*|共\s*)[第\s]+([0-9一二三四五六七八九十百零EP\-]+)\s*[集话話期](?!\s*全|\s*共)"
-    _subtitle_episode_all_re = r"([0-9一二三四五六七八九十百零]+)\s*集\s*[全共]|[共全]\s*([0-9一二三四五六七八九十百零]+)\s*[集话話期]"
+    _subtitle_season_re = _SUBTITLE_SEASON_RE.pattern
+    _subtitle_season_all_re = _SUBTITLE_SEASON_ALL_RE.pattern
+    _subtitle_episode_re = _SUBTITLE_EPISODE_RE.pattern
+    _subtitle_episode_all_re = _SUBTITLE_EPISODE_ALL_RE.pattern
 
     def __init__(self, title, subtitle=None, fileflag=False):
         self.category_handler = Category()
@@ -667,9 +678,9 @@ class MetaBase(object):
         if not title_text:
             return
         title_text = f" {title_text} "
-        if re.search(r'[全第季集话話期]', title_text, re.IGNORECASE):
+        if _SUBTITLE_FLAG_RE.search(title_text):
             # 第x季
-            season_str = re.search(r'%s' % self._subtitle_season_re, title_text, re.IGNORECASE)
+            season_str = _SUBTITLE_SEASON_RE.search(title_text)
             if season_str:
                 seasons = season_str.group(1)
                 if seasons:
@@ -700,7 +711,7 @@ class MetaBase(object):
                 self.type = MediaType.TV
                 self._subtitle_flag = True
             # 第x集
-            episode_str = re.search(r'%s' % self._subtitle_episode_re, title_text, re.IGNORECASE)
+            episode_str = _SUBTITLE_EPISODE_RE.search(title_text)
             if episode_str:
                 episodes = episode_str.group(1)
                 if episodes:
@@ -731,7 +742,7 @@ class MetaBase(object):
                 self.type = MediaType.TV
                 self._subtitle_flag = True
             # x集全
-            episode_all_str = re.search(r'%s' % self._subtitle_episode_all_re, title_text, re.IGNORECASE)
+            episode_all_str = _SUBTITLE_EPISODE_ALL_RE.search(title_text)
             if episode_all_str:
                 episode_all = episode_all_str.group(1)
                 if not episode_all:
@@ -747,7 +758,7 @@ class MetaBase(object):
                     self.type = MediaType.TV
                     self._subtitle_flag = True
             # 全x季 x季全
-            season_all_str = re.search(r"%s" % self._subtitle_season_all_re, title_text, re.IGNORECASE)
+            season_all_str = _SUBTITLE_SEASON_ALL_RE.search(title_text)
             if season_all_str:
                 season_all = season_all_str.group(1)
                 if not season_all:
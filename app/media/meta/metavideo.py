@@ -9,6 +9,56 @@ from app.utils.types import MediaType
 from app.media.meta.release_groups import ReleaseGroupsMatcher
 from app.media.meta.customization import CustomizationMatcher
 
+# 预编译正则，名称识别是最频繁的CPU路径，避免每个token都经过re的模式缓存查找
+_SEASON_RE = re.compile(r"S(\d{2})|^S(\d{1,2})$|S(\d{1,2})E", re.IGNORECASE)
+_EPISODE_RE_STR = r"EP?(\d{2,4})$|^EP?(\d{1,4})$|^S\d{1,2}EP?(\d{1,4})$|S\d{2}EP?(\d{2,4})"
+_EPISODE_RE = re.compile(_EPISODE_RE_STR, re.IGNORECASE)
+_PART_RE = re.compile(r"(^PART[0-9ABI]{0,2}$|^CD[0-9]{0,2}$|^DVD[0-9]{0,2}$|^DISK[0-9]{0,2}$|^DISC[0-9]{0,2}$)",
+                      re.IGNORECASE)
+_ROMAN_NUMERALS_RE = re.compile(r"^(?=[MDCLXVI])M*(C[MD]|D?C{0,3})(X[CL]|L?X{0,3})(I[XV]|V?I{0,3})$")
+_SOURCE_RE_STR = r"^BLURAY$|^HDTV$|^UHDTV$|^HDDVD$|^WEBRIP$|^DVDRIP$|^BDRIP$|^BLU$|^WEB$|^BD$|^HDRip$"
+_SOURCE_RE = re.compile(r"(%s)" % _SOURCE_RE_STR, re.IGNORECASE)
+_EFFECT_RE_STR = r"^REMUX$|^UHD$|^SDR$|^HDR\d*$|^DOLBY$|^DOVI$|^DV$|^3D$|^REPACK$"
+_EFFECT_RE = re.compile(r"(%s)" % _EFFECT_RE_STR, re.IGNORECASE)
+_RESOURCES_TYPE_RE_STR = r"%s|%s" % (_SOURCE_RE_STR, _EFFECT_RE_STR)
+_NAME_NO_BEGIN_RE = re.compile(r"^\[.+?]")
+_NAME_NO_CHINESE_RE = re.compile(r".*版|.*字幕", re.IGNORECASE)
+_NAME_SE_WORDS = ['共', '第', '季', '集', '话', '話', '期']
+# 保持原有行为：列表格式化后作为字符集使用
+_NAME_SE_WORDS_RE = re.compile("%s" % _NAME_SE_WORDS, re.IGNORECASE)
+_NAME_NOSTRING_RE = re.compile(
+    r"^PTS|^JADE|^AOD|^CHC|^[A-Z]{1,4}TV[\-0-9UVHDK]*"
+    r"|HBO$|\s+HBO|\d{1,2}th|\d{1,2}bit|NETFLIX|AMAZON|IMAX|^3D|\s+3D|^BBC\s+|\s+BBC|BBC$|DISNEY\+?|XXX|\s+DC$"
+    r"|[第\s共]+[0-9一二三四五六七八九十\-\s]+季"
+    r"|[第\s共]+[0-9一二三四五六七八九十百零\-\s]+[集话話]"
+    r"|连载|日剧|美剧|电视剧|动画片|动漫|欧美|西德|日韩|超高清|高清|蓝光|翡翠台|梦幻天堂·龙网|★?\d*月?新番"
+    r"|最终季|合集|[多中国英葡法俄日韩德意西印泰台港粤双文语简繁体特效内封官译外挂]+字幕|版本|出品|台版|港版|\w+字幕组"
+    r"|未删减版|UNCUT$|UNRATE$|WITH EXTRAS$|RERIP$|SUBBED$|PROPER$|REPACK$|SEASON$|EPISODE$|Complete$|Extended$|Extended Version$"
+    r"|S\d{2}\s*-\s*S\d{2}|S\d{2}|\s+S\d{1,2}|EP?\d{2,4}\s*-\s*EP?\d{2,4}|EP?\d{2,4}|\s+EP?\d{1,4}"
+    r"|CD[\s.]*[1-9]|DVD[\s.]*[1-9]|DISK[\s.]*[1-9]|DISC[\s.]*[1-9]"
+    r"|[248]K|\d{3,4}[PIX]+"
+    r"|CD[\s.]*[1-9]|DVD[\s.]*[1-9]|DISK[\s.]*[1-9]|DISC[\s.]*[1-9]",
+    re.IGNORECASE)
+_RESOURCES_PIX_RE_STR = r"^[SBUHD]*(\d{3,4}[PI]+)|\d{3,4}X(\d{3,4})"
+_RESOURCES_PIX_RE = re.compile(_RESOURCES_PIX_RE_STR, re.IGNORECASE)
+_RESOURCES_PIX_RE2 = re.compile(r"(^[248]+K)", re.IGNORECASE)
+_VIDEO_ENCODE_RE_STR = r"^[HX]26[45]$|^AVC$|^HEVC$|^VC\d?$|^MPEG\d?$|^Xvid$|^DivX$|^HDR\d*$"
+_VIDEO_ENCODE_RE = re.compile(r"(%s)" % _VIDEO_ENCODE_RE_STR, re.IGNORECASE)
+_AUDIO_ENCODE_RE_STR = r"^DTS\d?$|^DTSHD$|^DTSHDMA$|^Atmos$|^TrueHD\d?$|^AC3$|^\dAudios?$|^DDP\d?$|^DD\d?$" \
+                       r"|^LPCM\d?$|^AAC\d?$|^FLAC\d?$|^HD\d?$|^MA\d?$"
+_AUDIO_ENCODE_RE = re.compile(r"(%s)" % _AUDIO_ENCODE_RE_STR, re.IGNORECASE)
+# 名称之后出现集、来源、版本、分辨率时停止取名，合并为一次匹配
+_NAME_STOP_RE = re.compile(r"%s|%s|%s" % (_EPISODE_RE_STR, _RESOURCES_TYPE_RE_STR, _RESOURCES_PIX_RE_STR),
+                           re.IGNORECASE)
+# 标题预处理
+_YEAR_RANGE_RE = re.compile(r'([\s.]+)(\d{4})-(\d{4})')
+_SIZE_RE = re.compile(r'[0-9.]+\s*[MGT]i?B(?![A-Z]+)', re.IGNORECASE)
+_DATE_RE = re.compile(r'\d{4}[\s._-]\d{1,2}[\s._-]\d{1,2}')
+_DIY_RE = re.compile(r'D[Ii]Y')
+_DIY_TEAM_RE = re.compile(r'-D[Ii]Y@')
+_SEASON_SUFFIX_RE = re.compile(r"SEASON$", re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
 
 class MetaVideo(MetaBase):
     """
@@ -23,32 +73,22 @@ class MetaVideo(MetaBase):
     _unknown_name_str = ""
     _source = ""
     _effect = []
-    # 正则式区
-    _season_re = r"S(\d{2})|^S(\d{1,2})$|S(\d{1,2})E"
-    _episode_re = r"EP?(\d{2,4})$|^EP?(\d{1,4})$|^S\d{1,2}EP?(\d{1,4})$|S\d{2}EP?(\d{2,4})"
-    _part_re = r"(^PART[0-9ABI]{0,2}$|^CD[0-9]{0,2}$|^DVD[0-9]{0,2}$|^DISK[0-9]{0,2}$|^DISC[0-9]{0,2}$)"
-    _roman_numerals = r"^(?=[MDCLXVI])M*(C[MD]|D?C{0,3})(X[CL]|L?X{0,3})(I[XV]|V?I{0,3})$"
-    _source_re = r"^BLURAY$|^HDTV$|^UHDTV$|^HDDVD$|^WEBRIP$|^DVDRIP$|^BDRIP$|^BLU$|^WEB$|^BD$|^HDRip$"
-    _effect_re = r"^REMUX$|^UHD$|^SDR$|^HDR\d*$|^DOLBY$|^DOVI$|^DV$|^3D$|^REPACK$"
-    _resources_type_re = r"%s|%s" % (_source_re, _effect_re)
-    _name_no_begin_re = r"^\[.+?]"
-    _name_no_chinese_re = r".*版|.*字幕"
-    _name_se_words = ['共', '第', '季', '集', '话', '話', '期']
-    _name_nostring_re = r"^PTS|^JADE|^AOD|^CHC|^[A-Z]{1,4}TV[\-0-9UVHDK]*" \
-                        r"|HBO$|\s+HBO|\d{1,2}th|\d{1,2}bit|NETFLIX|AMAZON|IMAX|^3D|\s+3D|^BBC\s+|\s+BBC|BBC$|DISNEY\+?|XXX|\s+DC$" \
-                        r"|[第\s共]+[0-9一二三四五六七八九十\-\s]+季" \
-                        r"|[第\s共]+[0-9一二三四五六七八九十百零\-\s]+[集话話]" \
-                        r"|连载|日剧|美剧|电视剧|动画片|动漫|欧美|西德|日韩|超高清|高清|蓝光|翡翠台|梦幻天堂·龙网|★?\d*月?新番" \
-                        r"|最终季|合集|[多中国英葡法俄日韩德意西印泰台港粤双文语简繁体特效内封官译外挂]+字幕|版本|出品|台版|港版|\w+字幕组" \
-                        r"|未删减版|UNCUT$|UNRATE$|WITH EXTRAS$|RERIP$|SUBBED$|PROPER$|REPACK$|SEASON$|EPISODE$|Complete$|Extended$|Extended Version$" \
-                        r"|S\d{2}\s*-\s*S\d{2}|S\d{2}|\s+S\d{1,2}|EP?\d{2,4}\s*-\s*EP?\d{2,4}|EP?\d{2,4}|\s+EP?\d{1,4}" \
-                        r"|CD[\s.]*[1-9]|DVD[\s.]*[1-9]|DISK[\s.]*[1-9]|DISC[\s.]*[1-9]" \
-                        r"|[248]K|\d{3,4}[PIX]+" \
-                        r"|CD[\s.]*[1-9]|DVD[\s.]*[1-9]|DISK[\s.]*[1-9]|DISC[\s.]*[1-9]"
-    _resources_pix_re = r"^[SBUHD]*(\d{3,4}[PI]+)|\d{3,4}X(\d{3,4})"
-    _resources_pix_re2 = r"(^[248]+K)"
-    _video_encode_re = r"^[HX]26[45]$|^AVC$|^HEVC$|^VC\d?$|^MPEG\d?$|^Xvid$|^DivX$|^HDR\d*$"
-    _audio_encode_re = r"^DTS\d?$|^DTSHD$|^DTSHDMA$|^Atmos$|^TrueHD\d?$|^AC3$|^\dAudios?$|^DDP\d?$|^DD\d?$|^LPCM\d?$|^AAC\d?$|^FLAC\d?$|^HD\d?$|^MA\d?$"
+    # 正则式区（字符串保留用于兼容，解析时使用模块级预编译的正则）
+    _season_re = _SEASON_RE.pattern
+    _episode_re = _EPISODE_RE_STR
+    _part_re = _PART_RE.pattern
+    _roman_numerals = _ROMAN_NUMERALS_RE.pattern
+    _source_re = _SOURCE_RE_STR
+    _effect_re = _EFFECT_RE_STR
+    _resources_type_re = _RESOURCES_TYPE_RE_STR
+    _name_no_begin_re = _NAME_NO_BEGIN_RE.pattern
+    _name_no_chinese_re = _NAME_NO_CHINESE_RE.pattern
+    _name_se_words = _NAME_SE_WORDS
+    _name_nostring_re = _NAME_NOSTRING_RE.pattern
+    _resources_pix_re = _RESOURCES_PIX_RE_STR
+    _resources_pix_re2 = _RESOURCES_PIX_RE2.pattern
+    _video_encode_re = _VIDEO_ENCODE_RE_STR
+    _audio_encode_re = _AUDIO_ENCODE_RE_STR
 
     def __init__(self, title, subtitle=None, fileflag=False):
         super().__init__(title, subtitle, fileflag)
@@ -65,13 +105,13 @@ class MetaVideo(MetaBase):
             self.type = MediaType.TV
             return
         # 去掉名称中第1个[]的内容
-        title = re.sub(r'%s' % self._name_no_begin_re, "", title, count=1)
+        title = _NAME_NO_BEGIN_RE.sub("", title, count=1)
         # 把xxxx-xxxx年份换成前一个年份，常出现在季集上
-        title = re.sub(r'([\s.]+)(\d{4})-(\d{4})', r'\1\2', title)
+        title = _YEAR_RANGE_RE.sub(r'\1\2', title)
         # 把大小去掉
-        title = re.sub(r'[0-9.]+\s*[MGT]i?B(?![A-Z]+)', "", title, flags=re.IGNORECASE)
+        title = _SIZE_RE.sub("", title)
         # 把年月日去掉
-        title = re.sub(r'\d{4}[\s._-]\d{1,2}[\s._-]\d{1,2}', "", title)
+        title = _DATE_RE.sub("", title)
         # 拆分tokens
         tokens = Tokens(title)
         self.tokens = tokens
@@ -115,8 +155,8 @@ class MetaVideo(MetaBase):
             self.resource_type = self._source.strip()
         # 提取原盘DIY
         if self.resource_type and "BluRay" in self.resource_type:
-            if (self.subtitle and re.findall(r'D[Ii]Y', self.subtitle)) \
-                    or re.findall(r'-D[Ii]Y@', original_title):
+            if (self.subtitle and _DIY_RE.findall(self.subtitle)) \
+                    or _DIY_TEAM_RE.findall(original_title):
                 self.resource_type = f"{self.resource_type} DIY"
         # 解析副标题，只要季和集
         self.init_subtitle(self.org_string)
@@ -139,9 +179,8 @@ class MetaVideo(MetaBase):
     def __fix_name(self, name):
         if not name:
             return name
-        name = re.sub(r'%s' % self._name_nostring_re, '', name,
-                      flags=re.IGNORECASE).strip()
-        name = re.sub(r'\s+', ' ', name)
+        name = _NAME_NOSTRING_RE.sub('', name).strip()
+        name = _SPACES_RE.sub(' ', name)
         if name.isdigit() \
                 and int(name) < 1800 \
                 and not self.year \
@@ -184,12 +223,12 @@ class MetaVideo(MetaBase):
             if not self.cn_name:
                 self.cn_name = token
             elif not self._stop_cnname_flag:
-                if not re.search("%s" % self._name_no_chinese_re, token, flags=re.IGNORECASE) \
-                        and not re.search("%s" % self._name_se_words, token, flags=re.IGNORECASE):
+                if not _NAME_NO_CHINESE_RE.search(token) \
+                        and not _NAME_SE_WORDS_RE.search(token):
                     self.cn_name = "%s %s" % (self.cn_name, token)
                 self._stop_cnname_flag = True
         else:
-            is_roman_digit = re.search(self._roman_numerals, token)
+            is_roman_digit = _ROMAN_NUMERALS_RE.search(token)
             # 阿拉伯数字或者罗马数字
             if token.isdigit() or is_roman_digit:
                 # 第季集后面的不要
@@ -225,16 +264,14 @@ class MetaVideo(MetaBase):
                     # 名字未出现前的第一个数字，记下来
                     if not self._unknown_name_str:
                         self._unknown_name_str = token
-            elif re.search(r"%s" % self._season_re, token, re.IGNORECASE):
+            elif _SEASON_RE.search(token):
                 # 季的处理
-                if self.en_name and re.search(r"SEASON$", self.en_name, re.IGNORECASE):
+                if self.en_name and _SEASON_SUFFIX_RE.search(self.en_name):
                     # 如果匹配到季，英文名结尾为Season，说明Season属于标题，不应在后续作为干扰词去除
                     self.en_name += ' '
                 self._stop_name_flag = True
                 return
-            elif re.search(r"%s" % self._episode_re, token, re.IGNORECASE) \
-                    or re.search(r"(%s)" % self._resources_type_re, token, re.IGNORECASE) \
-                    or re.search(r"%s" % self._resources_pix_re, token, re.IGNORECASE):
+            elif _NAME_STOP_RE.search(token):
                 # 集、来源、版本等不要
                 self._stop_name_flag = True
                 return
@@ -258,7 +295,7 @@ class MetaVideo(MetaBase):
                 and not self.resource_pix \
                 and not self.resource_type:
             return
-        re_res = re.search(r"%s" % self._part_re, token, re.IGNORECASE)
+        re_res = _PART_RE.search(token)
         if re_res:
             if not self.part:
                 self.part = re_res.group(1)
@@ -286,7 +323,7 @@ class MetaVideo(MetaBase):
                 self.en_name = "%s %s" % (self.en_name.strip(), self.year)
             elif self.cn_name:
                 self.cn_name = "%s %s" % (self.cn_name, self.year)
-        elif self.en_name and re.search(r"SEASON$", self.en_name, re.IGNORECASE):
+        elif self.en_name and _SEASON_SUFFIX_RE.search(self.en_name):
             # 如果匹配到年，且英文名结尾为Season，说明Season属于标题，不应在后续作为干扰词去除
             self.en_name += ' '
         self.year = token
@@ -297,7 +334,7 @@ class MetaVideo(MetaBase):
     def __init_resource_pix(self, token):
         if not self.get_name():
             return
-        re_res = re.findall(r"%s" % self._resources_pix_re, token, re.IGNORECASE)
+        re_res = _RESOURCES_PIX_RE.findall(token)
         if re_res:
             self._last_token_type = "pix"
             self._continue_flag = False
@@ -322,7 +359,7 @@ class MetaVideo(MetaBase):
                     and self.resource_pix[-1] not in 'kpi':
                 self.resource_pix = "%sp" % self.resource_pix
         else:
-            re_res = re.search(r"%s" % self._resources_pix_re2, token, re.IGNORECASE)
+            re_res = _RESOURCES_PIX_RE2.search(token)
             if re_res:
                 self._last_token_type = "pix"
                 self._continue_flag = False
@@ -331,7 +368,7 @@ class MetaVideo(MetaBase):
                     self.resource_pix = re_res.group(1).lower()
 
     def __init_season(self, token):
-        re_res = re.findall(r"%s" % self._season_re, token, re.IGNORECASE)
+        re_res = _SEASON_RE.findall(token)
         if re_res:
             self._last_token_type = "season"
             self.type = MediaType.TV
@@ -378,7 +415,7 @@ class MetaVideo(MetaBase):
             self._last_token_type = "SEASON"
 
     def __init_episode(self, token):
-        re_res = re.findall(r"%s" % self._episode_re, token, re.IGNORECASE)
+        re_res = _EPISODE_RE.findall(token)
         if re_res:
             self._last_token_type = "episode"
             self._continue_flag = False
@@ -450,7 +487,7 @@ class MetaVideo(MetaBase):
     def __init_resource_type(self, token):
         if not self.get_name():
             return
-        source_res = re.search(r"(%s)" % self._source_re, token, re.IGNORECASE)
+        source_res = _SOURCE_RE.search(token)
         if source_res:
             self._last_token_type = "source"
             self._continue_flag = False
@@ -475,7 +512,7 @@ class MetaVideo(MetaBase):
             self._source = "WEB-DL"
             self._continue_flag = False
             return
-        effect_res = re.search(r"(%s)" % self._effect_re, token, re.IGNORECASE)
+        effect_res = _EFFECT_RE.search(token)
         if effect_res:
             self._last_token_type = "effect"
             self._continue_flag = False
@@ -494,7 +531,7 @@ class MetaVideo(MetaBase):
                 and not self.begin_season \
                 and not self.begin_episode:
             return
-        re_res = re.search(r"(%s)" % self._video_encode_re, token, re.IGNORECASE)
+        re_res = _VIDEO_ENCODE_RE.search(token)
         if re_res:
             self._continue_flag = False
             self._stop_name_flag = True
@@ -534,7 +571,7 @@ class MetaVideo(MetaBase):
                 and not self.begin_season \
                 and not self.begin_episode:
             return
-        re_res = re.search(r"(%s)" % self._audio_encode_re, token, re.IGNORECASE)
+        re_res = _AUDIO_ENCODE_RE.search(token)
         if re_res:
             self._continue_flag = False
             self._stop_name_flag = True
@@ -1,6 +1,167 @@
+from functools import lru_cache
+
 import regex as re
 from app.utils.commons import SingletonMeta
 
+# 制作组前后必须出现的分隔符
+_GROUP_PREFIX_CHARS = "-@[￡【&"
+_GROUP_SUFFIX_CHARS = "@.][】&"
+# 单个制作组表达式展开的最大字面量数量，超过时按正则处理
+_MAX_EXPANSIONS = 256
+
+
+def _split_alternatives(pattern):
+    """
+    按顶层的 | 拆分正则表达式，括号、字符集和转义内的 | 不拆分
+    """
+    parts = []
+    depth = 0
+    in_class = False
+    start = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 2
+            continue
+        if in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            parts.append(pattern[start:i])
+            start = i + 1
+        i += 1
+    parts.append(pattern[start:])
+    return parts
+
+
+def _expand_literals(pattern):
+    """
+    将只包含字面量和 (?:a|b) 分组的表达式展开为全部字面量，保持正则的尝试顺序
+    :return: 字面量列表，包含其它正则语法时返回None
+    """
+
+    def parse_sequence(pos, stop_chars):
+        results = [""]
+        while pos < len(pattern) and pattern[pos] not in stop_chars:
+            char = pattern[pos]
+            if char == "\\":
+                if pos + 1 >= len(pattern) or pattern[pos + 1].isalnum():
+                    return None, pos
+                options = [pattern[pos + 1]]
+                pos += 2
+            elif pattern.startswith("(?:", pos):
+                options, pos = parse_group(pos + 3)
+                if options is None:
+                    return None, pos
+            elif char in ".^$*+?{}[]()|":
+                return None, pos
+            else:
+                options = [char]
+                pos += 1
+            results = [prefix + option for prefix in results for option in options]
+            if len(results) > _MAX_EXPANSIONS:
+                return None, pos
+        return results, pos
+
+    def parse_group(pos):
+        options = []
+        while True:
+            branch, pos = parse_sequence(pos, "|)")
+            if branch is None or pos >= len(pattern):
+                return None, pos
+            options.extend(branch)
+            if pattern[pos] == ")":
+                return options, pos + 1
+            pos += 1
+
+    literals, end = parse_sequence(0, "")
+    if literals is None or end != len(pattern):
+        return None
+    return literals
+
+
+class _GroupsAutomaton:
+    """
+    制作组匹配自动机：可展开为字面量的表达式放入不区分大小写的字典树，一次线性扫描标题完成匹配；
+    无法展开的表达式合并编译为一个正则兜底
+    """
+
+    def __init__(self, groups):
+        self._trie = {}
+        regex_groups = []
+        for order, group in enumerate(_split_alternatives(groups or "")):
+            if not group:
+                continue
+            literals = _expand_literals(group)
+            if literals is None:
+                regex_groups.append(group)
+                continue
+            for sub_order, literal in enumerate(literals):
+                if literal:
+                    self.__add(literal, (order, sub_order))
+        self._regex = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % "|".join(regex_groups),
+                                 re.I) if regex_groups else None
+
+    def __add(self, literal, priority):
+        node = self._trie
+        for char in literal.lower():
+            node = node.setdefault(char, {})
+        # 同一字面量保留最先出现的优先级，与正则分支的尝试顺序一致
+        if "" not in node or priority < node[""]:
+            node[""] = priority
+
+    def __match_at(self, title, start):
+        """
+        从指定位置沿字典树匹配，返回优先级最高且后面是分隔符的结束位置
+        """
+        best = None
+        node = self._trie
+        pos = start
+        while pos < len(title):
+            node = node.get(title[pos].lower())
+            if node is None:
+                break
+            pos += 1
+            priority = node.get("")
+            if priority is not None \
+                    and pos < len(title) \
+                    and (title[pos] in _GROUP_SUFFIX_CHARS or title[pos].isspace()) \
+                    and (best is None or priority < best[0]):
+                best = (priority, pos)
+        return best[1] if best else None
+
+    def findall(self, title):
+        """
+        按出现顺序返回标题中匹配到的所有制作组
+        """
+        matches = []
+        if self._trie:
+            pos = 1
+            while pos < len(title):
+                if title[pos - 1] in _GROUP_PREFIX_CHARS:
+                    end = self.__match_at(title, pos)
+                    if end:
+                        matches.append((pos, title[pos:end]))
+                        pos = end
+                        continue
+                pos += 1
+        if self._regex:
+            matches.extend((match.start(), match.group()) for match in self._regex.finditer(title))
+            matches.sort(key=lambda x: x[0])
+        return [item for _, item in matches]
+
+
+@lru_cache(maxsize=64)
+def _get_automaton(groups):
+    return _GroupsAutomaton(groups)
+
 
 class ReleaseGroupsMatcher(metaclass=SingletonMeta):
     """
@@ -72,12 +233,25 @@ class ReleaseGroupsMatcher(metaclass=SingletonMeta):
         "anime": ['ANi', 'HYSUB', 'KTXP', 'LoliHouse', 'MCE', 'Nekomoe kissaten', '(?:Lilith|NC)-Raws', '织梦字幕组']
     }
 
+    __automaton = None
+
     def __init__(self):
         release_groups = []
         for site_groups in self.RELEASE_GROUPS.values():
             for release_group in site_groups:
                 release_groups.append(release_group)
         self.__release_groups = '|'.join(release_groups)
+        self.__build_automaton()
+
+    def __build_automaton(self):
+        """
+        构建内置及自定义制作组的匹配自动机，仅在配置变化时调用
+        """
+        if self.custom_release_groups:
+            groups = f"{self.__release_groups}|{self.custom_release_groups}"
+        else:
+            groups = self.__release_groups
+        self.__automaton = _GroupsAutomaton(groups)
 
     def match(self, title=None, groups=None):
         """
@@ -87,16 +261,11 @@ class ReleaseGroupsMatcher(metaclass=SingletonMeta):
         """
         if not title:
             return ""
-        if not groups:
-            if self.custom_release_groups:
-                groups = f"{self.__release_groups}|{self.custom_release_groups}"
-            else:
-                groups = self.__release_groups
+        automaton = _get_automaton(groups) if groups else self.__automaton
         title = f"{title} "
-        groups_re = re.compile(r"(?<=[-@\[￡【&])(?:%s)(?=[@.\s\]\[】&])" % groups, re.I)
         # 处理一个制作组识别多次的情况，保留顺序
         unique_groups = []
-        for item in re.findall(groups_re, title):
+        for item in automaton.findall(title):
             if item not in unique_groups:
                 unique_groups.append(item)
         separator = self.custom_separator or "@"
@@ -106,5 +275,7 @@ class ReleaseGroupsMatcher(metaclass=SingletonMeta):
         """
         更新自定义制作组/字幕组，自定义分隔符
         """
-        self.custom_release_groups = release_groups
         self.custom_separator = separator
+        if release_groups != self.custom_release_groups:
+            self.custom_release_groups = release_groups
+            self.__build_automaton()
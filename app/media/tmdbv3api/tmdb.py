@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import copy
 import logging
-import os
+import threading
 import time
-from functools import lru_cache
+from contextlib import contextmanager
 
 import requests
 import requests.exceptions
+from cacheout import LRUCache
+from requests.adapters import HTTPAdapter
 
 from .as_obj import AsObj
 from .exceptions import TMDbException
@@ -23,102 +26,147 @@ class TMDb(object):
     TMDB_PROXIES = "TMDB_PROXIES"
     TMDB_DOMAIN = "TMDB_DOMAIN"
     REQUEST_CACHE_MAXSIZE = 512
+    REQUEST_CACHE_TTL = 24 * 3600
+    REQUEST_POOL_MAXSIZE = 50
+
+    # Client settings shared by every TMDb object in the process
+    _settings = {
+        TMDB_API_KEY: None,
+        TMDB_LANGUAGE: "zh",
+        TMDB_WAIT_ON_RATE_LIMIT: True,
+        TMDB_DEBUG_ENABLED: False,
+        TMDB_CACHE_ENABLED: True,
+        TMDB_PROXIES: None,
+        TMDB_DOMAIN: "https://api.themoviedb.org/3",
+    }
+    # Per-thread language override and paging info of the last response
+    _local = threading.local()
+    # Keep-alive connection pool shared by all objects
+    _shared_session = None
+    _session_lock = threading.Lock()
+    # Parsed JSON bodies of GET requests
+    _request_cache = LRUCache(maxsize=REQUEST_CACHE_MAXSIZE, ttl=REQUEST_CACHE_TTL, timer=time.time)
+    # Rate limit state reported by the server
+    _rate_lock = threading.Lock()
+    _remaining = 40
+    _reset = None
 
     def __init__(self, obj_cached=True, session=None):
-        self._session = requests.Session() if session is None else session
-        self._remaining = 40
-        self._reset = None
+        self._session = session
         self.obj_cached = obj_cached
-        if os.environ.get(self.TMDB_LANGUAGE) is None:
-            os.environ[self.TMDB_LANGUAGE] = "zh"
-        if not os.environ.get(self.TMDB_DOMAIN):
-            os.environ[self.TMDB_DOMAIN] = "https://api.themoviedb.org/3"
+
+    @classmethod
+    def _get_session(cls):
+        if cls._shared_session is None:
+            with cls._session_lock:
+                if cls._shared_session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=10,
+                                          pool_maxsize=cls.REQUEST_POOL_MAXSIZE)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    cls._shared_session = session
+        return cls._shared_session
+
+    @property
+    def session(self):
+        return self._session or self._get_session()
 
     @property
     def page(self):
-        return os.environ["page"]
+        return getattr(self._local, "page", None)
 
     @property
     def total_results(self):
-        return os.environ["total_results"]
+        return getattr(self._local, "total_results", None)
 
     @property
     def total_pages(self):
-        return os.environ["total_pages"]
+        return getattr(self._local, "total_pages", None)
 
     @property
     def api_key(self):
-        return os.environ.get(self.TMDB_API_KEY)
+        return self._settings.get(self.TMDB_API_KEY)
+
+    @api_key.setter
+    def api_key(self, api_key):
+        self._settings[self.TMDB_API_KEY] = str(api_key)
 
     @property
     def domain(self):
-        return os.environ.get(self.TMDB_DOMAIN)
+        return self._settings.get(self.TMDB_DOMAIN)
 
     @domain.setter
     def domain(self, domain):
-        os.environ[self.TMDB_DOMAIN] = str(domain or '')
+        self._settings[self.TMDB_DOMAIN] = str(domain or '')
 
     @property
     def proxies(self):
-        return os.environ.get(self.TMDB_PROXIES)
+        return self._settings.get(self.TMDB_PROXIES)
 
     @proxies.setter
     def proxies(self, proxies):
         if proxies:
-            proxies_strs = []
-            for key, value in proxies.items():
-                if not value:
-                    continue
-                proxies_strs.append("'%s': '%s'" % (key, value))
-            if proxies_strs:
-                os.environ[self.TMDB_PROXIES] = "{%s}" % ",".join(proxies_strs)
-            else:
-                os.environ[self.TMDB_PROXIES] = 'None'
+            proxies = {key: value for key, value in proxies.items() if value}
+        self._settings[self.TMDB_PROXIES] = proxies or None
 
-    @api_key.setter
-    def api_key(self, api_key):
-        os.environ[self.TMDB_API_KEY] = str(api_key)
+    @property
+    def default_language(self):
+        return self._settings.get(self.TMDB_LANGUAGE)
+
+    @default_language.setter
+    def default_language(self, language):
+        self._settings[self.TMDB_LANGUAGE] = language or "zh"
 
     @property
     def language(self):
-        return os.environ.get(self.TMDB_LANGUAGE)
+        """
+        Language of the current thread, falls back to the default language.
+        """
+        return getattr(self._local, "language", None) or self.default_language
 
     @language.setter
     def language(self, language):
-        os.environ[self.TMDB_LANGUAGE] = language
+        """
+        Only affects requests made by the current thread, set None to restore the default language.
+        """
+        self._local.language = language
+
+    @contextmanager
+    def language_context(self, language):
+        """
+        Use the given language for the calls made inside the block by the current thread.
+        """
+        old_language = getattr(self._local, "language", None)
+        self._local.language = language
+        try:
+            yield self
+        finally:
+            self._local.language = old_language
 
     @property
     def wait_on_rate_limit(self):
-        if os.environ.get(self.TMDB_WAIT_ON_RATE_LIMIT) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get(self.TMDB_WAIT_ON_RATE_LIMIT)
 
     @wait_on_rate_limit.setter
     def wait_on_rate_limit(self, wait_on_rate_limit):
-        os.environ[self.TMDB_WAIT_ON_RATE_LIMIT] = str(wait_on_rate_limit)
+        self._settings[self.TMDB_WAIT_ON_RATE_LIMIT] = bool(wait_on_rate_limit)
 
     @property
     def debug(self):
-        if os.environ.get(self.TMDB_DEBUG_ENABLED) == "True":
-            return True
-        else:
-            return False
+        return self._settings.get(self.TMDB_DEBUG_ENABLED)
 
     @debug.setter
     def debug(self, debug):
-        os.environ[self.TMDB_DEBUG_ENABLED] = str(debug)
+        self._settings[self.TMDB_DEBUG_ENABLED] = bool(debug)
 
     @property
     def cache(self):
-        if os.environ.get(self.TMDB_CACHE_ENABLED) == "False":
-            return False
-        else:
-            return True
+        return self._settings.get(self.TMDB_CACHE_ENABLED)
 
     @cache.setter
     def cache(self, cache):
-        os.environ[self.TMDB_CACHE_ENABLED] = str(cache)
+        self._settings[self.TMDB_CACHE_ENABLED] = bool(cache)
 
     @staticmethod
     def _get_obj(result, key="results", all_details=False):
@@ -129,13 +177,18 @@ class TMDb(object):
         else:
             return [AsObj(**res) for res in result[key]]
 
-    @staticmethod
-    @lru_cache(maxsize=REQUEST_CACHE_MAXSIZE)
-    def cached_request(method, url, data, proxies):
-        return requests.request(method, url, data=data, proxies=eval(proxies), verify=False, timeout=10)
-
     def cache_clear(self):
-        return self.cached_request.cache_clear()
+        return self._request_cache.clear()
+
+    def _request(self, method, url, data=None):
+        req = self.session.request(method, url, data=data, proxies=self.proxies, timeout=10, verify=False)
+        headers = req.headers
+        with self._rate_lock:
+            if "X-RateLimit-Remaining" in headers:
+                TMDb._remaining = int(headers["X-RateLimit-Remaining"])
+            if "X-RateLimit-Reset" in headers:
+                TMDb._reset = int(headers["X-RateLimit-Reset"])
+        return req.json()
 
     def _call(
             self, action, append_to_response, call_cached=True, method="GET", data=None
@@ -151,46 +204,38 @@ class TMDb(object):
             self.language,
         )
 
-        if self.cache and self.obj_cached and call_cached and method != "POST":
-            req = self.cached_request(method, url, data, self.proxies)
-        else:
-            req = self._session.request(method, url, data=data, proxies=eval(self.proxies), timeout=10, verify=False)
-
-        headers = req.headers
-
-        if "X-RateLimit-Remaining" in headers:
-            self._remaining = int(headers["X-RateLimit-Remaining"])
-
-        if "X-RateLimit-Reset" in headers:
-            self._reset = int(headers["X-RateLimit-Reset"])
+        use_cache = self.cache and self.obj_cached and call_cached and method != "POST"
+        cache_key = (method, url, data, str(self.proxies))
+        cached_json = self._request_cache.get(cache_key) if use_cache else None
 
-        if self._remaining < 1:
-            current_time = int(time.time())
-            sleep_time = self._reset - current_time
-
-            if self.wait_on_rate_limit:
-                logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
-                time.sleep(abs(sleep_time))
-                self._call(action, append_to_response, call_cached, method, data)
-            else:
-                raise TMDbException(
-                    "Rate limit reached. Try again in %d seconds." % sleep_time
-                )
-
-        json = req.json()
+        if cached_json is not None:
+            # Callers mutate the returned dicts, never hand out the cached object
+            json = copy.deepcopy(cached_json)
+        else:
+            if self._remaining < 1 and self._reset:
+                sleep_time = self._reset - int(time.time())
+                if sleep_time > 0:
+                    if not self.wait_on_rate_limit:
+                        raise TMDbException(
+                            "Rate limit reached. Try again in %d seconds." % sleep_time
+                        )
+                    logger.warning("Rate limit reached. Sleeping for: %d" % sleep_time)
+                    time.sleep(sleep_time)
+            json = self._request(method, url, data)
+            if use_cache and "errors" not in json and json.get("success") is not False:
+                self._request_cache.set(cache_key, copy.deepcopy(json))
 
         if "page" in json:
-            os.environ["page"] = str(json["page"])
+            self._local.page = str(json["page"])
 
         if "total_results" in json:
-            os.environ["total_results"] = str(json["total_results"])
+            self._local.total_results = str(json["total_results"])
 
         if "total_pages" in json:
-            os.environ["total_pages"] = str(json["total_pages"])
+            self._local.total_pages = str(json["total_pages"])
 
         if self.debug:
             logger.info(json)
-            logger.info(self.cached_request.cache_info())
 
         if "errors" in json:
             raise TMDbException(json["errors"])
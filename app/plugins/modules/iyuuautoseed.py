@@ -419,7 +419,8 @@ class IYUUAutoSeed(_IPluginModule):
             # 下载器类型
             downloader_type = self.downloader.get_downloader_type(downloader_id=downloader)
             # 获取下载器中已完成的种子
-            torrents: list[Torrent] = self.downloader.get_completed_torrents(downloader_id=downloader)
+            torrents: list[Torrent] = self.downloader.get_state_torrents(downloader_id=downloader,
+                                                                         status="completed")
             if torrents:
                 self.info(f"下载器 {downloader} 已完成种子数：{len(torrents)}")
             else:
@@ -497,8 +498,9 @@ class IYUUAutoSeed(_IPluginModule):
                 continue
             self.info(f"开始检查下载器 {downloader} 的校验任务 ...")
             # 获取下载器中的种子
-            torrents: list[Torrent] = self.downloader.get_torrents(downloader_id=downloader,
-                                                    ids=recheck_torrents)
+            torrents: list[Torrent] = self.downloader.get_state_torrents(downloader_id=downloader,
+                                                                         ids=recheck_torrents,
+                                                                         max_age=0)
             if torrents:
                 can_seeding_torrents = []
                 for torrent in torrents:
@@ -664,14 +666,14 @@ class IYUUAutoSeed(_IPluginModule):
             return False
         self.realtotal += 1
         # 查询hash值是否已经在下载器中
-        torrent_info = self.downloader.get_torrents(downloader_id=downloader,
-                                                    ids=[seed.get("info_hash")])
+        torrent_info = self.downloader.get_state_torrents(downloader_id=downloader,
+                                                          ids=[seed.get("info_hash")])
         if torrent_info:
             self.debug(f"{seed.get('info_hash')} 已在下载器中，跳过 ...")
             self.exist += 1
             return False
         # 站点流控
-        if self.sites.check_ratelimit(site_info.get("id")):
+        if self.sites.check_ratelimit(site_info.get("id"), timeout=30):
             self.fail += 1
             return False
         # 下载种子
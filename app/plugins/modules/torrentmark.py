@@ -8,6 +8,7 @@ from app.downloader import Downloader
 from app.entities.torrent import Torrent
 from app.message import Message
 from app.plugins.modules._base import _IPluginModule
+from app.utils.types import TorrentChangeType
 from config import Config
 
 from app.scheduler_service import SchedulerService
@@ -132,6 +133,12 @@ class TorrentMark(_IPluginModule):
         self.run_service()
 
     def run_service(self):
+        # 订阅下载完成的种子，及时标记新种子
+        if self._enable and self._downloaders:
+            self.downloader.subscribe_torrent_changes(self.on_torrent_changes,
+                                                      change_types=[TorrentChangeType.Added,
+                                                                    TorrentChangeType.Completed],
+                                                      downloader_ids=self._downloaders)
         # 启动定时任务 & 立即运行一次
         if self.get_state() or self._onlyonce:
             if self._cron:
@@ -192,22 +199,37 @@ class TorrentMark(_IPluginModule):
                 if self._event.is_set():
                     self.info(f"标记服务停止")
                     return
-                # 获取种子hash
-                hash_str = torrent.id
-                # 获取种子标签
-                torrent_tags = set(torrent.labels)
-                pt_flag = self.__isPt(torrent)
-                torrent_tags.discard("")
-                if pt_flag is True:
-                    torrent_tags.discard("BT")
-                    torrent_tags.add("PT")
-                    self.downloader.set_torrents_tag(downloader_id=downloader, ids=hash_str, tags=list(torrent_tags))
-                else:
-                    torrent_tags.add("BT")
-                    torrent_tags.discard("PT")
-                    self.downloader.set_torrents_tag(downloader_id=downloader, ids=hash_str, tags=list(torrent_tags))
+                self.__mark_torrent(downloader, torrent)
         self.info("标记任务执行完成")
 
+    def on_torrent_changes(self, changes):
+        """
+        下载器种子新增或下载完成时标记
+        """
+        if not self._enable:
+            return
+        for change in changes:
+            if change.type == TorrentChangeType.Added and (change.torrent.progress or 0) < 1:
+                continue
+            self.__mark_torrent(change.downloader_id, change.torrent)
+
+    def __mark_torrent(self, downloader, torrent: Torrent):
+        """
+        标记单个种子，标签已正确时不再设置
+        """
+        if not torrent.trackers:
+            return
+        # 获取种子标签
+        torrent_tags = set(torrent.labels)
+        torrent_tags.discard("")
+        if self.__isPt(torrent) is True:
+            new_tags = (torrent_tags - {"BT"}) | {"PT"}
+        else:
+            new_tags = (torrent_tags - {"PT"}) | {"BT"}
+        if new_tags == torrent_tags:
+            return
+        self.downloader.set_torrents_tag(downloader_id=downloader, ids=torrent.id, tags=list(new_tags))
+
     @staticmethod
     def __isPt(torrent: Torrent):
         """
@@ -224,6 +246,8 @@ class TorrentMark(_IPluginModule):
         """
         退出插件
         """
+        if self.downloader:
+            self.downloader.unsubscribe_torrent_changes(self.on_torrent_changes)
         try:
             if self._scheduler and self._scheduler.SCHEDULER:
                 for job in self._scheduler.get_jobs(self._jobstore):
@@ -396,7 +396,7 @@ class TorrentTransfer(_IPluginModule):
         # 目的下载器类型
         to_downloader_type = self.downloader.get_downloader_type(downloader_id=todownloader)
         # 获取下载器中已完成的种子
-        torrents = self.downloader.get_completed_torrents(downloader_id=downloader)
+        torrents = self.downloader.get_state_torrents(downloader_id=downloader, status="completed")
         if torrents:
             self.info(f"下载器 {downloader} 已完成种子数：{len(torrents)}")
         else:
@@ -453,8 +453,8 @@ class TorrentTransfer(_IPluginModule):
                     fail += 1
                     continue
                 # 查询hash值是否已经在目的下载器中
-                torrent_info = self.downloader.get_torrents(downloader_id=todownloader,
-                                                            ids=[hash_item.get('hash')])
+                torrent_info = self.downloader.get_state_torrents(downloader_id=todownloader,
+                                                                  ids=[hash_item.get('hash')])
                 if torrent_info:
                     self.debug(f"{hash_item.get('hash')} 已在目的下载器中，跳过 ...")
                     continue
@@ -593,8 +593,9 @@ class TorrentTransfer(_IPluginModule):
         # 下载器类型
         downloader_type = self.downloader.get_downloader_type(downloader_id=downloader)
         # 获取下载器中的种子
-        torrents = self.downloader.get_torrents(downloader_id=downloader,
-                                                ids=recheck_torrents)
+        torrents = self.downloader.get_state_torrents(downloader_id=downloader,
+                                                      ids=recheck_torrents,
+                                                      max_age=0)
         if torrents:
             can_seeding_torrents = []
             for torrent in torrents:
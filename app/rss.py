@@ -1,4 +1,4 @@
-import re
+import hashlib
 from threading import Lock
 
 import log
@@ -6,11 +6,12 @@ import json
 from app.downloader import Downloader
 from app.filter import Filter
 from app.helper import DbHelper, RssHelper
+from app.indexer.executor import SearchExecutor
 from app.media import Media
 from app.media.meta import MetaInfo
 from app.sites import Sites, SiteConf
-from app.subscribe import Subscribe
-from app.utils import ExceptionUtils, Torrent, JsonUtils
+from app.subscribe import Subscribe, SubscribeIndex
+from app.utils import ExceptionUtils, Torrent, JsonUtils, StringUtils
 from app.utils.commons import SingletonMeta
 from app.utils.types import MediaType, SearchType
 
@@ -27,6 +28,11 @@ class Rss(metaclass=SingletonMeta):
     dbhelper = None
     rsshelper = None
     subscribe = None
+    executor = None
+    # 上次RSS时的订阅及站点设置摘要
+    _rss_sign = None
+    # 订阅索引
+    _subscribe_index = None
 
     def __init__(self):
         self.init_config()
@@ -40,6 +46,7 @@ class Rss(metaclass=SingletonMeta):
         self.dbhelper = DbHelper()
         self.rsshelper = RssHelper()
         self.subscribe = Subscribe()
+        self.executor = SearchExecutor()
 
     def rssdownload(self):
         """
@@ -97,7 +104,15 @@ class Rss(metaclass=SingletonMeta):
             rss_download_torrents = []
             # 缺失的资源详情
             rss_no_exists = {}
-            # 遍历站点资源
+            # 订阅的下载历史，其它TMDB ID用到时再查询
+            rss_tmdbids = [str(info.get("tmdbid")) for info in list(rss_movies.values()) + list(rss_tvs.values())
+                           if info.get("tmdbid")]
+            download_history = {tmdbid: set() for tmdbid in rss_tmdbids}
+            download_history.update(self.dbhelper.get_download_history_se_by_tmdbids(rss_tmdbids))
+            # 订阅或站点设置有变化时，RSS需完整下载重新匹配
+            self.__check_rss_sign(rss_movies=rss_movies, rss_tvs=rss_tvs, rss_sites_info=rss_sites_info)
+            # 并发下载各站点RSS，同一站点受并发限制
+            rss_tasks = []
             for site_info in rss_sites_info:
                 if not site_info:
                     continue
@@ -111,6 +126,16 @@ class Rss(metaclass=SingletonMeta):
                 if not rss_url:
                     log.info(f"【Rss】{site_name} 未配置rssurl，跳过...")
                     continue
+                task = self.executor.submit(StringUtils.get_url_domain(rss_url) or site_name,
+                                            self.rsshelper.parse_rssxml_if_modified,
+                                            url=rss_url)
+                rss_tasks.append((site_info, task))
+            # 遍历站点资源
+            for site_info, task in rss_tasks:
+                # 站点名称
+                site_name = site_info.get("name")
+                # 站点rss链接
+                rss_url = site_info.get("rssurl")
                 # 站点信息
                 site_id = site_info.get("id")
                 site_cookie = site_info.get("cookie")
@@ -132,7 +157,15 @@ class Rss(metaclass=SingletonMeta):
                     site_order = 100 - int(site_info.get("pri"))
                 else:
                     site_order = 0
-                rss_acticles = self.rsshelper.parse_rssxml(url=rss_url)
+                try:
+                    rss_modified, rss_acticles = task.result()
+                except Exception as e:
+                    ExceptionUtils.exception_traceback(e)
+                    log.error(f"【Rss】{site_name} 下载RSS发生错误：{str(e)}")
+                    continue
+                if not rss_modified:
+                    log.info(f"【Rss】{site_name} RSS无变化，跳过")
+                    continue
                 if rss_acticles is None:
                     # RSS链接过期
                     log.error(f"【Rss】站点 {site_name} RSS链接已过期，请重新获取！")
@@ -148,6 +181,9 @@ class Rss(metaclass=SingletonMeta):
                     log.info(f"【Rss】{site_name} 获取数据：{len(rss_acticles)}")
                 # 处理RSS结果
                 res_num = 0
+                # 批量查询已处理过的种子
+                rssd_enclosures = self.rsshelper.get_rssd_enclosures(
+                    [article.get('enclosure') for article in rss_acticles])
                 for article in rss_acticles:
                     try:
                         # 种子名
@@ -161,13 +197,15 @@ class Rss(metaclass=SingletonMeta):
                         # 开始处理
                         log.info(f"【Rss】开始处理：{title}")
                         # 检查这个种子是不是下过了
-                        if self.rsshelper.is_rssd_by_enclosure(enclosure):
+                        if enclosure in rssd_enclosures:
                             log.info(f"【Rss】{title} 已成功订阅过")
                             continue
                         # 重新查询TMDB
                         media_info = self.media.get_media_info(title=title)
                         if not media_info:
                             log.warn(f"【Rss】{title} 无法识别出媒体信息！")
+                            # 下次RSS时重新识别
+                            self.rsshelper.retry_rss_enclosure(rss_url, enclosure)
                             continue
                         elif not media_info.tmdb_info:
                             log.info(f"【Rss】{title} 识别为 {media_info.get_name()} 未匹配到TMDB媒体信息")
@@ -180,7 +218,9 @@ class Rss(metaclass=SingletonMeta):
                         # 检查是否已在下载历史中存在（防止与searcher模块重复下载）
                         if media_info.tmdb_id:
                             season_episode = media_info.get_season_episode_string()
-                            if self.dbhelper.is_exists_download_history_by_tmdb(media_info.tmdb_id, season_episode):
+                            if self.__is_download_history_exists(download_history=download_history,
+                                                                 tmdb_id=media_info.tmdb_id,
+                                                                 season_episode=season_episode):
                                 log.info(f"【Rss】{title} 已在下载历史中存在，跳过下载")
                                 continue
                         # 检查种子是否匹配订阅，返回匹配到的订阅ID、是否洗版、总集数、上传因子、下载因子
@@ -194,7 +234,8 @@ class Rss(metaclass=SingletonMeta):
                             site_parse=site_parse,
                             site_headers=site_headers,
                             site_ua=site_ua,
-                            site_proxy=site_proxy)
+                            site_proxy=site_proxy,
+                            subscribe_index=self._subscribe_index)
                         for msg in match_msg:
                             log.info(f"【Rss】{msg}")
 
@@ -209,6 +250,8 @@ class Rss(metaclass=SingletonMeta):
                                 media_info.set_tmdb_info(self.media.get_tmdb_info(mtype=media_info.type,
                                                                                   tmdbid=media_info.tmdb_id))
                             if not media_info.tmdb_info:
+                                log.warn(f"【Rss】{title} 未查询到TMDB媒体信息，下次RSS时重试")
+                                self.rsshelper.retry_rss_enclosure(rss_url, enclosure)
                                 continue
                             # 非洗版时检查本地是否存在
                             if not match_info.get("over_edition"):
@@ -289,7 +332,9 @@ class Rss(metaclass=SingletonMeta):
                             pass
 
                         # 站点流控
-                        if self.sites.check_ratelimit(site_id):
+                        if self.sites.check_ratelimit(site_id, timeout=30):
+                            # 下次RSS时重新匹配
+                            self.rsshelper.retry_rss_enclosure(rss_url, enclosure)
                             continue
 
                         # 设置种子信息
@@ -304,6 +349,7 @@ class Rss(metaclass=SingletonMeta):
                                                      save_path=match_info.get("save_path"))
                         # 插入数据库历史记录
                         self.rsshelper.insert_rss_torrents(media_info)
+                        rssd_enclosures.add(enclosure)
                         # 加入下载列表
                         if media_info not in rss_download_torrents:
                             rss_download_torrents.append(media_info)
@@ -311,6 +357,7 @@ class Rss(metaclass=SingletonMeta):
                     except Exception as e:
                         ExceptionUtils.exception_traceback(e)
                         log.error("【Rss】处理RSS发生错误：%s" % str(e))
+                        self.rsshelper.retry_rss_enclosure(rss_url, article.get('enclosure'))
                         continue
                 log.info("【Rss】%s 处理结束，匹配到 %s 个有效资源" % (site_name, res_num))
             log.info("【Rss】所有RSS处理结束，共 %s 个有效资源" % len(rss_download_torrents))
@@ -318,6 +365,33 @@ class Rss(metaclass=SingletonMeta):
             self.download_rss_torrent(rss_download_torrents=rss_download_torrents,
                                       rss_no_exists=rss_no_exists)
 
+    def __is_download_history_exists(self, download_history, tmdb_id, season_episode):
+        """
+        查询下载历史是否存在，本次RSS内按TMDB ID缓存
+        """
+        tmdb_id = str(tmdb_id)
+        if tmdb_id not in download_history:
+            download_history[tmdb_id] = self.dbhelper.get_download_history_se_by_tmdbids(
+                [tmdb_id]).get(tmdb_id) or set()
+        if not season_episode:
+            return bool(download_history[tmdb_id])
+        return season_episode in download_history[tmdb_id]
+
+    def __check_rss_sign(self, rss_movies, rss_tvs, rss_sites_info):
+        """
+        订阅、站点、过滤规则或下载设置变化后清除RSS条件请求的校验信息，未变化的RSS才能直接跳过，并重建订阅索引
+        订阅及站点中只保存规则组、下载设置的ID，需加入其内容，修改规则后上次未匹配的种子才会重新检查
+        """
+        rss_sign = hashlib.md5(json.dumps([rss_movies, rss_tvs, rss_sites_info,
+                                           self.filter.get_rule_infos(),
+                                           self.downloader.get_download_setting()],
+                                          sort_keys=True,
+                                          default=str).encode("utf-8")).hexdigest()
+        if rss_sign != self._rss_sign or not self._subscribe_index:
+            self.rsshelper.clear_rss_validators()
+            self._subscribe_index = SubscribeIndex(rss_movies=rss_movies, rss_tvs=rss_tvs)
+            self._rss_sign = rss_sign
+
     def check_torrent_rss(self,
                           media_info,
                           rss_movies,
@@ -328,7 +402,8 @@ class Rss(metaclass=SingletonMeta):
                           site_parse,
                           site_ua,
                           site_headers,
-                          site_proxy):
+                          site_proxy,
+                          subscribe_index=None):
         """
         判断种子是否命中订阅
         :param media_info: 已识别的种子媒体信息
@@ -341,6 +416,7 @@ class Rss(metaclass=SingletonMeta):
         :param site_ua: 站点请求UA
         :param site_headers: 站点请求头
         :param site_proxy: 是否使用代理
+        :param subscribe_index: 订阅索引，为空时按订阅清单建立
         :return: 匹配到的订阅ID、是否洗版、总集数、匹配规则的资源顺序、上传因子、下载因子，匹配的季（电视剧）
         """
         # 默认值
@@ -355,98 +431,21 @@ class Rss(metaclass=SingletonMeta):
         download_volume_factor = None
         hit_and_run = False
 
-        # 匹配电影
-        if media_info.type == MediaType.MOVIE and rss_movies:
-            for rid, rss_info in rss_movies.items():
-                rss_sites = rss_info.get('rss_sites')
-                # 过滤订阅站点
-                if rss_sites and media_info.site not in rss_sites:
-                    continue
-                # tmdbid或名称年份匹配
-                name = rss_info.get('name')
-                year = rss_info.get('year')
-                tmdbid = rss_info.get('tmdbid')
-                fuzzy_match = rss_info.get('fuzzy_match')
-                # 非模糊匹配
-                if not fuzzy_match:
-                    # 有tmdbid时使用tmdbid匹配
-                    if tmdbid and not tmdbid.startswith("DB:"):
-                        if str(media_info.tmdb_id) != str(tmdbid):
-                            continue
-                    else:
-                        # 豆瓣年份与tmdb取向不同
-                        if year and str(media_info.year) not in [str(year),
-                                                                 str(int(year) + 1),
-                                                                 str(int(year) - 1)]:
-                            continue
-                        if name != media_info.title:
-                            continue
-                # 模糊匹配
-                else:
-                    # 匹配年份
-                    if year and str(year) != str(media_info.year):
-                        continue
-                    # 匹配关键字或正则表达式
-                    search_title = f"{media_info.rev_string} {media_info.title} {media_info.year}"
-                    if not re.search(name, search_title, re.I) and name not in search_title:
-                        continue
-                # 媒体匹配成功
-                match_flag = True
-                match_rss_info = rss_info
-
-                break
-        # 匹配电视剧
-        elif rss_tvs:
-            # 匹配种子标题
-            for rid, rss_info in rss_tvs.items():
-                rss_sites = rss_info.get('rss_sites')
-                # 过滤订阅站点
-                if rss_sites and media_info.site not in rss_sites:
-                    continue
-                # 有tmdbid时精确匹配
-                name = rss_info.get('name')
-                year = rss_info.get('year')
-                season = rss_info.get('season')
-                tmdbid = rss_info.get('tmdbid')
-                fuzzy_match = rss_info.get('fuzzy_match')
-                # 非模糊匹配
-                if not fuzzy_match:
-                    if tmdbid and not tmdbid.startswith("DB:"):
-                        if str(media_info.tmdb_id) != str(tmdbid):
-                            continue
-                    else:
-                        # 匹配年份，年份可以为空
-                        if year and str(year) != str(media_info.year):
-                            continue
-                        # 匹配名称
-                        if name != media_info.title:
-                            continue
-                    # 匹配季，季可以为空
-                    if season and season != media_info.get_season_string():
-                        continue
-                # 模糊匹配
-                else:
-                    # 匹配季，季可以为空
-                    if season and season != "S00" and season != media_info.get_season_string():
-                        continue
-                    # 匹配年份
-                    if year and str(year) != str(media_info.year):
-                        continue
-                    # 匹配关键字或正则表达式
-                    search_title = f"{media_info.rev_string} {media_info.title} {media_info.year}"
-                    if not re.search(name, search_title, re.I) and name not in search_title:
-                        continue
-                # 媒体匹配成功
-                match_flag = True
-                match_rss_info = rss_info
-                break
+        # 只与可能命中的订阅比较
+        if not subscribe_index:
+            subscribe_index = SubscribeIndex(rss_movies=rss_movies, rss_tvs=rss_tvs)
+        rss_info = subscribe_index.match(media_info)
+        if rss_info:
+            # 媒体匹配成功，复制一份避免修改订阅索引中的信息
+            match_flag = True
+            match_rss_info = dict(rss_info)
 
         # 名称匹配成功，开始过滤
         if match_flag:
             # 解析种子详情
             if site_parse:
                 # 站点流控
-                if self.sites.check_ratelimit(site_id):
+                if self.sites.check_ratelimit(site_id, timeout=10):
                     match_msg.append("触发站点流控")
                     return False, match_msg, match_rss_info
                 # 检测Free
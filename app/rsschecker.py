@@ -452,7 +452,7 @@ class RssChecker(metaclass=SingletonMeta):
             # 解析数据 XPATH
             if rss_parser.get("type") == "XML":
                 try:
-                    result_tree = etree.XML(ret.text.encode("utf-8"))
+                    result_tree = etree.XML(ret.text.encode("utf-8"), parser=RssHelper.get_xml_parser())
                     item_list = result_tree.xpath(rss_parser_format.get("list")) or []
                     for item in item_list:
                         rss_item = {}
@@ -42,13 +42,15 @@ class Searcher(metaclass=SingletonMeta):
                       key_word: [str, list],
                       filter_args: dict,
                       match_media=None,
-                      in_from: SearchType = None):
+                      in_from: SearchType = None,
+                      callback=None):
         """
         根据关键字调用索引器检查媒体
         :param key_word: 搜索的关键字，不能为空
         :param filter_args: 过滤条件
         :param match_media: 区配的媒体信息
         :param in_from: 搜索渠道
+        :param callback: 每个索引站点完成时的回调
         :return: 命中的资源媒体信息列表
         """
         if not key_word:
@@ -65,7 +67,8 @@ class Searcher(metaclass=SingletonMeta):
         return self.indexer.search_by_keyword(key_word=key_word,
                                               filter_args=filter_args,
                                               match_media=match_media,
-                                              in_from=in_from)
+                                              in_from=in_from,
+                                              callback=callback)
 
     def search_one_media(self, media_info,
                          in_from: SearchType,
@@ -244,6 +247,13 @@ class Searcher(metaclass=SingletonMeta):
         """
         return self.dbhelper.get_search_results()
 
+    def get_search_results_by_title(self, page=None, page_size=None, filters=None):
+        """
+        按标题分组分页获取搜索结果
+        :return: 结果总数，标题总数，当前页的搜索结果
+        """
+        return self.dbhelper.get_search_results_by_title(page=page, page_size=page_size, filters=filters)
+
     def delete_all_search_torrents(self):
         """
         删除所有搜索结果
@@ -1,54 +1,214 @@
 import time
+from threading import Lock
+
+import redis
+
+import log
+from app.utils import RedisStore
+
+# 取令牌的Lua脚本，多个桶要么全部扣减要么都不扣减
+# KEYS[1]: 桶状态，KEYS[2]: 正在等待的高优先级请求数
+# ARGV: 当前时间, 优先级, 是否扣减, 桶数量, 状态过期时间, [桶名, 容量, 每秒补充数]...
+# 返回: {需等待秒数（-1表示让位给高优先级请求）, 各桶剩余令牌数...}
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local priority = tonumber(ARGV[2])
+local consume = tonumber(ARGV[3])
+local count = tonumber(ARGV[4])
+local ttl = tonumber(ARGV[5])
+local wait = 0
+local tokens = {}
+for i = 0, count - 1 do
+    local name = ARGV[6 + i * 3]
+    local capacity = tonumber(ARGV[7 + i * 3])
+    local rate = tonumber(ARGV[8 + i * 3])
+    local t = tonumber(redis.call('HGET', KEYS[1], name .. ':t') or capacity)
+    local ts = tonumber(redis.call('HGET', KEYS[1], name .. ':ts') or now)
+    t = math.min(capacity, t + math.max(0, now - ts) * rate)
+    tokens[i + 1] = t
+    if t < 1 then
+        wait = math.max(wait, (1 - t) / rate)
+    end
+end
+if wait == 0 and priority > 0 and tonumber(redis.call('GET', KEYS[2]) or '0') > 0 then
+    wait = -1
+end
+local ret = {tostring(wait)}
+for i = 0, count - 1 do
+    local t = tokens[i + 1]
+    if wait == 0 and consume == 1 then
+        t = t - 1
+        redis.call('HSET', KEYS[1], ARGV[6 + i * 3] .. ':t', tostring(t), ARGV[6 + i * 3] .. ':ts', tostring(now))
+    end
+    ret[i + 2] = tostring(t)
+end
+if wait == 0 and consume == 1 then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return ret
+"""
 
 
 class SiteRateLimiter:
-    def __init__(self, limit_interval: int, limit_count: int, limit_seconds: int):
+    """
+    站点访问令牌桶，状态保存在Redis中由所有线程和进程共享，Redis不可用时退回进程内令牌桶
+    - 单位时间访问次数：容量为访问次数，单位时间内匀速补满
+    - 访问间隔：容量为1，每个间隔补充1个
+    超出频率时可在期限内等待令牌，高优先级请求（交互搜索）等待时低优先级请求（刷流、RSS等）让行
+    """
+    # 请求优先级
+    PRIORITY_HIGH = 0
+    PRIORITY_LOW = 1
+    # 让行高优先级请求时的重试间隔（秒）
+    _YIELD_SECONDS = 0.5
+    _PREFIX = "site:ratelimit"
+
+    def __init__(self, limit_interval: int, limit_count: int, limit_seconds: int, site_id=None):
         """
         限制访问频率
         :param limit_interval: 单位时间（秒）
         :param limit_count: 单位时间内访问次数
         :param limit_seconds: 访问间隔（秒）
+        :param site_id: 站点ID，用于区分Redis中的令牌桶
         """
         self.limit_count = limit_count
         self.limit_interval = limit_interval
         self.limit_seconds = limit_seconds
-        self.last_visit_time = 0
-        self.count = 0
+        # 令牌桶：(名称, 容量, 每秒补充数)
+        self.buckets = []
+        if limit_interval and limit_count:
+            self.buckets.append(("count", limit_count, limit_count / limit_interval))
+        if limit_seconds:
+            self.buckets.append(("interval", 1, 1 / limit_seconds))
+        self._state_key = f"{self._PREFIX}:{site_id}"
+        self._waiting_key = f"{self._PREFIX}:{site_id}:waiting"
+        self._state_ttl = int(max([capacity / rate for _, capacity, rate in self.buckets] or [0])) + 60
+        self.redis = RedisStore() if self.buckets else None
+        self._lock = Lock()
+        # 进程内令牌桶状态：名称 -> [令牌数, 更新时间]
+        self._local_buckets = {}
+        self._local_waiting = 0
+        # 使用统计
+        self._stats = {"granted": 0, "waited": 0, "rejected": 0, "wait_time": 0.0}
+
+    def __take(self, priority, consume=True):
+        """
+        尝试取令牌
+        :return: 需等待的秒数（0为已取得，-1为让位给高优先级请求），各桶剩余令牌数
+        """
+        now = time.time()
+        try:
+            args = [now, priority, 1 if consume else 0, len(self.buckets), self._state_ttl]
+            for name, capacity, rate in self.buckets:
+                args += [name, capacity, rate]
+            ret = self.redis.eval(_TAKE_SCRIPT, [self._state_key, self._waiting_key], args)
+            return float(ret[0]), [float(t) for t in ret[1:]]
+        except redis.RedisError as err:
+            log.debug(f"【Sites】读取站点流控令牌失败，使用本地令牌桶：{str(err)}")
+        with self._lock:
+            wait = 0
+            tokens = []
+            for name, capacity, rate in self.buckets:
+                t, ts = self._local_buckets.get(name) or (capacity, now)
+                t = min(capacity, t + max(0.0, now - ts) * rate)
+                tokens.append(t)
+                if t < 1:
+                    wait = max(wait, (1 - t) / rate)
+            if wait == 0 and priority > self.PRIORITY_HIGH and self._local_waiting > 0:
+                wait = -1
+            if wait == 0 and consume:
+                tokens = [t - 1 for t in tokens]
+                for (name, _, _), t in zip(self.buckets, tokens):
+                    self._local_buckets[name] = (t, now)
+            return wait, tokens
+
+    def __set_waiting(self, delta, timeout=0):
+        """
+        登记正在等待的高优先级请求
+        """
+        try:
+            self.redis.incr(self._waiting_key, delta)
+            if delta > 0:
+                self.redis.expire(self._waiting_key, int(timeout) + 5)
+        except redis.RedisError:
+            pass
+        with self._lock:
+            self._local_waiting += delta
+
+    def acquire(self, priority=PRIORITY_LOW, timeout=0) -> bool:
+        """
+        取得一次访问令牌
+        :param priority: 优先级
+        :param timeout: 最长等待时间（秒），0为不等待
+        :return: 是否取得令牌
+        """
+        if not self.buckets:
+            return True
+        start = time.time()
+        deadline = start + (timeout or 0)
+        waiting = False
+        try:
+            while True:
+                wait, _ = self.__take(priority)
+                if wait == 0:
+                    with self._lock:
+                        self._stats["granted"] += 1
+                        if time.time() - start > 0.01:
+                            self._stats["waited"] += 1
+                            self._stats["wait_time"] += time.time() - start
+                    return True
+                remaining = deadline - time.time()
+                if wait < 0:
+                    wait = self._YIELD_SECONDS
+                # 期限内等不到令牌的直接拒绝
+                if remaining <= 0 or wait > remaining:
+                    with self._lock:
+                        self._stats["rejected"] += 1
+                    return False
+                if priority == self.PRIORITY_HIGH and not waiting:
+                    waiting = True
+                    self.__set_waiting(1, timeout)
+                time.sleep(wait)
+        finally:
+            if waiting:
+                self.__set_waiting(-1)
 
-    def check_rate_limit(self) -> (bool, str):
+    def check_rate_limit(self, priority=PRIORITY_LOW, timeout=0) -> (bool, str):
         """
         检查是否超出访问频率控制
         :return: 超出返回True，否则返回False，超出时返回错误信息
         """
-        current_time = time.time()
-        # 防问间隔时间
+        if self.acquire(priority=priority, timeout=timeout):
+            return False, ""
+        msgs = []
         if self.limit_seconds:
-            if current_time - self.last_visit_time < self.limit_seconds:
-                return True, f"触发流控规则，访问间隔不得小于 {self.limit_seconds} 秒，" \
-                             f"上次访问时间：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_visit_time))}"
-        # 单位时间内访问次数
+            msgs.append(f"访问间隔不得小于 {self.limit_seconds} 秒")
         if self.limit_interval and self.limit_count:
-            if current_time - self.last_visit_time > self.limit_interval:
-                # 计数清零
-                self.count = 0
-            if self.count >= self.limit_count:
-                return True, f"触发流控规则，{self.limit_interval} 秒内访问次数不得超过 {self.limit_count} 次，" \
-                             f"上次访问时间：{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_visit_time))}"
-            # 访问计数
-            self.count += 1
-        # 更新最后访问时间
-        self.last_visit_time = current_time
-        # 未触发流控
-        return False, ""
+            msgs.append(f"{self.limit_interval} 秒内访问次数不得超过 {self.limit_count} 次")
+        return True, f"触发流控规则，{'，'.join(msgs)}"
+
+    def get_usage(self) -> dict:
+        """
+        获取令牌使用情况
+        """
+        if not self.buckets:
+            return {}
+        _, tokens = self.__take(self.PRIORITY_HIGH, consume=False)
+        with self._lock:
+            usage = dict(self._stats)
+        usage["wait_time"] = round(usage["wait_time"], 1)
+        for (name, capacity, _), t in zip(self.buckets, tokens):
+            usage[name] = {"tokens": max(int(t), 0), "capacity": capacity}
+        return usage
 
 
 if __name__ == "__main__":
     # 限制 1 分钟内最多访问 10 次，单次访问间隔不得小于 10 秒
-    site_rate_limit = SiteRateLimiter(10, 60, 10)
+    site_rate_limit = SiteRateLimiter(60, 10, 10, site_id="test")
 
-    # 模拟访问
+    # 模拟访问，最多等待5秒
     for i in range(12):
-        if site_rate_limit.check_rate_limit():
+        if site_rate_limit.check_rate_limit(timeout=5)[0]:
             print("访问频率超限")
         else:
             print("访问成功")
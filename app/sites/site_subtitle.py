@@ -39,7 +39,7 @@ class SiteSubtitle:
             return
 
         # 站点流控
-        if self.sites.check_ratelimit(site_id):
+        if self.sites.check_ratelimit(site_id, timeout=30):
             return
 
         # 检查是否为 m-team 站点
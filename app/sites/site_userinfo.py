@@ -61,7 +61,7 @@ class SiteUserInfo(metaclass=SingletonMeta):
             f"【Sites】站点 {site_name} url={url} site_cookie={site_cookie} site_headers={site_headers} ua={ua}")
 
         # 站点流控
-        if self.sites.check_ratelimit(site_id):
+        if self.sites.check_ratelimit(site_id, timeout=30):
             return
 
         site_headers.update({'User-Agent': ua, 'referer': url})
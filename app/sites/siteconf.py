@@ -137,7 +137,7 @@ class SiteConf(metaclass=SingletonMeta):
         
         return torrent_url  # 如果不匹配任何 key，返回原始 URL
 
-    def check_torrent_attr(self, torrent_url, cookie, ua=None, headers=None, proxy=False):
+    def check_torrent_attr(self, torrent_url, cookie, ua=None, headers=None, proxy=False, cached=True):
         """
         检验种子是否免费，当前做种人数
         :param torrent_url: 种子的详情页面
@@ -145,8 +145,10 @@ class SiteConf(metaclass=SingletonMeta):
         :param ua: 站点的ua
         :param ua: 站点的请求头
         :param proxy: 是否使用代理
-        :return: 种子属性，包含FREE 2XFREE HR PEER_COUNT等属性
+        :param cached: 是否使用进程内的页面缓存，刷新促销状态时需重新请求页面
+        :return: 种子属性，包含FREE 2XFREE HR PEER_COUNT等属性，详情页获取失败时unknown为True
         """
+        get_page_html = self.__get_site_page_html if cached else self.__get_site_page_html.__wrapped__
         ret_attr = {
             "free": False,
             "2xfree": False,
@@ -163,17 +165,19 @@ class SiteConf(metaclass=SingletonMeta):
                 res = re.findall(r'\d+', torrent_url)
                 param = res[0]
 
-                json_text = self.__get_site_page_html(url=detail_url,
-                                                      cookie="",
-                                                      ua=ua,
-                                                      headers=headers,
-                                                      proxy=proxy,
-                                                      param=param)
+                json_text = get_page_html(url=detail_url,
+                                          cookie="",
+                                          ua=ua,
+                                          headers=headers,
+                                          proxy=proxy,
+                                          param=param)
                 if not json_text:
                     logger.debug(f'获取 M-Team 明细数据失败，种子id: {param}')
+                    ret_attr["unknown"] = True
                     return ret_attr
                 json_data = json.loads(json_text)
                 if json_data.get('message') != "SUCCESS":
+                    ret_attr["unknown"] = True
                     return ret_attr
                 discount = json_data.get('data').get('status').get('discount')
                 seeders = json_data.get('data').get('status').get('seeders')
@@ -190,13 +194,14 @@ class SiteConf(metaclass=SingletonMeta):
                 torrent_url = self.get_tid_and_url(torrent_url)
 
                 site_info = Sites().get_sites(siteurl=torrent_url)
-                html_text = self.__get_site_page_html(url=torrent_url,
-                                                      cookie=cookie,
-                                                      ua=ua,
-                                                      headers=headers,
-                                                      render=site_info.get('chrome'),
-                                                      proxy=proxy)
+                html_text = get_page_html(url=torrent_url,
+                                          cookie=cookie,
+                                          ua=ua,
+                                          headers=headers,
+                                          render=site_info.get('chrome'),
+                                          proxy=proxy)
                 if not html_text:
+                    ret_attr["unknown"] = True
                     return ret_attr
                 if JsonUtils.is_valid_json(html_text):
                     # 检测2XFREE
@@ -263,6 +268,7 @@ class SiteConf(metaclass=SingletonMeta):
 
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
+            ret_attr["unknown"] = True
         # 随机休眼后再返回
         time.sleep(round(random.uniform(2, 8), 1))
         return ret_attr
@@ -138,7 +138,8 @@ class Sites:
                     site_note.get("limit_interval")).isdigit() and site_note.get("limit_count") and str(
                     site_note.get("limit_count")).isdigit() else None,
                 limit_seconds=int(site_note.get("limit_seconds")) if site_note.get("limit_seconds") and str(
-                    site_note.get("limit_seconds")).isdigit() else None
+                    site_note.get("limit_seconds")).isdigit() else None,
+                site_id=site.ID
             )
 
     def init_favicons(self):
@@ -180,19 +181,33 @@ class Sites:
             return {}
         return ret_sites
 
-    def check_ratelimit(self, site_id):
+    def check_ratelimit(self, site_id, priority=SiteRateLimiter.PRIORITY_LOW, timeout=0):
         """
-        检查站点是否触发流控
+        检查站点是否触发流控，未触发时占用一次访问令牌
         :param site_id: 站点ID
+        :param priority: 请求优先级，交互搜索使用高优先级
+        :param timeout: 令牌不足时最长等待时间（秒），期限内取得令牌则不算触发流控
         :return: True为触发了流控，False为未触发
         """
         if not self._limiters.get(site_id):
             return False
-        state, msg = self._limiters[site_id].check_rate_limit()
+        state, msg = self._limiters[site_id].check_rate_limit(priority=priority, timeout=timeout)
         if msg:
             log.warn(f"【Sites】站点 {self._siteByIds[site_id].get('name')} {msg}")
         return state
 
+    def get_ratelimit_usage(self):
+        """
+        获取各站点流控令牌使用情况
+        :return: {站点ID: 使用情况}，未设置流控的站点不返回
+        """
+        ret_usage = {}
+        for site_id, limiter in self._limiters.items():
+            usage = limiter.get_usage()
+            if usage:
+                ret_usage[site_id] = usage
+        return ret_usage
+
     def get_sites_by_suffix(self, suffix):
         """
         根据url的后缀获取站点配置
@@ -1,4 +1,5 @@
 import json
+import re
 from threading import Lock
 import traceback
 
@@ -1023,3 +1024,134 @@ class Subscribe(metaclass=SingletonMeta):
         清空订阅缺失集数
         """
         self.dbhelper.truncate_rss_episodes()
+
+
+class SubscribeIndex(object):
+    """
+    订阅索引，按TMDB ID、名称建立索引，每个种子只需与可能命中的少数订阅比较
+    模糊匹配的正则表达式只编译一次，订阅变化时重新建立
+    """
+    _title_strip_re = re.compile(r"[\s\W_]+")
+
+    def __init__(self, rss_movies=None, rss_tvs=None):
+        self.rss_movies = rss_movies or {}
+        self.rss_tvs = rss_tvs or {}
+        self._movies = self.__build(self.rss_movies)
+        self._tvs = self.__build(self.rss_tvs)
+
+    @classmethod
+    def normalize_title(cls, title):
+        """
+        名称归一化，忽略大小写、空格及标点
+        """
+        if not title:
+            return ""
+        return cls._title_strip_re.sub("", str(title)).lower()
+
+    @classmethod
+    def __build(cls, subscribes):
+        index = {"tmdbid": {}, "title": {}, "fuzzy": []}
+        for order, rss_info in enumerate(subscribes.values()):
+            tmdbid = rss_info.get("tmdbid")
+            if rss_info.get("fuzzy_match"):
+                name = rss_info.get("name") or ""
+                try:
+                    pattern = re.compile(name, re.I)
+                except re.error:
+                    pattern = None
+                index["fuzzy"].append((order, rss_info, pattern))
+            elif tmdbid and not str(tmdbid).startswith("DB:"):
+                index["tmdbid"].setdefault(str(tmdbid), []).append((order, rss_info, None))
+            else:
+                index["title"].setdefault(cls.normalize_title(rss_info.get("name")), []).append(
+                    (order, rss_info, None))
+        return index
+
+    def __get_candidates(self, index, media_info):
+        """
+        可能命中的订阅，按订阅原顺序排列
+        """
+        candidates = index["tmdbid"].get(str(media_info.tmdb_id), []) \
+            + index["title"].get(self.normalize_title(media_info.title), []) \
+            + index["fuzzy"]
+        return sorted(candidates, key=lambda x: x[0])
+
+    def match(self, media_info):
+        """
+        查找种子命中的第一个订阅
+        :return: 命中的订阅信息，未命中返回None
+        """
+        if media_info.type == MediaType.MOVIE and self.rss_movies:
+            for _, rss_info, pattern in self.__get_candidates(self._movies, media_info):
+                if self.__match_movie(media_info, rss_info, pattern):
+                    return rss_info
+        elif self.rss_tvs:
+            for _, rss_info, pattern in self.__get_candidates(self._tvs, media_info):
+                if self.__match_tv(media_info, rss_info, pattern):
+                    return rss_info
+        return None
+
+    @staticmethod
+    def __match_fuzzy_name(media_info, name, pattern):
+        """
+        匹配关键字或正则表达式
+        """
+        search_title = f"{media_info.rev_string} {media_info.title} {media_info.year}"
+        if pattern and pattern.search(search_title):
+            return True
+        return (name or "") in search_title
+
+    def __match_movie(self, media_info, rss_info, pattern):
+        rss_sites = rss_info.get('rss_sites')
+        # 过滤订阅站点
+        if rss_sites and media_info.site not in rss_sites:
+            return False
+        name = rss_info.get('name')
+        year = rss_info.get('year')
+        tmdbid = rss_info.get('tmdbid')
+        # 非模糊匹配
+        if not rss_info.get('fuzzy_match'):
+            # 有tmdbid时使用tmdbid匹配
+            if tmdbid and not tmdbid.startswith("DB:"):
+                return str(media_info.tmdb_id) == str(tmdbid)
+            # 豆瓣年份与tmdb取向不同
+            if year and str(media_info.year) not in [str(year),
+                                                     str(int(year) + 1),
+                                                     str(int(year) - 1)]:
+                return False
+            return name == media_info.title
+        # 模糊匹配年份
+        if year and str(year) != str(media_info.year):
+            return False
+        return self.__match_fuzzy_name(media_info, name, pattern)
+
+    def __match_tv(self, media_info, rss_info, pattern):
+        rss_sites = rss_info.get('rss_sites')
+        # 过滤订阅站点
+        if rss_sites and media_info.site not in rss_sites:
+            return False
+        name = rss_info.get('name')
+        year = rss_info.get('year')
+        season = rss_info.get('season')
+        tmdbid = rss_info.get('tmdbid')
+        # 非模糊匹配
+        if not rss_info.get('fuzzy_match'):
+            if tmdbid and not tmdbid.startswith("DB:"):
+                if str(media_info.tmdb_id) != str(tmdbid):
+                    return False
+            else:
+                # 匹配年份，年份可以为空
+                if year and str(year) != str(media_info.year):
+                    return False
+                # 匹配名称
+                if name != media_info.title:
+                    return False
+            # 匹配季，季可以为空
+            return not season or season == media_info.get_season_string()
+        # 模糊匹配季，季可以为空
+        if season and season != "S00" and season != media_info.get_season_string():
+            return False
+        # 匹配年份
+        if year and str(year) != str(media_info.year):
+            return False
+        return self.__match_fuzzy_name(media_info, name, pattern)
@@ -8,7 +8,8 @@ from .string_utils import StringUtils
 from .system_utils import SystemUtils
 from .tokens import Tokens
 from .torrent import Torrent
-from .cache_manager import cacheman, TokenCache, ConfigLoadCache, CategoryLoadCache, OpenAISessionCache
+from .cache_manager import cacheman, TokenCache, ConfigLoadCache, CategoryLoadCache, OpenAISessionCache, \
+    SingleFlight, TmdbLookupFlight, get_cache_stats
 from .exception_utils import ExceptionUtils
 from .rsstitle_utils import RssTitleUtils
 from .nfo_reader import NfoReader
@@ -16,4 +17,5 @@ from .ip_utils import IpUtils
 from .image_utils import ImageUtils
 from .scheduler_utils import SchedulerUtils
 from .redis_store import RedisStore
+from .bloom_filter import BloomFilter
 from .temp_manager import TempManager, temp_manager, temp_file_context, temp_dir_context
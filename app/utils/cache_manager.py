@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import copy
 import time
 import threading
 import functools
@@ -6,7 +7,27 @@ import functools
 from cacheout import CacheManager, LRUCache, Cache
 
 CACHES = {
-    "tmdb_supply": {'maxsize': 500}  # 增加缓存大小
+    # 辅助识别关键字
+    "tmdb_supply": {'maxsize': 500, 'enable_stats': True},
+    # 索引器搜索结果的媒体识别
+    "indexer_media_ident": {'maxsize': 5000, 'ttl': 6 * 3600, 'enable_stats': True},
+    # WEB/消息搜索关键字的媒体识别
+    "search_media_ident": {'maxsize': 500, 'ttl': 6 * 3600, 'enable_stats': True},
+    # 消息交互中待用户选择的媒体列表
+    "search_media_choose": {'maxsize': 200, 'ttl': 3600, 'enable_stats': True},
+    # 消息交互中的搜索结果分页
+    "search_media_page": {'maxsize': 200, 'ttl': 3600, 'enable_stats': True},
+    # 识别词处理结果，识别词变化时清空
+    "words_process": {'maxsize': 5000, 'enable_stats': True},
+}
+
+CACHE_NAMES = {
+    "tmdb_supply": "辅助识别关键字",
+    "indexer_media_ident": "索引器识别结果",
+    "search_media_ident": "搜索关键字识别结果",
+    "search_media_choose": "消息搜索媒体选择",
+    "search_media_page": "消息搜索结果分页",
+    "words_process": "识别词处理结果",
 }
 
 cacheman = CacheManager(CACHES, cache_class=LRUCache)
@@ -25,6 +46,27 @@ SearchResultCache = Cache(maxsize=500, ttl=1800, timer=time.time, default=None)
 SiteInfoCache = Cache(maxsize=100, ttl=300, timer=time.time, default=None)  # 站点信息缓存
 
 
+def get_cache_stats():
+    """
+    获取各缓存的容量及命中、未命中、淘汰统计
+    """
+    ret_stats = []
+    for name, cache in cacheman:
+        stats = cache.stats.info()
+        ret_stats.append({
+            "name": name,
+            "desc": CACHE_NAMES.get(name) or name,
+            "size": cache.size(),
+            "maxsize": cache.maxsize,
+            "ttl": cache.ttl,
+            "hits": stats.hit_count,
+            "misses": stats.miss_count,
+            "evictions": stats.eviction_count,
+            "hit_rate": round(stats.hit_rate * 100, 1)
+        })
+    return ret_stats
+
+
 def cached(cache_instance, key_func=None):
     """
     装饰器：为函数添加缓存功能
@@ -93,3 +135,68 @@ def cached_with_lock(cache_instance, lock=None):
         
         return wrapper
     return decorator
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个key同时只执行一次，其余调用方等待并共享结果，
+    未找到的空结果（{}、[]等）在短时间内缓存，避免反复查询不存在的内容；
+    None表示查询出错，与异常一样不缓存
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, negative_ttl=120, negative_maxsize=2000):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._negative = Cache(maxsize=negative_maxsize, ttl=negative_ttl, timer=time.time, default=None)
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行函数，相同key的并发调用只执行一次
+        :param key: 请求的唯一标识，需可哈希
+        :param func: 实际执行的函数
+        :return: 函数结果，等待方拿到的是结果的副本
+        """
+        negative = self._negative.get(key)
+        if negative is not None:
+            return copy.copy(negative[0])
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+        try:
+            call.result = func(*args, **kwargs)
+            if call.result is not None and not call.result:
+                self._negative.set(key, (call.result,))
+            return call.result
+        except Exception as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def forget(self, key=None):
+        """
+        清除空结果缓存
+        """
+        if key is None:
+            self._negative.clear()
+        else:
+            self._negative.delete(key)
+
+
+# TMDB查询请求合并
+TmdbLookupFlight = SingleFlight(negative_ttl=120)
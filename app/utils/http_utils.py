@@ -211,8 +211,8 @@ class RequestUtils:
                 # 检查返回的内容是否为空字符串
                 if response.text.strip() == "" and response.status_code not in [301, 302]:
                     log.debug(f"Attempt {attempt + 1} returned an empty string.")
-                    # 对于成功的状态码（2xx），即使响应体为空也返回响应对象
-                    if 200 <= response.status_code < 300:
+                    # 对于成功的状态码（2xx）及未修改（304），即使响应体为空也返回响应对象
+                    if 200 <= response.status_code < 300 or response.status_code == 304:
                         return response
                     if attempt + 1 < retries:
                         time.sleep(2)  # 重试前等待2秒
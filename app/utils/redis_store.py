@@ -17,6 +17,12 @@ class RedisStore:
         """获取键值"""
         return self.client.get(key)
 
+    def mget(self, *keys: str) -> List[Optional[Any]]:
+        """批量获取键值"""
+        if not keys:
+            return []
+        return self.client.mget(keys)
+
     def hset(self, name: str, key: str, value: Any) -> None:
         """设置哈希字段"""
         if isinstance(value, (dict, list)):
@@ -83,3 +89,34 @@ class RedisStore:
             >=0: 剩余生存时间(秒)
         """
         return self.client.ttl(key)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        """自增计数"""
+        return self.client.incr(key, amount)
+
+    def zadd(self, name: str, mapping: dict) -> None:
+        """有序集合添加成员，mapping为 成员 -> 分数"""
+        self.client.zadd(name, mapping)
+
+    def zremrangebyscore(self, name: str, min_score: float, max_score: float) -> int:
+        """按分数范围删除有序集合成员"""
+        return self.client.zremrangebyscore(name, min_score, max_score)
+
+    def zscan_iter(self, name: str, count: int = 500):
+        """增量遍历有序集合成员，不阻塞Redis"""
+        for member, _ in self.client.zscan_iter(name, count=count):
+            yield member.decode('utf-8') if isinstance(member, bytes) else member
+
+    def scan_iter(self, pattern: str, count: int = 500):
+        """增量遍历匹配模式的键，替代会阻塞Redis的KEYS"""
+        for key in self.client.scan_iter(match=pattern, count=count):
+            yield key.decode('utf-8') if isinstance(key, bytes) else key
+
+    def unlink(self, *keys: str) -> None:
+        """异步删除键"""
+        if keys:
+            self.client.unlink(*keys)
+
+    def eval(self, script: str, keys: List[str], args: List[Any]) -> Any:
+        """执行Lua脚本，脚本内的操作是原子的"""
+        return self.client.eval(script, len(keys), *keys, *args)
@@ -1,4 +1,5 @@
 import datetime
+import errno
 import os
 import platform
 import shutil
@@ -13,6 +14,13 @@ from config import WEBDRIVER_PATH
 
 
 class SystemUtils:
+    # 内核复制每次提交的数据量，同时也是进度回调的粒度
+    _COPY_CHUNK_SIZE = 64 * 1024 * 1024
+    # 普通读写的缓冲区大小
+    _COPY_BUFFER_SIZE = 1024 * 1024
+    # 内核复制不可用时降级的错误码
+    _COPY_FALLBACK_ERRNOS = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                             errno.ENOTSUP, errno.ENOTSOCK, errno.EBADF, errno.EPERM)
 
     @staticmethod
     def __get_hidden_shell():
@@ -109,27 +117,94 @@ class SystemUtils:
             return WEBDRIVER_PATH.get(SystemUtils.get_system().value)
 
     @staticmethod
-    def copy(src, dest):
+    def copy(src, dest, callback=None):
         """
         复制
+        :param callback: 进度回调，参数为已复制字节数、文件总大小
         """
         try:
-            shutil.copy2(os.path.normpath(src), os.path.normpath(dest))
+            SystemUtils.copy_file(os.path.normpath(src), os.path.normpath(dest), callback=callback)
             return 0, ""
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
             return -1, str(err)
 
     @staticmethod
-    def move(src, dest):
+    def copy_file(src, dest, callback=None):
+        """
+        复制文件内容及属性，与shutil.copy2相同，但优先由内核完成数据复制（copy_file_range/sendfile），
+        数据不经过用户态，支持的文件系统上还可直接使用reflink或服务端复制
+        :param callback: 进度回调，参数为已复制字节数、文件总大小
+        :return: 目的文件路径
+        """
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, os.path.basename(src))
+        if os.path.exists(dest) and os.path.samefile(src, dest):
+            raise shutil.SameFileError("%s 和 %s 是同一个文件" % (src, dest))
+        with open(src, "rb") as fsrc, open(dest, "wb") as fdst:
+            SystemUtils.__copy_data(fsrc, fdst, os.fstat(fsrc.fileno()).st_size, callback)
+        shutil.copystat(src, dest)
+        return dest
+
+    @staticmethod
+    def __copy_data(fsrc, fdst, total, callback=None):
+        """
+        复制文件数据，依次尝试copy_file_range、sendfile，都不支持时使用普通读写
+        """
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        if hasattr(os, "copy_file_range"):
+            method = "copy_file_range"
+        elif hasattr(os, "sendfile") and not SystemUtils.is_windows():
+            method = "sendfile"
+        else:
+            method = None
+        copied = 0
+        while method and copied < total:
+            count = min(SystemUtils._COPY_CHUNK_SIZE, total - copied)
+            try:
+                if method == "copy_file_range":
+                    sent = os.copy_file_range(infd, outfd, count, copied, copied)
+                else:
+                    sent = os.sendfile(outfd, infd, copied, count)
+            except OSError as err:
+                # 文件系统或平台不支持时，在开始复制前降级
+                if copied or err.errno not in SystemUtils._COPY_FALLBACK_ERRNOS:
+                    raise
+                sent = 0
+            if not sent:
+                if copied:
+                    # 源文件被截断
+                    break
+                method = "sendfile" if method == "copy_file_range" and hasattr(os, "sendfile") else None
+                continue
+            copied += sent
+            if callback:
+                callback(copied, total)
+        if method:
+            return copied
+        # 普通读写
+        while True:
+            buf = fsrc.read(SystemUtils._COPY_BUFFER_SIZE)
+            if not buf:
+                break
+            fdst.write(buf)
+            copied += len(buf)
+            if callback:
+                callback(copied, total)
+        return copied
+
+    @staticmethod
+    def move(src, dest, callback=None):
         """
         移动
+        :param callback: 跨文件系统移动时的复制进度回调，参数为已复制字节数、文件总大小
         """
         try:
             tmp_file = os.path.normpath(os.path.join(os.path.dirname(src),
                                                      os.path.basename(dest)))
             shutil.move(os.path.normpath(src), tmp_file)
-            shutil.move(tmp_file, os.path.normpath(dest))
+            shutil.move(tmp_file, os.path.normpath(dest),
+                        copy_function=lambda s, d: SystemUtils.copy_file(s, d, callback=callback))
             return 0, ""
         except Exception as err:
             ExceptionUtils.exception_traceback(err)
@@ -321,6 +396,25 @@ class SystemUtils:
             return 0.0
         return psutil.disk_usage(path).total / 1024 / 1024 / 1024
 
+    @staticmethod
+    def get_fstype(path):
+        """
+        获取指定路径所在挂载点的文件系统类型
+        """
+        path = os.path.realpath(path)
+        fstype, mount_len = "", -1
+        try:
+            partitions = psutil.disk_partitions(all=True)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            return ""
+        for partition in partitions:
+            mountpoint = partition.mountpoint
+            if len(mountpoint) > mount_len and (path == mountpoint
+                                                or path.startswith(mountpoint.rstrip(os.sep) + os.sep)):
+                fstype, mount_len = partition.fstype, len(mountpoint)
+        return fstype.lower()
+
     @staticmethod
     def calculate_space_usage(dir_list):
         """
@@ -1,93 +1,240 @@
+import json
+import time
+from enum import Enum
+from typing import Optional, Any, Tuple
+
+import redis
+
 import log
-import pickle
-from typing import Optional, Dict, Any
 from app.utils.redis_store import RedisStore
 from app.utils.types import MediaType
 
+
 class TMDBCache:
+    """
+    TMDB识别缓存，分为两部分：
+    - 名称索引：名称+年份+类型 -> TMDBID，同一部影视的不同种子名共用一份详情
+    - 详情条目：每个TMDBID+语言一条紧凑的JSON
+    键名带有结构版本和代数，清空缓存时只需代数加一，旧键自然过期，再后台按集合增量删除
+    登记键的集合为有序集合，分数为键的过期时间，每次写入时剔除已过期的成员，集合不会无限增长
+    """
+    # 缓存结构版本，结构变化时递增
+    _SCHEMA = 3
+    # 当前代数
+    _GENERATION_KEY = "tmdb:cache:generation"
+    # 代数在本地的缓存时间（秒）
+    _GENERATION_TTL = 10
+    # 未识别结果的缓存时间（秒）
+    NEGATIVE_TTL = 3600
+    # 键登记集合的有效期（秒），需大于条目的最长有效期，集合不再写入后自然过期
+    _TRACK_TTL = 13 * 3600
+
+    _generation = None
+    _generation_time = 0
+
     def __init__(self):
         self.redis = RedisStore()
 
-    def get_tmdb_info(self, mtype: MediaType, tmdbid: str, language: str = None) -> Optional[Any]:
-        """从缓存获取TMDB信息，支持字典和对象"""
-        if mtype == MediaType.ANIME:
-            mtype = MediaType.TV
-        cache_key = f"tmdb:{mtype.value}:{tmdbid}:{language or 'default'}"
-        cached = self.redis.get(cache_key)
-        if cached:
+    def __get_generation(self) -> int:
+        """
+        获取当前缓存代数，本地短暂缓存以减少Redis访问
+        """
+        now = time.time()
+        if TMDBCache._generation is None or now - TMDBCache._generation_time > self._GENERATION_TTL:
             try:
-                result = pickle.loads(cached)
-                log.debug(f"从Redis缓存命中TMDB信息: {cache_key}")
-                return result
-            except:
-                log.debug(f"从Redis缓存命中TMDB信息(原始值): {cache_key}")
-                return cached
-        return None
+                generation = self.redis.get(self._GENERATION_KEY)
+                TMDBCache._generation = int(generation) if generation else 0
+            except redis.RedisError as err:
+                log.debug(f"读取TMDB缓存代数失败: {str(err)}")
+                TMDBCache._generation = TMDBCache._generation or 0
+            TMDBCache._generation_time = now
+        return TMDBCache._generation
 
-    def set_tmdb_info(self, mtype: MediaType, tmdbid: str, info: Any, 
-                     language: str = None, ttl: int = 3600) -> None:
-        """缓存TMDB信息，支持字典和对象，默认1小时"""
-        if mtype == MediaType.ANIME:
-            mtype = MediaType.TV
+    def __prefix(self, generation: int = None) -> str:
+        if generation is None:
+            generation = self.__get_generation()
+        return f"tmdb:s{self._SCHEMA}:g{generation}"
+
+    def __keyset(self, generation: int = None) -> str:
+        """
+        记录某一代所有键的集合，用于清空
+        """
+        return f"{self.__prefix(generation)}:keys"
 
-        cache_key = f"tmdb:{mtype.value}:{tmdbid}:{language or 'default'}"
-        # 其他类型则序列化存储
-        value = pickle.dumps(info)
-        self.redis.set(cache_key, value, ex=ttl)
-        log.debug(f"已缓存TMDB信息到Redis: {cache_key}")
+    def __refs_key(self, tmdbid) -> str:
+        """
+        记录某个TMDBID相关键的集合，用于按TMDBID删除
+        """
+        return f"{self.__prefix()}:refs:{tmdbid}"
 
-    def get_media_info(self, title: str, year: str = None, 
-                      mtype: MediaType = None) -> Optional[Any]:
-        """从缓存获取媒体信息，支持字典和对象"""
+    @staticmethod
+    def __normalize_type(mtype: MediaType) -> MediaType:
+        if not mtype:
+            return MediaType.UNKNOWN
         if mtype == MediaType.ANIME:
-            mtype = MediaType.TV
-        cache_key = self._get_media_cache_key(title, year, mtype)
-        cached = self.redis.get(cache_key)
-        if cached:
-            try:
-                # 尝试反序列化对象
-                result = pickle.loads(cached)
-                log.debug(f"从Redis缓存命中媒体信息: {cache_key}")
-                return result
-            except:
-                # 如果反序列化失败，直接返回原始值(兼容旧字典数据)
-                log.debug(f"从Redis缓存命中媒体信息(原始值): {cache_key}")
-                return cached
+            return MediaType.TV
+        return mtype
+
+    def __info_key(self, mtype: MediaType, tmdbid, language: str = None) -> str:
+        return f"{self.__prefix()}:info:{self.__normalize_type(mtype).name}:{tmdbid}:{language or 'default'}"
+
+    def __title_key(self, title: str, year: str = None, mtype: MediaType = None) -> str:
+        title = " ".join(str(title).split()).lower()
+        mtype = mtype.name if mtype else "ALL"
+        return f"{self.__prefix()}:title:{mtype}:{year or ''}:{title}"
+
+    @staticmethod
+    def __json_default(obj):
+        if isinstance(obj, Enum):
+            return obj.value
+        if hasattr(obj, "__dict__"):
+            return obj.__dict__
+        raise TypeError(f"{type(obj)} 无法序列化")
+
+    def __dumps(self, info: Any) -> str:
+        return json.dumps(info, default=self.__json_default, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def __loads(value) -> Optional[Any]:
+        from app.media.tmdbv3api.as_obj import AsObj
+        info = json.loads(value, object_hook=lambda entries: AsObj(**entries))
+        media_type = info.get("media_type")
+        if media_type in [MediaType.MOVIE.value, MediaType.TV.value, MediaType.ANIME.value]:
+            info["media_type"] = MediaType(media_type)
+        return info
+
+    def __track(self, tmdbid, ttl: int, *keys: str) -> None:
+        """
+        登记键到代数集合和TMDBID集合，分数为键的过期时间，同时剔除已过期的成员
+        :param ttl: 键的有效期（秒）
+        """
+        now = time.time()
+        members = {key: now + ttl for key in keys}
+        keyset = self.__keyset()
+        if tmdbid:
+            refs_key = self.__refs_key(tmdbid)
+            self.redis.zadd(refs_key, members)
+            self.redis.zremrangebyscore(refs_key, "-inf", now)
+            self.redis.expire(refs_key, self._TRACK_TTL)
+            members[refs_key] = now + self._TRACK_TTL
+        self.redis.zadd(keyset, members)
+        self.redis.zremrangebyscore(keyset, "-inf", now)
+        self.redis.expire(keyset, self._TRACK_TTL)
+
+    def get_tmdb_info(self, mtype: MediaType, tmdbid: str, language: str = None) -> Optional[Any]:
+        """从缓存获取TMDB详情"""
+        if not tmdbid:
+            return None
+        cache_key = self.__info_key(mtype, tmdbid, language)
+        try:
+            cached = self.redis.get(cache_key)
+            if cached:
+                log.debug(f"从Redis缓存命中TMDB信息: {cache_key}")
+                return self.__loads(cached)
+        except (redis.RedisError, ValueError) as err:
+            log.debug(f"读取TMDB缓存失败 {cache_key}: {str(err)}")
         return None
 
-    def set_media_info(self, title: str, info: Any, 
-                      year: str = None, mtype: MediaType = None, 
-                      ttl: int = 3600*12) -> None:
-        """缓存媒体信息，支持字典和对象，默认1小时"""
-        if mtype == MediaType.ANIME:
-            mtype = MediaType.TV
-        cache_key = self._get_media_cache_key(title, year, mtype)
-        value = pickle.dumps(info)
-        self.redis.set(cache_key, value, ex=ttl)
-        log.debug(f"已缓存媒体信息到Redis: {cache_key}")
-
-    def _get_media_cache_key(self, title: str, year: str = None, 
-                           mtype: MediaType = None) -> str:
-        """生成媒体信息缓存键"""
-        parts = ["media", title]
-        if year:
-            parts.append(year)
-        if mtype:
-            parts.append(mtype.value)
-        return ":".join(parts)
+    def set_tmdb_info(self, mtype: MediaType, tmdbid: str, info: Any,
+                      language: str = None, ttl: int = 3600) -> None:
+        """缓存TMDB详情，默认1小时"""
+        if not tmdbid or not info:
+            return
+        cache_key = self.__info_key(mtype, tmdbid, language)
+        try:
+            self.redis.set(cache_key, self.__dumps(info), ex=ttl)
+            self.__track(tmdbid, ttl, cache_key)
+            log.debug(f"已缓存TMDB信息到Redis: {cache_key}")
+        except (redis.RedisError, TypeError) as err:
+            log.debug(f"写入TMDB缓存失败 {cache_key}: {str(err)}")
+
+    def get_media_info(self, title: str, year: str = None,
+                       mtype: MediaType = None) -> Optional[Tuple[Any, Optional[MediaType]]]:
+        """
+        从名称索引获取识别结果
+        :return: 未缓存时返回None，否则返回(TMDBID, 媒体类型)，未识别到时TMDBID为0
+        """
+        cache_key = self.__title_key(title, year, self.__normalize_type(mtype) if mtype else None)
+        try:
+            cached = self.redis.get(cache_key)
+            if not cached:
+                return None
+            entry = json.loads(cached)
+            log.debug(f"从Redis缓存命中媒体信息: {cache_key}")
+            return entry.get("id") or 0, MediaType(entry.get("type")) if entry.get("type") else None
+        except (redis.RedisError, ValueError) as err:
+            log.debug(f"读取媒体索引缓存失败 {cache_key}: {str(err)}")
+        return None
+
+    def set_media_info(self, title: str, tmdbid=None, media_type: MediaType = None,
+                       year: str = None, mtype: MediaType = None,
+                       info: Any = None, language: str = None,
+                       ttl: int = 3600 * 12) -> None:
+        """
+        缓存名称识别结果，名称索引只保存TMDBID，详情单独按TMDBID保存
+        :param title: 识别出的名称
+        :param tmdbid: 识别到的TMDBID，为空时按未识别缓存较短时间
+        :param media_type: 识别到的媒体类型
+        :param year: 年份
+        :param mtype: 识别时使用的类型
+        :param info: TMDB详情，有值时一并保存
+        :param language: 详情的语言
+        """
+        cache_key = self.__title_key(title, year, self.__normalize_type(mtype) if mtype else None)
+        entry = {"id": tmdbid or 0, "type": media_type.value if tmdbid and media_type else None}
+        try:
+            expire = ttl if tmdbid else min(ttl, self.NEGATIVE_TTL)
+            self.redis.set(cache_key, json.dumps(entry), ex=expire)
+            self.__track(tmdbid, expire, cache_key)
+            log.debug(f"已缓存媒体信息到Redis: {cache_key}")
+        except redis.RedisError as err:
+            log.debug(f"写入媒体索引缓存失败 {cache_key}: {str(err)}")
+            return
+        if tmdbid and info:
+            self.set_tmdb_info(media_type, tmdbid, info, language, ttl=ttl)
 
     def clear_tmdb_cache(self, tmdbid: str) -> None:
         """清除指定TMDB ID的所有缓存"""
-        pattern = f"tmdb:*:{tmdbid}:*"
-        keys = self.redis.keys(pattern)
-        if keys:
-            self.redis.delete(*keys)
+        refs_key = self.__refs_key(tmdbid)
+        try:
+            self.__delete_members(refs_key)
             log.debug(f"已清除TMDB ID {tmdbid} 的所有缓存")
+        except redis.RedisError as err:
+            log.debug(f"清除TMDB缓存失败 {tmdbid}: {str(err)}")
 
     def clear_media_cache(self, title: str) -> None:
-        """清除指定标题的所有媒体缓存"""
-        pattern = f"media:{title}:*"
-        keys = self.redis.keys(pattern)
-        if keys:
-            self.redis.delete(*keys)
+        """清除指定名称的所有媒体索引"""
+        title = " ".join(str(title).split()).lower()
+        try:
+            keys = [key for key in self.redis.scan_iter(f"{self.__prefix()}:title:*")
+                    if key.endswith(f":{title}")]
+            self.redis.unlink(*keys)
             log.debug(f"已清除标题 {title} 的所有媒体缓存")
+        except redis.RedisError as err:
+            log.debug(f"清除媒体缓存失败 {title}: {str(err)}")
+
+    def clear_all(self) -> None:
+        """
+        清空全部TMDB缓存：代数加一使旧键立即失效，再增量删除旧代的键
+        """
+        try:
+            generation = self.__get_generation()
+            TMDBCache._generation = self.redis.incr(self._GENERATION_KEY)
+            TMDBCache._generation_time = time.time()
+            self.__delete_members(self.__keyset(generation))
+            log.info("【Meta】TMDB缓存已清空")
+        except redis.RedisError as err:
+            log.error(f"【Meta】清空TMDB缓存失败：{str(err)}")
+
+    def __delete_members(self, set_key: str, batch: int = 500) -> None:
+        """
+        分批删除集合中登记的键及集合本身
+        """
+        keys = []
+        for key in self.redis.zscan_iter(set_key, count=batch):
+            keys.append(key)
+            if len(keys) >= batch:
+                self.redis.unlink(*keys)
+                keys = []
+        keys.append(set_key)
+        self.redis.unlink(*keys)
@@ -2,6 +2,9 @@ import re
 
 from config import SPLIT_CHARS
 
+_LEADING_DECIMAL_RE = re.compile(r'^\d+\.\d+')
+_SPLIT_RE = re.compile(r'%s' % SPLIT_CHARS)
+
 
 class Tokens:
     _text = ""
@@ -14,8 +17,8 @@ class Tokens:
         self.load_text(text)
 
     def load_text(self, text):
-        processed_text = re.sub(r'^\d+\.\d+', lambda x: x.group().replace('.', '@@'), text)
-        splited_text = re.split(r'%s' % SPLIT_CHARS, processed_text)
+        processed_text = _LEADING_DECIMAL_RE.sub(lambda x: x.group().replace('.', '@@'), text)
+        splited_text = _SPLIT_RE.split(processed_text)
         for sub_text in splited_text:
             if sub_text:
                 sub_text = sub_text.replace('@@', '.')
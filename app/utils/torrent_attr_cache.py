@@ -0,0 +1,86 @@
+import json
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import redis
+
+import log
+from app.utils.redis_store import RedisStore
+
+
+class TorrentAttrCache:
+    """
+    种子详情属性缓存（免费、2X免费、HR、做种人数等），按种子详情页地址保存在Redis中，重启后仍有效
+    每条记录有新鲜期：免费种子的促销会到期，新鲜期较短；过了新鲜期的记录仍保留一段时间，刷新受限时可继续使用
+    详情页获取失败的属性标记为unknown，只短时间缓存，避免每轮重复请求又不长期沿用默认值
+    """
+    _PREFIX = "brush:attr:v1"
+    # 免费种子的新鲜期（秒）
+    FREE_TTL = 1800
+    # 非免费种子的新鲜期（秒）
+    ATTR_TTL = 6 * 3600
+    # 获取失败的属性的新鲜期（秒）
+    UNKNOWN_TTL = 300
+    # 记录在Redis中的保存时间（秒）
+    STALE_TTL = 3 * 24 * 3600
+
+    def __init__(self):
+        self.redis = RedisStore()
+
+    def __key(self, torrent_url: str) -> str:
+        return f"{self._PREFIX}:{torrent_url}"
+
+    def get_attrs(self, torrent_urls: Iterable[str]) -> Dict[str, Tuple[dict, bool]]:
+        """
+        批量读取种子属性
+        :param torrent_urls: 种子详情页地址列表
+        :return: {详情页地址: (属性, 是否在新鲜期内)}，未缓存的地址不返回
+        """
+        torrent_urls = [url for url in dict.fromkeys(torrent_urls) if url]
+        if not torrent_urls:
+            return {}
+        try:
+            values = self.redis.mget(*[self.__key(url) for url in torrent_urls])
+        except redis.RedisError as err:
+            log.debug(f"读取种子属性缓存失败: {str(err)}")
+            return {}
+        now = time.time()
+        ret_attrs = {}
+        for url, value in zip(torrent_urls, values):
+            if not value:
+                continue
+            try:
+                entry = json.loads(value)
+            except ValueError:
+                continue
+            ret_attrs[url] = (entry.get("attr") or {}, now < (entry.get("expire") or 0))
+        return ret_attrs
+
+    def get_attr(self, torrent_url: str) -> Optional[dict]:
+        """
+        读取新鲜期内的种子属性
+        """
+        attr, fresh = self.get_attrs([torrent_url]).get(torrent_url, (None, False))
+        return attr if fresh else None
+
+    def set_attr(self, torrent_url: str, attr: dict, ttl: int = None) -> None:
+        """
+        保存种子属性
+        :param ttl: 新鲜期（秒），为空时按是否获取成功、是否免费决定
+        """
+        if not torrent_url or attr is None:
+            return
+        if ttl is None:
+            if attr.get("unknown"):
+                ttl = self.UNKNOWN_TTL
+            elif attr.get("free") or attr.get("2xfree"):
+                ttl = self.FREE_TTL
+            else:
+                ttl = self.ATTR_TTL
+        entry = {"attr": attr, "expire": time.time() + ttl}
+        try:
+            self.redis.set(self.__key(torrent_url),
+                           json.dumps(entry, ensure_ascii=False, separators=(",", ":")),
+                           ex=max(self.STALE_TTL, ttl))
+        except (redis.RedisError, TypeError) as err:
+            log.debug(f"写入种子属性缓存失败 {torrent_url}: {str(err)}")
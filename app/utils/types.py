@@ -164,6 +164,20 @@ class EventType(Enum):
     WeworkLogin = "wework.login"
 
 
+# 下载器种子变化类型
+class TorrentChangeType(Enum):
+    # 新增种子
+    Added = "added"
+    # 下载完成
+    Completed = "completed"
+    # 状态变化
+    StateChanged = "state_changed"
+    # 种子删除
+    Removed = "removed"
+    # 标签变化
+    TagsChanged = "tags_changed"
+
+
 # 系统配置Key字典
 class SystemConfigKey(Enum):
     # 同步媒体库范围
@@ -16,13 +16,24 @@ branch_labels = None
 depends_on = None
 
 
+def has_column(table_name, column_name):
+    """检查表中是否已存在指定列"""
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    columns = inspector.get_columns(table_name)
+    return any(col['name'] == column_name for col in columns)
+
+
 def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    op.add_column('MESSAGE_CLIENT', sa.Column('TEMPLATES', sa.Text(), nullable=True))
+    # 每次启动都会从头执行升级，已存在时跳过
+    if not has_column('MESSAGE_CLIENT', 'TEMPLATES'):
+        op.add_column('MESSAGE_CLIENT', sa.Column('TEMPLATES', sa.Text(), nullable=True))
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_column('MESSAGE_CLIENT', 'TEMPLATES')
+    if has_column('MESSAGE_CLIENT', 'TEMPLATES'):
+        op.drop_column('MESSAGE_CLIENT', 'TEMPLATES')
     # ### end Alembic commands ###
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+名称识别性能基准
+使用 tests/cases/meta_cases.py 中的用例，统计每秒识别的标题数，并校验识别结果与用例期望一致
+运行：python -m tests.benchmark_meta [轮数]
+"""
+import sys
+import time
+
+from app.media.meta import MetaInfo, MetaVideo
+from tests.cases.meta_cases import meta_cases
+
+
+def build_target(meta_info):
+    """
+    提取与用例期望对比的识别结果
+    """
+    return {
+        "type": meta_info.type.value,
+        "cn_name": meta_info.cn_name or "",
+        "en_name": meta_info.en_name or "",
+        "year": meta_info.year or "",
+        "part": meta_info.part or "",
+        "season": meta_info.get_season_string(),
+        "episode": meta_info.get_episode_string(),
+        "restype": meta_info.get_edtion_string(),
+        "pix": meta_info.resource_pix or "",
+        "video_codec": meta_info.video_encode or "",
+        "audio_codec": meta_info.audio_encode or ""
+    }
+
+
+def run_benchmark(rounds=5, parser=MetaInfo):
+    """
+    运行基准测试
+    :param rounds: 用例重复识别的轮数
+    :param parser: 计时的识别入口，MetaInfo包含识别词、动漫识别等完整流程，MetaVideo只计名称解析
+    :return: 识别标题数, 耗时(秒), 每秒标题数, 结果不一致的用例列表
+    """
+    cases = [case for case in meta_cases if case.get("title")]
+    mismatches = []
+    # 先校验结果，同时预热
+    for case in cases:
+        target = build_target(MetaInfo(title=case.get("title"), subtitle=case.get("subtitle")))
+        if target != case.get("target"):
+            mismatches.append({"title": case.get("title"), "expect": case.get("target"), "actual": target})
+    count = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for case in cases:
+            parser(case.get("title"), case.get("subtitle"))
+            count += 1
+    elapsed = time.perf_counter() - start
+    return count, elapsed, count / elapsed if elapsed else 0, mismatches
+
+
+if __name__ == '__main__':
+    _rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for _parser in [MetaInfo, MetaVideo]:
+        _count, _elapsed, _speed, _mismatches = run_benchmark(_rounds, _parser)
+        print(f"{_parser.__name__}：识别 {_count} 个标题，耗时 {_elapsed:.2f} 秒，{_speed:.0f} 个/秒")
+    for _mismatch in _mismatches:
+        print(f"结果不一致：{_mismatch.get('title')}\n  期望：{_mismatch.get('expect')}\n  实际：{_mismatch.get('actual')}")
+    print(f"结果不一致的用例：{len(_mismatches)} 个")
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+测试刷流种子属性缓存及批量刷新
+"""
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.brushtask import BrushTask
+from app.utils.torrent_attr_cache import TorrentAttrCache
+
+
+class FakeRedisStore:
+    """内存版RedisStore，仅实现缓存用到的方法"""
+
+    def __init__(self):
+        self.data = {}
+
+    def mget(self, *keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class FakeSiteConf:
+
+    def __init__(self):
+        self.requests = []
+        self.failed = False
+
+    def check_torrent_attr(self, torrent_url, cookie, ua=None, headers=None, proxy=False, cached=True):
+        self.requests.append(torrent_url)
+        if self.failed:
+            return {"free": False, "2xfree": False, "hr": False, "peer_count": 0, "pubdate": None, "unknown": True}
+        return {"free": True, "2xfree": False, "hr": False, "peer_count": 1, "pubdate": None}
+
+
+class FakeSites:
+
+    def __init__(self, limited=False):
+        self.limited = limited
+
+    def check_ratelimit(self, site_id):
+        return self.limited
+
+
+SITE_INFO = {"id": 1, "name": "test", "rssurl": "https://pt.example.org/torrentrss.php", "ua": "ua"}
+
+
+def _enclosure(tid):
+    return f"https://pt.example.org/download.php?id={tid}&passkey=x"
+
+
+@pytest.fixture
+def brushtask():
+    with patch("app.utils.torrent_attr_cache.RedisStore", FakeRedisStore):
+        task = BrushTask.__new__(BrushTask)
+        task.attr_cache = TorrentAttrCache()
+        task.siteconf = FakeSiteConf()
+        task.sites = FakeSites()
+        yield task
+
+
+class TestBrushTorrentAttr:
+
+    def test_cache_hit(self, brushtask):
+        enclosures = [_enclosure(i) for i in range(3)]
+        attrs = brushtask.get_torrent_attrs(SITE_INFO, enclosures + [None, enclosures[0]])
+        assert len(brushtask.siteconf.requests) == 3
+        assert set(attrs) == set(enclosures)
+        assert attrs[enclosures[0]][1]["free"]
+        # 新鲜期内不再请求详情页
+        brushtask.get_torrent_attrs(SITE_INFO, enclosures)
+        brushtask.get_torrent_attr(SITE_INFO, enclosures[1])
+        assert len(brushtask.siteconf.requests) == 3
+
+    def test_stale_refresh_limited(self, brushtask):
+        enclosures = [_enclosure(i) for i in range(5)]
+        brushtask.get_torrent_attrs(SITE_INFO, enclosures[:4])
+        # 全部过期
+        for key, value in brushtask.attr_cache.redis.data.items():
+            entry = json.loads(value)
+            entry["expire"] = 0
+            brushtask.attr_cache.redis.data[key] = json.dumps(entry)
+        brushtask.siteconf.requests = []
+        brushtask._attr_refresh_limit = 2
+        attrs = brushtask.get_torrent_attrs(SITE_INFO, enclosures)
+        # 未缓存的总是请求，过期的只刷新2个，其余使用旧属性
+        assert len(brushtask.siteconf.requests) == 3
+        assert len(attrs) == 5
+        brushtask.sites.limited = True
+        brushtask.siteconf.requests = []
+        brushtask.get_torrent_attrs(SITE_INFO, enclosures)
+        assert brushtask.siteconf.requests == []
+
+    def test_free_ttl(self):
+        with patch("app.utils.torrent_attr_cache.RedisStore", FakeRedisStore):
+            cache = TorrentAttrCache()
+            cache.set_attr("https://a/details.php?id=1", {"free": True})
+            cache.set_attr("https://a/details.php?id=2", {"free": False})
+        expires = {k: json.loads(v)["expire"] for k, v in cache.redis.data.items()}
+        free_expire, normal_expire = expires.values()
+        assert normal_expire - free_expire == pytest.approx(TorrentAttrCache.ATTR_TTL - TorrentAttrCache.FREE_TTL, abs=5)
+
+    def test_failed_fetch(self, brushtask):
+        enclosures = [_enclosure(i) for i in range(2)]
+        brushtask.get_torrent_attrs(SITE_INFO, enclosures[:1])
+        for key, value in brushtask.attr_cache.redis.data.items():
+            entry = json.loads(value)
+            entry["expire"] = 0
+            brushtask.attr_cache.redis.data[key] = json.dumps(entry)
+        brushtask.siteconf.failed = True
+        attrs = brushtask.get_torrent_attrs(SITE_INFO, enclosures)
+        # 刷新失败时继续使用旧属性，仍为过期状态，下一轮再刷新
+        assert attrs[enclosures[0]][1]["free"]
+        assert not attrs[enclosures[1]][1]["free"] and attrs[enclosures[1]][1]["unknown"]
+        cached = brushtask.attr_cache.get_attrs([attrs[enclosure][0] for enclosure in enclosures])
+        old_attr, old_fresh = cached[attrs[enclosures[0]][0]]
+        assert old_attr["free"] and not old_fresh
+        # 从未获取成功的只短时间缓存
+        new_expire = json.loads(brushtask.attr_cache.redis.data[
+            f"{TorrentAttrCache._PREFIX}:{attrs[enclosures[1]][0]}"])["expire"]
+        assert new_expire - time.time() <= TorrentAttrCache.UNKNOWN_TTL
+        # 属性未知时不按免费状态、HR删种停种
+        remove_rule = {"mode": "or", "freestatus": "Y", "time": "gt#1"}
+        params = {"seeding_time": 7200, "torrent_attr": attrs[enclosures[1]][1]}
+        assert not BrushTask._BrushTask__check_remove_rule(remove_rule, params)[0]
+        assert BrushTask._BrushTask__check_remove_rule(remove_rule, {"seeding_time": 7200, "torrent_attr": {}})[0]
+        assert not BrushTask._BrushTask__check_stop_rule({"stopfree": "Y"}, attrs[enclosures[1]][1])[0]
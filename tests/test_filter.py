@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+测试过滤规则组编译与批量检查
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.filter import Filter, _FilterRuleGroup, _compile_keyword
+from app.utils.types import MediaType
+
+
+def _meta(title, size=None, mtype=MediaType.MOVIE, total_episodes=0, ul=None, dl=None):
+    return SimpleNamespace(rev_string=title, subtitle=None, size=size, type=mtype,
+                           total_episodes=total_episodes,
+                           upload_volume_factor=ul, download_volume_factor=dl)
+
+
+def _rule(pri, include="", exclude="", size="", free=""):
+    return {"pri": pri,
+            "include": include.split("\n") if include else [],
+            "exclude": exclude.split("\n") if exclude else [],
+            "size": size,
+            "free": free}
+
+
+class TestFilterRules:
+
+    def test_keyword_fast_path(self):
+        assert _compile_keyword("WEB-DL")("movie.2020.web-dl.mkv")
+        assert _compile_keyword("国语")("电影 国语")
+        assert _compile_keyword(r"2160p|4K")("Movie.4k")
+        assert not _compile_keyword("HDR")("Movie.SDR")
+
+    def test_rule_group_order_and_size(self):
+        group = _FilterRuleGroup("测试", [
+            _rule("10", include="2160p\nWEB", size="10,40"),
+            _rule("20", include="1080p", exclude="HDTV"),
+        ])
+        assert group.check(_meta("Movie.2160p.WEB-DL", size="20GB")) == (True, 90, "测试")
+        assert group.check(_meta("Movie.2160p.WEB-DL", size="60GB")) == (False, 0, "测试")
+        assert group.check(_meta("Movie.1080p.BluRay")) == (True, 80, "测试")
+        assert group.check(_meta("Movie.1080p.HDTV")) == (False, 0, "测试")
+        # 剧集按单集大小计算
+        assert group.check(_meta("Show.S01.2160p.WEB", size="200GB", mtype=MediaType.TV,
+                                 total_episodes=10)) == (True, 90, "测试")
+
+    def test_free_and_invalid_rule(self):
+        group = _FilterRuleGroup("促销", [
+            _rule("1", include="(bad"),
+            _rule("2", free="1.0 0.0"),
+        ])
+        assert group.check(_meta("Movie", ul=1.0, dl=0.0)) == (True, 98, "促销")
+        assert group.check(_meta("Movie", ul=1.0, dl=1.0)) == (False, 0, "促销")
+
+    def test_batch_and_invalidation(self):
+        _filter = Filter()
+        group = {"id": 999, "name": "批量", "default": "N", "note": None}
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(_filter, "get_rule_groups",
+                       lambda groupid=None, default=False: group if str(groupid) == "999" else {})
+            mp.setattr(_filter, "get_rules", lambda groupid, ruleid=None: [_rule("0", include="x265")])
+            _filter._rule_groups = {}
+            results = _filter.check_rules_batch([_meta("A.x265"), _meta("B.x264"), None], 999)
+            assert results == [(True, 100, "批量"), (False, 0, "批量"), (False, 0, "")]
+            assert "999" in _filter._rule_groups
+            assert _filter.check_rules_batch([_meta("A")], -1) == [(True, 0, "不过滤")]
+        _filter.init_config()
+        assert _filter._rule_groups == {}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+测试索引搜索结果的去重与识别复用
+"""
+import datetime
+from types import SimpleNamespace
+
+from app.indexer.client._base import _IIndexClient
+from app.media.meta import MetaInfo
+from app.utils import cacheman
+from app.utils.types import MediaType
+
+
+class FakeIndexClient(_IIndexClient):
+    client_id = "fake"
+    client_name = "Fake"
+
+    def match(self, ctype):
+        return False
+
+    def get_status(self):
+        return True
+
+    def get_type(self):
+        return None
+
+    def get_client_id(self):
+        return self.client_id
+
+    def get_indexers(self):
+        return []
+
+    def search(self, order_seq, indexer, key_word, filter_args: dict, match_media, in_from):
+        return []
+
+
+class FakeMedia:
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_media_info(self, title, subtitle=None, chinese=True):
+        self.calls += 1
+        media_info = MetaInfo(title=title, subtitle=subtitle)
+        if "Unknown" not in title:
+            media_info.tmdb_info = {"id": 100}
+            media_info.tmdb_id = 100
+        return media_info
+
+    @staticmethod
+    def merge_media_info(target, source):
+        return target
+
+
+class FakeFilter:
+
+    def __init__(self):
+        self.batches = []
+
+    def check_torrents_filter(self, torrents, filter_args):
+        self.batches.append(len(torrents))
+        return [(True, 50, "") for _ in torrents]
+
+    @staticmethod
+    def is_torrent_match_sey(media_info, s_num, e_num, year_str):
+        return True
+
+
+def _row(title, enclosure, size="1GB"):
+    return {"title": title, "description": "", "enclosure": enclosure, "size": size,
+            "seeders": 1, "peers": 0, "page_url": enclosure}
+
+
+class TestFilterSearchResults:
+
+    def test_dedup_and_reuse_recognition(self):
+        cacheman["indexer_media_ident"].clear()
+        client = FakeIndexClient()
+        client.media = FakeMedia()
+        client.filter = FakeFilter()
+        match_media = SimpleNamespace(imdb_id=None, tmdb_id=100, over_edition=False,
+                                      type=MediaType.MOVIE, res_order=None)
+        rows = [_row("Movie.2020.1080p.WEB-DL", "a"),
+                _row("Movie.2020.1080p.WEB-DL", "a"),
+                _row("Movie.2020.1080p.WEB-DL", "b", size="2GB"),
+                _row("Unknown.Title.2020.1080p", "c"),
+                _row("Unknown.Title.2020.1080p", "d")]
+        indexer = SimpleNamespace(name="站点", public=True)
+        results = client.filter_search_results(result_array=rows, order_seq=90, indexer=indexer,
+                                               filter_args={}, match_media=match_media,
+                                               start_time=datetime.datetime.now())
+        # 重复种子去掉，相同名称只识别一次
+        assert [r.enclosure for r in results] == ["a", "b"]
+        assert [r.size for r in results] == ["1GB", "2GB"]
+        assert client.media.calls == 2
+        # 去重后的种子一次批量检查过滤规则
+        assert client.filter.batches == [4]
+        assert results[0] is not results[1]
+        cacheman["indexer_media_ident"].clear()
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+测试媒体库内存索引
+"""
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.media.library_index import LibraryIndex
+from config import RMT_MEDIAEXT
+
+
+class FakeConfig:
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_config(self, node):
+        return {"movie_path": self.root, "tv_path": [self.root]}
+
+
+def _wait(func, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if func():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _create_index(root):
+    with patch("app.media.library_index.Config", lambda: FakeConfig(root)):
+        index = LibraryIndex.__new__(LibraryIndex)
+        index.__init__()
+    return index
+
+
+@pytest.fixture
+def library(tmp_path):
+    season_dir = tmp_path / "电视剧" / "Show (2020)" / "Season 1"
+    season_dir.mkdir(parents=True)
+    for episode in [1, 2]:
+        (season_dir / f"Show - S01E0{episode} - 第 {episode} 集.mkv").write_bytes(b"x")
+    (season_dir / "Show - S01E01 - 第 1 集.nfo").write_bytes(b"x")
+    index = _create_index(str(tmp_path))
+    assert _wait(lambda: index.is_indexed(str(tmp_path)))
+    yield index, season_dir
+    index.stop_service()
+
+
+class TestLibraryIndex:
+
+    def test_query_without_filesystem(self, library, tmp_path):
+        index, season_dir = library
+        episode_file = str(season_dir / "Show - S01E01 - 第 1 集.mkv")
+        assert index.get_episodes(str(season_dir), "Show", 1, RMT_MEDIAEXT) == {1, 2}
+        # 文件名识别结果已缓存，之后的查询不再访问文件系统
+        with patch("os.path.exists", side_effect=AssertionError), \
+                patch("os.walk", side_effect=AssertionError):
+            assert index.exists(str(season_dir))
+            assert index.exists(episode_file)
+            assert not index.exists(str(season_dir / "Show - S01E03 - 第 3 集.mkv"))
+            assert not index.exists(str(tmp_path / "电影" / "Movie (2020)"))
+            assert len(index.get_dir_files(str(tmp_path / "电视剧"), RMT_MEDIAEXT)) == 2
+            assert index.get_dir_files(episode_file, RMT_MEDIAEXT) == [episode_file]
+            assert index.get_episodes(str(season_dir), "Show", 1, RMT_MEDIAEXT) == {1, 2}
+            assert index.get_episodes(str(season_dir), "Show", 2, RMT_MEDIAEXT) == set()
+
+    def test_filesystem_events(self, library):
+        index, season_dir = library
+        new_file = season_dir / "Show - S01E03 - 第 3 集.mkv"
+        new_file.write_bytes(b"x")
+        assert _wait(lambda: index.exists(str(new_file)))
+        assert _wait(lambda: index.get_episodes(str(season_dir), "Show", 1, RMT_MEDIAEXT) == {1, 2, 3})
+        os.remove(new_file)
+        assert _wait(lambda: not index.exists(str(new_file)))
+        # 移入目录时索引其中的文件
+        other = season_dir.parent.parent.parent / "tmp"
+        other.mkdir()
+        (other / "Show - S02E01 - 第 1 集.mkv").write_bytes(b"x")
+        os.rename(other, season_dir.parent / "Season 2")
+        assert _wait(lambda: index.get_episodes(str(season_dir.parent / "Season 2"), "Show", 2, RMT_MEDIAEXT) == {1})
+
+    def test_own_writes(self, library):
+        index, season_dir = library
+        # 不经过目录监控直接登记
+        index.add_path(str(season_dir.parent / "Season 3" / "Show - S03E01 - 第 1 集.mkv"))
+        assert index.exists(str(season_dir.parent / "Season 3"))
+        index.remove_path(str(season_dir.parent / "Season 3"))
+        assert not index.exists(str(season_dir.parent / "Season 3" / "Show - S03E01 - 第 1 集.mkv"))
+
+    def test_not_indexed(self, tmp_path):
+        index = _create_index(None)
+        (tmp_path / "a.mkv").write_bytes(b"x")
+        # 不在媒体库目录下时查询文件系统
+        assert index.exists(str(tmp_path / "a.mkv"))
+        assert index.get_dir_files(str(tmp_path), RMT_MEDIAEXT) == [str(tmp_path / "a.mkv")]
+
+    def test_symlink_dir(self, tmp_path):
+        season_dir = tmp_path / "电视剧" / "Show (2020)"
+        season_dir.mkdir(parents=True)
+        target = tmp_path / "外部" / "Season 1"
+        target.mkdir(parents=True)
+        (target / "Show - S01E01 - 第 1 集.mkv").write_bytes(b"x")
+        os.symlink(target, season_dir / "Season 1")
+        index = _create_index(str(tmp_path / "电视剧"))
+        try:
+            assert _wait(lambda: index.is_indexed(str(season_dir)))
+            # 软链接的目录收不到监控事件，查询文件系统
+            link_dir = str(season_dir / "Season 1")
+            assert not index.is_indexed(link_dir)
+            (target / "Show - S01E02 - 第 2 集.mkv").write_bytes(b"x")
+            assert index.get_episodes(link_dir, "Show", 1, RMT_MEDIAEXT) == {1, 2}
+            assert index.exists(os.path.join(link_dir, "Show - S01E02 - 第 2 集.mkv"))
+            assert len(index.get_dir_files(str(season_dir), RMT_MEDIAEXT)) == 2
+            # 新建的软链接目录同样不建立索引
+            os.symlink(target, season_dir / "Season 2")
+            assert _wait(lambda: not index.is_indexed(str(season_dir / "Season 2")))
+            assert len(index.get_dir_files(str(season_dir), RMT_MEDIAEXT)) == 4
+        finally:
+            index.stop_service()
+
+    def test_network_fs(self, tmp_path):
+        index = _create_index(None)
+        index._roots = [str(tmp_path)]
+        # 网络文件系统不建立索引，直接查询文件系统
+        with patch("app.media.library_index.SystemUtils.get_fstype", return_value="fuse.rclone"):
+            index._LibraryIndex__build(index._generation, index._stop_event)
+        assert not index._observers
+        assert not index.is_indexed(str(tmp_path))
+        (tmp_path / "a.mkv").write_bytes(b"x")
+        assert index.exists(str(tmp_path / "a.mkv"))
+
+    def test_rescan(self, tmp_path):
+        season_dir = tmp_path / "Season 1"
+        season_dir.mkdir()
+        episode_file = season_dir / "Show - S01E01 - 第 1 集.mkv"
+        episode_file.write_bytes(b"x")
+        with patch.object(LibraryIndex, "_rescan_interval", 0.2):
+            index = _create_index(str(tmp_path))
+            try:
+                assert _wait(lambda: index.is_indexed(str(tmp_path)))
+                # 模拟丢失的监控事件，定时重新遍历后校正
+                index.remove_path(str(episode_file))
+                index.add_path(str(season_dir / "Show - S01E02 - 第 2 集.mkv"))
+                assert _wait(lambda: index.get_episodes(str(season_dir), "Show", 1, RMT_MEDIAEXT) == {1})
+                assert index.exists(str(episode_file))
+            finally:
+                index.stop_service()
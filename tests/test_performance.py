@@ -199,6 +199,17 @@ def test_concurrent_performance():
     assert elapsed < 10.0
 
 
+def test_meta_parse_benchmark():
+    """测试名称识别基准：预编译正则后识别结果不变"""
+    from app.media.meta import MetaVideo
+    from tests.benchmark_meta import run_benchmark
+
+    count, elapsed, speed, mismatches = run_benchmark(rounds=1, parser=MetaVideo)
+    assert count > 0
+    assert not mismatches, mismatches
+    print(f"✓ 名称解析 {speed:.0f} 个/秒")
+
+
 class TestCodeOptimizations:
     """测试代码优化"""
     
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+测试qBittorrent通过sync/maindata增量同步种子表
+"""
+from app.downloader.client.qbittorrent import Qbittorrent
+from app.entities.torrentstatus import TorrentStatus
+
+
+def _torrent(name, state="uploading", progress=1, tags="", tracker="https://tracker.a/announce"):
+    return {"name": name, "state": state, "progress": progress, "tags": tags, "tracker": tracker,
+            "trackers_count": 1, "added_on": 1, "completion_on": 2, "uploaded": 1000,
+            "time_active": 10, "total_size": 100, "save_path": "/downloads"}
+
+
+class FakeQbc:
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.rids = []
+        self.tracker_calls = []
+
+    def sync_maindata(self, rid=0):
+        self.rids.append(rid)
+        return self.responses.pop(0)
+
+    def torrents_trackers(self, torrent_hash):
+        self.tracker_calls.append(torrent_hash)
+        return [{"url": "** [DHT] **"}, {"url": f"https://tracker.{torrent_hash}/announce"}]
+
+
+def _client(responses):
+    client = Qbittorrent.__new__(Qbittorrent)
+    client.host = None
+    client.connect()
+    client.qbc = FakeQbc(responses)
+    return client
+
+
+class TestQbittorrentSync:
+
+    def test_incremental_sync(self):
+        client = _client([
+            {"rid": 1, "full_update": True,
+             "torrents": {"a": _torrent("A"), "b": _torrent("B", state="downloading", progress=0.5, tags="刷流")}},
+            {"rid": 2},
+            {"rid": 3, "torrents": {"b": {"state": "stalledUP", "progress": 1}}, "torrents_removed": ["a"]},
+            {"rid": 4, "torrents": {"c": _torrent("C", tracker="https://tracker.x/announce")}},
+        ])
+        torrents, error = client.get_torrents()
+        assert not error
+        assert sorted(t.name for t in torrents) == ["A", "B"]
+        torrent_a = [t for t in torrents if t.id == "a"][0]
+        assert torrent_a.trackers == ["https://tracker.a/announce"]
+        assert torrent_a.avg_upload_speed == 100
+        assert [t.id for t in client.get_downloading_torrents(tag="刷流")] == ["b"]
+        # 增量更新及删除
+        completed = client.get_completed_torrents()
+        assert [(t.id, t.status) for t in completed] == [("b", TorrentStatus.Uploading)]
+        assert [t.id for t in client.get_torrents(ids=["C"])[0]] == ["c"]
+        assert client.qbc.rids == [0, 1, 2, 3]
+        # tracker只在首次使用时查询
+        assert client.qbc.tracker_calls == ["a", "b", "c"]
+
+    def test_sync_error_resets_rid(self):
+        client = _client([{"rid": 5, "full_update": True, "torrents": {"a": _torrent("A")}}])
+        assert len(client.get_torrents()[0]) == 1
+        torrents, error = client.get_torrents()
+        assert error and torrents == []
+        client.qbc.responses = [{"rid": 1, "full_update": True, "torrents": {}}]
+        assert client.get_torrents() == ([], False)
+        assert client.qbc.rids == [0, 5, 0]
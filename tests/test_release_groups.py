@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+测试制作组/字幕组自动机匹配
+"""
+from app.media.meta.release_groups import ReleaseGroupsMatcher, _expand_literals, _split_alternatives
+
+
+class TestReleaseGroupsMatcher:
+
+    def teardown_method(self):
+        ReleaseGroupsMatcher().update_custom(None, None)
+
+    def test_expand_literals(self):
+        assert _expand_literals("CHD(?:|Bits|PAD)") == ["CHD", "CHDBits", "CHDPAD"]
+        assert _expand_literals("(?:Lilith|NC)-Raws") == ["Lilith-Raws", "NC-Raws"]
+        assert _expand_literals("[A-Z]{2}Raws") is None
+        assert _split_alternatives("A(?:B|C)|[|]|D") == ["A(?:B|C)", "[|]", "D"]
+
+    def test_match_builtin_groups(self):
+        matcher = ReleaseGroupsMatcher()
+        assert matcher.match("Movie.2020.1080p.WEB-DL.H264-CHDWEB") == "CHDWEB"
+        assert matcher.match("[Nekomoe kissaten&LoliHouse] Title - 01 [1080p]") == "Nekomoe kissaten@LoliHouse"
+        assert matcher.match("Movie.2020-HDC@HDChina@HDC.mkv") == "HDC@HDChina"
+        assert matcher.match("Movie.2020.1080p-Unknown") == ""
+
+    def test_custom_groups(self):
+        matcher = ReleaseGroupsMatcher()
+        matcher.update_custom("Foo(?:Bar|)|[A-Z]{2}Raws", "|")
+        assert matcher.match("Title.S01-AbRaws.mkv") == "AbRaws"
+        assert matcher.match("Title.S01-FooBar&CHDWEB.mkv") == "FooBar|CHDWEB"
+        assert matcher.match("Title-abc.mkv", groups="abc|\\d+") == "abc"
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+测试RSS条件请求及解析
+"""
+import pytest
+
+from app.helper import RssHelper
+from app.rss import Rss
+from app.utils import RequestUtils, BloomFilter
+
+RSS_XML = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>test</title>
+<item><title>Movie.A.2020.1080p</title><link>https://example.org/details.php?id=1</link>
+<enclosure url="https://example.org/download.php?id=1" length="1024" /></item>
+</channel></rss>
+"""
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, text="", headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = headers or {}
+        self.apparent_encoding = "utf-8"
+        self.encoding = None
+
+    def __bool__(self):
+        return self.status_code < 400
+
+
+class FakeSite:
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get_res(self, req, url, *args, **kwargs):
+        self.requests.append(dict(req._headers))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fake_site():
+    RssHelper.clear_rss_validators()
+    with pytest.MonkeyPatch.context() as mp:
+        site = FakeSite([])
+        mp.setattr(RequestUtils, "get_res", lambda req, url, *args, **kwargs: site.get_res(req, url))
+        yield site
+    RssHelper.clear_rss_validators()
+
+
+MALFORMED_XML = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:torrent="https://example.org/torrent"><channel>
+<item><title>Show.S01E02.1080p &amp; more</title><link>https://example.org/details.php?id=3</link>
+<description><![CDATA[<b>desc</b>]]></description><torrent:size>1.5 GB</torrent:size>
+<pubDate>Mon, 02 Jan 2023 10:00:00 +0800</pubDate></item>
+<item><title>Only.Link.2021</title><link>https://example.org/download.php?id=2</link></item>
+<item><title>Broken & Title</title><enclosure url="https://example.org/download.php?id=1" length="10"/></item>
+<item><title>Truncated
+"""
+
+
+class TestRssParser:
+
+    def test_fields_and_malformed(self):
+        items = list(RssHelper.iter_rss_items(url="https://example.org/rss", ret_xml=MALFORMED_XML))
+        assert [i["enclosure"] for i in items] == ["https://example.org/details.php?id=3",
+                                                  "https://example.org/download.php?id=2",
+                                                  "https://example.org/download.php?id=1"]
+        assert items[0]["title"] == "Show.S01E02.1080p & more"
+        assert items[0]["description"] == "<b>desc</b>"
+        assert items[0]["size"] == int(1.5 * 1024 ** 3)
+        assert items[0]["link"] is None
+        assert items[0]["pubdate"]
+        assert items[2]["size"] == 10
+
+
+class TestRssConditionalGet:
+
+    def test_etag_not_modified(self, fake_site):
+        url = "https://example.org/torrentrss.php"
+        fake_site.responses = [FakeResponse(text=RSS_XML, headers={"ETag": '"v1"'}),
+                               FakeResponse(status_code=304)]
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert modified
+        assert [a["enclosure"] for a in articles] == ["https://example.org/download.php?id=1"]
+        assert articles[0]["size"] == 1024
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert not modified and articles == []
+        assert "If-None-Match" not in fake_site.requests[0]
+        assert fake_site.requests[1]["If-None-Match"] == '"v1"'
+
+    def test_content_hash_and_clear(self, fake_site):
+        url = "https://example.org/rss"
+        fake_site.responses = [FakeResponse(text=RSS_XML) for _ in range(3)]
+        assert RssHelper.parse_rssxml_if_modified(url)[0]
+        # 没有ETag/Last-Modified时按内容判断
+        assert not RssHelper.parse_rssxml_if_modified(url)[0]
+        RssHelper.clear_rss_validators(url)
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert modified and len(articles) == 1
+
+    def test_only_new_items(self, fake_site):
+        url = "https://example.org/new"
+        newer = RSS_XML.replace("<item>", "<item><title>Movie.B.2021.1080p</title>"
+                                          "<enclosure url=\"https://example.org/download.php?id=2\" /></item>"
+                                          "<item>", 1)
+        fake_site.responses = [FakeResponse(text=RSS_XML), FakeResponse(text=newer),
+                               FakeResponse(text=newer + " ")]
+        assert len(RssHelper.parse_rssxml_if_modified(url)[1]) == 1
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert modified and [a["title"] for a in articles] == ["Movie.B.2021.1080p"]
+        # 内容有变化但没有新种子
+        assert RssHelper.parse_rssxml_if_modified(url) == (False, [])
+
+    def test_pinned_head_item(self, fake_site):
+        url = "https://example.org/pinned"
+
+        def _feed(*ids):
+            items = "".join(f"<item><title>Movie.{i}.2021.1080p</title>"
+                            f"<enclosure url=\"https://example.org/download.php?id={i}\" /></item>" for i in ids)
+            return f"<rss version=\"2.0\"><channel>{items}</channel></rss>"
+
+        # 置顶种子P一直排在最前面，其后出现的新种子C仍要返回
+        fake_site.responses = [FakeResponse(text=_feed("P", "A", "B")),
+                               FakeResponse(text=_feed("P", "C", "A", "B")),
+                               FakeResponse(text=_feed("P", "D", "C", "A"))]
+        assert len(RssHelper.parse_rssxml_if_modified(url)[1]) == 3
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert modified and [a["title"] for a in articles] == ["Movie.C.2021.1080p"]
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert modified and [a["title"] for a in articles] == ["Movie.D.2021.1080p"]
+
+    def test_retry_enclosure(self, fake_site):
+        url = "https://example.org/retry"
+        newer = RSS_XML.replace("<item>", "<item><title>Movie.B.2021.1080p</title>"
+                                          "<enclosure url=\"https://example.org/download.php?id=2\" /></item>"
+                                          "<item>", 1)
+        fake_site.responses = [FakeResponse(text=newer, headers={"ETag": '"v1"'}),
+                               FakeResponse(text=newer, headers={"ETag": '"v1"'}),
+                               FakeResponse(status_code=304)]
+        assert len(RssHelper.parse_rssxml_if_modified(url)[1]) == 2
+        # 识别失败的种子下次重新返回，内容未变也要完整下载
+        RssHelper.retry_rss_enclosure(url, "https://example.org/download.php?id=2")
+        modified, articles = RssHelper.parse_rssxml_if_modified(url)
+        assert "If-None-Match" not in fake_site.requests[1]
+        assert modified and [a["title"] for a in articles] == ["Movie.B.2021.1080p"]
+        assert RssHelper.parse_rssxml_if_modified(url) == (False, [])
+
+    def test_expired_not_recorded(self, fake_site):
+        url = "https://example.org/expired"
+        expired = "RSS Link has expired, You need to get a new one!"
+        fake_site.responses = [FakeResponse(text=expired), FakeResponse(text=expired)]
+        assert RssHelper.parse_rssxml_if_modified(url) == (True, None)
+        # 过期的RSS每次都要提醒
+        assert RssHelper.parse_rssxml_if_modified(url) == (True, None)
+
+
+class TestRssSeen:
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"https://example.org/download.php?id={i}")
+        assert all(f"https://example.org/download.php?id={i}" in bloom for i in range(1000))
+        false_positive = sum(f"https://example.org/other.php?id={i}" in bloom for i in range(10000))
+        assert false_positive < 300
+        assert bloom.is_full()
+
+    def test_get_rssd_enclosures(self):
+        helper = RssHelper()
+        enclosures = [f"https://example.org/seen-test.php?id={i}" for i in range(3)]
+        try:
+            helper.simple_insert_rss_torrents("seen-test-0", enclosures[0])
+            assert helper.get_rssd_enclosures(enclosures + [""]) == {enclosures[0], ""}
+            # 新增记录增量载入
+            helper.simple_insert_rss_torrents("seen-test-1", enclosures[1])
+            assert helper.get_rssd_enclosures(enclosures) == {enclosures[0], enclosures[1]}
+            helper.simple_delete_rss_torrents("seen-test-1", enclosures[1])
+            assert helper.get_rssd_enclosures(enclosures) == {enclosures[0]}
+        finally:
+            for i, enclosure in enumerate(enclosures):
+                helper.simple_delete_rss_torrents(f"seen-test-{i}", enclosure)
+
+
+class FakeFilter:
+
+    def __init__(self):
+        self.rules = [{"id": 1, "name": "默认", "rules": [{"id": 1, "include": ["1080p"]}]}]
+
+    def get_rule_infos(self):
+        return self.rules
+
+
+class FakeDownloader:
+
+    def __init__(self):
+        self.settings = {"-1": {"name": "预设", "category": ""}}
+
+    def get_download_setting(self, sid=None):
+        return self.settings
+
+
+class TestRssSign:
+
+    def test_rule_change_clears_validators(self, fake_site):
+        rss = Rss.__new__(Rss)
+        rss.filter = FakeFilter()
+        rss.downloader = FakeDownloader()
+        rss.rsshelper = RssHelper()
+        rss_movies = {1: {"name": "Movie A", "filter_rule": 1, "download_setting": "-1"}}
+
+        def _check_and_mark():
+            rss._Rss__check_rss_sign(rss_movies=rss_movies, rss_tvs={}, rss_sites_info=[])
+            cleared = "https://example.org/rss" not in RssHelper._rss_validators
+            RssHelper._rss_validators["https://example.org/rss"] = {"hash": "x"}
+            return cleared
+
+        assert _check_and_mark()
+        assert not _check_and_mark()
+        # 订阅中只保存规则组ID，修改规则组内容也要重新匹配
+        rss.filter.rules[0]["rules"][0]["include"] = ["2160p"]
+        assert _check_and_mark()
+        rss.downloader.settings["-1"]["category"] = "电影"
+        assert _check_and_mark()
+        assert not _check_and_mark()
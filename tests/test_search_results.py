@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+测试搜索结果入库分组及分页查询
+"""
+import pytest
+
+from app.helper import DbHelper
+from app.media.meta import MetaInfo
+
+
+def _item(title, site, res_order, site_order, seeders, size=1024 ** 3):
+    meta_info = MetaInfo(title=title)
+    meta_info.title = meta_info.get_name()
+    meta_info.set_torrent_info(site=site,
+                               site_order=site_order,
+                               res_order=res_order,
+                               size=size,
+                               seeders=seeders,
+                               enclosure=f"{site}/{title}",
+                               upload_volume_factor=1.0,
+                               download_volume_factor=0.0 if site == "A" else 1.0)
+    return meta_info
+
+
+@pytest.fixture
+def dbhelper():
+    helper = DbHelper()
+    helper.delete_all_search_torrents()
+    yield helper
+    helper.delete_all_search_torrents()
+
+
+class TestSearchResults:
+
+    def test_group_keys_and_pagination(self, dbhelper):
+        dbhelper.insert_search_results([
+            _item("Movie.One.2020.1080p.WEB-DL.x264-CHD", "A", 90, 99, 5),
+            _item("Movie.Two.2021.2160p.BluRay.x265-CHD", "B", 95, 90, 1),
+            _item("Movie.One.2020.2160p.WEB-DL.x265-CHD", "B", 95, 90, 10),
+            _item("Show.S01E02.1080p.WEB-DL.x264", "A", 50, 99, 100),
+        ])
+        rows = dbhelper.get_search_results()
+        # 资源优先级、站点优先级、做种数倒序
+        assert [row.SEEDERS for row in rows] == [10, 1, 5, 100]
+        assert rows[0].TITLE_KEY == "Movie One (2020)"
+        assert rows[0].GROUP_KEY == "2160p_webdl"
+        assert rows[-1].SE_KEY == "S01 E02"
+
+        total, title_total, page_rows = dbhelper.get_search_results_by_title(page=1, page_size=2)
+        assert (total, title_total) == (4, 3)
+        # 同一标题的结果相邻，按组内最优资源排序
+        assert [row.TITLE_KEY for row in page_rows] == ["Movie One (2020)", "Movie One (2020)", "Movie Two (2021)"]
+        _, _, page_rows = dbhelper.get_search_results_by_title(page=2, page_size=2)
+        assert [row.TITLE_KEY for row in page_rows] == ["Show"]
+
+    def test_filters(self, dbhelper):
+        dbhelper.insert_search_results([
+            _item("Movie.One.2020.1080p.WEB-DL.x264-CHD", "A", 90, 99, 5),
+            _item("Movie.One.2020.2160p.WEB-DL.x265-CHD", "B", 95, 90, 10),
+            _item("Show.S02E01.1080p.WEB-DL.x264", "A", 50, 99, 100),
+        ])
+        total, _, rows = dbhelper.get_search_results_by_title(filters={"site": ["A"]})
+        assert total == 2 and {row.SITE for row in rows} == {"A"}
+        total, _, rows = dbhelper.get_search_results_by_title(filters={"free": ["1.0 0.0"]})
+        assert total == 2
+        total, _, rows = dbhelper.get_search_results_by_title(filters={"season": ["S02"]})
+        assert [row.TITLE_KEY for row in rows] == ["Show"]
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+测试按索引站点推送的流式搜索及搜索线程池
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.indexer import Indexer
+from app.indexer.client._base import _IIndexClient
+from app.indexer.executor import SearchExecutor, SearchDeadlineExceeded
+from app.utils.types import IndexerType
+from web.backend.search_torrents import SearchJob
+
+
+class FakeClient:
+    _search_state = threading.local()
+    set_search_state = _IIndexClient.set_search_state
+    get_search_state = _IIndexClient.get_search_state
+
+    def flush_indexer_statistics(self):
+        pass
+
+    def search(self, order_seq, indexer, key_word, filter_args, match_media, in_from):
+        if indexer.name == "slow":
+            time.sleep(0.2)
+            self.set_search_state("timeout")
+            return []
+        if indexer.name == "broken":
+            raise RuntimeError("broken")
+        return [f"{indexer.name}-{key_word}"]
+
+
+class TestSearchStream:
+
+    def test_callback_per_indexer(self):
+        indexer = Indexer()
+        indexers = [SimpleNamespace(name=name, pri="1") for name in ("fast", "slow", "broken")]
+        events = []
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr(indexer, "_client", FakeClient())
+            mp.setattr(indexer, "_client_type", IndexerType.BUILTIN)
+            mp.setattr(indexer, "get_indexers", lambda check=True: indexers)
+            result = indexer.search_by_keyword("key", {},
+                                               callback=lambda idx, state, res: events.append(
+                                                   (idx.name, state, res)))
+        assert result == ["fast-key"]
+        assert sorted(events) == [("broken", "failed", []),
+                                  ("fast", "done", ["fast-key"]),
+                                  ("slow", "timeout", [])]
+        # 慢站点最后完成
+        assert events[-1][0] == "slow"
+
+    def test_search_job_events(self):
+        job = SearchJob("test")
+        assert job.wait_events(0, timeout=0.01) == []
+        job.push({"type": "indexer", "count": 1})
+        threading.Timer(0.05, job.push, args=({"type": "end", "code": 0},)).start()
+        assert job.wait_events(0) == [{"type": "indexer", "count": 1}]
+        assert job.wait_events(1, timeout=2) == [{"type": "end", "code": 0}]
+        assert job.finished
+        assert job.wait_events(2, timeout=2) == []
+
+
+class TestSearchExecutor:
+
+    def test_site_concurrency_and_deadline(self):
+        executor = SearchExecutor()
+        running = {"a": 0}
+        peak = {"a": 0}
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                running["a"] += 1
+                peak["a"] = max(peak["a"], running["a"])
+            time.sleep(0.05)
+            with lock:
+                running["a"] -= 1
+            return "ok"
+
+        futures = [executor.submit("site-a", work) for _ in range(6)]
+        assert [future.result(timeout=5) for future in futures] == ["ok"] * 6
+        assert peak["a"] <= executor.get_stats()["site_concurrency"]
+        assert executor.get_stats()["sites"]["site-a"]["count"] == 6
+        # 单个任务的排队时间记录在Future上，后提交的任务需排队
+        assert futures[0].queue_wait >= 0
+        assert futures[-1].queue_wait >= 0.05
+        # 排队超过截止时间的任务不再执行
+        expired = executor.submit("site-b", work, deadline=time.time() - 1)
+        with pytest.raises(SearchDeadlineExceeded):
+            expired.result(timeout=5)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+测试并发请求合并
+"""
+import threading
+import time
+
+import pytest
+
+from app.utils.cache_manager import SingleFlight
+
+
+class TestSingleFlight:
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def lookup(name):
+            calls.append(name)
+            time.sleep(0.2)
+            return {"name": name}
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("key", lookup, "test")))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+        assert results == [{"name": "test"}] * 5
+        # 等待方拿到的是副本
+        assert len({id(result) for result in results}) == 5
+
+    def test_negative_result_cached(self):
+        flight = SingleFlight(negative_ttl=60)
+        calls = []
+
+        def lookup():
+            calls.append(1)
+            return {}
+
+        assert flight.do("missing", lookup) == {}
+        assert flight.do("missing", lookup) == {}
+        assert len(calls) == 1
+        flight.forget("missing")
+        flight.do("missing", lookup)
+        assert len(calls) == 2
+
+    def test_error_is_not_cached(self):
+        flight = SingleFlight()
+
+        def lookup():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("error", lookup)
+        assert flight.do("error", lambda: "ok") == "ok"
+
+    def test_none_result_is_not_cached(self):
+        flight = SingleFlight(negative_ttl=60)
+        calls = []
+
+        def lookup():
+            calls.append(1)
+            # 查询出错时返回None
+            return None if len(calls) == 1 else {"id": 1}
+
+        assert flight.do("timeout", lookup) is None
+        assert flight.do("timeout", lookup) == {"id": 1}
+        assert len(calls) == 2
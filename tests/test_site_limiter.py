@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+测试站点令牌桶流控
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+import redis
+
+from app.sites.site_limiter import SiteRateLimiter
+
+
+class UnavailableRedisStore:
+    """模拟Redis不可用，使用本地令牌桶"""
+
+    def __getattr__(self, item):
+        def _raise(*args, **kwargs):
+            raise redis.ConnectionError("unavailable")
+        return _raise
+
+
+@pytest.fixture(autouse=True)
+def local_redis():
+    with patch("app.sites.site_limiter.RedisStore", UnavailableRedisStore):
+        yield
+
+
+class TestSiteRateLimiter:
+
+    def test_no_limit(self):
+        limiter = SiteRateLimiter(None, None, None, site_id=1)
+        assert all(limiter.acquire() for _ in range(100))
+        assert limiter.get_usage() == {}
+
+    def test_count_bucket(self):
+        # 60秒内最多3次
+        limiter = SiteRateLimiter(60, 3, None, site_id=1)
+        assert [limiter.acquire() for _ in range(4)] == [True, True, True, False]
+        state, msg = limiter.check_rate_limit()
+        assert state and "60 秒内访问次数不得超过 3 次" in msg
+        usage = limiter.get_usage()
+        assert usage["count"] == {"tokens": 0, "capacity": 3}
+        assert usage["granted"] == 3 and usage["rejected"] == 2
+
+    def test_wait_for_token(self):
+        limiter = SiteRateLimiter(None, None, 0.2, site_id=1)
+        assert limiter.acquire()
+        # 期限内可补充令牌则等待
+        start = time.time()
+        assert limiter.acquire(timeout=1)
+        assert 0.1 < time.time() - start < 0.5
+        # 期限内等不到时直接拒绝
+        start = time.time()
+        assert not limiter.acquire(timeout=0.05)
+        assert time.time() - start < 0.05
+        assert limiter.get_usage()["waited"] == 1
+
+    def test_priority(self):
+        limiter = SiteRateLimiter(None, None, 0.3, site_id=1)
+        assert limiter.acquire()
+        results = []
+
+        def _acquire(name, priority):
+            if limiter.acquire(priority=priority, timeout=2):
+                results.append(name)
+
+        high = threading.Thread(target=_acquire, args=("high", SiteRateLimiter.PRIORITY_HIGH))
+        low = threading.Thread(target=_acquire, args=("low", SiteRateLimiter.PRIORITY_LOW))
+        high.start()
+        time.sleep(0.05)
+        low.start()
+        high.join()
+        low.join()
+        # 高优先级请求等待时低优先级请求让行
+        assert results == ["high", "low"]
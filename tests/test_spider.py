@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+测试内置爬虫的完成通知与种子解析
+"""
+import threading
+from types import SimpleNamespace
+
+from app.indexer.client._spider import TorrentSpider
+
+HTML = """
+<table class="torrents">
+  <tr class="row"><td class="name"><a href="details.php?id=1">Movie.A.2020.1080p</a></td><td class="size">1.5 GB</td></tr>
+  <tr class="row"><td class="name"><a href="details.php?id=2">Movie.B.2021.2160p</a></td><td class="size">20 GB</td></tr>
+</table>
+"""
+
+
+def _spider(result_num=100):
+    spider = TorrentSpider()
+    spider.indexerid = "test"
+    spider.indexername = "测试站点"
+    spider.domain = "https://example.org/"
+    spider.site_info = {}
+    spider.list = {"selector": "table.torrents > tr.row"}
+    spider.fields = {"title": {"selector": "td.name > a"},
+                     "description": {"text": "{{ fields.tags }}"},
+                     "size": {"selector": "td.size"}}
+    spider.result_num = result_num
+    spider.torrents_info_array = []
+    spider._selectors = {}
+    spider._complete_event = threading.Event()
+    return spider
+
+
+class TestTorrentSpider:
+
+    def test_parse_sets_complete(self):
+        spider = _spider()
+        assert not spider.wait_complete(0)
+        spider.parse(None, SimpleNamespace(extract=lambda: HTML))
+        assert spider.wait_complete(0)
+        assert not spider.is_error
+        assert [row["title"] for row in spider.torrents_info_array] == ["Movie.A.2020.1080p",
+                                                                        "Movie.B.2021.2160p"]
+        # 每行都是独立的字典
+        assert spider.torrents_info_array[0] is not spider.torrents_info_array[1]
+        assert spider.torrents_info_array[1]["indexer"] == "test"
+
+    def test_result_limit_and_error(self):
+        spider = _spider(result_num=1)
+        spider.parse(None, SimpleNamespace(extract=lambda: HTML))
+        assert len(spider.torrents_info_array) == 1
+        spider = _spider()
+        spider.parse(None, SimpleNamespace(extract=lambda: ""))
+        assert spider.wait_complete(0) and spider.is_error
+
+    def test_stop_wakes_waiter(self):
+        spider = _spider()
+        threading.Timer(0.05, spider.stop_spider).start()
+        assert spider.wait_complete(2)
+        assert not spider.is_complete
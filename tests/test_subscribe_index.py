@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+测试订阅索引匹配
+"""
+from types import SimpleNamespace
+
+from app.subscribe import SubscribeIndex
+from app.utils.types import MediaType
+
+
+def _media(title, year, tmdb_id=None, mtype=MediaType.MOVIE, season="S01", site="站点A"):
+    return SimpleNamespace(title=title, year=year, tmdb_id=tmdb_id, type=mtype, site=site,
+                           rev_string=f"{title}.{year}.1080p",
+                           get_season_string=lambda: season)
+
+
+def _rss(rid, name, year="", tmdbid="", fuzzy_match=False, season=None, rss_sites=None):
+    return {"id": rid, "name": name, "year": year, "tmdbid": tmdbid, "season": season,
+            "fuzzy_match": fuzzy_match, "rss_sites": rss_sites or []}
+
+
+class TestSubscribeIndex:
+
+    def test_movie_match(self):
+        rss_movies = {
+            1: _rss(1, "Fuzzy(.*)", fuzzy_match=True),
+            2: _rss(2, "Movie A", year="2020", tmdbid="100"),
+            3: _rss(3, "豆瓣电影", year="2021", tmdbid="DB:123"),
+            4: _rss(4, "Bad[regex", fuzzy_match=True, rss_sites=["站点B"]),
+        }
+        index = SubscribeIndex(rss_movies=rss_movies)
+        assert index.match(_media("Movie A", "2020", tmdb_id=100))["id"] == 2
+        assert index.match(_media("Movie B", "2020", tmdb_id=101)) is None
+        # 豆瓣订阅按名称及前后一年匹配
+        assert index.match(_media("豆瓣电影", "2022"))["id"] == 3
+        assert index.match(_media("豆瓣电影", "2023")) is None
+        # 按订阅顺序，模糊匹配优先
+        assert index.match(_media("Fuzzyxx", "2020", tmdb_id=100))["id"] == 1
+        # 非法正则按关键字匹配，并过滤站点
+        assert index.match(_media("Bad[regex", "2020", site="站点B"))["id"] == 4
+        assert index.match(_media("Bad[regex", "2020")) is None
+
+    def test_tv_match(self):
+        rss_tvs = {
+            1: _rss(1, "Show", tmdbid="200", season="S02"),
+            2: _rss(2, "Show", tmdbid="200", season="S01"),
+            3: _rss(3, "anime", fuzzy_match=True, season="S00"),
+        }
+        index = SubscribeIndex(rss_tvs=rss_tvs)
+        assert index.match(_media("Show", "2020", tmdb_id=200, mtype=MediaType.TV))["id"] == 2
+        assert index.match(_media("Show", "2020", tmdb_id=200, mtype=MediaType.TV, season="S03")) is None
+        assert index.match(_media("Anime Title", "2020", mtype=MediaType.ANIME, season="S05"))["id"] == 3
+        assert SubscribeIndex.normalize_title(" The.Show: 2 ") == "theshow2"
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+测试TMDB识别缓存的名称索引与详情分离存储
+"""
+import fnmatch
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.media.tmdbv3api.as_obj import AsObj
+from app.utils.tmdb_cache import TMDBCache
+from app.utils.types import MediaType
+
+
+class FakeRedisStore:
+    """内存版RedisStore，仅实现缓存用到的方法"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value = self.data.get(key)
+        return value.encode() if isinstance(value, str) else value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key, amount=1):
+        self.data[key] = str(int(self.data.get(key) or 0) + amount)
+        return int(self.data[key])
+
+    def zadd(self, name, mapping):
+        self.data.setdefault(name, {}).update(mapping)
+
+    def zremrangebyscore(self, name, min_score, max_score):
+        members = self.data.get(name) or {}
+        expired = [member for member, score in members.items() if float(min_score) <= score <= float(max_score)]
+        for member in expired:
+            members.pop(member)
+        return len(expired)
+
+    def expire(self, key, seconds):
+        pass
+
+    def zscan_iter(self, name, count=500):
+        return iter(list(self.data.get(name) or {}))
+
+    def scan_iter(self, pattern, count=500):
+        return iter([key for key in list(self.data) if fnmatch.fnmatch(key, pattern)])
+
+    def unlink(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+@pytest.fixture
+def tmdb_cache():
+    TMDBCache._generation = None
+    with patch("app.utils.tmdb_cache.RedisStore", FakeRedisStore):
+        yield TMDBCache()
+    TMDBCache._generation = None
+
+
+class TestTMDBCache:
+
+    def test_title_variants_share_one_entry(self, tmdb_cache):
+        info = AsObj(**{"id": 100, "title": "测试电影", "genres": [{"id": 1, "name": "剧情"}]})
+        info["media_type"] = MediaType.MOVIE
+        for title in ["Test Movie", "test  movie"]:
+            tmdb_cache.set_media_info(title=title, tmdbid=100, media_type=MediaType.MOVIE,
+                                      year="2020", mtype=MediaType.MOVIE, info=info)
+        info_keys = [key for key in tmdb_cache.redis.data if ":info:" in key]
+        assert len(info_keys) == 1
+        assert tmdb_cache.get_media_info("TEST MOVIE", "2020", MediaType.MOVIE) == (100, MediaType.MOVIE)
+        cached = tmdb_cache.get_tmdb_info(MediaType.MOVIE, 100)
+        assert cached.media_type == MediaType.MOVIE
+        assert cached.genres[0].name == "剧情"
+
+    def test_negative_result(self, tmdb_cache):
+        tmdb_cache.set_media_info(title="Unknown", year=None, mtype=MediaType.TV)
+        assert tmdb_cache.get_media_info("Unknown", None, MediaType.TV) == (0, None)
+        assert tmdb_cache.get_media_info("Other", None, MediaType.TV) is None
+
+    def test_clear_by_tmdbid_and_all(self, tmdb_cache):
+        tmdb_cache.set_media_info(title="A", tmdbid=1, media_type=MediaType.TV, info={"id": 1})
+        tmdb_cache.set_media_info(title="B", tmdbid=2, media_type=MediaType.TV, info={"id": 2})
+        tmdb_cache.clear_tmdb_cache(1)
+        assert tmdb_cache.get_media_info("A") is None
+        assert tmdb_cache.get_media_info("B") == (2, MediaType.TV)
+        tmdb_cache.clear_all()
+        assert tmdb_cache.get_media_info("B") is None
+        assert tmdb_cache.get_tmdb_info(MediaType.TV, 2) is None
+        assert not [key for key in tmdb_cache.redis.data if key.startswith("tmdb:s3:g0")]
+
+    def test_expired_members_trimmed(self, tmdb_cache):
+        tmdb_cache.set_media_info(title="A", tmdbid=1, media_type=MediaType.TV, info={"id": 1}, ttl=60)
+        keyset, refs = [tmdb_cache.redis.data[key] for key in ["tmdb:s3:g0:keys", "tmdb:s3:g0:refs:1"]]
+        assert len(refs) == 2
+        # 已过期的成员在下次写入时剔除
+        for members in [keyset, refs]:
+            for member in members:
+                members[member] = time.time() - 1
+        tmdb_cache.set_media_info(title="B", tmdbid=1, media_type=MediaType.TV, info={"id": 1})
+        assert set(refs) == {"tmdb:s3:g0:title:ALL::b", "tmdb:s3:g0:info:TV:1:default"}
+        assert "tmdb:s3:g0:title:ALL::a" not in keyset
+
+    def test_tmdb_info_cached_under_fetched_language(self, tmdb_cache):
+        from app.media import Media
+        from app.media.tmdbv3api.tmdb import TMDb
+        tmdb = TMDb()
+        media = Media.__new__(Media)
+        media.tmdb = tmdb
+        media.redis_cache = tmdb_cache
+        media._Media__do_get_tmdb_info = lambda mtype, tmdbid, append_to_response, chinese: \
+            {"id": tmdbid, "language": tmdb.language}
+        with tmdb.language_context("en"):
+            info = media.get_tmdb_info(MediaType.MOVIE, 300, language="ja")
+            # 查询后恢复调用方的语言
+            assert tmdb.language == "en"
+        assert info["language"] == "ja"
+        assert tmdb_cache.get_tmdb_info(MediaType.MOVIE, 300, "ja")["language"] == "ja"
+        assert tmdb_cache.get_tmdb_info(MediaType.MOVIE, 300) is None
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+测试 TMDb 客户端的线程隔离语言与JSON缓存
+"""
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.media.tmdbv3api.tmdb import TMDb
+
+
+def _mock_session(payload):
+    session = MagicMock()
+    response = MagicMock()
+    response.headers = {}
+    response.json.side_effect = lambda: dict(payload)
+    session.request.return_value = response
+    return session
+
+
+class TestTMDbClient:
+
+    @pytest.fixture(autouse=True)
+    def tmdb_settings(self, monkeypatch):
+        # 设置为进程内共用，测试中修改副本，结束后恢复
+        monkeypatch.setattr(TMDb, "_settings", dict(TMDb._settings))
+        TMDb._request_cache.clear()
+        TMDb._local.__dict__.clear()
+        tmdb = TMDb()
+        tmdb.api_key = "test"
+        tmdb.default_language = "zh"
+        yield
+        TMDb._request_cache.clear()
+        TMDb._local.__dict__.clear()
+
+    def test_language_is_thread_local(self):
+        tmdb = TMDb()
+        tmdb.language = "en"
+        seen = {}
+
+        def worker():
+            seen["language"] = TMDb().language
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert tmdb.language == "en"
+        assert seen["language"] == "zh"
+        tmdb.language = None
+        assert tmdb.language == "zh"
+
+    def test_language_context(self):
+        tmdb = TMDb()
+        with tmdb.language_context("en"):
+            assert tmdb.language == "en"
+        assert tmdb.language == "zh"
+
+    def test_cached_json_is_copied(self):
+        session = _mock_session({"id": 1, "page": 1})
+        tmdb = TMDb(session=session)
+        first = tmdb._call("/movie/1", "")
+        first["media_type"] = "电影"
+        second = tmdb._call("/movie/1", "")
+        assert session.request.call_count == 1
+        assert "media_type" not in second
+        assert tmdb.page == "1"
+
+    def test_proxies_without_eval(self):
+        tmdb = TMDb()
+        tmdb.proxies = {"http": "http://127.0.0.1:7890", "https": None}
+        assert tmdb.proxies == {"http": "http://127.0.0.1:7890"}
+        tmdb.proxies = None
+        assert tmdb.proxies is None
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+测试下载器种子状态服务的变化推送
+"""
+from app.downloader.downloader import Downloader
+from app.downloader.torrent_state import TorrentStateService
+from app.entities.torrent import Torrent
+from app.entities.torrentstatus import TorrentStatus
+from app.utils.types import TorrentChangeType
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.torrents = []
+        self.error = False
+        self.calls = 0
+
+    def get_torrents(self, ids=None, status=None, tag=None, fields=None):
+        self.calls += 1
+        return [Torrent(**t.__dict__) for t in self.torrents], self.error
+
+
+def _torrent(tid, progress=0.5, status=TorrentStatus.Downloading, labels=None):
+    return Torrent(id=tid, name=tid, progress=progress, status=status, labels=labels or [])
+
+
+class TestTorrentStateService:
+
+    def test_change_feed(self):
+        client = FakeClient()
+        service = TorrentStateService("1", lambda: client)
+        received = []
+        completed = []
+        service.subscribe(received.extend)
+        service.subscribe(completed.extend, [TorrentChangeType.Completed])
+
+        client.torrents = [_torrent("a"), _torrent("b", progress=1, status=TorrentStatus.Uploading)]
+        service.refresh()
+        assert [(c.type, c.torrent.id) for c in received] == [(TorrentChangeType.Added, "a"),
+                                                             (TorrentChangeType.Added, "b")]
+        assert service.is_ready()
+
+        received.clear()
+        client.torrents = [_torrent("a", progress=1, status=TorrentStatus.Uploading, labels=["PT"])]
+        service.refresh(force=True)
+        assert [(c.type, c.torrent.id) for c in received] == [(TorrentChangeType.Completed, "a"),
+                                                             (TorrentChangeType.StateChanged, "a"),
+                                                             (TorrentChangeType.TagsChanged, "a"),
+                                                             (TorrentChangeType.Removed, "b")]
+        assert [c.torrent.id for c in completed] == ["a"]
+        assert received[1].previous.status == TorrentStatus.Downloading
+        assert [t.id for t in service.get_torrents()] == ["a"]
+
+    def test_adaptive_interval(self):
+        client = FakeClient()
+        service = TorrentStateService("1", lambda: client)
+        client.torrents = [_torrent("a")]
+        service.refresh()
+        # 未到间隔不轮询
+        assert service.refresh() == [] and client.calls == 1
+        service.refresh(force=True)
+        service.refresh(force=True)
+        assert service.interval == TorrentStateService.min_interval * 4
+        for _ in range(5):
+            service.refresh(force=True)
+        assert service.interval == TorrentStateService.max_interval
+        client.torrents = [_torrent("a", progress=1)]
+        service.refresh(force=True)
+        assert service.interval == TorrentStateService.min_interval
+
+    def test_error_and_handler_failure(self):
+        client = FakeClient()
+        service = TorrentStateService("1", lambda: client)
+        received = []
+
+        def broken(changes):
+            raise ValueError("broken")
+
+        service.subscribe(broken)
+        service.subscribe(received.extend)
+        client.torrents = [_torrent("a")]
+        service.refresh()
+        # 订阅者出错不影响其它订阅者
+        assert len(received) == 1
+        client.error = True
+        assert service.refresh(force=True) == []
+        assert not service.is_ready()
+        # 出错时保留原种子表，恢复后不会误报删除/新增
+        client.error = False
+        assert service.refresh(force=True) == []
+        service.unsubscribe(received.extend)
+        assert [h for h, _ in service._handlers] == [broken]
+
+
+class FakeTransferClient:
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_transfer_task(self, tag=None, match_path=None):
+        self.calls += 1
+        return []
+
+
+class TestTransferChanged:
+
+    def test_skip_when_nothing_pending(self):
+        client = FakeClient()
+        service = TorrentStateService("1", lambda: client)
+        client.torrents = [_torrent("a")]
+        service.refresh()
+        transfer_client = FakeTransferClient()
+        downloader = Downloader.__new__(Downloader)
+        downloader._state_services = {"1": service}
+        downloader._monitor_downloader_ids = ["1"]
+        downloader._transfer_pending = {"1"}
+        downloader.get_downloader_conf = lambda did: {"name": "test"}
+        downloader._Downloader__get_client = lambda did: transfer_client
+        # 启动后第一次定时转移完整检查一遍
+        downloader.transfer_changed()
+        assert transfer_client.calls == 1 and not downloader._transfer_pending
+        # 种子表可信且没有变化时不再列出种子
+        downloader.transfer_changed()
+        assert transfer_client.calls == 1
+        # 有新完成的种子时转移
+        downloader._transfer_pending.add("1")
+        downloader.transfer_changed()
+        assert transfer_client.calls == 2
+        # 种子表不可信时照常转移
+        client.error = True
+        service.refresh(force=True)
+        downloader.transfer_changed()
+        assert transfer_client.calls == 3
+
+
+class TestStateTorrents:
+
+    def test_shared_table(self):
+        client = FakeClient()
+        service = TorrentStateService("1", lambda: client)
+        downloader = Downloader.__new__(Downloader)
+        downloader._state_services = {"1": service}
+        client.torrents = [_torrent("a"), _torrent("b", progress=1, status=TorrentStatus.Uploading)]
+        assert [t.id for t in downloader.get_state_torrents("1", status="completed")] == ["b"]
+        assert [t.id for t in downloader.get_state_torrents("1", status="downloading")] == ["a"]
+        # 未到轮询间隔时多个模块共用种子表，不再列出下载器种子
+        assert [t.id for t in downloader.get_state_torrents("1", ids=["a", "b"])] == ["a", "b"]
+        assert client.calls == 1
+        # 缺少种子时种子表不足最小间隔不刷新，要求最新状态时强制刷新
+        client.torrents.append(_torrent("c"))
+        assert downloader.get_state_torrents("1", ids=["c"]) == []
+        assert [t.id for t in downloader.get_state_torrents("1", ids=["c"], max_age=0)] == ["c"]
+        assert client.calls == 2
+        # 下载器出错时返回None
+        client.error = True
+        service.refresh(force=True)
+        assert downloader.get_state_torrents("1") is None
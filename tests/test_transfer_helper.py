@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+测试文件转移调度及内核复制
+"""
+import errno
+import os
+import threading
+import time
+from unittest.mock import patch
+
+from app.helper.transfer_helper import TransferHelper
+from app.utils import SystemUtils
+from app.utils.types import RmtMode
+
+
+def _write(path, size):
+    data = os.urandom(size)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
+
+
+class TestCopyFile:
+
+    def test_copy_with_progress(self, tmp_path):
+        src = tmp_path / "src.mkv"
+        data = _write(src, 300 * 1024)
+        os.utime(src, (1600000000, 1600000000))
+        progress = []
+        with patch.object(SystemUtils, "_COPY_CHUNK_SIZE", 100 * 1024):
+            retcode, _ = SystemUtils.copy(str(src), str(tmp_path / "dest.mkv"),
+                                          callback=lambda c, t: progress.append((c, t)))
+        assert retcode == 0
+        assert (tmp_path / "dest.mkv").read_bytes() == data
+        # 保留文件属性
+        assert int(os.path.getmtime(tmp_path / "dest.mkv")) == 1600000000
+        assert progress[-1] == (len(data), len(data))
+        assert len(progress) == 3
+
+    def test_fallback(self, tmp_path):
+        src = tmp_path / "src.mkv"
+        data = _write(src, 10 * 1024)
+
+        def _unsupported(*args, **kwargs):
+            raise OSError(errno.ENOSYS, "unsupported")
+
+        with patch("os.copy_file_range", _unsupported, create=True), \
+                patch("os.sendfile", _unsupported, create=True):
+            (tmp_path / "dest").mkdir()
+            SystemUtils.copy_file(str(src), str(tmp_path / "dest"))
+        assert (tmp_path / "dest" / "src.mkv").read_bytes() == data
+        with patch("os.copy_file_range", _unsupported, create=True):
+            SystemUtils.copy_file(str(src), str(tmp_path / "dest.mkv"))
+        assert (tmp_path / "dest.mkv").read_bytes() == data
+
+    def test_empty_file(self, tmp_path):
+        src = tmp_path / "src.ass"
+        src.write_bytes(b"")
+        assert SystemUtils.copy(str(src), str(tmp_path / "dest.ass"))[0] == 0
+        assert (tmp_path / "dest.ass").read_bytes() == b""
+
+
+class TestTransferHelper:
+
+    def test_group(self, tmp_path):
+        helper = TransferHelper()
+        dev = os.stat(tmp_path).st_dev
+        # 目的文件不存在时按上级目录所在设备分组
+        assert helper.get_group(str(tmp_path), str(tmp_path / "a" / "b.mkv"), RmtMode.COPY) == f"{dev}:{dev}"
+        assert helper.get_group(str(tmp_path), "/remote/b.mkv", RmtMode.RCLONE) == "remote"
+        assert helper.get_group(str(tmp_path), "/x", RmtMode.LINK) == f"link:{dev}"
+
+    def test_run(self):
+        helper = TransferHelper()
+        running = {}
+        peak = {}
+        lock = threading.Lock()
+
+        def _job(group, ret):
+            def _run():
+                with lock:
+                    running[group] = running.get(group, 0) + 1
+                    peak[group] = max(peak.get(group, 0), running[group])
+                time.sleep(0.05)
+                with lock:
+                    running[group] -= 1
+                if ret is None:
+                    raise ValueError("broken")
+                return ret
+            return _run
+
+        tasks = []
+        with patch.object(TransferHelper, "get_group", lambda self, src, dest, mode: src):
+            for i in range(4):
+                tasks.append((_job("test-a", i), "test-a", "", RmtMode.COPY))
+                tasks.append((_job("test-b", i), "test-b", "", RmtMode.COPY))
+            tasks.append((_job("test-b", None), "test-b", "", RmtMode.COPY))
+            start = time.time()
+            results = helper.run(tasks)
+        # 结果与任务顺序一致，出错的任务返回-1
+        assert results == [0, 0, 1, 1, 2, 2, 3, 3, -1]
+        # 同组排队，不同组并行
+        assert peak == {"test-a": 1, "test-b": 1}
+        assert time.time() - start < 0.05 * 9
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+测试Transmission按需查询参数及本地种子表增量更新
+"""
+import time
+
+import transmission_rpc
+
+from app.downloader.client.transmission import Transmission
+from app.entities.torrentstatus import TorrentStatus
+
+
+def _fields(tid, name, status=6, percent_done=1.0, activity=100, labels=None):
+    return {"id": tid, "hashString": f"hash{tid}", "name": name, "status": status, "error": 0,
+            "labels": labels or [], "percentDone": percent_done, "activityDate": activity, "editDate": 0,
+            "doneDate": 1000, "downloadDir": "/downloads", "totalSize": 100, "uploadRatio": 2.0,
+            "uploadedEver": 200, "secondsSeeding": 10, "addedDate": 900, "rateDownload": 0,
+            "rateUpload": 5, "eta": -1, "trackers": [{"announce": "https://tracker.a/announce"}]}
+
+
+class FakeTrc:
+
+    def __init__(self, torrents):
+        self.torrents = {t["id"]: t for t in torrents}
+        self.calls = []
+        self.active = []
+        self.removed = []
+
+    @staticmethod
+    def _project(fields, arguments):
+        return transmission_rpc.Torrent(fields={k: v for k, v in fields.items() if k in arguments})
+
+    def get_torrents(self, ids=None, arguments=None):
+        self.calls.append(("get", sorted(ids) if ids else None, sorted(arguments)))
+        return [self._project(t, arguments) for tid, t in self.torrents.items() if not ids or tid in ids]
+
+    def get_recently_active_torrents(self, arguments=None):
+        self.calls.append(("active", None, sorted(arguments)))
+        return [self._project(self.torrents[tid], arguments) for tid in self.active], self.removed
+
+
+def _client(torrents):
+    client = Transmission.__new__(Transmission)
+    client.host = None
+    client.connect()
+    client.trc = FakeTrc(torrents)
+    return client
+
+
+class TestTransmissionTable:
+
+    def test_field_projection(self):
+        client = _client([_fields(1, "A"), _fields(2, "B", status=4, percent_done=0.5, labels=["刷流"])])
+        torrents = client.get_downloading_torrents(tag="刷流", fields=["name"])
+        assert [(t.id, t.name, t.status) for t in torrents] == [("hash2", "B", TorrentStatus.Downloading)]
+        arguments = client.trc.calls[0][2]
+        assert "trackers" not in arguments and "name" in arguments
+        # 需要新的属性时完整查询
+        torrents, error = client.get_torrents(fields=["trackers", "avg_upload_speed"])
+        assert torrents[0].trackers == ["https://tracker.a/announce"]
+        assert torrents[0].avg_upload_speed == 20
+        assert client.trc.calls[1][0] == "get" and "trackers" in client.trc.calls[1][2]
+
+    def test_recently_active_and_change_keys(self):
+        client = _client([_fields(1, "A"), _fields(2, "B")])
+        assert len(client.get_torrents(fields=["name"])[0]) == 2
+        # 短时间内只查询有变化的种子
+        client.trc.torrents[1]["name"] = "A2"
+        client.trc.active = [1]
+        client.trc.torrents.pop(2)
+        client.trc.removed = [2]
+        torrents, _ = client.get_torrents(fields=["name"])
+        assert [t.name for t in torrents] == ["A2"]
+        assert client.trc.calls[-1][0] == "active"
+        # 超过间隔后比对变化参数，只重新获取有变化的种子
+        client.trc.torrents[3] = _fields(3, "C")
+        client.trc.torrents[1]["activityDate"] = 200
+        client._table_time = time.time() - 600
+        torrents, _ = client.get_torrents(fields=["name"])
+        assert sorted(t.name for t in torrents) == ["A2", "C"]
+        assert client.trc.calls[-1][:2] == ("get", [1, 3])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+测试识别词规则编译与处理结果缓存
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.helper.words_helper import WordsHelper
+
+
+def _word(wid, wtype, replaced="", replace="", front="", back="", offset="", regex=0):
+    return SimpleNamespace(ID=wid, TYPE=wtype, REPLACED=replaced, REPLACE=replace,
+                           FRONT=front, BACK=back, OFFSET=offset, REGEX=regex)
+
+
+class FakeDbHelper:
+
+    def __init__(self, words):
+        self.words = words
+        self.queries = 0
+
+    def get_custom_words(self, enabled=None):
+        self.queries += 1
+        return list(self.words)
+
+
+@pytest.fixture
+def words_helper():
+    helper = WordsHelper()
+    dbhelper = helper.dbhelper
+    yield helper
+    helper.dbhelper = dbhelper
+    helper.clear_cache()
+
+
+def _load(helper, words):
+    helper.dbhelper = FakeDbHelper(words)
+    helper._load_words_with_cache(force=True)
+    return helper.dbhelper
+
+
+class TestWordsHelper:
+
+    def test_rules_applied_in_order(self, words_helper):
+        _load(words_helper, [
+            _word(1, 1, "[BLOCK]"),
+            _word(2, 1, "HDR"),
+            _word(3, 1, r"\d+MB", regex=1),
+            _word(4, 2, "Foo", "Bar"),
+            _word(5, 4, front="Bar.S01E", back=".1080p", offset="EP+2"),
+        ])
+        title, msg, used = words_helper.process("[BLOCK]Foo.S01E05.1080p.HDR.500MB")
+        assert title == "Bar.S01E07.1080p.."
+        assert msg == []
+        assert used == {"ignored": ["[BLOCK]", "HDR", r"\d+MB"],
+                        "replaced": ["Foo ⇒ Bar"],
+                        "offset": ["Bar.S01E + .1080p >> EP+2"]}
+        assert words_helper.process("Other.Title")[0] == "Other.Title"
+
+    def test_invalid_regex_reports_message(self, words_helper):
+        _load(words_helper, [_word(1, 2, "(abc", "x", regex=1)])
+        title, msg, _ = words_helper.process("(abc")
+        assert title == "(abc"
+        assert msg and "格式有误" in msg[0]
+
+    def test_cache_invalidated_on_change(self, words_helper):
+        dbhelper = _load(words_helper, [_word(1, 2, "Foo", "Bar")])
+        assert words_helper.process("Foo")[0] == "Bar"
+        assert words_helper.process("Foo")[0] == "Bar"
+        # 未到检查时间不重复查询数据库
+        assert dbhelper.queries == 1
+        dbhelper.words = [_word(1, 2, "Foo", "Baz")]
+        words_helper._load_words_with_cache(force=True)
+        assert words_helper.process("Foo")[0] == "Baz"
@@ -22,6 +22,7 @@ from werkzeug.security import generate_password_hash
 from app.helper import tmdb_blacklist_helper
 from app.helper.drissionpage_helper import DrissionPageHelper
 from app.helper.tmdb_blacklist_helper import TmdbBlacklistHelper
+from app.utils.tmdb_cache import TMDBCache
 import log
 from app.brushtask import BrushTask
 from app.conf import SystemConfig, ModuleConf
@@ -32,6 +33,7 @@ from app.helper import DbHelper, ProgressHelper, ThreadHelper, \
      WordsHelper, IndexerHelper
 from app.helper import RssHelper, PluginHelper
 from app.indexer import Indexer
+from app.indexer.executor import SearchExecutor
 from app.media import Category, Media, Bangumi, DouBan, Scraper
 from app.media.meta import MetaInfo, MetaBase
 from app.mediaserver import MediaServer
@@ -46,11 +48,11 @@ from app.subscribe import Subscribe
 from app.sync import Sync
 from app.torrentremover import TorrentRemover
 from app.utils import StringUtils, EpisodeFormat, RequestUtils, PathUtils, \
-    SystemUtils, ExceptionUtils, Torrent
+    SystemUtils, ExceptionUtils, Torrent, get_cache_stats
 from app.utils.types import RmtMode, OsType, SearchType, SyncType, MediaType, MovieTypes, TvTypes, \
     EventType, SystemConfigKey, RssType
 from config import RMT_MEDIAEXT, RMT_SUBEXT, RMT_AUDIO_TRACK_EXT, Config
-from web.backend.search_torrents import search_medias_for_web, search_media_by_message
+from web.backend.search_torrents import search_medias_for_web, search_media_by_message, start_search_job
 from web.backend.user import User
 from web.backend.web_utils import WebUtils
 from web.cache import cache
@@ -235,11 +237,14 @@ class WebAction:
             "update_category_config": self.update_category_config,
             "get_category_config": self.get_category_config,
             "get_system_processes": self.get_system_processes,
+            "get_cache_stats": self.get_cache_stats,
+            "get_search_stats": self.get_search_stats,
             "run_plugin_method": self.run_plugin_method,
             "update_all_config": self.__update_all_config,
             "add_tmdb_blacklist": self.__add_tmdb_blacklist,
             "delete_tmdb_blacklist": self.__delete_tmdb_blacklist,
-            "clear_tmdb_blacklist": self.__clear_tmdb_blacklist
+            "clear_tmdb_blacklist": self.__clear_tmdb_blacklist,
+            "clear_tmdb_cache": self.__clear_tmdb_cache
         }
         # 远程命令响应
         self._commands = {
@@ -409,7 +414,6 @@ class WebAction:
                     channel=in_from, title="正在运行 %s ..." % command.get("desc"), user_id=user_id)
                 return
 
-        cache.delete("search")
         # 站点搜索或者添加订阅
         ThreadHelper().start_thread(search_media_by_message,
                                     (msg, in_from, user_id, user_name))
@@ -545,7 +549,6 @@ class WebAction:
         """
         WEB搜索资源
         """
-        cache.delete("search")
         search_word = data.get("search_word")
         ident_flag = False if data.get("unident") else True
         filters = data.get("filters")
@@ -556,6 +559,14 @@ class WebAction:
                 media_type = MediaType.MOVIE
             else:
                 media_type = MediaType.TV
+        if search_word and data.get("stream"):
+            # 流式搜索，结果通过 stream-search 按索引站点推送
+            job = start_search_job(content=search_word,
+                                   ident_flag=ident_flag,
+                                   filters=filters,
+                                   tmdbid=tmdbid,
+                                   media_type=media_type)
+            return {"code": 0, "job_id": job.id}
         if search_word:
             ret, ret_msg = search_medias_for_web(content=search_word,
                                                  ident_flag=ident_flag,
@@ -1782,6 +1793,14 @@ class WebAction:
             tmdb_blacklist_helper.clear_blacklist()
         return {"code": 0}
 
+    @staticmethod
+    def __clear_tmdb_cache(data=None):
+        """
+        清空TMDB识别缓存
+        """
+        TMDBCache().clear_all()
+        return {"code": 0}
+
     @staticmethod
     def __movie_calendar_data(data):
         """
@@ -2277,6 +2296,8 @@ class WebAction:
                 if str(init_rulegroup.get("id")) == groupid:
                     for sql in init_rulegroup.get("sql"):
                         DbHelper().excute(sql)
+        # 重新加载规则，清空已编译的规则组
+        _filter.init_config()
         return {"code": 0}
 
     @staticmethod
@@ -3524,55 +3545,32 @@ class WebAction:
         """
         return {"code": 0, "result": MediaServer().get_activity_log(30)}
 
-    def get_search_result(self):
+    def get_search_result(self, data=None):
         """
-        查询所有搜索结果
+        查询搜索结果，按标题分组，分组、排序、过滤和分页在数据库中完成
+        :param data: page 页码，pagenum 每页标题数，未传页码时返回全部；filters 过滤条件
         """
+        data = data or {}
+        page = data.get("page")
+        pagenum = data.get("pagenum") or 20
+        total, title_total, res = Searcher().get_search_results_by_title(page=page,
+                                                                         page_size=pagenum,
+                                                                         filters=data.get("filters"))
         SearchResults = {}
-        res = Searcher().get_search_results()
-        total = len(res)
         for item in res:
-            # 质量(来源、效果)、分辨率
-            if item.RES_TYPE:
-                try:
-                    res_mix = json.loads(item.RES_TYPE)
-                except Exception as err:
-                    ExceptionUtils.exception_traceback(err)
-                    continue
-                respix = res_mix.get("respix") or ""
-                video_encode = res_mix.get("video_encode") or ""
-                restype = res_mix.get("restype") or ""
-                reseffect = res_mix.get("reseffect") or ""
-            else:
-                restype = ""
-                respix = ""
-                reseffect = ""
-                video_encode = ""
+            respix = item.RES_PIX or ""
+            restype = item.RES_SOURCE or ""
+            reseffect = item.RES_EFFECT or ""
+            video_encode = item.VIDEO_ENCODE or ""
             # 分组标识 (来源，分辨率)
-            group_key = re.sub(r"[-.\s@|]", "", f"{respix}_{restype}").lower()
-            # 分组信息
-            group_info = {
-                "respix": respix,
-                "restype": restype,
-            }
+            group_key = item.GROUP_KEY
             # 种子唯一标识 （大小，质量(来源、效果)，制作组组成）
-            unique_key = re.sub(r"[-.\s@|]", "",
-                                f"{respix}_{restype}_{video_encode}_{reseffect}_{item.SIZE}_{item.OTHERINFO}").lower()
-            # 标识信息
-            unique_info = {
-                "video_encode": video_encode,
-                "size": item.SIZE,
-                "reseffect": reseffect,
-                "releasegroup": item.OTHERINFO
-            }
+            unique_key = item.UNIQUE_KEY
             # 结果
-            title_string = f"{item.TITLE}"
-            if item.YEAR:
-                title_string = f"{title_string} ({item.YEAR})"
+            title_string = item.TITLE_KEY
             # 电视剧季集标识
             mtype = item.TYPE or ""
-            SE_key = item.ES_STRING if item.ES_STRING and mtype != "MOV" else "MOV"
-            media_type = {"MOV": "电影", "TV": "电视剧", "ANI": "动漫"}.get(mtype)
+            SE_key = item.SE_KEY
             # 只需要部分种子标签
             labels = [label for label in str(item.NOTE).split("|")
                       if label in ["官方", "官组", "中字", "国语", "粤语", "国配", "特效", "特效字幕"]]
@@ -3608,64 +3606,8 @@ class WebAction:
             # 季
             filter_season = SE_key.split()[0] if SE_key and SE_key not in [
                 "MOV", "TV"] else None
-            # 合并搜索结果
-            if SearchResults.get(title_string):
-                # 种子列表
-                result_item = SearchResults[title_string]
-                torrent_dict = SearchResults[title_string].get("torrent_dict")
-                SE_dict = torrent_dict.get(SE_key)
-                if SE_dict:
-                    group = SE_dict.get(group_key)
-                    if group:
-                        unique = group.get("group_torrents").get(unique_key)
-                        if unique:
-                            unique["torrent_list"].append(torrent_item)
-                            group["group_total"] += 1
-                        else:
-                            group["group_total"] += 1
-                            group.get("group_torrents")[unique_key] = {
-                                "unique_info": unique_info,
-                                "torrent_list": [torrent_item]
-                            }
-                    else:
-                        SE_dict[group_key] = {
-                            "group_info": group_info,
-                            "group_total": 1,
-                            "group_torrents": {
-                                unique_key: {
-                                    "unique_info": unique_info,
-                                    "torrent_list": [torrent_item]
-                                }
-                            }
-                        }
-                else:
-                    torrent_dict[SE_key] = {
-                        group_key: {
-                            "group_info": group_info,
-                            "group_total": 1,
-                            "group_torrents": {
-                                unique_key: {
-                                    "unique_info": unique_info,
-                                    "torrent_list": [torrent_item]
-                                }
-                            }
-                        }
-                    }
-                # 过滤条件
-                torrent_filter = dict(result_item.get("filter"))
-                if free_item not in torrent_filter.get("free"):
-                    torrent_filter["free"].append(free_item)
-                if releasegroup not in torrent_filter.get("releasegroup"):
-                    torrent_filter["releasegroup"].append(releasegroup)
-                if item.SITE not in torrent_filter.get("site"):
-                    torrent_filter["site"].append(item.SITE)
-                if video_encode \
-                        and video_encode not in torrent_filter.get("video"):
-                    torrent_filter["video"].append(video_encode)
-                if filter_season \
-                        and filter_season not in torrent_filter.get("season"):
-                    torrent_filter["season"].append(filter_season)
-            else:
+            result_item = SearchResults.get(title_string)
+            if not result_item:
                 fav, rssid = 0, None
                 # 存在标志
                 if item.TMDBID:
@@ -3674,14 +3616,13 @@ class WebAction:
                         title=item.TITLE,
                         year=item.YEAR,
                         mediaid=item.TMDBID)
-
-                SearchResults[title_string] = {
+                result_item = SearchResults[title_string] = {
                     "key": item.ID,
                     "title": item.TITLE,
                     "year": item.YEAR,
                     "type_key": mtype,
                     "image": item.IMAGE,
-                    "type": media_type,
+                    "type": {"MOV": "电影", "TV": "电视剧", "ANI": "动漫"}.get(mtype),
                     "vote": item.VOTE,
                     "tmdbid": item.TMDBID,
                     "backdrop": item.IMAGE,
@@ -3689,28 +3630,54 @@ class WebAction:
                     "overview": item.OVERVIEW,
                     "fav": fav,
                     "rssid": rssid,
-                    "torrent_dict": {
-                        SE_key: {
-                            group_key: {
-                                "group_info": group_info,
-                                "group_total": 1,
-                                "group_torrents": {
-                                    unique_key: {
-                                        "unique_info": unique_info,
-                                        "torrent_list": [torrent_item]
-                                    }
-                                }
-                            }
-                        }
-                    },
+                    "torrent_dict": {},
                     "filter": {
-                        "site": [item.SITE],
-                        "free": [free_item],
-                        "releasegroup": [releasegroup],
-                        "video": [video_encode] if video_encode else [],
-                        "season": [filter_season] if filter_season else []
+                        "site": [],
+                        "free": [],
+                        "releasegroup": [],
+                        "video": [],
+                        "season": []
                     }
                 }
+            # 种子分组
+            group = result_item["torrent_dict"].setdefault(SE_key, {}).get(group_key)
+            if not group:
+                group = result_item["torrent_dict"][SE_key][group_key] = {
+                    "group_info": {
+                        "respix": respix,
+                        "restype": restype,
+                    },
+                    "group_total": 0,
+                    "group_torrents": {}
+                }
+            group["group_total"] += 1
+            unique = group["group_torrents"].get(unique_key)
+            if unique:
+                unique["torrent_list"].append(torrent_item)
+            else:
+                group["group_torrents"][unique_key] = {
+                    "unique_info": {
+                        "video_encode": video_encode,
+                        "size": item.SIZE,
+                        "reseffect": reseffect,
+                        "releasegroup": item.OTHERINFO
+                    },
+                    "torrent_list": [torrent_item]
+                }
+            # 过滤条件
+            torrent_filter = result_item["filter"]
+            if free_item not in torrent_filter["free"]:
+                torrent_filter["free"].append(free_item)
+            if releasegroup not in torrent_filter["releasegroup"]:
+                torrent_filter["releasegroup"].append(releasegroup)
+            if item.SITE not in torrent_filter["site"]:
+                torrent_filter["site"].append(item.SITE)
+            if video_encode \
+                    and video_encode not in torrent_filter["video"]:
+                torrent_filter["video"].append(video_encode)
+            if filter_season \
+                    and filter_season not in torrent_filter["season"]:
+                torrent_filter["season"].append(filter_season)
 
         # 提升整季的顺序到顶层
         def se_sort(k):
@@ -3728,7 +3695,12 @@ class WebAction:
             item["torrent_dict"] = sorted(item["torrent_dict"].items(),
                                           key=se_sort,
                                           reverse=True)
-        return {"code": 0, "total": total, "result": SearchResults}
+        return {"code": 0,
+                "total": total,
+                "title_total": title_total,
+                "page": int(page) if page else 1,
+                "pagenum": int(pagenum),
+                "result": SearchResults}
 
     @staticmethod
     def search_media_infos(data):
@@ -5158,6 +5130,20 @@ class WebAction:
         """
         return {"code": 0, "data": SystemUtils.get_all_processes()}
 
+    @staticmethod
+    def get_cache_stats():
+        """
+        获取缓存统计
+        """
+        return {"code": 0, "data": get_cache_stats()}
+
+    @staticmethod
+    def get_search_stats():
+        """
+        获取搜索线程池运行情况及各站点排队等待统计
+        """
+        return {"code": 0, "data": SearchExecutor().get_stats()}
+
     @staticmethod
     def run_plugin_method(data):
         """
@@ -1,14 +1,17 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os.path
 import re
+import threading
+import time
 from time import sleep
+from uuid import uuid4
 import zhconv
 import hashlib
 
 from app import media
 import log
 from app.downloader import Downloader
-from app.helper import ProgressHelper
+from app.helper import ProgressHelper, ThreadHelper
 from app.helper.openai_helper import OpenAiHelper
 from app.indexer import Indexer
 from app.media import Media, DouBan
@@ -16,22 +19,111 @@ from app.message import Message
 from app.searcher import Searcher
 from app.sites import Sites
 from app.subscribe import Subscribe
-from app.utils import StringUtils, Torrent
+from app.utils import StringUtils, Torrent, cacheman, ExceptionUtils
 from app.utils.types import SearchType, IndexerType, ProgressKey, RssType
 from config import Config
 from web.backend.web_utils import WebUtils
 from app.utils.types import MediaType
 from app.media.meta import MetaInfo
 
-SEARCH_MEDIA_CACHE = {}
 SEARCH_MEDIA_TYPE = {}
 # 媒体识别结果缓存，避免重复识别
-MEDIA_IDENT_CACHE = {}
+MEDIA_IDENT_CACHE = cacheman["search_media_ident"]
+# 用户待选择的媒体列表：user_id -> [MetaInfo]
+SEARCH_MEDIA_CACHE = cacheman["search_media_choose"]
 # 分页缓存：user_id -> {"page": 当前页码, "page_size": 每页数量, "total": 总结果数, "all_items": 所有结果列表}
-SEARCH_MEDIA_PAGE = {}
+SEARCH_MEDIA_PAGE = cacheman["search_media_page"]
+# WEB流式搜索任务：job_id -> SearchJob
+SEARCH_JOBS = {}
+SEARCH_JOBS_LOCK = threading.Lock()
+# 已结束的搜索任务保留时间（秒）
+SEARCH_JOB_EXPIRE = 3600
 
 
-def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, media_type=None):
+class SearchJob:
+    """
+    WEB流式搜索任务，按索引站点完成顺序记录事件，供SSE推送
+    """
+
+    def __init__(self, content):
+        self.id = uuid4().hex
+        self.content = content
+        self.events = []
+        self.finished = False
+        self.end_time = None
+        self._cond = threading.Condition()
+
+    def push(self, event: dict):
+        """
+        追加事件，end事件表示任务结束
+        """
+        with self._cond:
+            self.events.append(event)
+            if event.get("type") == "end":
+                self.finished = True
+                self.end_time = time.time()
+            self._cond.notify_all()
+
+    def wait_events(self, index, timeout=15):
+        """
+        获取index之后的事件，没有新事件时最多等待timeout秒
+        """
+        with self._cond:
+            if index >= len(self.events) and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[index:]
+
+
+def start_search_job(content, ident_flag=True, filters=None, tmdbid=None, media_type=None):
+    """
+    启动WEB流式搜索任务
+    :return: 搜索任务
+    """
+    job = SearchJob(content)
+    with SEARCH_JOBS_LOCK:
+        # 清理过期任务
+        for job_id in [_id for _id, _job in SEARCH_JOBS.items()
+                       if _job.finished and time.time() - _job.end_time > SEARCH_JOB_EXPIRE]:
+            SEARCH_JOBS.pop(job_id, None)
+        SEARCH_JOBS[job.id] = job
+
+    def __run():
+        try:
+            code, msg = search_medias_for_web(content=content,
+                                              ident_flag=ident_flag,
+                                              filters=filters,
+                                              tmdbid=tmdbid,
+                                              media_type=media_type,
+                                              job=job)
+        except Exception as err:
+            ExceptionUtils.exception_traceback(err)
+            code, msg = -1, str(err)
+        job.push({"type": "end", "code": code, "msg": msg})
+
+    ThreadHelper().start_thread(__run, ())
+    return job
+
+
+def get_search_job(job_id):
+    """
+    查询WEB流式搜索任务
+    """
+    if not job_id:
+        return None
+    with SEARCH_JOBS_LOCK:
+        return SEARCH_JOBS.get(job_id)
+
+
+def _sort_search_results(media_list):
+    """
+    按资源优先级、站点优先级、做种数排序
+    """
+    return sorted(media_list, key=lambda x: "%s%s%s" % (str(x.res_order).rjust(3, '0'),
+                                                        str(x.site_order).rjust(3, '0'),
+                                                        str(x.seeders).rjust(10, '0')), reverse=True)
+
+
+def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, media_type=None, job=None):
     """
     WEB资源搜索
     :param content: 关键字文本，可以包括 类型、标题、季、集、年份等信息，使用 空格分隔，也支持种子的命名格式
@@ -39,6 +131,7 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
     :param filters: 其它过滤条件
     :param tmdbid: TMDBID或DB:豆瓣ID
     :param media_type: 媒体类型，配合tmdbid传入
+    :param job: 流式搜索任务，传入时每个索引站点完成即插入数据库并推送事件
     :return: 错误码，错误原因，成功时直接插入数据库
     """
     mtype, key_word, season_num, episode_num, year, content = StringUtils.get_keyword_from_string(content)
@@ -65,8 +158,8 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
         else:
             # 检查缓存
             cache_key = hashlib.md5(f"{content}_{mtype}".encode()).hexdigest()
-            if cache_key in MEDIA_IDENT_CACHE:
-                media_info = MEDIA_IDENT_CACHE[cache_key]
+            media_info = MEDIA_IDENT_CACHE.get(cache_key)
+            if media_info:
                 log.info(f"【Web】从缓存获取媒体信息: {content}")
             else:
                 # 按输入名称查
@@ -74,7 +167,7 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
                                                    title=content)
                 # 缓存识别结果
                 if media_info and media_info.tmdb_info:
-                    MEDIA_IDENT_CACHE[cache_key] = media_info
+                    MEDIA_IDENT_CACHE.set(cache_key, media_info)
 
         # 整合集
         if media_info:
@@ -171,6 +264,38 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
 
     # 多线程 - 优化线程管理和减少延迟
     media_list = []
+    media_seen = set()
+    # 流式搜索时按索引站点完成顺序增量插入
+    callback = None
+    if job:
+        _searcher.delete_all_search_torrents()
+        stream_lock = threading.Lock()
+        stream_state = {"finished": 0,
+                        "tasks": len(search_name_list) * len(Indexer().get_indexers(check=True) or [])}
+        job.push({"type": "start", "keywords": search_name_list, "tasks": stream_state["tasks"]})
+
+        def callback(indexer, state, result):
+            with stream_lock:
+                new_items = []
+                for item in result:
+                    item_key = StringUtils.md5_hash(f'{item.org_string}{item.site}{item.description or ""}')
+                    if item_key not in media_seen:
+                        new_items.append(item)
+                        media_seen.add(item_key)
+                media_list.extend(new_items)
+                stream_state["finished"] += 1
+                if new_items:
+                    _searcher.insert_search_results(media_items=_sort_search_results(new_items),
+                                                    ident_flag=ident_flag,
+                                                    title=content)
+                job.push({"type": "indexer",
+                          "indexer": indexer.name,
+                          "state": state,
+                          "count": len(new_items),
+                          "total": len(media_list),
+                          "finished": stream_state["finished"],
+                          "tasks": stream_state["tasks"]})
+
     if search_name_list:
         executor = ThreadPoolExecutor(max_workers=max_workers)
         all_task = []
@@ -179,21 +304,33 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
                                     search_name,
                                     filter_args,
                                     media_info,
-                                    SearchType.WEB
+                                    SearchType.WEB,
+                                    callback
                                 )
             all_task.append(task)
             # 减少线程间延迟，只在需要时添加微小延迟
             if len(search_name_list) > 1:
                 sleep(0.1)  # 从0.5秒减少到0.1秒
         
+        result_list = []
         for future in as_completed(all_task):
             result = future.result()
             if result:
-                media_list.extend(result)
+                result_list.extend(result)
+        if not job:
+            media_list.extend(result_list)
+
+    if job:
+        # 流式搜索结果已增量插入数据库
+        _process.end(ProgressKey.Search)
+        if len(media_list) == 0:
+            log.info("【Web】%s 未搜索到任何资源" % content)
+            return 1, "%s 未搜索到任何资源" % content
+        log.info("【Web】共搜索到 %s 个有效资源" % len(media_list))
+        return 0, ""
 
     # 根据 org_string 去重列表
     unique_media_list = []
-    media_seen = set()
     for d in media_list:
         org_string = StringUtils.md5_hash(f'{d.org_string}{d.site}{d.description or ""}')
         if org_string not in media_seen:
@@ -211,9 +348,7 @@ def search_medias_for_web(content, ident_flag=True, filters=None, tmdbid=None, m
     else:
         log.info("【Web】共搜索到 %s 个有效资源" % len(media_list))
         # 插入数据库
-        media_list = sorted(media_list, key=lambda x: "%s%s%s" % (str(x.res_order).rjust(3, '0'),
-                                                                  str(x.site_order).rjust(3, '0'),
-                                                                  str(x.seeders).rjust(10, '0')), reverse=True)
+        media_list = _sort_search_results(media_list)
         _searcher.insert_search_results(media_items=media_list,
                                         ident_flag=ident_flag,
                                         title=content)
@@ -230,8 +365,6 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
     :return: 请求的资源是否全部下载完整、请求的文本对应识别出来的媒体信息、请求的资源如果是剧集，则返回下载后仍然缺失的季集信息
     """
     global SEARCH_MEDIA_TYPE
-    global SEARCH_MEDIA_CACHE
-    global SEARCH_MEDIA_PAGE
 
     if not input_str:
         log.info("【Searcher】搜索关键字有误！")
@@ -242,13 +375,13 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
     # 处理分页导航：n下一页，p上一页
     if input_str.lower() in ['n', 'p']:
         # 检查是否有分页缓存
-        if not SEARCH_MEDIA_PAGE.get(user_id):
+        page_info = SEARCH_MEDIA_PAGE.get(user_id)
+        if not page_info:
             Message().send_channel_msg(channel=in_from,
                                        title="没有可用的搜索结果分页",
                                        user_id=user_id)
             return
         
-        page_info = SEARCH_MEDIA_PAGE[user_id]
         current_page = page_info.get("page", 1)
         page_size = page_info.get("page_size", 8)
         total_items = page_info.get("total", 0)
@@ -308,9 +441,9 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
     # 如果是数字，表示选择项
     if input_str.isdigit() and int(input_str) < 10:
         # 首先检查是否有分页缓存（搜索结果选择）
-        if SEARCH_MEDIA_PAGE.get(user_id):
+        page_info = SEARCH_MEDIA_PAGE.get(user_id)
+        if page_info:
             # 从分页缓存中获取当前页的项目
-            page_info = SEARCH_MEDIA_PAGE[user_id]
             current_page = page_info.get("page", 1)
             page_size = page_info.get("page_size", 8)
             all_items = page_info.get("all_items", [])
@@ -365,7 +498,7 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
                                            title=f"无法识别媒体信息: {title}",
                                            user_id=user_id)
                 # 清除分页缓存
-                del SEARCH_MEDIA_PAGE[user_id]
+                SEARCH_MEDIA_PAGE.delete(user_id)
                 return
             
             # 设置种子相关信息
@@ -383,19 +516,20 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
             )
             
             # 清除分页缓存
-            del SEARCH_MEDIA_PAGE[user_id]
+            SEARCH_MEDIA_PAGE.delete(user_id)
             return
         
         # 如果没有分页缓存，则使用原来的媒体选择逻辑
         choose = int(input_str) - 1
-        if not SEARCH_MEDIA_CACHE.get(user_id) or \
-                choose < 0 or choose >= len(SEARCH_MEDIA_CACHE.get(user_id)):
+        choose_medias = SEARCH_MEDIA_CACHE.get(user_id)
+        if not choose_medias or \
+                choose < 0 or choose >= len(choose_medias):
             Message().send_channel_msg(channel=in_from,
                                        title="输入有误！",
                                        user_id=user_id)
             log.warn("【Web】错误的输入值：%s" % input_str)
             return
-        media_info = SEARCH_MEDIA_CACHE[user_id][choose]
+        media_info = choose_medias[choose]
         if not SEARCH_MEDIA_TYPE.get(user_id) \
                 or SEARCH_MEDIA_TYPE.get(user_id) == "SEARCH":
             # 如果是豆瓣数据，需要重新查询TMDB的数据
@@ -548,17 +682,18 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
                 return
 
             # 保存识别信息到临时结果中，由于消息长度限制只取前8条
-            SEARCH_MEDIA_CACHE[user_id] = []
+            choose_medias = []
             for meta_info in medias[:8]:
                 # 合并站点和下载设置信息
                 meta_info.rss_sites = rss_sites
                 meta_info.search_sites = search_sites
                 meta_info.set_download_info(download_setting=download_setting)
-                SEARCH_MEDIA_CACHE[user_id].append(meta_info)
+                choose_medias.append(meta_info)
+            SEARCH_MEDIA_CACHE.set(user_id, choose_medias)
 
-            if 1 == len(SEARCH_MEDIA_CACHE[user_id]):
+            if 1 == len(choose_medias):
                 # 只有一条数据，直接开始搜索
-                media_info = SEARCH_MEDIA_CACHE[user_id][0]
+                media_info = choose_medias[0]
                 if not SEARCH_MEDIA_TYPE.get(user_id) \
                         or SEARCH_MEDIA_TYPE.get(user_id) == "SEARCH":
                     # 如果是豆瓣数据，需要重新查询TMDB的数据
@@ -593,8 +728,8 @@ def search_media_by_message(input_str, in_from: SearchType, user_id, user_name=N
                 # 发送消息通知选择
                 Message().send_channel_list_msg(channel=in_from,
                                                 title="共找到%s条相关信息，请回复对应序号" % len(
-                                                    SEARCH_MEDIA_CACHE[user_id]),
-                                                medias=SEARCH_MEDIA_CACHE[user_id],
+                                                    choose_medias),
+                                                medias=choose_medias,
                                                 user_id=user_id)
 
 
@@ -602,8 +737,6 @@ def __search_media(in_from, media_info, user_id, user_name=None):
     """
     开始搜索和发送消息
     """
-    global SEARCH_MEDIA_PAGE
-    
     # 检查是否存在，电视剧返回不存在的集清单
     exist_flag, no_exists, messages = Downloader().check_exists_medias(meta_info=media_info)
     if messages:
@@ -644,13 +777,13 @@ def __search_media(in_from, media_info, user_id, user_name=None):
             total_items = len(search_results)
             total_pages = ((total_items - 1) // page_size) + 1
             
-            SEARCH_MEDIA_PAGE[user_id] = {
+            SEARCH_MEDIA_PAGE.set(user_id, {
                 "page": 1,
                 "page_size": page_size,
                 "total": total_items,
                 "all_items": search_results,
                 "media_title": media_info.title
-            }
+            })
             
             # 显示第一页
             current_page = 1
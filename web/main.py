@@ -10,14 +10,14 @@ import urllib
 import sys
 import xml.dom.minidom
 from functools import wraps
-from math import floor
+from math import floor, ceil
 from pathlib import Path
 from threading import Lock
 from urllib.parse import unquote
 from redis import Redis
 
 from flask import Flask, request, json, render_template, make_response, session, send_from_directory, send_file, \
-    redirect, Response
+    redirect, Response, stream_with_context
 from flask_compress import Compress
 from flask_login import LoginManager, login_user, login_required, current_user
 from flask_sock import Sock
@@ -49,6 +49,7 @@ from config import PT_TRANSFER_INTERVAL, REDIS_HOST, REDIS_PORT, Config, TMDB_AP
 from web.action import WebAction
 from web.apiv1 import apiv1_bp
 from web.backend.WXBizMsgCrypt3 import WXBizMsgCrypt
+from web.backend.search_torrents import get_search_job
 from web.backend.user import User
 from web.backend.wallpaper import get_login_wallpaper
 from web.backend.web_utils import WebUtils
@@ -331,7 +332,6 @@ def index():
 
 # 资源搜索页面
 @App.route('/search', methods=['POST', 'GET'])
-@cache.cached(timeout=43200, key_prefix='search')
 @login_required
 def search():
     # 权限
@@ -340,16 +340,23 @@ def search():
         pris = User().get_user(username).get("pris")
     else:
         pris = ""
-    # 结果
-    res = WebAction().get_search_result()
+    # 结果，按标题分页查询
+    current_page = int(request.args.get("page") or 1)
+    res = WebAction().get_search_result({"page": current_page})
     SearchResults = res.get("result")
     Count = res.get("total")
+    TotalPage = max(ceil(res.get("title_total") / res.get("pagenum")), 1)
     return render_template("search.html",
                            UserPris=str(pris).split(","),
                            Count=Count,
                            Results=SearchResults,
                            SiteDict=Indexer().get_indexer_hash_dict(),
-                           UPCHAR=chr(8593))
+                           UPCHAR=chr(8593),
+                           Search=request.args.get("s") or "",
+                           CurrentPage=current_page,
+                           TotalPage=TotalPage,
+                           PageRange=WebUtils.get_page_range(current_page=current_page,
+                                                             total_page=TotalPage))
 
 
 # 电影订阅页面
@@ -418,6 +425,7 @@ def rss_calendar():
 @login_required
 def sites():
     CfgSites = Sites().get_sites()
+    RateLimits = Sites().get_ratelimit_usage()
     RuleGroups = {str(group["id"]): group["name"]
                   for group in Filter().get_rule_groups()}
     DownloadSettings = {did: attr["name"] for did,
@@ -427,6 +435,7 @@ def sites():
     CookieUserInfoCfg = SystemConfig().get(SystemConfigKey.CookieUserInfo)
     return render_template("site/site.html",
                            Sites=CfgSites,
+                           RateLimits=RateLimits,
                            RuleGroups=RuleGroups,
                            DownloadSettings=DownloadSettings,
                            ChromeOk=ChromeOk,
@@ -1829,6 +1838,39 @@ def stream_progress():
     )
 
 
+@App.route('/stream-search')
+@login_required
+def stream_search():
+    """
+    流式搜索EventSources响应，按索引站点完成顺序推送搜索状态
+    """
+    def __search(_job):
+        """
+        搜索事件
+        """
+        index = 0
+        while True:
+            events = _job.wait_events(index)
+            if not events:
+                # 保持连接
+                yield ': keepalive\n\n'
+                continue
+            index += len(events)
+            for event in events:
+                yield 'data: %s\n\n' % json.dumps(event)
+                if event.get("type") == "end":
+                    return
+
+    job = get_search_job(request.args.get("job"))
+    if not job:
+        return Response('data: %s\n\n' % json.dumps({"type": "end", "code": -1, "msg": "搜索任务不存在或已过期"}),
+                        mimetype='text/event-stream')
+    return Response(
+        stream_with_context(__search(job)),
+        mimetype='text/event-stream'
+    )
+
+
 @Sock.route('/message')
 @login_required
 def message_handler(ws):
@@ -20,6 +20,10 @@ let NavPageXhr;
 let GlobalModalAbort = true;
 // 进度刷新EventSource
 let ProgressES;
+// 流式搜索
+let SearchStreamES;
+// 流式搜索各索引站点状态
+let SearchStreamStatus = [];
 // 日志来源筛选时关掉之前的刷新日志计时器
 let LoggingSource = "";
 // 日志EventSource
@@ -101,17 +105,101 @@ function navmenu(page, newflag = false) {
 // 搜索
 function media_search(tmdbid, title, type) {
   const param = {"tmdbid": tmdbid, "search_word": title, "media_type": type};
-  show_refresh_progress("正在搜索 " + title + " ...", "search");
+  search_stream(param, title);
+}
+
+// 停止流式搜索
+function stop_search_stream() {
+  if (SearchStreamES) {
+    SearchStreamES.close();
+    SearchStreamES = undefined;
+  }
+}
+
+// 流式搜索：按索引站点完成顺序推送结果，首批结果到达即打开搜索页，后续结果到达时刷新
+function search_stream(param, keyword, fail_func) {
+  stop_search_stream();
+  SearchStreamStatus = [];
+  param["stream"] = true;
+  show_refresh_progress(`正在搜索 ${keyword} ...`, "search");
   ajax_post("search", param, function (ret) {
-    hide_refresh_process();
-    if (ret.code === 0) {
-      navmenu('search?s=' + title)
-    } else {
-      show_fail_modal(ret.msg);
+    if (ret.code !== 0 || !ret.job_id) {
+      hide_refresh_process();
+      show_fail_modal(ret.msg, fail_func);
+      return;
     }
+    let shown = false;
+    let refresh_timer;
+    const show_results = function () {
+      if (!shown) {
+        shown = true;
+        hide_refresh_process();
+        navmenu(`search?s=${keyword}`);
+      } else if (!refresh_timer) {
+        // 合并短时间内的多次刷新
+        refresh_timer = setTimeout(function () {
+          refresh_timer = undefined;
+          if (CurrentPageUri.startsWith("search")) {
+            window_history_refresh();
+          }
+        }, 1500);
+      }
+    };
+    SearchStreamES = new EventSource(`stream-search?job=${ret.job_id}`);
+    SearchStreamES.onmessage = function (event) {
+      const data = JSON.parse(event.data);
+      if (data.type === "indexer") {
+        SearchStreamStatus.push(data);
+        render_search_stream_status();
+        if (data.count > 0) {
+          show_results();
+        }
+      } else if (data.type === "end") {
+        stop_search_stream();
+        if (shown) {
+          render_search_stream_status(true);
+        } else {
+          hide_refresh_process();
+          if (data.code === 0) {
+            navmenu(`search?s=${keyword}`);
+          } else {
+            show_fail_modal(data.msg, fail_func);
+          }
+        }
+      }
+    };
+    SearchStreamES.onerror = function () {
+      stop_search_stream();
+      if (!shown) {
+        hide_refresh_process();
+        navmenu(`search?s=${keyword}`);
+      }
+    };
   }, true, false);
 }
 
+// 渲染流式搜索各索引站点状态
+function render_search_stream_status(finished) {
+  const status_text = {"done": "完成", "timeout": "超时", "failed": "失败"};
+  if (SearchStreamStatus.length === 0) {
+    return;
+  }
+  const last = SearchStreamStatus[SearchStreamStatus.length - 1];
+  let summary = `已完成 ${last.finished}/${last.tasks}，共 ${last.total} 条结果`;
+  if (finished || last.finished >= last.tasks) {
+    summary = `搜索完成，共 ${last.total} 条结果`;
+  }
+  const details = SearchStreamStatus.filter(function (item) {
+    return item.state !== "done";
+  }).map(function (item) {
+    return `${item.indexer}${status_text[item.state] || item.state}`;
+  });
+  if (details.length > 0) {
+    summary = `${summary}（${details.join("、")}）`;
+  }
+  $("#search_stream_status").text(summary);
+}
+
 // 显示全局加载蒙版
 function show_wait_modal(blur) {
   if (blur) {
@@ -655,15 +743,7 @@ function show_rss_seasons_modal(name, year, type, mediaid, seasons, func) {
 function search_mediainfo_media(tmdbid, title, typestr) {
   hide_mediainfo_modal();
   const param = {"tmdbid": tmdbid, "search_word": title, "media_type": typestr};
-  show_refresh_progress("正在搜索 " + title + " ...", "search");
-  ajax_post("search", param, function (ret) {
-    hide_refresh_process();
-    if (ret.code === 0) {
-      navmenu('search?s=' + title);
-    } else {
-      show_fail_modal(ret.msg);
-    }
-  }, true, false);
+  search_stream(param, title);
 }
 
 //新增订阅
@@ -1318,17 +1398,9 @@ function search_media_advanced() {
   };
   const param = {"search_word": keyword, "filters": filters, "unident": true};
   $("#modal-search-advanced").modal("hide");
-  show_refresh_progress(`正在搜索 ${keyword} ...`, "search");
-  ajax_post("search", param, function (ret) {
-    hide_refresh_process();
-    if (ret.code === 0) {
-      navmenu(`search?s=${keyword}`);
-    } else {
-      show_fail_modal(ret.msg, function () {
-        $("#modal-search-advanced").modal("show");
-      });
-    }
-  }, true, false);
+  search_stream(param, keyword, function () {
+    $("#modal-search-advanced").modal("show");
+  });
 }
 
 //刷新tooltip